@@ -1,13 +1,17 @@
 from typing import Union
 
-import aiohttp
-
 from .base import *
 from .protect import protector
+from ..batch_loader import BatchLoader
 from ..errors import *
 
 
 class FriendMixin(WechatAPIClientBase):
+    def __init__(self, ip: str, port: int):
+        super().__init__(ip, port)
+        # 合并并发的单个联系人详情查询，每批最多20个wxid
+        self.contact_loader = BatchLoader(self._load_contract_details)
+
     async def accept_friend(self, scene: int, v1: str, v2: str) -> bool:
         """接受好友请求
 
@@ -35,7 +39,7 @@ class FriendMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Scene": scene, "V1": v1, "V2": v2}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Friend/PassVerify', json=json_param)
             json_resp = await response.json()
@@ -60,7 +64,7 @@ class FriendMixin(WechatAPIClientBase):
         if isinstance(wxid, list):
             wxid = ",".join(wxid)
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "RequestWxids": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Friend/GetContact', json=json_param)
             json_resp = await response.json()
@@ -77,6 +81,8 @@ class FriendMixin(WechatAPIClientBase):
     async def get_contract_detail(self, wxid: Union[str, list[str]], chatroom: str = "") -> list:
         """获取联系人详情
 
+        查询单个wxid时，与其他并发的单个查询合并为一次批量请求
+
         Args:
             wxid: 联系人wxid
             chatroom: 群聊wxid
@@ -87,14 +93,19 @@ class FriendMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
+        if isinstance(wxid, str) and wxid and "," not in wxid:
+            return await self.contact_loader.load(wxid, chatroom)
+
         if isinstance(wxid, list):
             if len(wxid) > 20:
                 raise ValueError("一次最多查询20个联系人")
             wxid = ",".join(wxid)
 
+        return await self._request_contract_detail(wxid, chatroom)
 
-        async with aiohttp.ClientSession() as session:
-            json_param = {"Wxid": self.wxid, "Towxids": wxid, "Chatroom": chatroom}
+    async def _request_contract_detail(self, wxids: str, chatroom: str = "") -> list:
+        async with self._session_scope() as session:
+            json_param = {"Wxid": self.wxid, "Towxids": wxids, "Chatroom": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Friend/GetContractDetail', json=json_param)
             json_resp = await response.json()
 
@@ -103,6 +114,21 @@ class FriendMixin(WechatAPIClientBase):
             else:
                 self.error_handler(json_resp)
 
+    async def _load_contract_details(self, wxids: list[str], chatroom: str) -> dict:
+        """contact_loader 的批量查询函数，返回 {wxid: 该联系人的详情列表}"""
+        contacts = await self._request_contract_detail(",".join(wxids), chatroom) or []
+        by_wxid = {}
+        for contact in contacts:
+            username = contact.get("UserName")
+            if isinstance(username, dict):
+                username = username.get("string")
+            if username:
+                by_wxid[username] = contact
+        if len(by_wxid) < len(wxids) and len(contacts) == len(wxids):
+            # 返回数据中缺少UserName时按顺序对应
+            by_wxid = dict(zip(wxids, contacts))
+        return {wxid: [by_wxid[wxid]] if wxid in by_wxid else [] for wxid in wxids}
+
     async def get_contract_list(self, wx_seq: int = 0, chatroom_seq: int = 0) -> dict:
         """获取联系人列表
 
@@ -116,7 +142,7 @@ class FriendMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "CurrentWxcontactSeq": wx_seq, "CurrentChatroomContactSeq": chatroom_seq}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Friend/GetContractList', json=json_param)
             json_resp = await response.json()
@@ -141,7 +167,7 @@ class FriendMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {
                 "Wxid": self.wxid,
                 "CurrentWxcontactSeq": wx_seq,
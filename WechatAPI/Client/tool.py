@@ -31,7 +31,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "AesKey": aeskey, "Cdnmidimgurl": cdnmidimgurl}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/CdnDownloadImg', json=json_param)
             json_resp = await response.json()
@@ -59,7 +59,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "MsgId": msg_id, "Voiceurl": voiceurl, "Length": length}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/DownloadVoice', json=json_param)
             json_resp = await response.json()
@@ -85,7 +85,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             # 设置请求超时时间为5分钟，以处理大文件
             timeout = aiohttp.ClientTimeout(total=300)  # 5分钟
 
@@ -114,7 +114,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "MsgId": msg_id}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/DownloadVideo', json=json_param)
             json_resp = await response.json()
@@ -143,7 +143,7 @@ class ToolMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "StepCount": count}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/SetStep', json=json_param)
             json_resp = await response.json()
@@ -169,7 +169,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid,
                           "Proxy": {"ProxyIp": f"{proxy.ip}:{proxy.port}",
                                     "ProxyUser": proxy.username,
@@ -188,7 +188,7 @@ class ToolMixin(WechatAPIClientBase):
         Returns:
             bool: 数据库正常返回True，否则返回False
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             response = await session.get(f'http://{self.ip}:{self.port}/VXAPI/Tools/CheckDatabaseOK')
             json_resp = await response.json()
 
@@ -402,7 +402,7 @@ class ToolMixin(WechatAPIClientBase):
             raise ValueError("文件数据必须是base64字符串、字节数据或文件路径")
 
         # 发送请求上传文件
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Base64": file_base64}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/UploadFile', json=json_param)
             json_resp = await response.json()
@@ -430,7 +430,7 @@ class ToolMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Md5": md5}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Tools/EmojiDownload', json=json_param)
             json_resp = await response.json()
@@ -1,4 +1,3 @@
-import aiohttp
 import base64
 from .base import WechatAPIClientBase
 from ..errors import UserLoggedOut
@@ -36,7 +35,7 @@ class ToolExtensionMixin(WechatAPIClientBase):
             logger.warning(f"无效的分段下载参数: start_pos={start_pos}, data_len={data_len}")
             return b""
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             # 根据提供的API文档构造请求参数
             json_param = {
                 "Wxid": self.wxid,
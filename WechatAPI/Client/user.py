@@ -1,5 +1,3 @@
-import aiohttp
-
 from .base import *
 from .protect import protector
 from ..errors import *
@@ -25,7 +23,7 @@ class UserMixin(WechatAPIClientBase):
         if not wxid:
             wxid = self.wxid
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"wxid": wxid}
             # response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Login/GetCacheInfo', data=json_param)
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/User/GetContractProfile', data=json_param)
@@ -56,7 +54,7 @@ class UserMixin(WechatAPIClientBase):
         elif protector.check(14400) and not self.ignore_protect:
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Style": style}
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/User/GetQRCode', json=json_param)
             json_resp = await response.json()
@@ -102,7 +100,7 @@ class UserMixin(WechatAPIClientBase):
         if not wxid:
             wxid = self.wxid
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"wxid": wxid}
             # response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Login/GetCacheInfo', data=json_param)
             response = await session.post(f'http://{self.ip}:{self.port}/VXAPI/Label/GetList', data=json_param)
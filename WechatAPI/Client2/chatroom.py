@@ -1,7 +1,5 @@
 from typing import Union, Any
 
-import aiohttp
-
 from .base import *
 from .protect import protector
 from ..errors import *
@@ -23,7 +21,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ChatRoomName": chatroom, "ToWxids": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/AddChatroomMember', json=json_param)
             json_resp = await response.json()
@@ -45,7 +43,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "QID": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/GetChatroomInfoDetail', json=json_param)
             json_resp = await response.json()
@@ -71,7 +69,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "QID": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/GetChatroomInfo', json=json_param)
             json_resp = await response.json()
@@ -93,7 +91,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "QID": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/GetChatroomMemberDetail', json=json_param)
             json_resp = await response.json()
@@ -117,7 +115,7 @@ class ChatroomMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(86400):
             raise BanProtection("获取二维码需要在登录后24小时才可使用")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "QID": chatroom}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/GetQRCode', json=json_param)
             json_resp = await response.json()
@@ -146,7 +144,7 @@ class ChatroomMixin(WechatAPIClientBase):
         if isinstance(wxid, list):
             wxid = ",".join(wxid)
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ChatRoomName": chatroom, "ToWxids": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Group/InviteChatroomMember', json=json_param)
             json_resp = await response.json()
@@ -1,5 +1,3 @@
-import aiohttp
-
 from .base import *
 from ..errors import *
 
@@ -19,7 +17,7 @@ class HongBaoMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Xml": xml, "EncryptKey": encrypt_key, "EncryptUserinfo": encrypt_userinfo,"InWay": "1"}
             response = await session.post(f'http://{self.ip}:{self.port}/api/TenPay/Receivewxhb', json=json_param)
             json_resp = await response.json()
@@ -1,64 +1,47 @@
-import asyncio
-import base64
 import os
-from asyncio import Future
-from asyncio import Queue, sleep
-from io import BytesIO
 from pathlib import Path
-from typing import Union
+from typing import Union, Optional
 
 import aiohttp
-import pysilk
 from loguru import logger
-from pydub import AudioSegment
-from pymediainfo import MediaInfo
 
 from .base import *
 from .protect import protector
 from ..errors import *
+from ..send_scheduler import SendScheduler, LANE_TEXT, LANE_MEDIA
+from .. import media_worker
+from ..voice_cache import voice_cache
 
 
 class MessageMixin(WechatAPIClientBase):
     def __init__(self, ip: str, port: int):
-        # 初始化消息队列
         super().__init__(ip, port)
-        self._message_queue = Queue()
-        self._is_processing = False
+        # 发送调度器：会话内按顺序发送，全局令牌桶限速，文本与媒体分通道
+        self.send_scheduler = SendScheduler()
 
-    async def _process_message_queue(self):
-        """
-        处理消息队列的异步方法
-        """
-        if self._is_processing:
-            return
-
-        self._is_processing = True
-        while True:
-            if self._message_queue.empty():
-                self._is_processing = False
-                break
+    def configure_send_scheduler(self, rate: float = None, burst: int = None,
+                                 text_concurrency: int = None, media_concurrency: int = None):
+        """设置发送速率、突发量和各通道并发数
 
-            func, args, kwargs, future = await self._message_queue.get()
-            try:
-                result = await func(*args, **kwargs)
-                future.set_result(result)
-            except Exception as e:
-                future.set_exception(e)
-            finally:
-                self._message_queue.task_done()
-                await sleep(1)  # 消息发送间隔1秒
+        Args:
+            rate (float, optional): 全局每秒发送数
+            burst (int, optional): 全局允许的突发发送数
+            text_concurrency (int, optional): 文本通道并发数
+            media_concurrency (int, optional): 媒体通道并发数
+        """
+        self.send_scheduler.configure(rate, burst, text_concurrency, media_concurrency)
 
     async def _queue_message(self, func, *args, **kwargs):
         """
-        将消息添加到队列
+        将文本类消息交给发送调度器，第一个参数为接收人wxid
         """
-        future = Future()
-        await self._message_queue.put((func, args, kwargs, future))
+        return await self.send_scheduler.submit(args[0], func, *args, lane=LANE_TEXT, **kwargs)
 
-        if not self._is_processing:
-            asyncio.create_task(self._process_message_queue())
-
-        return await future
+    async def _queue_media(self, func, *args, **kwargs):
+        """
+        将图片、语音、视频等媒体消息交给发送调度器的媒体通道，第一个参数为接收人wxid
+        """
+        return await self.send_scheduler.submit(args[0], func, *args, lane=LANE_MEDIA, **kwargs)
 
     async def revoke_message(self, wxid: str, client_msg_id: int, create_time: int, new_msg_id: int) -> bool:
         """撤回消息。
@@ -82,7 +65,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "ClientMsgId": client_msg_id, "CreateTime": create_time,
                           "NewMsgId": new_msg_id}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/Revoke', json=json_param)
@@ -133,7 +116,7 @@ class MessageMixin(WechatAPIClientBase):
         else:
             raise ValueError("Argument 'at' should be str or list")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": content, "Type": 1, "At": at_str}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendTxt', json=json_param)
             json_resp = await response.json()
@@ -161,7 +144,7 @@ class MessageMixin(WechatAPIClientBase):
             ValueError: image_path和image_base64都为空或都不为空时
             根据error_handler处理错误
         """
-        return await self._queue_message(self._send_image_message, wxid, image)
+        return await self._queue_media(self._send_image_message, wxid, image)
 
     async def _send_image_message(self, wxid: str, image: Union[str, bytes, os.PathLike]) -> dict:
         if not self.wxid:
@@ -172,14 +155,13 @@ class MessageMixin(WechatAPIClientBase):
         if isinstance(image, str):
             pass
         elif isinstance(image, bytes):
-            image = base64.b64encode(image).decode()
+            image = await media_worker.b64encode(image)
         elif isinstance(image, os.PathLike):
-            with open(image, 'rb') as f:
-                image = base64.b64encode(f.read()).decode()
+            image = await media_worker.b64encode_file(image)
         else:
             raise ValueError("Argument 'image' can only be str, bytes, or os.PathLike")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": image}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/UploadImg', json=json_param)
             json_resp = await response.json()
@@ -210,26 +192,28 @@ class MessageMixin(WechatAPIClientBase):
                     ValueError: 视频或图片参数都为空或都不为空时
                     根据error_handler处理错误
                 """
+        return await self._queue_media(self._send_video_message, wxid, video, image)
+
+    async def _send_video_message(self, wxid: str, video: Union[str, bytes, os.PathLike],
+                                  image: [str, bytes, os.PathLike] = None):
         if not image:
             image = Path(os.path.join(Path(__file__).resolve().parent, "fallback.png"))
         # get video base64 and duration
         if isinstance(video, str):
             vid_base64 = video
-            video = base64.b64decode(video)
+            video = await media_worker.b64decode(video)
             file_len = len(video)
-            media_info = MediaInfo.parse(BytesIO(video))
+            raw_duration = await media_worker.probe_duration(video)
         elif isinstance(video, bytes):
-            vid_base64 = base64.b64encode(video).decode()
+            vid_base64 = await media_worker.b64encode(video)
             file_len = len(video)
-            media_info = MediaInfo.parse(BytesIO(video))
+            raw_duration = await media_worker.probe_duration(video)
         elif isinstance(video, os.PathLike):
-            with open(video, "rb") as f:
-                file_len = len(f.read())
-                vid_base64 = base64.b64encode(f.read()).decode()
-            media_info = MediaInfo.parse(video)
+            file_len = os.path.getsize(video)
+            vid_base64 = await media_worker.b64encode_file(video)
+            raw_duration = await media_worker.probe_duration(video)
         else:
             raise ValueError("video should be str, bytes, or path")
-        raw_duration = media_info.tracks[0].duration
 
         # 如果外部提供了时长，则优先使用外部时长
         # MediaInfo返回的单位通常是毫秒，确保转换为整数秒
@@ -243,7 +227,6 @@ class MessageMixin(WechatAPIClientBase):
         if video_duration is None:
             try:
                 # 检查时长单位和值
-                raw_duration = media_info.tracks[0].duration
                 if raw_duration is None:
                     # 如果无法获取时长，使用默认值
                     video_duration = 5  # 默认5秒
@@ -266,10 +249,9 @@ class MessageMixin(WechatAPIClientBase):
         if isinstance(image, str):
             image_base64 = image
         elif isinstance(image, bytes):
-            image_base64 = base64.b64encode(image).decode()
+            image_base64 = await media_worker.b64encode(image)
         elif isinstance(image, os.PathLike):
-            with open(image, "rb") as f:
-                image_base64 = base64.b64encode(f.read()).decode()
+            image_base64 = await media_worker.b64encode_file(image)
         else:
             raise ValueError("image should be str, bytes, or path")
 
@@ -277,7 +259,7 @@ class MessageMixin(WechatAPIClientBase):
         predict_time = int(file_len / 1024 / 300)
         logger.info("开始发送视频: 对方wxid:{} 视频base64略 图片base64略 预计耗时:{}秒", wxid, predict_time)
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": "data:video/mp4;base64,"+ vid_base64, "ImageBase64": "data:image/jpeg;base64,"+image_base64,
                           "PlayLength": duration}
             async with session.post(f'http://{self.ip}:{self.port}/api/Msg/SendVideo', json=json_param) as resp:
@@ -292,14 +274,15 @@ class MessageMixin(WechatAPIClientBase):
         else:
             self.error_handler(json_resp)
 
-    async def send_voice_message(self, wxid: str, voice: Union[str, bytes, os.PathLike], format: str = "amr") -> \
-            tuple[int, int, int]:
+    async def send_voice_message(self, wxid: str, voice: Union[str, bytes, os.PathLike], format: str = "amr",
+                                 cache_key: str = None) -> tuple[int, int, int]:
         """发送语音消息。
 
         Args:
             wxid (str): 接收人wxid
             voice (str, bytes, os.PathLike): 语音 接受base64字符串，字节，文件路径
             format (str, optional): 语音格式，支持amr/wav/mp3. Defaults to "amr".
+            cache_key (str, optional): 语音缓存键，由 voice_cache.make_key 生成，提供时转码结果写入语音缓存. Defaults to None.
 
         Returns:
             tuple[int, int, int]: 返回(ClientMsgid, CreateTime, NewMsgId)
@@ -310,10 +293,10 @@ class MessageMixin(WechatAPIClientBase):
             ValueError: voice_path和voice_base64都为空或都不为空时，或format不支持时
             根据error_handler处理错误
         """
-        return await self._queue_message(self._send_voice_message, wxid, voice, format)
+        return await self._queue_media(self._send_voice_message, wxid, voice, format, cache_key)
 
-    async def _send_voice_message(self, wxid: str, voice: Union[str, bytes, os.PathLike], format: str = "amr") -> \
-            tuple[int, int, int]:
+    async def _send_voice_message(self, wxid: str, voice: Union[str, bytes, os.PathLike], format: str = "amr",
+                                  cache_key: str = None) -> tuple[int, int, int]:
         if not self.wxid:
             raise UserLoggedOut("请先登录")
         elif not self.ignore_protect and protector.check(14400):
@@ -323,45 +306,65 @@ class MessageMixin(WechatAPIClientBase):
 
         # read voice to byte
         if isinstance(voice, str):
-            voice_byte = base64.b64decode(voice)
+            voice_byte = await media_worker.b64decode(voice)
         elif isinstance(voice, bytes):
             voice_byte = voice
         elif isinstance(voice, os.PathLike):
-            with open(voice, "rb") as f:
-                voice_byte = f.read()
+            voice_byte = await media_worker.read_file(voice)
         else:
             raise ValueError("voice should be str, bytes, or path")
 
-        # get voice duration and b64
-        if format.lower() == "amr":
-            audio = AudioSegment.from_file(BytesIO(voice_byte), format="amr")
-            voice_base64 = base64.b64encode(voice_byte).decode()
-        elif format.lower() == "wav":
-            audio = AudioSegment.from_file(BytesIO(voice_byte), format="wav").set_channels(1)
-            audio = audio.set_frame_rate(self._get_closest_frame_rate(audio.frame_rate))
-            voice_base64 = base64.b64encode(
-                await pysilk.async_encode(audio.raw_data, sample_rate=audio.frame_rate)).decode()
-        elif format.lower() == "mp3":
-            audio = AudioSegment.from_file(BytesIO(voice_byte), format="mp3").set_channels(1)
-            audio = audio.set_frame_rate(self._get_closest_frame_rate(audio.frame_rate))
-            voice_base64 = base64.b64encode(
-                await pysilk.async_encode(audio.raw_data, sample_rate=audio.frame_rate)).decode()
-        else:
-            raise ValueError("format must be one of amr, wav, mp3")
+        # 解码与 silk 转码在进程池中执行，不阻塞事件循环
+        duration, voice_data = await media_worker.transcode_voice(voice_byte, format)
+        voice_format = "amr" if format == "amr" else "silk"
+        if cache_key:
+            await voice_cache.put(cache_key, duration, voice_format, voice_data)
+
+        return await self._post_voice(wxid, duration, voice_format, voice_data)
 
-        duration = len(audio)
+    async def send_cached_voice_message(self, wxid: str, cache_key: str) -> Optional[tuple[int, int, int]]:
+        """发送语音缓存中已转码的语音，不需要再合成和转码。
 
-        format_dict = {"amr": 0, "wav": 4, "mp3": 4}
+        Args:
+            wxid (str): 接收人wxid
+            cache_key (str): 语音缓存键，由 voice_cache.make_key 生成
 
-        async with aiohttp.ClientSession() as session:
+        Returns:
+            Optional[tuple[int, int, int]]: 返回(ClientMsgid, CreateTime, NewMsgId)，缓存中没有该语音时返回None
+
+        Raises:
+            UserLoggedOut: 未登录时调用
+            BanProtection: 登录新设备后4小时内操作
+            根据error_handler处理错误
+        """
+        return await self._queue_media(self._send_cached_voice_message, wxid, cache_key)
+
+    async def _send_cached_voice_message(self, wxid: str, cache_key: str) -> Optional[tuple[int, int, int]]:
+        if not self.wxid:
+            raise UserLoggedOut("请先登录")
+        elif not self.ignore_protect and protector.check(14400):
+            raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
+
+        cached = await voice_cache.get(cache_key)
+        if cached is None:
+            return None
+        duration, voice_format, voice_data = cached
+        return await self._post_voice(wxid, duration, voice_format, voice_data)
+
+    async def _post_voice(self, wxid: str, duration: int, voice_format: str, voice_data: bytes) -> \
+            tuple[int, int, int]:
+        voice_base64 = await media_worker.b64encode(voice_data)
+        format_dict = {"amr": 0, "silk": 4}
+
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Base64": voice_base64, "VoiceTime": duration,
-                          "Type": format_dict[format]}
+                          "Type": format_dict[voice_format]}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendVoice', json=json_param)
             json_resp = await response.json()
 
             if json_resp.get("Success"):
                 json_param.pop('Base64')
-                logger.info("发送语音消息: 对方wxid:{} 时长:{} 格式:{} 音频base64略", wxid, duration, format)
+                logger.info("发送语音消息: 对方wxid:{} 时长:{} 格式:{} 音频base64略", wxid, duration, voice_format)
                 data = json_resp.get("Data")
                 # 不尝试将ClientMsgId转换为整数，因为它可能包含群聊ID和时间戳
                 return data.get("ClientMsgId"), data.get("CreateTime"), data.get("NewMsgId")
@@ -370,16 +373,7 @@ class MessageMixin(WechatAPIClientBase):
 
     @staticmethod
     def _get_closest_frame_rate(frame_rate: int) -> int:
-        supported = [8000, 12000, 16000, 24000]
-        closest_rate = None
-        smallest_diff = float('inf')
-        for num in supported:
-            diff = abs(frame_rate - num)
-            if diff < smallest_diff:
-                smallest_diff = diff
-                closest_rate = num
-
-        return closest_rate
+        return media_worker.closest_silk_rate(frame_rate)
 
     async def send_link_message(self, wxid: str, url: str, title: str = "", description: str = "",
                                 thumb_url: str = "") -> tuple[str, int, int]:
@@ -409,7 +403,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Url": url, "Title": title, "Desc": description,
                           "ThumbUrl": thumb_url}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/ShareLink', json=json_param)
@@ -434,7 +428,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Infourl": Infourl, "Label": Label, "Scale": Scale,
                           "X": X,"Y": Y, "Poiname": Poiname}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/ShareLocation', json=json_param)
@@ -478,7 +472,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Md5": md5, "TotalLen": total_length}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendEmoji', json=json_param)
             json_resp = await response.json()
@@ -516,7 +510,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "CardWxid": card_wxid, "CardAlias": card_alias,
                           "CardNickname": card_nickname}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendCard', json=json_param)
@@ -557,7 +551,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Xml": xml, "Type": type}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendApp', json=json_param)
             json_resp = await response.json()
@@ -593,7 +587,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendCDNFile', json=json_param)
             json_resp = await response.json()
@@ -628,7 +622,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendCDNImg', json=json_param)
             json_resp = await response.json()
@@ -663,7 +657,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Content": xml}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendCDNVideo', json=json_param)
             json_resp = await response.json()
@@ -699,7 +693,7 @@ class MessageMixin(WechatAPIClientBase):
         elif not self.ignore_protect and protector.check(14400):
             raise BanProtection("风控保护: 新设备登录后4小时内请挂机")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "ToWxid": wxid, "Md5": md5, "TotalLen": total_len}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/SendEmoji', json=json_param)
             json_resp = await response.json()
@@ -723,9 +717,9 @@ class MessageMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "Scene": 0, "Synckey": ""}
-            response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/Sync', json=json_param)
+            response = await session.post(f'http://{self.ip}:{self.port}/api/Msg/Sync', json=json_param, timeout=aiohttp.ClientTimeout(total=10))
             json_resp = await response.json()
 
             if json_resp.get("Success"):
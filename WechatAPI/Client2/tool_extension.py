@@ -1,4 +1,3 @@
-import aiohttp
 import base64
 from .base import WechatAPIClientBase
 from ..errors import UserLoggedOut
@@ -22,7 +21,7 @@ class ToolExtensionMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid, "FileAesKey": aeskey, "FileNo": cdnmidimgurl}
             logger.info(f"调用CDN高清图片下载接口: {json_param}")
             response = await session.post(f'http://{self.ip}:{self.port}/api/Tools/CdnDownloadImage', json=json_param)
@@ -1,4 +1,12 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import aiohttp
 
 from WechatAPI.errors import *
 
@@ -44,7 +52,12 @@ class WechatAPIClientBase:
         alias (str): 别名
         phone (str): 手机号
         ignore_protect (bool): 是否忽略保护机制
+        connection_limit (int): 到协议服务器的最大并发连接数
+        keepalive_timeout (float): 空闲连接保持时间（秒）
     """
+    connection_limit: int = 100
+    keepalive_timeout: float = 60
+
     def __init__(self, ip: str, port: int):
         self.ip = ip
         self.port = port
@@ -56,9 +69,106 @@ class WechatAPIClientBase:
 
         self.ignore_protect = False
 
+        # 长连接会话，按事件循环各保留一个（管理后台可能运行在其他事件循环中）
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+        # 每个接口的耗时统计
+        self.endpoint_stats: Dict[str, dict] = {}
+
         # 调用所有 Mixin 的初始化方法
         super().__init__()
 
+    def configure_http(self, connection_limit: Optional[int] = None, keepalive_timeout: Optional[float] = None):
+        """设置连接池参数，已创建的会话会在下次请求时按新参数重建
+
+        Args:
+            connection_limit (int, optional): 最大并发连接数
+            keepalive_timeout (float, optional): 空闲连接保持时间（秒）
+        """
+        if connection_limit:
+            self.connection_limit = int(connection_limit)
+        if keepalive_timeout:
+            self.keepalive_timeout = float(keepalive_timeout)
+        for session in list(self._sessions.values()):
+            if not session.closed:
+                asyncio.ensure_future(session.close())
+        self._sessions.clear()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环的长连接会话，不存在或已关闭时创建"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connection_limit,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=300)
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[self._create_trace_config()])
+            self._sessions[loop] = session
+        return session
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        """在长连接会话上执行请求，连接出错时丢弃会话，下次请求重新创建"""
+        session = self._get_session()
+        try:
+            yield session
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            await self._discard_session(session)
+            raise
+
+    async def _discard_session(self, session: aiohttp.ClientSession):
+        for loop, cached in list(self._sessions.items()):
+            if cached is session:
+                del self._sessions[loop]
+        if not session.closed:
+            await session.close()
+
+    async def close_session(self):
+        """关闭当前事件循环的会话，程序退出时调用"""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session and not session.closed:
+            await session.close()
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.start = time.perf_counter()
+
+        async def on_request_end(session, ctx, params):
+            self._record_latency(params.url, time.perf_counter() - ctx.start, False)
+
+        async def on_request_exception(session, ctx, params):
+            self._record_latency(params.url, time.perf_counter() - ctx.start, True)
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    def _record_latency(self, url, elapsed: float, failed: bool):
+        endpoint = urlparse(str(url)).path
+        stats = self.endpoint_stats.get(endpoint)
+        if stats is None:
+            stats = self.endpoint_stats[endpoint] = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0}
+        stats["count"] += 1
+        stats["total"] += elapsed
+        if elapsed > stats["max"]:
+            stats["max"] = elapsed
+        if failed:
+            stats["errors"] += 1
+
+    def get_endpoint_stats(self) -> Dict[str, dict]:
+        """获取每个接口的请求次数、失败次数、平均和最大耗时（毫秒）"""
+        return {
+            endpoint: {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "avg_ms": round(stats["total"] / stats["count"] * 1000, 2) if stats["count"] else 0,
+                "max_ms": round(stats["max"] * 1000, 2),
+            }
+            for endpoint, stats in self.endpoint_stats.items()
+        }
+
     @staticmethod
     def error_handler(json_resp):
         """处理API响应中的错误码
@@ -19,7 +19,7 @@ class LoginMixin(WechatAPIClientBase):
             bool: 如果WechatAPI正在运行返回True，否则返回False。
         """
         try:
-            async with aiohttp.ClientSession() as session:
+            async with self._session_scope() as session:
                 response = await session.get(f'http://{self.ip}:{self.port}/api/IsRunning')
                 return await response.text() == 'OK'
         except aiohttp.client_exceptions.ClientConnectorError:
@@ -40,7 +40,7 @@ class LoginMixin(WechatAPIClientBase):
         Raises:
             根据error_handler处理错误
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {'DeviceName': device_name, 'DeviceID': device_id}
             if proxy:
                 json_param['ProxyInfo'] = {'ProxyIp': f'{proxy.ip}:{proxy.port}',
@@ -95,7 +95,7 @@ class LoginMixin(WechatAPIClientBase):
         Raises:
             根据error_handler处理错误
         """
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"uuid": uuid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/CheckQR', data=json_param)
             if response.content_type == 'application/json':
@@ -126,7 +126,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/Logout', json=json_param)
             json_resp = await response.json()
@@ -158,7 +158,7 @@ class LoginMixin(WechatAPIClientBase):
         if not wxid and self.wxid:
             wxid = self.wxid
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/Awaken', json=json_param)
             json_resp = await response.json()
@@ -192,7 +192,7 @@ class LoginMixin(WechatAPIClientBase):
         if not wxid and self.wxid:
             wxid = self.wxid
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"wxid": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/TwiceAutoAuth', data=json_param)
             json_resp = await response.json()
@@ -213,7 +213,7 @@ class LoginMixin(WechatAPIClientBase):
             dict: 返回缓存信息，如果未提供wxid且未登录返回空字典
         """
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"wxid": wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/GetCacheInfo', data=json_param)
             json_resp = await response.json()
@@ -236,7 +236,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/HeartBeatLong', json=json_param)
             json_resp = await response.json()
@@ -260,7 +260,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/HeartBeatLong', data=json_param)
             json_resp = await response.json()
@@ -284,7 +284,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/AutoHeartbeatStop', json=json_param)
             json_resp = await response.json()
@@ -307,7 +307,7 @@ class LoginMixin(WechatAPIClientBase):
         if not self.wxid:
             raise UserLoggedOut("请先登录")
 
-        async with aiohttp.ClientSession() as session:
+        async with self._session_scope() as session:
             json_param = {"Wxid": self.wxid}
             response = await session.post(f'http://{self.ip}:{self.port}/api/Login/AutoHeartbeatStatus', json=json_param)
             json_resp = await response.json()
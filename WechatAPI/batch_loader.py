@@ -0,0 +1,128 @@
+"""批量查询合并器
+
+联系人详情接口一次最多可以查询 20 个 wxid，但调用方几乎都是一次查一个。
+这里把短时间窗口内并发的单个查询收集起来，合并为一次批量请求，再把结果分发给各个调用方：
+
+- 窗口内攒够一批（默认 20 个）立即发出，否则等待窗口结束（默认几毫秒）后发出
+- 同一个键已在排队或请求中时直接等待同一个结果，不重复查询
+- 管理后台运行在其他事件循环中，每个事件循环各自合并
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class _LoopState:
+    """一个事件循环中待发出和请求中的查询"""
+
+    def __init__(self):
+        # 分组 -> 当前正在收集的一批键；分组用于区分不能合并到同一请求的查询（如不同群聊）
+        self.pending: Dict[Hashable, List[Hashable]] = {}
+        self.timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # (分组, 键) -> 结果 future，排队和请求中的查询都在这里
+        self.futures: Dict[Tuple[Hashable, Hashable], asyncio.Future] = {}
+        self.tasks = set()
+
+
+class BatchLoader:
+    """合并并发单键查询的加载器
+
+    Args:
+        batch_fn: 批量查询协程函数，参数为 (键列表, 分组)，返回 {键: 结果}，缺少的键结果为 None
+        max_batch (int): 每次请求最多包含的键数量
+        window (float): 收集查询的时间窗口（秒）
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable], Hashable], Awaitable[Dict[Hashable, Any]]],
+                 max_batch: int = 20, window: float = 0.005):
+        self.batch_fn = batch_fn
+        self.max_batch = max(int(max_batch), 1)
+        self.window = max(float(window), 0.0)
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+        self.stats = {"requests": 0, "hits": 0, "batches": 0, "keys": 0, "failed": 0,
+                      "max_batch_size": 0, "latency_total": 0.0, "latency_max": 0.0}
+
+    def _state(self) -> Tuple[asyncio.AbstractEventLoop, _LoopState]:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return loop, state
+
+    async def load(self, key: Hashable, group: Hashable = "") -> Any:
+        """查询单个键，与同一窗口内的其他查询合并发出"""
+        loop, state = self._state()
+        self.stats["requests"] += 1
+
+        future = state.futures.get((group, key))
+        if future is not None:
+            self.stats["hits"] += 1
+            # shield: 一个调用方被取消时不影响其他等待同一结果的调用方
+            return await asyncio.shield(future)
+
+        future = state.futures[(group, key)] = loop.create_future()
+        batch = state.pending.setdefault(group, [])
+        batch.append(key)
+        if len(batch) >= self.max_batch:
+            self._dispatch(state, group)
+        elif len(batch) == 1:
+            state.timers[group] = loop.call_later(self.window, self._dispatch, state, group)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable], group: Hashable = "") -> List[Any]:
+        """查询多个键，结果顺序与 keys 一致"""
+        return list(await asyncio.gather(*(self.load(key, group) for key in keys)))
+
+    def _dispatch(self, state: _LoopState, group: Hashable):
+        timer = state.timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        keys = state.pending.pop(group, None)
+        if not keys:
+            return
+        task = asyncio.ensure_future(self._run(state, group, keys))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+
+    async def _run(self, state: _LoopState, group: Hashable, keys: List[Hashable]):
+        start = time.perf_counter()
+        try:
+            results = await self.batch_fn(keys, group)
+        except BaseException as e:
+            self.stats["failed"] += 1
+            for key in keys:
+                future = state.futures.pop((group, key), None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return
+
+        elapsed = time.perf_counter() - start
+        self.stats["batches"] += 1
+        self.stats["keys"] += len(keys)
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], len(keys))
+        self.stats["latency_total"] += elapsed
+        self.stats["latency_max"] = max(self.stats["latency_max"], elapsed)
+        for key in keys:
+            future = state.futures.pop((group, key), None)
+            if future is not None and not future.done():
+                future.set_result((results or {}).get(key))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并效果和请求耗时统计"""
+        batches = self.stats["batches"]
+        return {
+            "requests": self.stats["requests"],
+            "hits": self.stats["hits"],
+            "batches": batches,
+            "failed": self.stats["failed"],
+            "avg_batch_size": round(self.stats["keys"] / batches, 2) if batches else 0,
+            "max_batch_size": self.stats["max_batch_size"],
+            "avg_latency_ms": round(self.stats["latency_total"] / batches * 1000, 2) if batches else 0,
+            "max_latency_ms": round(self.stats["latency_max"] * 1000, 2),
+            "pending": sum(len(state.futures) for state in list(self._states.values())),
+        }
@@ -0,0 +1,193 @@
+"""媒体处理工作池
+
+发送图片、语音、视频前的 base64 编码、时长解析和 silk 转码原先直接在事件循环中执行，
+一个大文件或一段 TTS 语音的转码会阻塞整个循环，期间收不到任何消息。这里把这些工作移出事件循环：
+
+- 转码（pydub 解码 + silk 编码）是纯 CPU 计算，放入进程池，不受 GIL 影响
+- 文件读取、base64 编码、哈希、MediaInfo 解析主要是 C 实现或 I/O，放入线程池即可
+
+协议接口要求把整个文件的 base64 放在 JSON 请求体中，编码结果仍会完整保存在内存里。
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Optional, Tuple, Union
+
+from loguru import logger
+
+# 计算文件哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+SILK_SAMPLE_RATES = (8000, 12000, 16000, 24000)
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_thread_workers = min(8, (os.cpu_count() or 1) + 2)
+_process_workers = max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def configure(thread_workers: int = None, process_workers: int = None):
+    """设置工作池大小，需在第一次使用前调用"""
+    global _thread_workers, _process_workers
+    if thread_workers:
+        _thread_workers = max(int(thread_workers), 1)
+    if process_workers:
+        _process_workers = max(int(process_workers), 1)
+
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=_thread_workers, thread_name_prefix="media-worker")
+    return _thread_pool
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=_process_workers)
+    return _process_pool
+
+
+def shutdown():
+    """关闭工作池"""
+    global _thread_pool, _process_pool
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def _run(executor: Executor, func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def run_in_thread(func, *args):
+    """在线程池中执行函数"""
+    return await _run(_get_thread_pool(), func, *args)
+
+
+async def run_in_process(func, *args):
+    """在进程池中执行函数，进程池不可用时回退到线程池
+
+    func 及参数必须可以被 pickle，即模块级函数
+    """
+    global _process_pool
+    try:
+        return await _run(_get_process_pool(), func, *args)
+    except (BrokenProcessPool, OSError, NotImplementedError) as e:
+        logger.warning(f"媒体处理进程池不可用，回退到线程池执行: {e}")
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+        return await run_in_thread(func, *args)
+
+
+# ---------- base64 / 哈希 ----------
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _b64encode_file(path: Union[str, os.PathLike]) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+def _read_file(path: Union[str, os.PathLike]) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _file_digest(path: Union[str, os.PathLike], algorithm: str) -> str:
+    h = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def b64encode(data: bytes) -> str:
+    """将字节编码为 base64 字符串"""
+    return await run_in_thread(_b64encode, data)
+
+
+async def b64decode(data: str) -> bytes:
+    """将 base64 字符串解码为字节"""
+    return await run_in_thread(base64.b64decode, data)
+
+
+async def b64encode_file(path: Union[str, os.PathLike]) -> str:
+    """在线程池中读取文件并编码为 base64 字符串"""
+    return await run_in_thread(_b64encode_file, path)
+
+
+async def read_file(path: Union[str, os.PathLike]) -> bytes:
+    """在线程池中读取文件"""
+    return await run_in_thread(_read_file, path)
+
+
+async def digest(data: Union[bytes, str, os.PathLike], algorithm: str = "md5") -> str:
+    """计算字节或文件的哈希值"""
+    if isinstance(data, bytes):
+        return await run_in_thread(lambda: hashlib.new(algorithm, data).hexdigest())
+    return await run_in_thread(_file_digest, data, algorithm)
+
+
+# ---------- 媒体解析与转码 ----------
+
+def _probe_duration(source: Union[bytes, str, os.PathLike]) -> Optional[float]:
+    from pymediainfo import MediaInfo
+
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    media_info = MediaInfo.parse(source)
+    return media_info.tracks[0].duration
+
+
+async def probe_duration(source: Union[bytes, str, os.PathLike]) -> Optional[float]:
+    """用 MediaInfo 解析媒体时长，返回第一个轨道的原始时长（通常为毫秒）"""
+    return await run_in_thread(_probe_duration, source)
+
+
+def closest_silk_rate(frame_rate: int) -> int:
+    """返回与给定采样率最接近的 silk 支持的采样率"""
+    return min(SILK_SAMPLE_RATES, key=lambda rate: abs(frame_rate - rate))
+
+
+def _encode_voice(voice_byte: bytes, format: str) -> Tuple[int, bytes]:
+    """解码音频并转换为微信语音格式，返回 (时长毫秒, 语音数据)
+
+    amr 原样返回，wav/mp3 转为单声道 silk
+    """
+    from pydub import AudioSegment
+
+    format = format.lower()
+    if format == "amr":
+        audio = AudioSegment.from_file(BytesIO(voice_byte), format="amr")
+        return len(audio), voice_byte
+
+    import pysilk
+
+    audio = AudioSegment.from_file(BytesIO(voice_byte), format=format).set_channels(1)
+    audio = audio.set_frame_rate(closest_silk_rate(audio.frame_rate))
+    silk = pysilk.encode(audio.raw_data, sample_rate=audio.frame_rate)
+    return len(audio), silk
+
+
+async def transcode_voice(voice_byte: bytes, format: str) -> Tuple[int, bytes]:
+    """在进程池中转码语音，返回 (时长毫秒, 语音数据)"""
+    return await run_in_process(_encode_voice, voice_byte, format)
+
+
+async def encode_voice(voice_byte: bytes, format: str) -> Tuple[int, str]:
+    """在进程池中转码语音，返回 (时长毫秒, 语音base64)"""
+    duration, data = await transcode_voice(voice_byte, format)
+    return duration, await b64encode(data)
@@ -0,0 +1,209 @@
+"""发送调度器
+
+替代原先整个账号共用一个队列、每条消息之后固定等待 1 秒的发送方式：
+
+- 每个会话（接收人 wxid）内部严格按提交顺序发送
+- 不同会话之间并发发送，由全局令牌桶限制总体速率和突发量
+- 文本类消息与图片、语音、视频等大体积媒体消息使用不同的通道，
+  各自限制并发数，媒体上传不会占满文本回复的并发
+- 管理后台运行在其他事件循环中，会话队列和通道并发按事件循环分开，令牌桶全局共用
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+LANE_TEXT = "text"
+LANE_MEDIA = "media"
+
+
+class TokenBucket:
+    """令牌桶限速器
+
+    Args:
+        rate (float): 每秒补充的令牌数，即长期平均发送速率
+        burst (int): 桶容量，即允许的最大突发数量
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(float(rate), 0.01)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        # 多个事件循环（线程）共用同一个桶，只在计算令牌时短暂加锁
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """取得一个令牌，令牌不足时等待"""
+        # 先预留令牌再等待，令牌数可以为负，等待者按预留的先后顺序取得令牌
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class _Job:
+    __slots__ = ("func", "args", "kwargs", "future", "lane", "enqueued_at")
+
+    def __init__(self, func, args, kwargs, future, lane):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+
+
+class _LoopState:
+    """一个事件循环中的会话队列、发送协程和通道并发"""
+
+    def __init__(self):
+        self.lane_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 每个会话一个待发送队列，会话有任务时才存在对应的发送协程
+        self.conversations: Dict[str, Deque[_Job]] = {}
+        self.drainers: Dict[str, asyncio.Task] = {}
+
+
+class SendScheduler:
+    """按会话排序、全局限速、文本与媒体分通道的发送调度器
+
+    Args:
+        rate (float): 全局每秒发送数
+        burst (int): 全局允许的突发发送数
+        text_concurrency (int): 文本通道同时发送的会话数
+        media_concurrency (int): 媒体通道同时上传的数量
+    """
+
+    def __init__(self, rate: float = 2.0, burst: int = 5, text_concurrency: int = 8, media_concurrency: int = 2):
+        self.bucket = TokenBucket(rate, burst)
+        self._lane_limits = {LANE_TEXT: max(int(text_concurrency), 1), LANE_MEDIA: max(int(media_concurrency), 1)}
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+        self._stats = {
+            lane: {"pending": 0, "sent": 0, "failed": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in (LANE_TEXT, LANE_MEDIA)
+        }
+
+    def configure(self, rate: Optional[float] = None, burst: Optional[int] = None,
+                  text_concurrency: Optional[int] = None, media_concurrency: Optional[int] = None):
+        """调整限速和并发参数，对之后取得令牌/通道的任务生效"""
+        if rate or burst:
+            self.bucket = TokenBucket(rate or self.bucket.rate, burst or self.bucket.burst)
+        if text_concurrency:
+            self._lane_limits[LANE_TEXT] = max(int(text_concurrency), 1)
+        if media_concurrency:
+            self._lane_limits[LANE_MEDIA] = max(int(media_concurrency), 1)
+        for state in list(self._states.values()):
+            state.lane_semaphores.clear()
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    def _semaphore(self, state: _LoopState, lane: str) -> asyncio.Semaphore:
+        semaphore = state.lane_semaphores.get(lane)
+        if semaphore is None:
+            semaphore = state.lane_semaphores[lane] = asyncio.Semaphore(self._lane_limits[lane])
+        return semaphore
+
+    async def submit(self, conversation: str, func: Callable[..., Awaitable[Any]], *args,
+                     lane: str = LANE_TEXT, **kwargs) -> Any:
+        """提交一个发送任务并等待其结果
+
+        Args:
+            conversation (str): 会话标识，一般为接收人wxid，同一会话内按提交顺序发送
+            func: 实际发送消息的协程函数
+            lane (str): 发送通道，LANE_TEXT 或 LANE_MEDIA
+        """
+        state = self._state()
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(func, args, kwargs, future, lane)
+
+        queue = state.conversations.get(conversation)
+        if queue is None:
+            queue = state.conversations[conversation] = deque()
+        queue.append(job)
+        self._stats[lane]["pending"] += 1
+
+        if conversation not in state.drainers:
+            state.drainers[conversation] = asyncio.create_task(self._drain(state, conversation))
+
+        return await future
+
+    async def _drain(self, state: _LoopState, conversation: str):
+        """依次发送一个会话中的消息，队列为空时退出并回收该会话"""
+        queue = state.conversations[conversation]
+        try:
+            while queue:
+                job = queue.popleft()
+                stats = self._stats[job.lane]
+                async with self._semaphore(state, job.lane):
+                    await self.bucket.acquire()
+
+                    waited = time.monotonic() - job.enqueued_at
+                    stats["pending"] -= 1
+                    stats["wait_total"] += waited
+                    if waited > stats["wait_max"]:
+                        stats["wait_max"] = waited
+
+                    try:
+                        result = await job.func(*job.args, **job.kwargs)
+                    except Exception as e:
+                        stats["failed"] += 1
+                        if not job.future.done():
+                            job.future.set_exception(e)
+                    else:
+                        stats["sent"] += 1
+                        if not job.future.done():
+                            job.future.set_result(result)
+        finally:
+            state.drainers.pop(conversation, None)
+            if not queue:
+                state.conversations.pop(conversation, None)
+            else:
+                # 协程被取消时，剩余的任务不再发送
+                while queue:
+                    job = queue.popleft()
+                    self._stats[job.lane]["pending"] -= 1
+                    if not job.future.done():
+                        job.future.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取队列深度、等待时间等指标"""
+        lanes = {}
+        for lane, stats in self._stats.items():
+            finished = stats["sent"] + stats["failed"]
+            lanes[lane] = {
+                "pending": stats["pending"],
+                "sent": stats["sent"],
+                "failed": stats["failed"],
+                "avg_wait_ms": round(stats["wait_total"] / finished * 1000, 2) if finished else 0,
+                "max_wait_ms": round(stats["wait_max"] * 1000, 2),
+                "concurrency": self._lane_limits[lane],
+            }
+        return {
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "active_conversations": sum(len(state.drainers) for state in list(self._states.values())),
+            "deepest_conversations": self._deepest(5),
+            "lanes": lanes,
+        }
+
+    def _deepest(self, limit: int) -> Tuple[Tuple[str, int], ...]:
+        depths = sorted(((conv, len(queue)) for state in list(self._states.values())
+                         for conv, queue in list(state.conversations.items()) if queue),
+                        key=lambda item: item[1], reverse=True)
+        return tuple(depths[:limit])
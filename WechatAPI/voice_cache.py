@@ -0,0 +1,261 @@
+"""语音合成缓存
+
+帮助菜单、问候语、错误提示这类固定文本每次回复都要重新调用一次 TTS 接口，再在进程池中转码为 silk。
+这里按 (提供方, 音色, 文本, 格式) 的内容哈希缓存转码后的最终语音数据，命中时跳过 TTS 请求和转码：
+
+- 磁盘缓存保存在 resource/voice_cache 下，总大小超过上限时淘汰最久未使用的语音
+- 最近使用的语音同时保留在内存中，命中时不读磁盘
+- 文件名就是缓存键，重启后从磁盘恢复索引，按修改时间还原使用顺序
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from . import media_worker
+
+CACHE_DIR = os.path.join("resource", "voice_cache")
+# 缓存的语音格式：amr 原样发送，其他格式转码为 silk
+VOICE_FORMATS = ("silk", "amr")
+
+
+class VoiceCache:
+    """内容寻址的语音缓存
+
+    Args:
+        cache_dir: 磁盘缓存目录
+        max_bytes: 磁盘缓存总大小上限（字节）
+        memory_bytes: 内存热缓存大小上限（字节）
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 200 * 1024 * 1024,
+                 memory_bytes: int = 16 * 1024 * 1024):
+        self.enabled = True
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        # 缓存键 -> (格式, 文件大小)，按使用顺序排列，最久未使用的在前
+        self._index: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._disk_size = 0
+        # 缓存键 -> (时长毫秒, 格式, 语音数据)
+        self._memory: "OrderedDict[str, Tuple[int, str, bytes]]" = OrderedDict()
+        self._memory_size = 0
+        self._loaded = False
+
+        self.stats = {"requests": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "stores": 0, "evictions": 0, "errors": 0, "bytes_saved": 0}
+
+    def configure(self, config: Dict[str, Any]):
+        """读取 main_config.toml 中的 [VoiceCache] 配置"""
+        self.enabled = config.get("enable", True)
+        cache_dir = config.get("dir", self.cache_dir)
+        if cache_dir != self.cache_dir:
+            self.cache_dir = cache_dir
+            self._reset()
+        self.max_bytes = int(float(config.get("max-size-mb", self.max_bytes / 1024 / 1024)) * 1024 * 1024)
+        self.memory_bytes = int(float(config.get("memory-size-mb", self.memory_bytes / 1024 / 1024)) * 1024 * 1024)
+        if self.enabled:
+            self._ensure_index()
+            self._trim_memory()
+            self._remove_files(self._evict())
+
+    @staticmethod
+    def make_key(provider: str, voice: str, text: str, format: str = "silk") -> str:
+        """根据提供方、音色、文本和缓存格式生成缓存键"""
+        raw = json.dumps([provider or "", voice or "", text or "", format or ""], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---------- 读写 ----------
+
+    async def get(self, key: str) -> Optional[Tuple[int, str, bytes]]:
+        """读取缓存，返回 (时长毫秒, 格式, 语音数据)，未命中返回 None"""
+        if not self.enabled or not key:
+            return None
+        self.stats["requests"] += 1
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            if key in self._index:
+                self._index.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            self.stats["bytes_saved"] += len(entry[2])
+            return entry
+
+        self._ensure_index()
+        item = self._index.get(key)
+        if item is None:
+            self.stats["misses"] += 1
+            return None
+
+        voice_format, _ = item
+        try:
+            entry = await media_worker.run_in_thread(self._read_file, self._path(key, voice_format))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取语音缓存 {key} 失败: {e}")
+            self.stats["errors"] += 1
+            self.stats["misses"] += 1
+            self._drop(key)
+            return None
+
+        duration, data = entry
+        self._index.move_to_end(key)
+        self._remember(key, duration, voice_format, data)
+        self.stats["disk_hits"] += 1
+        self.stats["bytes_saved"] += len(data)
+        return duration, voice_format, data
+
+    async def put(self, key: str, duration: int, voice_format: str, data: bytes):
+        """写入缓存，超过大小上限时淘汰最久未使用的语音"""
+        if not self.enabled or not key or not data:
+            return
+        if voice_format not in VOICE_FORMATS:
+            raise ValueError(f"voice_format must be one of {', '.join(VOICE_FORMATS)}")
+        self._ensure_index()
+
+        size = len(data) + 4
+        self._remember(key, duration, voice_format, data)
+        if size > self.max_bytes:
+            return
+        try:
+            await media_worker.run_in_thread(self._write_file, self._path(key, voice_format), duration, data)
+        except OSError as e:
+            logger.warning(f"写入语音缓存 {key} 失败: {e}")
+            self.stats["errors"] += 1
+            return
+
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._disk_size -= old[1]
+        self._index[key] = (voice_format, size)
+        self._disk_size += size
+        self.stats["stores"] += 1
+
+        evicted = self._evict()
+        if evicted:
+            await media_worker.run_in_thread(self._remove_files, evicted)
+
+    # ---------- 内存 ----------
+
+    def _remember(self, key: str, duration: int, voice_format: str, data: bytes):
+        if len(data) > self.memory_bytes // 4:
+            # 太大的语音只放磁盘，避免一条就挤掉整个内存缓存
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[2])
+        self._memory[key] = (duration, voice_format, data)
+        self._memory_size += len(data)
+        self._trim_memory()
+
+    def _trim_memory(self):
+        while self._memory and self._memory_size > self.memory_bytes:
+            _, (_, _, data) = self._memory.popitem(last=False)
+            self._memory_size -= len(data)
+
+    # ---------- 磁盘 ----------
+
+    def _path(self, key: str, voice_format: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{voice_format}")
+
+    @staticmethod
+    def _read_file(path: str) -> Tuple[int, bytes]:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if len(raw) < 4:
+            raise ValueError("缓存文件不完整")
+        # 更新修改时间，重启后按修改时间还原使用顺序
+        os.utime(path)
+        return int.from_bytes(raw[:4], "big"), raw[4:]
+
+    @staticmethod
+    def _write_file(path: str, duration: int, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(max(int(duration), 0).to_bytes(4, "big"))
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self) -> List[str]:
+        """从索引中移除最久未使用的语音直到不超过上限，返回要删除的文件"""
+        paths = []
+        while self._index and self._disk_size > self.max_bytes:
+            key, (voice_format, size) = self._index.popitem(last=False)
+            self._disk_size -= size
+            paths.append(self._path(key, voice_format))
+            self.stats["evictions"] += 1
+        return paths
+
+    def _drop(self, key: str):
+        item = self._index.pop(key, None)
+        if item is not None:
+            self._disk_size -= item[1]
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[2])
+
+    def _reset(self):
+        self._index.clear()
+        self._memory.clear()
+        self._disk_size = self._memory_size = 0
+        self._loaded = False
+
+    def _ensure_index(self):
+        """第一次使用时扫描缓存目录，建立索引"""
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        start = time.perf_counter()
+        try:
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    key, _, voice_format = name.partition(".")
+                    if voice_format not in VOICE_FORMATS:
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, key, voice_format, stat.st_size))
+        except OSError as e:
+            logger.warning(f"扫描语音缓存目录失败: {e}")
+        for _, key, voice_format, size in sorted(entries):
+            self._index[key] = (voice_format, size)
+            self._disk_size += size
+        if entries:
+            logger.info(f"已载入 {len(entries)} 条语音缓存，共 {self._disk_size / 1024 / 1024:.1f}MB，"
+                        f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中率、节省的数据量和缓存占用"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "hits": hits,
+            "hit_rate": round(hits / requests * 100, 1) if requests else 0.0,
+            "entries": len(self._index),
+            "disk_bytes": self._disk_size,
+            "max_bytes": self.max_bytes,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_size,
+        }
+
+
+voice_cache = VoiceCache()
@@ -318,6 +318,7 @@ async def api_get_account_list(request: Request):
         account_list["current"] = current_wxid
 
         # 格式化时间并添加头像路径
+        missing_avatars = []
         for account in account_list["accounts"]:
             if "last_login" in account:
                 # 转换时间戳为可读格式
@@ -328,14 +329,19 @@ async def api_get_account_list(request: Request):
 
             # 获取头像路径
             if "wxid" in account:
-                # 尝试下载头像
-                try:
-                    await download_avatar(account["wxid"])
-                except Exception as e:
-                    logger.error(f"下载头像失败: {e}")
+                if not (Path("resource") / "avatars" / f"{account['wxid']}.jpg").exists():
+                    missing_avatars.append(account["wxid"])
                 # 获取头像路径
                 account["avatar_url"] = get_bot_avatar(account["wxid"])
 
+        # 缺少的头像交给后台任务下载，不阻塞本次请求
+        if missing_avatars:
+            try:
+                from job_engine import job_engine
+                job_engine.submit("avatar_download", {"wxids": missing_avatars})
+            except Exception as e:
+                logger.error(f"提交头像下载任务失败: {e}")
+
         # 如果当前有登录的账号，尝试从API获取最新的昵称和头像
         if current_wxid:
             try:
@@ -529,6 +535,8 @@ async def api_switch_account(wxid: str, request: Request):
                 # 尝试导入并清除联系人缓存
                 from database.contacts_db import clear_contacts_cache
                 clear_contacts_cache()
+                from database.group_members_db import group_member_cache
+                group_member_cache.clear()
                 logger.info("清除联系人缓存成功")
             except Exception as e:
                 logger.warning(f"清除联系人缓存失败: {e}")
@@ -1088,6 +1096,17 @@ async def check_and_update_account_list():
         logger.error(f"检查并更新账号列表失败: {e}")
         return False
 
+async def _list_avatar_wxids(params: Dict) -> List[str]:
+    """头像下载任务的条目：指定的wxid，默认为所有账号"""
+    if params.get("wxids"):
+        return params["wxids"]
+    return [account["wxid"] for account in get_account_list().get("accounts", []) if account.get("wxid")]
+
+
+async def _download_avatar_item(wxid: str, params: Dict) -> bool:
+    return await download_avatar(wxid)
+
+
 def register_account_manager_routes(app, auth_func, status_update_func=None, restart_func=None):
     """
     注册账号管理相关路由
@@ -1106,6 +1125,10 @@ def register_account_manager_routes(app, auth_func, status_update_func=None, res
     # 确保账号目录存在
     ensure_accounts_dir()
 
+    # 注册批量下载头像的后台任务
+    from job_engine import job_engine
+    job_engine.register("avatar_download", _list_avatar_wxids, _download_avatar_item, concurrency=4, title="下载头像")
+
     # 注册路由
     app.include_router(router)
 
@@ -0,0 +1,361 @@
+# 管理后台后台任务引擎
+"""
+同步全部联系人、同步群成员、批量下载头像等操作原先在 HTTP 请求中逐个执行，
+几千个联系人要占用一个请求很多分钟，期间没有进度，请求断开或重启后只能从头再来。
+
+这里改为提交后台任务：
+- 接口提交任务后立即返回任务ID，任务在管理后台的事件循环中执行
+- 每类任务按各自的并发数同时处理多个条目
+- 任务的条目列表和已完成的条目定期写入检查点文件，重启后未完成的任务从中断处继续
+- 条目处理函数抛出 NotReadyError（如机器人尚未登录）时任务暂停，稍后重试该条目，不计为失败
+- 进度通过 /ws 广播，消息格式为 {"type": "job_progress", "data": 任务信息}
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from loguru import logger
+
+JOBS_DIR = os.path.join("resource", "admin_jobs")
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+_UNFINISHED = (STATUS_PENDING, STATUS_RUNNING)
+
+
+class NotReadyError(RuntimeError):
+    """任务依赖的资源暂未就绪，任务暂停一段时间后重试，不计为失败"""
+
+
+@dataclass
+class JobKind:
+    """一类后台任务
+
+    Args:
+        list_items: 协程函数，参数为任务参数，返回要处理的条目列表（字符串）
+        process_item: 协程函数，参数为 (条目, 任务参数)，返回是否处理成功
+        concurrency: 同时处理的条目数
+        title: 任务名称，用于展示
+    """
+    list_items: Callable[[Dict[str, Any]], Awaitable[Iterable[str]]]
+    process_item: Callable[[str, Dict[str, Any]], Awaitable[bool]]
+    concurrency: int = 4
+    title: str = ""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = STATUS_PENDING
+    items: Optional[List[str]] = None
+    done: Set[str] = field(default_factory=set)
+    succeeded: int = 0
+    failed: int = 0
+    errors: List[str] = field(default_factory=list)
+    error: str = ""
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self, title: str = "") -> Dict[str, Any]:
+        """任务信息，不包含条目列表"""
+        total = len(self.items) if self.items is not None else None
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "title": title,
+            "params": self.params,
+            "status": self.status,
+            "total": total,
+            "processed": len(self.done),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "progress": round(len(self.done) / total * 100, 1) if total else (100.0 if total == 0 else 0.0),
+            "errors": self.errors[-10:],
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "kind": self.kind, "params": self.params, "status": self.status,
+            "items": self.items, "done": sorted(self.done), "succeeded": self.succeeded, "failed": self.failed,
+            "errors": self.errors[-20:], "error": self.error, "created_at": self.created_at,
+            "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data: Dict[str, Any]) -> "Job":
+        data = dict(data)
+        data["done"] = set(data.get("done") or [])
+        return cls(**data)
+
+
+class JobEngine:
+    """后台任务引擎
+
+    Args:
+        jobs_dir: 检查点文件目录
+        checkpoint_interval: 任务执行中写检查点的最小间隔（秒）
+        progress_interval: 广播进度的最小间隔（秒）
+        history: 保留的已结束任务数量
+        retry_interval: 遇到 NotReadyError 后暂停的时间（秒）
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, checkpoint_interval: float = 2.0,
+                 progress_interval: float = 0.5, history: int = 50, retry_interval: float = 5.0):
+        self.jobs_dir = jobs_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval = progress_interval
+        self.history = history
+        self.retry_interval = retry_interval
+        self.kinds: Dict[str, JobKind] = {}
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._notifier: Optional[Callable[[str], Awaitable]] = None
+        self._last_checkpoint: Dict[str, float] = {}
+        self._last_progress: Dict[str, float] = {}
+        self._started = False
+
+    def register(self, kind: str, list_items, process_item, concurrency: int = 4, title: str = ""):
+        """注册一类任务"""
+        self.kinds[kind] = JobKind(list_items, process_item, max(int(concurrency), 1), title or kind)
+
+    def set_notifier(self, notifier: Callable[[str], Awaitable]):
+        """设置进度广播函数，参数为 JSON 字符串"""
+        self._notifier = notifier
+
+    async def start(self):
+        """载入检查点，继续执行上次未完成的任务"""
+        if self._started:
+            return
+        self._started = True
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for job in self._load_all():
+            self.jobs[job.id] = job
+        self._prune()
+
+        resumed = 0
+        for job in list(self.jobs.values()):
+            if job.status not in _UNFINISHED:
+                continue
+            if job.kind not in self.kinds:
+                job.status, job.error = STATUS_FAILED, f"未知的任务类型: {job.kind}"
+                self._save(job)
+                continue
+            self._spawn(job)
+            resumed += 1
+        if resumed:
+            logger.info(f"已恢复 {resumed} 个未完成的后台任务")
+
+    async def stop(self):
+        """停止正在执行的任务，保留检查点以便下次启动时继续"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # ---------- 提交与查询 ----------
+
+    def submit(self, kind: str, params: Dict[str, Any] = None) -> Job:
+        """提交任务，相同类型和参数的任务正在执行时直接返回该任务"""
+        if kind not in self.kinds:
+            raise ValueError(f"未知的任务类型: {kind}")
+        params = params or {}
+        for job in self.jobs.values():
+            if job.kind == kind and job.params == params and job.status in _UNFINISHED:
+                return job
+
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind, params=params)
+        self.jobs[job.id] = job
+        self._save(job)
+        self._spawn(job)
+        self._prune()
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in _UNFINISHED:
+            return False
+        job.status = STATUS_CANCELLED
+        job.finished_at = time.time()
+        self._save(job)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return self._describe(job) if job else None
+
+    def list_jobs(self, kind: str = None) -> List[Dict[str, Any]]:
+        jobs = sorted(self.jobs.values(), key=lambda job: job.created_at, reverse=True)
+        return [self._describe(job) for job in jobs if kind is None or job.kind == kind]
+
+    def _describe(self, job: Job) -> Dict[str, Any]:
+        spec = self.kinds.get(job.kind)
+        return job.to_dict(spec.title if spec else job.kind)
+
+    # ---------- 执行 ----------
+
+    def _spawn(self, job: Job):
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+
+    async def _run(self, job: Job):
+        spec = self.kinds[job.kind]
+        job.status = STATUS_RUNNING
+        job.started_at = job.started_at or time.time()
+        try:
+            while job.items is None:
+                try:
+                    items = await spec.list_items(job.params)
+                except NotReadyError as e:
+                    await self._pause(job, e)
+                    continue
+                # 去重并保持顺序
+                job.items = list(dict.fromkeys(str(item) for item in items if item))
+                job.error = ""
+                self._save(job)
+            await self._notify(job, force=True)
+            logger.info(f"后台任务 {job.id}({spec.title}) 开始执行，共 {len(job.items)} 项，已完成 {len(job.done)} 项")
+
+            remaining = iter([item for item in job.items if item not in job.done])
+
+            async def worker():
+                # 多个协程共用同一个迭代器，每个条目只会被取出一次
+                for item in remaining:
+                    while True:
+                        try:
+                            ok = await spec.process_item(item, job.params)
+                        except asyncio.CancelledError:
+                            raise
+                        except NotReadyError as e:
+                            # 暂停后重试同一条目
+                            await self._pause(job, e)
+                            continue
+                        except Exception as e:
+                            ok = False
+                            job.errors.append(f"{item}: {e}")
+                            del job.errors[:-20]
+                        break
+                    if job.error:
+                        job.error = ""
+                    job.done.add(item)
+                    if ok is False:
+                        job.failed += 1
+                    else:
+                        job.succeeded += 1
+                    self._checkpoint(job)
+                    await self._notify(job)
+
+            await asyncio.gather(*(worker() for _ in range(spec.concurrency)))
+            job.status = STATUS_COMPLETED
+            logger.info(f"后台任务 {job.id}({spec.title}) 已完成，成功 {job.succeeded} 项，失败 {job.failed} 项")
+        except asyncio.CancelledError:
+            # 用户取消时状态已是 cancelled；管理后台退出时保持 running，下次启动继续
+            if job.status == STATUS_CANCELLED:
+                logger.info(f"后台任务 {job.id}({spec.title}) 已取消")
+            raise
+        except Exception as e:
+            job.status, job.error = STATUS_FAILED, str(e)
+            logger.exception(f"后台任务 {job.id}({spec.title}) 执行失败: {e}")
+        finally:
+            if job.status not in _UNFINISHED:
+                job.finished_at = time.time()
+            self._save(job)
+            await self._notify(job, force=True)
+
+    async def _pause(self, job: Job, reason: Exception):
+        """依赖的资源未就绪时暂停任务，已完成的条目保持不变"""
+        message = f"等待重试: {reason}"
+        if job.error != message:
+            job.error = message
+            logger.warning(f"后台任务 {job.id} 暂停，{self.retry_interval:g} 秒后重试: {reason}")
+            await self._notify(job, force=True)
+        await asyncio.sleep(self.retry_interval)
+
+    # ---------- 检查点 ----------
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _checkpoint(self, job: Job):
+        now = time.monotonic()
+        if now - self._last_checkpoint.get(job.id, 0) >= self.checkpoint_interval:
+            self._save(job)
+
+    def _save(self, job: Job):
+        self._last_checkpoint[job.id] = time.monotonic()
+        try:
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            path = self._path(job.id)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_checkpoint(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存后台任务 {job.id} 检查点失败: {e}")
+
+    def _load_all(self) -> List[Job]:
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r", encoding="utf-8") as f:
+                    jobs.append(Job.from_checkpoint(json.load(f)))
+            except Exception as e:
+                logger.warning(f"读取后台任务检查点 {name} 失败: {e}")
+        return jobs
+
+    def _prune(self):
+        """只保留最近的已结束任务"""
+        finished = sorted((job for job in self.jobs.values() if job.status not in _UNFINISHED),
+                          key=lambda job: job.created_at, reverse=True)
+        for job in finished[self.history:]:
+            self.jobs.pop(job.id, None)
+            self._last_checkpoint.pop(job.id, None)
+            self._last_progress.pop(job.id, None)
+            try:
+                os.remove(self._path(job.id))
+            except OSError:
+                pass
+
+    # ---------- 进度 ----------
+
+    async def _notify(self, job: Job, force: bool = False):
+        if self._notifier is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress.get(job.id, 0) < self.progress_interval:
+            return
+        self._last_progress[job.id] = now
+        try:
+            await self._notifier(json.dumps({"type": "job_progress", "data": self._describe(job)}, ensure_ascii=False))
+        except Exception as e:
+            logger.debug(f"广播后台任务进度失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._tasks),
+            "jobs": len(self.jobs),
+            "kinds": {kind: {"title": spec.title, "concurrency": spec.concurrency} for kind, spec in self.kinds.items()},
+        }
+
+
+job_engine = JobEngine()
@@ -0,0 +1,39 @@
+"""
+管理后台的中间件
+
+fastapi~=0.110 对应的 starlette 0.36 中，GZipMiddleware 会把流式响应写入 gzip 缓冲区，
+缓冲区满或响应结束后才发给浏览器。SSE 推送的事件很小，经过压缩后会一直停留在缓冲区中，
+前端收不到任何事件，所以 text/event-stream 的请求不做压缩。
+"""
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+
+class SSEAwareGZipMiddleware(GZipMiddleware):
+    """跳过 SSE 请求的 GZipMiddleware
+
+    EventSource 请求都会带 Accept: text/event-stream，按请求头判断，
+    不需要等到响应头才能决定是否压缩。
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def add_middlewares(app: FastAPI):
+    """添加管理后台使用的中间件"""
+    app.add_middleware(SSEAwareGZipMiddleware, minimum_size=1000)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
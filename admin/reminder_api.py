@@ -1,7 +1,5 @@
-import os
 import json
 import logging
-import sqlite3
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 import time
@@ -16,208 +14,34 @@ except ImportError:
     # 如果无法导入，使用默认值
     config = {"secret_key": "xybotv2_admin_secret_key"}
 
-def get_reminder_file_path(wxid: str) -> str:
-    """获取提醒文件路径"""
-    # 获取当前文件所在目录
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    # 获取项目根目录 (比当前目录高一级)
-    root_dir = os.path.dirname(current_dir)
-    # 使用项目根目录下的reminder_data目录
-    reminders_dir = os.path.join(root_dir, "reminder_data")
-    
-    if not os.path.exists(reminders_dir):
-        logger.warning(f"提醒数据目录不存在，将创建: {reminders_dir}")
-        os.makedirs(reminders_dir, exist_ok=True)
-    
-    # 使用与系统其他部分兼容的文件命名格式
-    return os.path.join(reminders_dir, f"user_{wxid}.db")
+def _reminder_db():
+    """获取统一的提醒数据库，插件和管理后台共用，修改会同步到插件的调度器"""
+    from database.reminder_db import get_reminder_db
+    return get_reminder_db()
 
-def init_reminder_db(db_path):
-    """初始化提醒数据库"""
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # 创建提醒表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY,
-            wxid TEXT,
-            content TEXT,
-            reminder_type TEXT,
-            reminder_time TEXT,
-            chat_id TEXT,
-            is_done INTEGER DEFAULT 0
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"成功初始化提醒数据库: {db_path}")
-        return True
-    except Exception as e:
-        logger.error(f"初始化提醒数据库失败: {str(e)}")
-        return False
+def _to_api_reminder(reminder, owner_id=None):
+    """转换为接口返回的提醒字典"""
+    return {
+        "id": reminder["id"],
+        "wxid": reminder["wxid"],
+        "content": reminder["content"],
+        "reminder_type": reminder["reminder_type"],
+        "reminder_time": reminder["reminder_time"],
+        "chat_id": reminder["chat_id"],
+        "is_done": reminder["is_done"],
+        "owner_id": owner_id or reminder["wxid"]
+    }
 
-def load_reminders_from_db(db_path, wxid):
-    """从数据库加载提醒数据"""
+def load_reminders(wxid):
+    """加载用户的提醒数据"""
     try:
-        if not os.path.exists(db_path):
-            logger.warning(f"提醒数据库不存在: {db_path}")
-            return []
-        
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        SELECT id, content, reminder_type, reminder_time, chat_id, is_done 
-        FROM reminders 
-        WHERE wxid = ? AND is_done = 0
-        """, (wxid,))
-        
-        results = cursor.fetchall()
-        reminders = []
-        
-        for row in results:
-            reminders.append({
-                "id": row["id"],
-                "wxid": wxid,
-                "content": row["content"],
-                "reminder_type": row["reminder_type"],
-                "reminder_time": row["reminder_time"],
-                "chat_id": row["chat_id"],
-                "is_done": row["is_done"]
-            })
-        
-        conn.close()
+        reminders = [_to_api_reminder(r) for r in _reminder_db().list_by_wxid(wxid)]
         logger.info(f"成功从数据库加载 {len(reminders)} 条提醒")
         return reminders
     except Exception as e:
         logger.error(f"从数据库加载提醒失败: {str(e)}")
         return []
 
-def save_reminder_to_db(db_path, reminder):
-    """保存提醒到数据库"""
-    try:
-        # 确保数据库初始化
-        if not os.path.exists(db_path):
-            if not init_reminder_db(db_path):
-                return False
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        INSERT INTO reminders (id, wxid, content, reminder_type, reminder_time, chat_id, is_done)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            reminder["id"],
-            reminder["wxid"],
-            reminder["content"],
-            reminder["reminder_type"],
-            reminder["reminder_time"],
-            reminder["chat_id"],
-            reminder["is_done"]
-        ))
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"成功保存提醒到数据库: ID={reminder['id']}")
-        return True
-    except Exception as e:
-        logger.error(f"保存提醒到数据库失败: {str(e)}")
-        return False
-
-def update_reminder_in_db(db_path, reminder):
-    """更新数据库中的提醒"""
-    try:
-        if not os.path.exists(db_path):
-            logger.warning(f"提醒数据库不存在: {db_path}")
-            return False
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        UPDATE reminders 
-        SET content = ?, reminder_type = ?, reminder_time = ?, chat_id = ?, is_done = ?
-        WHERE id = ? AND wxid = ?
-        """, (
-            reminder["content"],
-            reminder["reminder_type"],
-            reminder["reminder_time"],
-            reminder["chat_id"],
-            reminder["is_done"],
-            reminder["id"],
-            reminder["wxid"]
-        ))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            logger.warning(f"未找到ID为 {reminder['id']} 的提醒，无法更新")
-            return False
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"成功更新数据库中的提醒: ID={reminder['id']}")
-        return True
-    except Exception as e:
-        logger.error(f"更新数据库中的提醒失败: {str(e)}")
-        return False
-
-def delete_reminder_from_db(db_path, wxid, reminder_id):
-    """从数据库删除提醒"""
-    try:
-        if not os.path.exists(db_path):
-            logger.warning(f"提醒数据库不存在: {db_path}")
-            return False
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        DELETE FROM reminders 
-        WHERE id = ? AND wxid = ?
-        """, (reminder_id, wxid))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            logger.warning(f"未找到ID为 {reminder_id} 的提醒，无法删除")
-            return False
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"成功从数据库删除提醒: ID={reminder_id}")
-        return True
-    except Exception as e:
-        logger.error(f"从数据库删除提醒失败: {str(e)}")
-        return False
-
-def get_next_reminder_id(db_path, wxid):
-    """获取下一个可用的提醒ID"""
-    try:
-        if not os.path.exists(db_path):
-            return 1
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        SELECT MAX(id) FROM reminders WHERE wxid = ?
-        """, (wxid,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result[0] is None:
-            return 1
-        else:
-            return result[0] + 1
-    except Exception as e:
-        logger.error(f"获取下一个提醒ID失败: {str(e)}")
-        return 1
-
 def remove_existing_reminder_routes(app: FastAPI):
     """移除已存在的提醒API路由，防止冲突"""
     routes_to_remove = []
@@ -294,33 +118,7 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
         try:
             logger.info(f"用户 {username} 获取所有提醒")
             
-            # 获取reminder_data目录
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            root_dir = os.path.dirname(current_dir)
-            reminders_dir = os.path.join(root_dir, "reminder_data")
-            
-            if not os.path.exists(reminders_dir):
-                logger.warning(f"提醒数据目录不存在: {reminders_dir}")
-                return JSONResponse(content={"success": True, "reminders": []})
-            
-            # 获取目录中的所有db文件
-            all_reminders = []
-            db_files = [f for f in os.listdir(reminders_dir) if f.startswith("user_") and f.endswith(".db")]
-            
-            logger.info(f"找到 {len(db_files)} 个提醒数据库文件")
-            
-            for db_file in db_files:
-                # 从文件名中提取wxid
-                wxid = db_file[5:-3]  # 移除"user_"前缀和".db"后缀
-                
-                # 获取完整文件路径
-                db_path = os.path.join(reminders_dir, db_file)
-                
-                # 加载该用户的提醒
-                user_reminders = load_reminders_from_db(db_path, wxid)
-                
-                # 添加到总列表
-                all_reminders.extend(user_reminders)
+            all_reminders = [_to_api_reminder(r) for r in _reminder_db().list_all()]
             
             logger.info(f"成功加载所有提醒，总数: {len(all_reminders)}")
             return JSONResponse(content={"success": True, "reminders": all_reminders})
@@ -347,79 +145,14 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
             if is_chatroom:
                 logger.info(f"查询群聊 {wxid} 的提醒列表")
                 
-                # 获取reminder_data目录
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                root_dir = os.path.dirname(current_dir)
-                reminders_dir = os.path.join(root_dir, "reminder_data")
-                
-                if not os.path.exists(reminders_dir):
-                    logger.warning(f"提醒数据目录不存在: {reminders_dir}")
-                    return JSONResponse(content={"success": True, "reminders": []})
-                
-                # 所有与该群聊相关的提醒
-                all_group_reminders = []
-                
-                # 获取目录中的所有db文件
-                db_files = [f for f in os.listdir(reminders_dir) if f.startswith("user_") and f.endswith(".db")]
-                logger.info(f"找到 {len(db_files)} 个提醒数据库文件")
-                
-                for db_file in db_files:
-                    # 从文件名中提取wxid
-                    owner_wxid = db_file[5:-3]  # 移除"user_"前缀和".db"后缀
-                    
-                    # 获取完整文件路径
-                    db_path = os.path.join(reminders_dir, db_file)
-                    
-                    try:
-                        # 检查数据库是否存在并初始化
-                        if not os.path.exists(db_path):
-                            continue
-                            
-                        # 尝试连接数据库
-                        conn = sqlite3.connect(db_path)
-                        conn.row_factory = sqlite3.Row
-                        cursor = conn.cursor()
-                        
-                        # 查询该群聊的提醒 (chat_id等于群聊ID的记录)
-                        cursor.execute("""
-                        SELECT * FROM reminders 
-                        WHERE chat_id = ? AND is_done = 0
-                        """, (wxid,))
-                        
-                        results = cursor.fetchall()
-                        conn.close()
-                        
-                        # 添加到总列表
-                        for row in results:
-                            reminder = {
-                                "id": row["id"],
-                                "wxid": row["wxid"],
-                                "content": row["content"],
-                                "reminder_type": row["reminder_type"],
-                                "reminder_time": row["reminder_time"],
-                                "chat_id": row["chat_id"],
-                                "is_done": row["is_done"],
-                                "owner_id": owner_wxid  # 额外记录真正设置提醒的用户ID
-                            }
-                            all_group_reminders.append(reminder)
-                            
-                    except Exception as e:
-                        logger.error(f"查询数据库 {db_file} 时出错: {str(e)}")
-                        continue
+                # 所有与该群聊相关的提醒 (chat_id等于群聊ID的记录)
+                all_group_reminders = [_to_api_reminder(r) for r in _reminder_db().list_by_chat(wxid)]
                 
                 logger.info(f"为群聊 {wxid} 找到 {len(all_group_reminders)} 条提醒")
                 return JSONResponse(content={"success": True, "reminders": all_group_reminders})
             else:
                 # 普通用户提醒处理
-                reminders_file = get_reminder_file_path(wxid)
-                logger.info(f"尝试从 {reminders_file} 加载提醒数据")
-                
-                # 从数据库加载提醒
-                reminders = load_reminders_from_db(reminders_file, wxid)
-                
-                # 添加所有者ID
-                for reminder in reminders:
-                    reminder["owner_id"] = wxid
+                reminders = load_reminders(wxid)
                 
                 logger.info(f"从数据库成功加载提醒，条目数: {len(reminders)}")
                 return JSONResponse(content={"success": True, "reminders": reminders})
@@ -440,16 +173,10 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
         try:
             logger.info(f"用户 {username} 获取 {wxid} 的提醒 {id} 详情")
             
-            # 获取提醒文件路径
-            reminders_file = get_reminder_file_path(wxid)
-            
-            # 从数据库加载所有提醒
-            reminders = load_reminders_from_db(reminders_file, wxid)
-            
             # 查找指定ID的提醒
-            for reminder in reminders:
-                if reminder.get("id") == id:
-                    return JSONResponse(content={"success": True, "reminder": reminder})
+            reminder = _reminder_db().get(id)
+            if reminder and reminder["wxid"] == wxid and not reminder["is_done"]:
+                return JSONResponse(content={"success": True, "reminder": _to_api_reminder(reminder)})
             
             # 未找到指定提醒
             logger.warning(f"未找到ID为 {id} 的提醒")
@@ -481,30 +208,15 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
                 logger.warning(f"添加提醒缺少必要参数: content={content}, type={reminder_type}, time={reminder_time}, chat_id={chat_id}")
                 return JSONResponse(content={"success": False, "error": "缺少必要参数"})
             
-            # 获取提醒文件路径
-            reminders_file = get_reminder_file_path(wxid)
-            
-            # 获取下一个可用的提醒ID
-            new_id = get_next_reminder_id(reminders_file, wxid)
-            
-            # 创建新提醒
-            new_reminder = {
-                "id": new_id,
-                "wxid": wxid,
-                "content": content,
-                "reminder_type": reminder_type,
-                "reminder_time": reminder_time,
-                "chat_id": chat_id,
-                "is_done": 0
-            }
-            
             # 保存到数据库
-            if save_reminder_to_db(reminders_file, new_reminder):
-                logger.info(f"成功为用户 {wxid} 添加提醒，ID: {new_id}")
-                return JSONResponse(content={"success": True, "id": new_id})
-            else:
-                logger.error(f"保存提醒到数据库失败")
+            try:
+                new_id = _reminder_db().add(wxid, content, reminder_type, reminder_time, chat_id)
+            except Exception as e:
+                logger.error(f"保存提醒到数据库失败: {str(e)}")
                 return JSONResponse(content={"success": False, "error": "保存提醒失败"})
+            
+            logger.info(f"成功为用户 {wxid} 添加提醒，ID: {new_id}")
+            return JSONResponse(content={"success": True, "id": new_id})
         
         except Exception as e:
             logger.exception(f"添加提醒失败: {str(e)}")
@@ -550,22 +262,8 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
             # 使用所有者ID或默认为请求中的wxid
             target_wxid = owner_id if owner_id else wxid
             
-            # 获取正确的数据库文件
-            reminders_file = get_reminder_file_path(target_wxid)
-            
-            # 创建更新后的提醒对象
-            updated_reminder = {
-                "id": id,
-                "wxid": target_wxid,
-                "content": content,
-                "reminder_type": reminder_type,
-                "reminder_time": reminder_time,
-                "chat_id": chat_id,
-                "is_done": 0
-            }
-            
             # 更新数据库中的提醒
-            if update_reminder_in_db(reminders_file, updated_reminder):
+            if _reminder_db().update(id, target_wxid, content, reminder_type, reminder_time, chat_id):
                 logger.info(f"成功更新提醒 ID={id}")
                 return JSONResponse(content={"success": True})
             else:
@@ -600,11 +298,8 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
                     owner_wxid, reminder = result
                     logger.info(f"找到提醒，所有者是 {owner_wxid}，在数据库中删除")
                     
-                    # 获取所有者的数据库文件
-                    owner_db_file = get_reminder_file_path(owner_wxid)
-                    
                     # 删除提醒
-                    if delete_reminder_from_db(owner_db_file, owner_wxid, id):
+                    if _reminder_db().delete(id, owner_wxid):
                         logger.info(f"成功删除群聊 {wxid} 中ID为 {id} 的提醒")
                         return JSONResponse(content={"success": True})
                     else:
@@ -614,12 +309,9 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
                     logger.warning(f"未在任何数据库中找到群聊 {wxid} 的提醒 ID={id}")
                     return JSONResponse(content={"success": False, "error": "未找到指定提醒"})
             else:
-                # 对于个人提醒，直接使用个人数据库
-                reminders_file = get_reminder_file_path(wxid)
-                logger.info(f"尝试从 {reminders_file} 删除提醒 ID={id}")
-                
-                # 从数据库删除提醒
-                if delete_reminder_from_db(reminders_file, wxid, id):
+                # 对于个人提醒，只删除属于该用户的提醒
+                logger.info(f"尝试删除用户 {wxid} 的提醒 ID={id}")
+                if _reminder_db().delete(id, wxid):
                     logger.info(f"成功删除用户 {wxid} 的提醒 ID={id}")
                     return JSONResponse(content={"success": True})
                 else:
@@ -631,7 +323,7 @@ def register_reminder_routes(app: FastAPI, check_auth=None):
             return JSONResponse(content={"success": False, "error": f"删除提醒失败: {str(e)}"})
 
 def find_reminder_in_all_dbs(reminder_id, target_chat_id=None):
-    """在所有数据库中查找特定ID的提醒
+    """查找特定ID的提醒
     
     Args:
         reminder_id: 要查找的提醒ID
@@ -641,66 +333,12 @@ def find_reminder_in_all_dbs(reminder_id, target_chat_id=None):
         (wxid, reminder) 元组，如果找到；None 如果未找到
     """
     try:
-        # 获取reminder_data目录
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(current_dir)
-        reminders_dir = os.path.join(root_dir, "reminder_data")
-        
-        if not os.path.exists(reminders_dir):
-            logger.warning(f"提醒数据目录不存在: {reminders_dir}")
-            return None
-        
-        # 获取目录中的所有db文件
-        db_files = [f for f in os.listdir(reminders_dir) if f.startswith("user_") and f.endswith(".db")]
-        
-        logger.info(f"在 {len(db_files)} 个提醒数据库文件中查找ID为 {reminder_id} 的提醒")
-        
-        for db_file in db_files:
-            # 从文件名中提取wxid
-            wxid = db_file[5:-3]  # 移除"user_"前缀和".db"后缀
-            
-            # 获取完整文件路径
-            db_path = os.path.join(reminders_dir, db_file)
-            
-            try:
-                # 连接到数据库
-                conn = sqlite3.connect(db_path)
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # 查询条件
-                query = "SELECT * FROM reminders WHERE id = ?"
-                params = [reminder_id]
-                
-                # 如果指定了聊天ID，添加到查询条件
-                if target_chat_id:
-                    query += " AND chat_id = ?"
-                    params.append(target_chat_id)
-                
-                # 执行查询
-                cursor.execute(query, params)
-                result = cursor.fetchone()
-                conn.close()
-                
-                if result:
-                    logger.info(f"在数据库 {db_file} 中找到ID为 {reminder_id} 的提醒")
-                    reminder = {
-                        "id": result["id"],
-                        "wxid": result["wxid"],
-                        "content": result["content"],
-                        "reminder_type": result["reminder_type"],
-                        "reminder_time": result["reminder_time"],
-                        "chat_id": result["chat_id"],
-                        "is_done": result["is_done"],
-                        "owner_id": wxid  # 记录真正的所有者ID
-                    }
-                    return (wxid, reminder)
-            except Exception as e:
-                logger.error(f"查询数据库 {db_file} 时出错: {str(e)}")
-                continue
+        reminder = _reminder_db().get(reminder_id)
+        if reminder and (not target_chat_id or reminder["chat_id"] == target_chat_id):
+            return (reminder["wxid"], _to_api_reminder(reminder))
         
-        logger.warning(f"在所有数据库中未找到ID为 {reminder_id} 的提醒")
+        logger.warning(f"未找到ID为 {reminder_id} 的提醒")
         return None
     except Exception as e:
-        logger.error(f"在所有数据库中查找提醒时出错: {str(e)}")
-        return None
\ No newline at end of file
+        logger.error(f"查找提醒时出错: {str(e)}")
+        return None
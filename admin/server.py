@@ -34,8 +34,6 @@ from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse, StreamingResponse
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from itsdangerous import URLSafeSerializer
 from functools import wraps
@@ -87,10 +85,18 @@ except ImportError as e:
         })
 
 
+# 导入系统状态采样器
+from system_sampler import system_sampler
+# 导入后台任务引擎
+from job_engine import job_engine, NotReadyError
+# 导入管理后台中间件
+from middleware import add_middlewares
+
 # 导入GitHub加速服务工具
 # 注意：这里使用相对导入，因为admin目录不在Python模块搜索路径中
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.github_proxy import get_github_url
+from utils.log_index import log_index
 
 # 导入数据库模块
 # 注意: 我们已经在上面导入了联系人数据库模块
@@ -224,6 +230,8 @@ def load_config():
                         config["log_level"] = admin_config["log_level"]
                         # 使用设置日志级别函数
                         set_log_level(admin_config["log_level"])
+                    # 系统状态采样间隔和保留的采样点数量
+                    system_sampler.configure(admin_config.get("stats-interval"), admin_config.get("stats-history"))
                     logger.info(f"从main_config.toml加载管理后台配置: {main_config_path}")
         else:
             # 如果main_config.toml不存在或没有Admin部分，尝试从config.json加载
@@ -352,43 +360,24 @@ def get_system_info():
         python_version = platform.python_version()
 
         # 获取CPU信息
+        # CPU、内存、磁盘信息来自后台采样器的最新快照，不在请求中阻塞采样
         try:
-            cpu_count = psutil.cpu_count(logical=True)
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            if cpu_count is None:
-                cpu_count = psutil.cpu_count(logical=False)
-        except Exception as e:
-            logger.error(f"获取CPU信息失败: {str(e)}")
-            cpu_count = 0
-            cpu_percent = 0
-
-        # 获取内存信息
-        try:
-            memory = psutil.virtual_memory()
-            memory_total = memory.total
-            memory_available = memory.available
-            memory_used = memory.used
-            memory_percent = memory.percent
-        except Exception as e:
-            logger.error(f"获取内存信息失败: {str(e)}")
-            memory_total = 0
-            memory_available = 0
-            memory_used = 0
-            memory_percent = 0
-
-        # 获取磁盘信息
-        try:
-            disk = psutil.disk_usage('/')
-            disk_total = disk.total
-            disk_free = disk.free
-            disk_used = disk.used
-            disk_percent = disk.percent
+            sample = system_sampler.snapshot()
+            cpu_count = sample["cpu_count"]
+            cpu_percent = sample["cpu_percent"]
+            memory_total = sample["memory_total"]
+            memory_available = sample["memory_available"]
+            memory_used = sample["memory_used"]
+            memory_percent = sample["memory_percent"]
+            disk_total = sample["disk_total"]
+            disk_free = sample["disk_free"]
+            disk_used = sample["disk_used"]
+            disk_percent = sample["disk_percent"]
         except Exception as e:
-            logger.error(f"获取磁盘信息失败: {str(e)}")
-            disk_total = 0
-            disk_free = 0
-            disk_used = 0
-            disk_percent = 0
+            logger.error(f"获取系统资源信息失败: {str(e)}")
+            cpu_count = cpu_percent = 0
+            memory_total = memory_available = memory_used = memory_percent = 0
+            disk_total = disk_free = disk_used = disk_percent = 0
 
         # 获取系统启动时间
         try:
@@ -455,25 +444,17 @@ def get_system_status():
         from datetime import datetime, timedelta
         from pathlib import Path
 
-        # 获取CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=0.5)
-
-        # 获取内存使用情况
-        memory = psutil.virtual_memory()
-        memory_percent = memory.percent
-        memory_used = memory.used
-        memory_total = memory.total
-
-        # 获取磁盘使用情况
-        disk = psutil.disk_usage('/')
-        disk_percent = disk.percent
-        disk_used = disk.used
-        disk_total = disk.total
-
-        # 获取网络信息
-        net_io_counters = psutil.net_io_counters()
-        bytes_sent = net_io_counters.bytes_sent
-        bytes_recv = net_io_counters.bytes_recv
+        # CPU、内存、磁盘、网络信息来自后台采样器的最新快照
+        sample = system_sampler.snapshot()
+        cpu_percent = sample["cpu_percent"]
+        memory_percent = sample["memory_percent"]
+        memory_used = sample["memory_used"]
+        memory_total = sample["memory_total"]
+        disk_percent = sample["disk_percent"]
+        disk_used = sample["disk_used"]
+        disk_total = sample["disk_total"]
+        bytes_sent = sample["bytes_sent"]
+        bytes_recv = sample["bytes_recv"]
 
         # 获取机器人启动时间和运行时间
         # 首先尝试从bot_status.json获取时间戳
@@ -531,6 +512,10 @@ def get_system_status():
             'disk_total': disk_total,
             'bytes_sent': bytes_sent,
             'bytes_recv': bytes_recv,
+            'process_rss': sample["process_rss"],
+            'loop_lag_ms': sample.get("loop_lag_ms"),
+            'bot_loop_lag_ms': sample.get("bot_loop_lag_ms"),
+            'message_rate': sample.get("message_rate"),
             'uptime': uptime_str,
             'start_time': login_time.strftime("%Y-%m-%d %H:%M:%S")
         }
@@ -557,6 +542,12 @@ def set_bot_instance(bot):
     bot_instance = bot
     logger.info("管理后台已设置bot实例")
 
+    # 记录机器人所在的事件循环，采样器据此测量其调度延迟
+    try:
+        system_sampler.set_bot_loop(asyncio.get_running_loop())
+    except RuntimeError:
+        pass
+
     # 不再需要添加get_contacts方法，因为我们直接使用wxapi.get_contract_list
 
     # 保存到临时文件，确保子进程能够访问
@@ -879,14 +870,7 @@ def init_app():
     logger.info("静态文件目录配置完成")
 
     # 添加中间件
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
+    add_middlewares(app)
     logger.info("中间件添加完成")
 
     # 加载路由
@@ -1581,6 +1565,88 @@ def setup_routes():
         # 调用system_stats_api模块中的处理函数
         return await handle_system_stats(request, type, time_range)
 
+    # API: 系统状态时间序列 (需要认证)
+    @app.get("/api/system/stats/series", response_class=JSONResponse)
+    async def api_system_stats_series(request: Request, minutes: float = 60, fields: str = None):
+        """返回后台采样器环形缓冲区中的时间序列
+
+        参数:
+            minutes: 最近多少分钟
+            fields: 逗号分隔的字段名，为空时返回全部字段
+        """
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+
+        field_list = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        return {
+            "success": True,
+            "data": {
+                "interval": system_sampler.interval,
+                "items": system_sampler.series(seconds=minutes * 60, fields=field_list)
+            }
+        }
+
+    # API: 系统状态实时推送 (需要认证)
+    @app.get("/api/system/stats/stream")
+    async def api_system_stats_stream(request: Request):
+        """以 SSE 推送采样结果，所有连接共用同一个采样器"""
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+
+        async def event_stream():
+            async for event in system_sampler.stream():
+                if await request.is_disconnected():
+                    break
+                yield event
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    # API: 运行性能指标 (需要认证)
+    @app.get("/api/system/performance", response_class=JSONResponse)
+    async def api_system_performance(request: Request):
+        """运行性能指标：协议接口耗时、消息接收队列、发送队列等"""
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+
+        data = {}
+        try:
+            api_client = getattr(bot_instance, "bot", None)
+            if api_client and hasattr(api_client, "get_endpoint_stats"):
+                data["api_endpoints"] = api_client.get_endpoint_stats()
+            if api_client and hasattr(api_client, "send_scheduler"):
+                data["message_sender"] = api_client.send_scheduler.get_stats()
+            if api_client and hasattr(api_client, "contact_loader"):
+                data["contact_loader"] = api_client.contact_loader.get_stats()
+
+            from WechatAPI.voice_cache import voice_cache
+            data["voice_cache"] = voice_cache.get_stats()
+
+            from utils.message_intake import get_message_intake
+            intake = get_message_intake()
+            if intake:
+                data["message_intake"] = intake.get_stats()
+
+            from database.contacts_db import contact_cache
+            data["contact_cache"] = contact_cache.get_stats()
+
+            from database.group_members_db import group_member_cache
+            data["group_member_cache"] = group_member_cache.get_stats()
+
+            from utils.plugin_manager import plugin_manager
+            data["plugin_loading"] = plugin_manager.get_load_stats()
+
+            data["system_sampler"] = system_sampler.get_stats()
+            data["admin_jobs"] = job_engine.get_stats()
+        except Exception as e:
+            logger.error(f"获取运行性能指标失败: {str(e)}")
+            return JSONResponse(content={"success": False, "error": str(e)})
+
+        return {"success": True, "data": data}
+
     # API: 系统信息 (需要认证)
     @app.get("/api/system/info", response_class=JSONResponse)
     async def api_system_info(request: Request):
@@ -2961,6 +3027,11 @@ except:
     # 启动周期性任务
     @app.on_event("startup")
     async def start_periodic_tasks():
+        # 启动系统状态采样器
+        system_sampler.start()
+        # 恢复上次未完成的后台任务，进度通过 /ws 广播
+        job_engine.set_notifier(broadcast_message)
+        await job_engine.start()
         # 启动同步待处理插件任务
         asyncio.create_task(sync_pending_plugins())
         # 启动缓存插件市场数据任务
@@ -4641,12 +4712,15 @@ except:
 
     # API: 系统日志 (需要认证)
     @app.get("/api/system/logs", response_class=JSONResponse)
-    async def api_system_logs(request: Request, log_level: str = None, limit: int = 0):
+    async def api_system_logs(request: Request, log_level: str = None, limit: int = 0,
+                              since: str = None, until: str = None):
         """获取系统日志
 
         参数:
             log_level: 日志级别过滤
             limit: 返回的日志行数，0表示返回所有行
+            since: 只返回该时间之后的日志，格式为 YYYY-MM-DD HH:MM:SS
+            until: 只返回该时间之前的日志，格式为 YYYY-MM-DD HH:MM:SS
         """
         # 检查认证状态
         username = await check_auth(request)
@@ -4654,30 +4728,20 @@ except:
             return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
 
         try:
-            # 可能的日志文件位置
-            log_paths = [
-                "logs/latest.log",
-                "logs/xybot.log",
-                "logs/XYBot_*.log",
-                "_data/logs/XYBot_*.log",
-                "../logs/XYBot_*.log",
-                "./logs/XYBot_*.log",
-                # 相对于当前目录的位置
-                os.path.join(current_dir, "../logs/latest.log"),
-                os.path.join(current_dir, "../logs/xybot.log"),
-                os.path.join(current_dir, "../logs/XYBot_*.log"),
-                os.path.join(current_dir, "./logs/latest.log"),
-            ]
+            since_ts = datetime.fromisoformat(since).timestamp() if since else None
+            until_ts = datetime.fromisoformat(until).timestamp() if until else None
+        except ValueError:
+            return JSONResponse(status_code=400, content={"success": False, "error": "时间格式错误，应为 YYYY-MM-DD HH:MM:SS"})
 
-            # 查找存在的日志文件
-            found_logs = []
-            for path_pattern in log_paths:
-                for log_file in glob.glob(path_pattern):
-                    if os.path.exists(log_file) and os.path.isfile(log_file):
-                        found_logs.append(log_file)
+        try:
+            # 日志索引只解析新追加的内容，最后 N 行从文件末尾向前读取
+            log_entries = await asyncio.to_thread(
+                log_index.tail, limit=max(limit, 0), level=log_level, since=since_ts, until=until_ts
+            )
+            latest_log = log_index.current_file
 
             # 如果没找到日志文件
-            if not found_logs:
+            if not latest_log:
                 logger.warning("未找到任何日志文件")
                 return {
                     "success": True,
@@ -4686,61 +4750,11 @@ except:
                     "message": "未找到任何日志文件"
                 }
 
-            # 选择最新的日志文件
-            latest_log = max(found_logs, key=os.path.getmtime)
-            logger.info(f"读取日志文件: {latest_log}")
-
-            # 读取日志文件并按行返回
-            log_entries = []
-            log_files = [os.path.basename(log) for log in found_logs]
-
-            with open(latest_log, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-                # 如果指定了limit并且大于0，则只获取最后的limit行
-                # 否则获取所有行
-                if limit > 0:
-                    lines = lines[-limit:]
-
-                logger.info(f"读取日志行数: {len(lines)}")
-
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    # 解析日志行
-                    log_entry = {"raw": line}
-
-                    # 尝试解析日志级别
-                    level_match = re.search(r'\|\s*(DEBUG|INFO|WARNING|ERROR|CRITICAL)\s*\|', line)
-                    if level_match:
-                        log_entry["level"] = level_match.group(1).lower()
-                    else:
-                        log_entry["level"] = "info"  # 默认级别
-
-                    # 如果指定了级别过滤，且不匹配，则跳过
-                    if log_level and log_entry["level"] != log_level.lower():
-                        continue
-
-                    # 尝试解析时间戳
-                    time_match = re.search(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})', line)
-                    if time_match:
-                        log_entry["timestamp"] = time_match.group(1)
-
-                    # 尝试解析消息内容
-                    content_match = re.search(r'\|\s*(DEBUG|INFO|WARNING|ERROR|CRITICAL)\s*\|\s*(.*)', line)
-                    if content_match:
-                        log_entry["message"] = content_match.group(2).strip()
-                    else:
-                        log_entry["message"] = line
-
-                    log_entries.append(log_entry)
-
             # 添加日志文件路径，用于下载
             return {
                 "success": True,
                 "logs": log_entries,
-                "log_files": log_files,
+                "log_files": [os.path.basename(log) for log in log_index.log_files],
                 "current_log": os.path.basename(latest_log),
                 "log_path": latest_log  # 添加日志文件路径
             }
@@ -4753,10 +4767,105 @@ except:
                 content={"success": False, "error": f"获取系统日志失败: {str(e)}"}
             )
 
+    def _get_api_client():
+        """后台任务使用的协议客户端"""
+        # 管理后台先于机器人启动，恢复的任务在机器人登录前会暂停等待，而不是把所有条目记为失败
+        if not bot_instance or not hasattr(bot_instance, 'bot'):
+            raise NotReadyError("机器人实例未初始化，请确保机器人已启动")
+        client = bot_instance.bot
+        if not client.wxid and getattr(bot_instance, 'wxid', None):
+            client.wxid = bot_instance.wxid
+        if not client.wxid:
+            raise NotReadyError("机器人尚未登录")
+        return client
+
+    def _parse_contact_detail(wxid: str, detail) -> Optional[Dict[str, Any]]:
+        """把联系人详情接口返回的数据转换为数据库中的联系人信息"""
+        if isinstance(detail, list):
+            detail = detail[0] if detail else None
+        if not isinstance(detail, dict):
+            return None
+
+        # 处理昵称
+        nickname = ""
+        if 'NickName' in detail:
+            if isinstance(detail['NickName'], dict) and 'string' in detail['NickName']:
+                nickname = detail['NickName']['string']
+            else:
+                nickname = str(detail['NickName'])
+        elif 'nickname' in detail:
+            nickname = detail.get('nickname')
+
+        # 处理头像
+        avatar = ""
+        if detail.get('BigHeadImgUrl'):
+            avatar = detail['BigHeadImgUrl']
+        elif detail.get('SmallHeadImgUrl'):
+            avatar = detail['SmallHeadImgUrl']
+        elif 'avatar' in detail:
+            avatar = detail.get('avatar')
+
+        # 处理备注
+        remark = ""
+        if 'Remark' in detail:
+            if isinstance(detail['Remark'], dict) and 'string' in detail['Remark']:
+                remark = detail['Remark']['string']
+            elif isinstance(detail['Remark'], str):
+                remark = detail['Remark']
+        elif 'remark' in detail:
+            remark = detail.get('remark')
+
+        # 处理微信号
+        alias = detail.get('Alias') if 'Alias' in detail else detail.get('alias', "")
+
+        # 确定联系人类型
+        contact_type = "friend"
+        if wxid.endswith("@chatroom"):
+            contact_type = "group"
+        elif wxid.startswith("gh_"):
+            contact_type = "official"
+
+        return {
+            'wxid': wxid,
+            'nickname': nickname or wxid,
+            'avatar': avatar or '',
+            'remark': remark or '',
+            'alias': alias or '',
+            'type': contact_type
+        }
+
+    async def _list_contact_wxids(params: Dict[str, Any]) -> List[str]:
+        if params.get("wxids"):
+            return params["wxids"]
+        from database.contacts_db import get_all_contacts
+        contacts = await asyncio.to_thread(get_all_contacts)
+        return [contact.get('wxid') for contact in contacts or []]
+
+    async def _sync_contact(wxid: str, params: Dict[str, Any]) -> bool:
+        # 并发的单个查询会被客户端合并为每批20个的批量请求
+        detail = await _get_api_client().get_contract_detail(wxid)
+        contact_info = _parse_contact_detail(wxid, detail)
+        if not contact_info:
+            raise ValueError("返回空数据或无法解析")
+        from database.contacts_db import update_contact_in_db
+        return bool(await asyncio.to_thread(update_contact_in_db, contact_info))
+
+    async def _list_group_wxids(params: Dict[str, Any]) -> List[str]:
+        wxids = await _list_contact_wxids(params)
+        return [wxid for wxid in wxids if wxid and wxid.endswith("@chatroom")]
+
+    async def _sync_group_members(wxid: str, params: Dict[str, Any]) -> bool:
+        members = await _get_api_client().get_chatroom_member_list(wxid)
+        from database.group_members_db import save_group_members_to_db
+        return bool(await asyncio.to_thread(save_group_members_to_db, wxid, members or []))
+
+    job_engine.register("contact_sync", _list_contact_wxids, _sync_contact, concurrency=20, title="同步联系人")
+    job_engine.register("group_member_sync", _list_group_wxids, _sync_group_members, concurrency=2, title="同步群成员")
+
     # API: 更新数据库中所有联系人信息
-    @app.get("/api/contacts/update_all", response_class=JSONResponse)
+    @app.api_route("/api/contacts/update_all", methods=["GET", "POST"], response_class=JSONResponse)
     async def api_update_all_contacts(request: Request):
-        """更新数据库中所有联系人信息
+        """提交后台任务更新数据库中所有联系人信息，立即返回任务ID，进度通过 /ws 推送
 
         Args:
             request: 请求对象
@@ -4769,239 +4878,66 @@ except:
                 "error": "未授权访问"
             })
 
-        logger.info(f"用户 {username} 请求更新数据库中所有联系人信息")
-
-        try:
-            # 确保bot_instance可用
-            if not bot_instance or not hasattr(bot_instance, 'bot'):
-                logger.error("bot_instance未设置或不可用")
-                return JSONResponse(content={
-                    "success": False,
-                    "error": "机器人实例未初始化，请确保机器人已启动"
-                })
-
-            # 检查get_contract_detail方法
-            if not hasattr(bot_instance.bot, 'get_contract_detail'):
-                logger.error("bot.get_contract_detail方法不存在")
-                return JSONResponse(content={
-                    "success": False,
-                    "error": "微信API不支持获取联系人详情"
-                })
-
-            # 保存原始wxid
-            original_wxid = None
-            if hasattr(bot_instance.bot, 'wxid'):
-                original_wxid = bot_instance.bot.wxid
-
-            # 设置wxid
-            bot_instance.bot.wxid = bot_instance.wxid
-
-            # 从数据库中获取所有联系人
-            from database.contacts_db import get_all_contacts
-            all_contacts = get_all_contacts()
-
-            if not all_contacts:
-                logger.warning("数据库中没有联系人信息")
-                return JSONResponse(content={
-                    "success": False,
-                    "error": "数据库中没有联系人信息"
-                })
-
-            logger.info(f"从数据库中获取到 {len(all_contacts)} 个联系人")
-
-            # 创建异步任务列表
-            import asyncio
-            update_tasks = []
-            updated_count = 0
-            failed_count = 0
-
-            # 每批处理的联系人数量
-            batch_size = 20
-
-            # 分批处理联系人
-            for i in range(0, len(all_contacts), batch_size):
-                batch = all_contacts[i:i+batch_size]
-
-                # 处理当前批次
-                for contact in batch:
-                    wxid = contact.get('wxid')
-                    if not wxid:
-                        continue
-
-                    try:
-                        # 调用API获取联系人详情
-                        if asyncio.get_event_loop().is_running():
-                            detail = await bot_instance.bot.get_contract_detail(wxid)
-                        else:
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
-                            try:
-                                detail = loop.run_until_complete(bot_instance.bot.get_contract_detail(wxid))
-                            finally:
-                                loop.close()
-
-                        # 处理返回数据
-                        if not detail:
-                            logger.warning(f"获取联系人 {wxid} 详情失败，返回空数据")
-                            failed_count += 1
-                            continue
-
-                        # 处理返回结果
-                        contact_info = None
-                        if isinstance(detail, list) and len(detail) > 0:
-                            detail_item = detail[0]
-
-                            # 处理昵称
-                            nickname = ""
-                            if 'NickName' in detail_item:
-                                if isinstance(detail_item['NickName'], dict) and 'string' in detail_item['NickName']:
-                                    nickname = detail_item['NickName']['string']
-                                else:
-                                    nickname = str(detail_item['NickName'])
-                            elif 'nickname' in detail_item:
-                                nickname = detail_item.get('nickname')
-
-                            # 处理头像
-                            avatar = ""
-                            if 'BigHeadImgUrl' in detail_item and detail_item['BigHeadImgUrl']:
-                                avatar = detail_item['BigHeadImgUrl']
-                                logger.debug(f"使用BigHeadImgUrl作为头像: {avatar}")
-                            elif 'SmallHeadImgUrl' in detail_item and detail_item['SmallHeadImgUrl']:
-                                avatar = detail_item['SmallHeadImgUrl']
-                                logger.debug(f"使用SmallHeadImgUrl作为头像: {avatar}")
-                            elif 'avatar' in detail_item:
-                                avatar = detail_item.get('avatar')
-
-                            # 处理备注
-                            remark = ""
-                            if 'Remark' in detail_item:
-                                if isinstance(detail_item['Remark'], dict) and 'string' in detail_item['Remark']:
-                                    remark = detail_item['Remark']['string']
-                                elif isinstance(detail_item['Remark'], str):
-                                    remark = detail_item['Remark']
-                            elif 'remark' in detail_item:
-                                remark = detail_item.get('remark')
-
-                            # 处理微信号
-                            alias = ""
-                            if 'Alias' in detail_item:
-                                alias = detail_item.get('Alias')
-                            elif 'alias' in detail_item:
-                                alias = detail_item.get('alias')
-
-                            # 确定联系人类型
-                            contact_type = "friend"
-                            if wxid.endswith("@chatroom"):
-                                contact_type = "group"
-                            elif wxid.startswith("gh_"):
-                                contact_type = "official"
-
-                            # 创建联系人信息对象
-                            contact_info = {
-                                'wxid': wxid,
-                                'nickname': nickname or wxid,
-                                'avatar': avatar or '',
-                                'remark': remark or '',
-                                'alias': alias or '',
-                                'type': contact_type
-                            }
-                        elif isinstance(detail, dict):
-                            # 如果是字典，直接使用
-                            detail_item = detail
-
-                            # 处理昵称
-                            nickname = ""
-                            if 'NickName' in detail_item:
-                                if isinstance(detail_item['NickName'], dict) and 'string' in detail_item['NickName']:
-                                    nickname = detail_item['NickName']['string']
-                                else:
-                                    nickname = str(detail_item['NickName'])
-                            elif 'nickname' in detail_item:
-                                nickname = detail_item.get('nickname')
-
-                            # 处理头像
-                            avatar = ""
-                            if 'BigHeadImgUrl' in detail_item and detail_item['BigHeadImgUrl']:
-                                avatar = detail_item['BigHeadImgUrl']
-                                logger.debug(f"使用BigHeadImgUrl作为头像: {avatar}")
-                            elif 'SmallHeadImgUrl' in detail_item and detail_item['SmallHeadImgUrl']:
-                                avatar = detail_item['SmallHeadImgUrl']
-                                logger.debug(f"使用SmallHeadImgUrl作为头像: {avatar}")
-                            elif 'avatar' in detail_item:
-                                avatar = detail_item.get('avatar')
-
-                            # 处理备注
-                            remark = ""
-                            if 'Remark' in detail_item:
-                                if isinstance(detail_item['Remark'], dict) and 'string' in detail_item['Remark']:
-                                    remark = detail_item['Remark']['string']
-                                elif isinstance(detail_item['Remark'], str):
-                                    remark = detail_item['Remark']
-                            elif 'remark' in detail_item:
-                                remark = detail_item.get('remark')
-
-                            # 处理微信号
-                            alias = ""
-                            if 'Alias' in detail_item:
-                                alias = detail_item.get('Alias')
-                            elif 'alias' in detail_item:
-                                alias = detail_item.get('alias')
-
-                            # 确定联系人类型
-                            contact_type = "friend"
-                            if wxid.endswith("@chatroom"):
-                                contact_type = "group"
-                            elif wxid.startswith("gh_"):
-                                contact_type = "official"
-
-                            # 创建联系人信息对象
-                            contact_info = {
-                                'wxid': wxid,
-                                'nickname': nickname or wxid,
-                                'avatar': avatar or '',
-                                'remark': remark or '',
-                                'alias': alias or '',
-                                'type': contact_type
-                            }
-
-                        # 将联系人信息保存到数据库
-                        if contact_info:
-                            from database.contacts_db import update_contact_in_db
-                            update_contact_in_db(contact_info)
-                            updated_count += 1
-                            logger.info(f"已将联系人 {wxid} 信息更新到数据库")
-                        else:
-                            failed_count += 1
-                            logger.warning(f"无法解析联系人 {wxid} 的详情")
-                    except Exception as e:
-                        failed_count += 1
-                        logger.error(f"更新联系人 {wxid} 信息失败: {str(e)}")
-
-                # 每批处理完成后等待一小段时间，避免请求过于频繁
-                await asyncio.sleep(1)
-
-            # 恢复原始wxid
-            if original_wxid is not None:
-                bot_instance.bot.wxid = original_wxid
-
-            # 返回结果
-            return JSONResponse(content={
-                "success": True,
-                "message": f"成功更新 {updated_count} 个联系人信息，失败 {failed_count} 个",
-                "updated_count": updated_count,
-                "failed_count": failed_count,
-                "total_count": len(all_contacts)
-            })
-
-        except Exception as e:
-            import traceback
-            logger.error(f"更新所有联系人信息失败: {str(e)}")
-            logger.error(traceback.format_exc())
+        if not bot_instance or not hasattr(bot_instance, 'bot'):
+            logger.error("bot_instance未设置或不可用")
             return JSONResponse(content={
                 "success": False,
-                "error": f"更新所有联系人信息失败: {str(e)}"
+                "error": "机器人实例未初始化，请确保机器人已启动"
             })
 
+        job = job_engine.submit("contact_sync")
+        logger.info(f"用户 {username} 请求更新数据库中所有联系人信息，后台任务: {job.id}")
+        return JSONResponse(content={
+            "success": True,
+            "message": "已开始在后台更新所有联系人信息",
+            "job_id": job.id,
+            "job": job_engine.get(job.id)
+        })
+
+    # API: 后台任务列表
+    @app.get("/api/jobs", response_class=JSONResponse)
+    async def api_list_jobs(request: Request, kind: Optional[str] = None):
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+        return JSONResponse(content={"success": True, "data": job_engine.list_jobs(kind)})
+
+    # API: 提交后台任务
+    @app.post("/api/jobs", response_class=JSONResponse)
+    async def api_submit_job(request: Request):
+        """提交后台任务，请求体为 {"kind": "contact_sync" | "group_member_sync" | "avatar_download", "params": {}}"""
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+        try:
+            data = await request.json()
+            job = job_engine.submit(data.get("kind", ""), data.get("params") or {})
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+        logger.info(f"用户 {username} 提交后台任务 {job.kind}: {job.id}")
+        return JSONResponse(content={"success": True, "job_id": job.id, "job": job_engine.get(job.id)})
+
+    # API: 查询后台任务
+    @app.get("/api/jobs/{job_id}", response_class=JSONResponse)
+    async def api_get_job(job_id: str, request: Request):
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+        job = job_engine.get(job_id)
+        if job is None:
+            return JSONResponse(status_code=404, content={"success": False, "error": "任务不存在"})
+        return JSONResponse(content={"success": True, "data": job})
+
+    # API: 取消后台任务
+    @app.post("/api/jobs/{job_id}/cancel", response_class=JSONResponse)
+    async def api_cancel_job(job_id: str, request: Request):
+        username = await check_auth(request)
+        if not username:
+            return JSONResponse(status_code=401, content={"success": False, "error": "未认证"})
+        if not job_engine.cancel(job_id):
+            return JSONResponse(content={"success": False, "error": "任务不存在或已结束"})
+        return JSONResponse(content={"success": True, "data": job_engine.get(job_id)})
+
     # API: 刷新单个联系人信息
     @app.get("/api/contacts/{wxid}/refresh", response_class=JSONResponse)
     async def api_refresh_contact(wxid: str, request: Request):
@@ -216,6 +216,10 @@
                             <div class="text-muted small text-truncate mb-2" title="${plugin.author || '未知作者'}">
                                 <i class="bi bi-person me-1"></i>${plugin.author || '未知作者'}
                             </div>
+                            ${plugin.import_ms != null || plugin.init_ms != null ? `
+                            <div class="text-muted small mb-2" title="导入耗时 / 初始化耗时">
+                                <i class="bi bi-stopwatch me-1"></i>导入 ${plugin.import_ms != null ? plugin.import_ms + 'ms' : '-'} / 初始化 ${plugin.init_ms != null ? plugin.init_ms + 'ms' : (plugin.load_status === 'timeout' ? '进行中' : '-')}
+                            </div>` : ''}
                             <div class="d-flex flex-wrap gap-2 justify-content-start align-items-center">
                                 <div class="d-flex gap-1">
                                     <button class="btn btn-sm btn-outline-secondary rounded-pill btn-readme" data-plugin-id="${plugin.id}">
@@ -0,0 +1,231 @@
+# 系统状态后台采样器
+"""
+管理后台原先在每次仪表盘轮询时调用 psutil.cpu_percent(interval=0.5)，
+阻塞管理后台的事件循环半秒，内存、磁盘等信息也在每个请求中重新获取。
+
+这里改为由一个后台协程按固定间隔采样 CPU、内存、磁盘、进程内存、事件循环延迟和消息速率，
+结果保存在环形缓冲区中：
+- 接口直接返回内存中的最新快照和时间序列，不再阻塞
+- 提供 SSE 推送，多个打开的仪表盘共用同一份采样，不会成倍增加开销
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+import psutil
+from loguru import logger
+
+
+class SystemSampler:
+    """系统状态采样器
+
+    Args:
+        interval: 采样间隔（秒）
+        history: 环形缓冲区保留的采样点数量
+    """
+
+    def __init__(self, interval: float = 5.0, history: int = 720):
+        self.interval = max(float(interval), 1.0)
+        self.samples: Deque[Dict[str, Any]] = deque(maxlen=max(int(history), 1))
+        self._task: Optional[asyncio.Task] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._process = psutil.Process(os.getpid())
+        self._bot_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # 计算速率用的上一次计数
+        self._last_time: Optional[float] = None
+        self._last_net = None
+        self._last_received: Optional[int] = None
+
+        # 不会变化的信息只取一次
+        self.static_info = {
+            "cpu_count": psutil.cpu_count(logical=True) or psutil.cpu_count(logical=False) or 0,
+            "boot_time": datetime.fromtimestamp(psutil.boot_time()).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def configure(self, interval: float = None, history: int = None):
+        """调整采样间隔和缓冲区大小"""
+        if interval:
+            self.interval = max(float(interval), 1.0)
+        if history and int(history) != self.samples.maxlen:
+            self.samples = deque(self.samples, maxlen=max(int(history), 1))
+
+    def set_bot_loop(self, loop: Optional[asyncio.AbstractEventLoop]):
+        """设置机器人主事件循环，用于测量其调度延迟"""
+        self._bot_loop = loop
+
+    def start(self):
+        """在当前事件循环中启动采样协程"""
+        if self._task is None or self._task.done():
+            # 第一次调用 cpu_percent 只用于建立基准，之后每次返回两次调用之间的平均值
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"系统状态采样器已启动，间隔 {self.interval} 秒，保留 {self.samples.maxlen} 个采样点")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        expected = loop.time() + self.interval
+        while True:
+            await asyncio.sleep(max(expected - loop.time(), 0))
+            # 实际醒来时间与预期时间之差，即管理后台事件循环的调度延迟
+            loop_lag = max(loop.time() - expected, 0)
+            expected = loop.time() + self.interval
+            try:
+                sample = await asyncio.to_thread(self._collect)
+                sample["loop_lag_ms"] = round(loop_lag * 1000, 2)
+                sample["bot_loop_lag_ms"] = await self._measure_bot_loop_lag()
+                self.samples.append(sample)
+                self._publish(sample)
+            except Exception as e:
+                logger.error(f"系统状态采样失败: {e}")
+
+    async def _measure_bot_loop_lag(self) -> Optional[float]:
+        """在机器人事件循环中排入一个回调，测量它被执行前等待的时间"""
+        bot_loop = self._bot_loop
+        if bot_loop is None or bot_loop.is_closed() or not bot_loop.is_running():
+            return None
+        future = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+
+        def _done():
+            lag = time.perf_counter() - start
+            future.get_loop().call_soon_threadsafe(lambda: future.done() or future.set_result(lag))
+
+        try:
+            bot_loop.call_soon_threadsafe(_done)
+            lag = await asyncio.wait_for(future, timeout=self.interval)
+            return round(lag * 1000, 2)
+        except (asyncio.TimeoutError, RuntimeError):
+            # 机器人事件循环被阻塞超过一个采样间隔
+            return round(self.interval * 1000, 2)
+
+    def _collect(self) -> Dict[str, Any]:
+        """采集一次系统状态，在线程中执行"""
+        now = time.time()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        net = psutil.net_io_counters()
+        with self._process.oneshot():
+            rss = self._process.memory_info().rss
+            process_cpu = self._process.cpu_percent(interval=None)
+
+        elapsed = now - self._last_time if self._last_time else None
+        sample = {
+            "timestamp": now,
+            "time": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": memory.percent,
+            "memory_used": memory.used,
+            "memory_total": memory.total,
+            "memory_available": memory.available,
+            "disk_percent": disk.percent,
+            "disk_used": disk.used,
+            "disk_total": disk.total,
+            "disk_free": disk.free,
+            "process_rss": rss,
+            "process_cpu_percent": process_cpu,
+            "bytes_sent": net.bytes_sent,
+            "bytes_recv": net.bytes_recv,
+            "net_sent_rate": None,
+            "net_recv_rate": None,
+            "message_rate": None,
+        }
+
+        if elapsed:
+            sample["net_sent_rate"] = round((net.bytes_sent - self._last_net.bytes_sent) / elapsed, 2)
+            sample["net_recv_rate"] = round((net.bytes_recv - self._last_net.bytes_recv) / elapsed, 2)
+
+        # 消息速率（条/分钟），来自消息接收器的计数
+        received = self._messages_received()
+        if received is not None and self._last_received is not None and elapsed:
+            sample["message_rate"] = round(max(received - self._last_received, 0) * 60 / elapsed, 2)
+
+        self._last_time = now
+        self._last_net = net
+        self._last_received = received
+        return sample
+
+    @staticmethod
+    def _messages_received() -> Optional[int]:
+        try:
+            from utils.message_intake import get_message_intake
+            intake = get_message_intake()
+            return intake.stats["received"] if intake else None
+        except Exception:
+            return None
+
+    # ---------- 查询 ----------
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """最新的采样点，尚未采样时返回 None"""
+        return self.samples[-1] if self.samples else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """最新采样点；采样器尚未产生数据时，用不阻塞的方式即时获取一次"""
+        sample = self.latest()
+        if sample is None:
+            sample = self._collect()
+        return {**self.static_info, **sample}
+
+    def series(self, seconds: float = None, fields: List[str] = None) -> List[Dict[str, Any]]:
+        """返回最近一段时间的采样序列"""
+        samples = list(self.samples)
+        if seconds:
+            since = time.time() - seconds
+            samples = [sample for sample in samples if sample["timestamp"] >= since]
+        if fields:
+            keep = set(fields) | {"timestamp", "time"}
+            samples = [{key: value for key, value in sample.items() if key in keep} for sample in samples]
+        return samples
+
+    # ---------- 推送 ----------
+
+    def _publish(self, sample: Dict[str, Any]):
+        for queue in list(self._subscribers):
+            if queue.full():
+                # 客户端消费太慢，丢弃最旧的采样点
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(sample)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """SSE 事件流：先发送最新快照，之后每次采样推送一次"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=10)
+        self._subscribers.add(queue)
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(self.snapshot(), ensure_ascii=False)}\n\n"
+            while True:
+                try:
+                    sample = await asyncio.wait_for(queue.get(), timeout=max(self.interval * 3, 15))
+                    yield f"event: sample\ndata: {json.dumps(sample, ensure_ascii=False)}\n\n"
+                except asyncio.TimeoutError:
+                    # 保持连接，防止被代理断开
+                    yield ": keepalive\n\n"
+        finally:
+            self._subscribers.discard(queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "samples": len(self.samples),
+            "history": self.samples.maxlen,
+            "subscribers": len(self._subscribers),
+            "running": self._task is not None and not self._task.done(),
+        }
+
+
+system_sampler = SystemSampler()
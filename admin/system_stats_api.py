@@ -8,6 +8,8 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 from loguru import logger
 
+from system_sampler import system_sampler
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
 async def handle_system_stats(request: Request, type: str = "system", time_range: str = "1"):
@@ -329,20 +331,15 @@ async def handle_system_stats(request: Request, type: str = "system", time_range
         elif type == "system":
             # 获取系统信息统计数据
             try:
-                # 获取CPU使用率
-                cpu_percent = psutil.cpu_percent(interval=0.5)
-
-                # 获取内存信息
-                memory = psutil.virtual_memory()
-                memory_used = memory.used
-                memory_total = memory.total
-                memory_percent = memory.percent
-
-                # 获取磁盘信息
-                disk = psutil.disk_usage('/')
-                disk_total = disk.total
-                disk_free = disk.free
-                disk_percent = disk.percent
+                # CPU、内存、磁盘信息来自后台采样器的最新快照
+                sample = system_sampler.snapshot()
+                cpu_percent = sample["cpu_percent"]
+                memory_used = sample["memory_used"]
+                memory_total = sample["memory_total"]
+                memory_percent = sample["memory_percent"]
+                disk_total = sample["disk_total"]
+                disk_free = sample["disk_free"]
+                disk_percent = sample["disk_percent"]
 
                 # 获取系统启动时间和运行时间
                 boot_time = datetime.fromtimestamp(psutil.boot_time())
@@ -410,7 +407,7 @@ async def handle_system_stats(request: Request, type: str = "system", time_range
                     "data": {
                         "cpu": {
                             "percent": cpu_percent,
-                            "cores": psutil.cpu_count()
+                            "cores": sample["cpu_count"]
                         },
                         "memory": {
                             "total": memory_total,
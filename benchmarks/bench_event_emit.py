@@ -0,0 +1,81 @@
+"""
+EventManager.emit 微基准测试
+
+对比 deepcopy 模式与写时复制（cow）模式下，单条消息的分发延迟随处理函数数量的变化。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_event_emit.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.event_manager import EventManager, COPY_MODE_COW, COPY_MODE_DEEPCOPY  # noqa: E402
+
+HANDLER_COUNTS = [1, 10, 20, 40, 80]
+ROUNDS = 2000
+
+
+def make_message() -> dict:
+    """构造一条接近真实的群聊文本消息"""
+    return {
+        "MsgId": 1234567890,
+        "MsgType": 1,
+        "FromWxid": "12345678@chatroom",
+        "ToWxid": "wxid_bot",
+        "SenderWxid": "wxid_sender",
+        "Content": "@机器人 帮我查一下今天的天气" * 4,
+        "MsgSource": "<msgsource><atuserlist>wxid_bot</atuserlist><silence>0</silence>"
+                     "<membercount>500</membercount></msgsource>" * 3,
+        "Ats": ["wxid_bot"],
+        "IsGroup": True,
+        "CreateTime": 1700000000,
+        "PushContent": "某人 : 帮我查一下今天的天气",
+        "Status": 3,
+        "ImgStatus": 1,
+        "ImgBuf": {"iLen": 0},
+    }
+
+
+def make_plugin(index: int):
+    class Plugin:
+        async def handle_text(self, bot, message):
+            # 只读访问，模拟绝大多数插件的关键字判断
+            if message["Content"].startswith("不存在的命令"):
+                return False
+            return True
+
+    Plugin.__name__ = f"BenchPlugin{index}"
+    Plugin.handle_text._event_type = "text_message"
+    Plugin.handle_text._priority = 50
+    return Plugin()
+
+
+async def bench(handler_count: int, mode: str) -> float:
+    EventManager._handlers.clear()
+    EventManager._dispatch.clear()
+    for i in range(handler_count):
+        EventManager.bind_instance(make_plugin(i))
+    EventManager.set_copy_mode(mode)
+
+    message = make_message()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await EventManager.emit("text_message", None, message)
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+async def main():
+    print(f"{'handlers':>8} {'deepcopy(us)':>14} {'cow(us)':>10} {'speedup':>8}")
+    for count in HANDLER_COUNTS:
+        deep = await bench(count, COPY_MODE_DEEPCOPY)
+        cow = await bench(count, COPY_MODE_COW)
+        print(f"{count:>8} {deep:>14.1f} {cow:>10.1f} {deep / cow:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
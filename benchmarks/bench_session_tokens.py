@@ -0,0 +1,125 @@
+"""
+ChatGPTSession token 计数基准测试
+
+对比原先每次裁剪都对整段历史重新计数（每次还要查找一次 tiktoken 编码器）的方式
+与按消息缓存 token 数、维护累计值的方式，在 200 轮对话中每轮提问和回复后各裁剪一次的耗时。
+tiktoken 编码文件无法加载（如离线环境）时改用按字符计数的模型，只比较计数次数带来的差异。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_session_tokens.py
+"""
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOW_DIR = os.path.join(ROOT, "dow")
+sys.path.insert(0, DOW_DIR)
+# DOW 的日志模块会在工作目录下创建 run.log
+os.chdir(DOW_DIR)
+
+from bot.chatgpt.chat_gpt_session import ChatGPTSession  # noqa: E402
+from bot.session_manager import Session  # noqa: E402
+
+TURNS = 200
+MAX_TOKENS = [1000, 4000, 16000]
+# 按字符计数时一个 token 大约对应的字符数，用于换算 max_tokens
+CHARS_PER_TOKEN = 4
+QUERY_WORDS = (10, 80)
+REPLY_WORDS = (50, 300)
+WORDS = "the quick brown fox jumps over a lazy dog 你好 今天 天气 怎么样".split()
+
+
+def legacy_num_tokens(messages, model):
+    """原先的 num_tokens_from_messages：每次调用都查找编码器并遍历全部消息"""
+    if model == "wenxin":
+        return sum(len(msg["content"]) for msg in messages)
+    import tiktoken
+
+    encoding = tiktoken.encoding_for_model(model)
+    num_tokens = 0
+    for message in messages:
+        num_tokens += 4
+        for key, value in message.items():
+            num_tokens += len(encoding.encode(value))
+            if key == "name":
+                num_tokens -= 1
+    return num_tokens + 3
+
+
+class LegacySession(Session):
+    """原先的 ChatGPTSession.discard_exceeding"""
+
+    def __init__(self, session_id, system_prompt=None, model="gpt-3.5-turbo"):
+        super().__init__(session_id, system_prompt)
+        self.model = model
+        self.reset()
+
+    def discard_exceeding(self, max_tokens, cur_tokens=None):
+        cur_tokens = self.calc_tokens()
+        while cur_tokens > max_tokens:
+            if len(self.messages) > 2:
+                self.messages.pop(1)
+            elif len(self.messages) == 2 and self.messages[1]["role"] == "assistant":
+                self.messages.pop(1)
+                cur_tokens = self.calc_tokens()
+                break
+            else:
+                break
+            cur_tokens = self.calc_tokens()
+        return cur_tokens
+
+    def calc_tokens(self):
+        return legacy_num_tokens(self.messages, self.model)
+
+
+def pick_model():
+    try:
+        import tiktoken
+
+        tiktoken.encoding_for_model("gpt-3.5-turbo").encode("hello")
+        return "gpt-3.5-turbo"
+    except Exception as e:
+        print(f"tiktoken 编码器不可用（{type(e).__name__}），改用按字符计数的模型 wenxin")
+        return "wenxin"
+
+
+def make_turns(seed=42):
+    rng = random.Random(seed)
+
+    def text(bounds):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(*bounds)))
+
+    return [(text(QUERY_WORDS), text(REPLY_WORDS)) for _ in range(TURNS)]
+
+
+def run(session_cls, model, turns, max_tokens):
+    session = session_cls("bench", "You are a helpful assistant.", model=model)
+    tokens = []
+    start = time.perf_counter()
+    for query, reply in turns:
+        session.add_query(query)
+        session.discard_exceeding(max_tokens)
+        session.add_reply(reply)
+        tokens.append(session.discard_exceeding(max_tokens))
+    return time.perf_counter() - start, tokens, len(session.messages)
+
+
+def main():
+    model = pick_model()
+    turns = make_turns()
+    print(f"{TURNS} 轮对话，模型 {model}")
+    print(f"{'max_tokens':>10} {'history':>8} {'legacy(ms)':>12} {'new(ms)':>10} {'speedup':>8} {'same':>6}")
+    for max_tokens in MAX_TOKENS:
+        if model == "wenxin":
+            max_tokens *= CHARS_PER_TOKEN
+        legacy_time, legacy_tokens, _ = run(LegacySession, model, turns, max_tokens)
+        new_time, new_tokens, history = run(ChatGPTSession, model, turns, max_tokens)
+        print(f"{max_tokens:>10} {history:>8} {legacy_time * 1000:>12.1f} {new_time * 1000:>10.1f} "
+              f"{legacy_time / new_time:>7.1f}x {str(legacy_tokens == new_tokens):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+WX849Channel 消息分发基准测试
+
+对比原先“每条消息一个线程 + 新事件循环（内部再开一个线程并 join）”的处理方式
+与 SessionDispatcher（单一事件循环 + 固定线程池、同一会话串行）在稳定速率和突发消息下的吞吐量、延迟和线程数。
+处理函数模拟一次短暂的阻塞调用（如 HTTP 请求）加少量 CPU 计算。
+突发时线程池大小限制了并发，消息在队列中等待，延迟高于不限线程数的旧方式，可通过 wx849_dispatch_workers 调整。
+
+用法（在项目根目录执行）:
+    python benchmarks/bench_wx849_dispatch.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOW_DIR = os.path.join(ROOT, "dow")
+sys.path.insert(0, DOW_DIR)
+# DOW 的日志模块会在工作目录下创建 run.log
+os.chdir(DOW_DIR)
+
+from common.session_dispatcher import SessionDispatcher  # noqa: E402
+
+SESSIONS = 50
+MESSAGES_PER_SESSION = 40
+HANDLER_SLEEP = 0.005
+HANDLER_CPU_LOOPS = 2000
+WORKERS = 8
+# 稳定到达速率（条/秒）；None 表示所有消息同时到达
+RATES = [500, None]
+
+
+def handle(session_id, index, enqueued, latencies, order):
+    """模拟 handle_single / handle_group"""
+    time.sleep(HANDLER_SLEEP)
+    total = 0
+    for i in range(HANDLER_CPU_LOOPS):
+        total += i * i
+    latencies.append(time.perf_counter() - enqueued)
+    order.setdefault(session_id, []).append(index)
+
+
+def legacy_process(session_id, index, enqueued, latencies, order):
+    """原先 _process_single_message_independently 的结构"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        def process_message_in_new_thread():
+            msg_loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(msg_loop)
+            try:
+                handle(session_id, index, enqueued, latencies, order)
+            finally:
+                msg_loop.close()
+
+        msg_thread = threading.Thread(target=process_message_in_new_thread, daemon=True)
+        msg_thread.start()
+        msg_thread.join()
+    finally:
+        loop.close()
+
+
+async def messages(rate):
+    """各会话的消息交错到达，按给定速率产生"""
+    start = time.perf_counter()
+    count = 0
+    for index in range(MESSAGES_PER_SESSION):
+        for session in range(SESSIONS):
+            if rate:
+                delay = start + count / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            count += 1
+            yield f"session_{session}", index
+
+
+async def run_legacy(rate):
+    latencies, order = [], {}
+    threads = []
+    peak = 0
+    start = time.perf_counter()
+    async for session_id, index in messages(rate):
+        thread = threading.Thread(target=legacy_process,
+                                  args=(session_id, index, time.perf_counter(), latencies, order), daemon=True)
+        thread.start()
+        threads.append(thread)
+        peak = max(peak, threading.active_count())
+    await asyncio.get_running_loop().run_in_executor(None, lambda: [thread.join() for thread in threads])
+    return time.perf_counter() - start, latencies, order, peak
+
+
+async def run_dispatcher(rate):
+    latencies, order = [], {}
+    dispatcher = SessionDispatcher(WORKERS)
+    total = SESSIONS * MESSAGES_PER_SESSION
+    start = time.perf_counter()
+    async for session_id, index in messages(rate):
+        dispatcher.submit(session_id, handle, session_id, index, time.perf_counter(), latencies, order)
+    peak = threading.active_count()
+    while dispatcher.stats["completed"] + dispatcher.stats["failed"] < total:
+        await asyncio.sleep(0.001)
+        peak = max(peak, threading.active_count())
+    elapsed = time.perf_counter() - start
+    dispatcher.shutdown(wait=True)
+    return elapsed, latencies, order, peak
+
+
+def report(rate, name, elapsed, latencies, order, peak):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    in_order = all(indexes == sorted(indexes) for indexes in order.values())
+    print(f"{rate:>8} {name:>12} {len(latencies) / elapsed:>10.0f} {p50:>10.1f} {p99:>10.1f} {peak:>8} {str(in_order):>8}")
+
+
+async def main():
+    print(f"{SESSIONS} 个会话 x {MESSAGES_PER_SESSION} 条消息，处理函数阻塞 {HANDLER_SLEEP * 1000:.0f}ms，"
+          f"线程池 {WORKERS} 个线程")
+    print(f"{'rate':>8} {'mode':>12} {'msgs/s':>10} {'p50(ms)':>10} {'p99(ms)':>10} {'threads':>8} {'ordered':>8}")
+    for rate in RATES:
+        label = str(rate) if rate else "burst"
+        report(label, "legacy", *await run_legacy(rate))
+        report(label, "dispatcher", *await run_dispatcher(rate))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,13 +11,20 @@ from datetime import datetime, timedelta
 from loguru import logger
 
 import WechatAPI
+from WechatAPI import media_worker
+from WechatAPI.voice_cache import voice_cache
 from database.XYBotDB import XYBotDB
 from database.keyvalDB import KeyvalDB
 from database.messsagDB import MessageDB
+from database.contacts_db import contact_cache
+from database.group_members_db import group_member_cache
+from database import message_counter
 from utils.decorators import scheduler
 from utils.plugin_manager import plugin_manager
 from utils.xybot import XYBot
 from utils.notification_service import init_notification_service, get_notification_service
+from utils.message_intake import init_message_intake
+from utils.message_bus import message_bus
 
 # 导入管理后台模块
 try:
@@ -209,6 +216,14 @@ async def bot_core():
 
     # 设置客户端属性
     bot.ignore_protect = config.get("XYBot", {}).get("ignore-protection", False)
+    # 到协议服务器的长连接池参数
+    bot.configure_http(api_config.get("connection-limit"), api_config.get("keepalive-timeout"))
+    # 发送调度器：全局限速与文本/媒体通道并发
+    sender_config = config.get("MessageSender", {})
+    bot.configure_send_scheduler(sender_config.get("rate"), sender_config.get("burst"),
+                                 sender_config.get("text-concurrency"), sender_config.get("media-concurrency"))
+    media_worker.configure(sender_config.get("media-threads"), sender_config.get("media-processes"))
+    voice_cache.configure(config.get("VoiceCache", {}))
 
     # 等待WechatAPI服务启动
     # time_out = 30  # 增加超时时间
@@ -536,6 +551,9 @@ async def bot_core():
     message_db = MessageDB()
     await message_db.initialize()
 
+    # 批量加载联系人到内存缓存
+    await asyncio.get_running_loop().run_in_executor(None, contact_cache.load_all)
+
     keyval_db = KeyvalDB()
     await keyval_db.initialize()
 
@@ -570,6 +588,18 @@ async def bot_core():
     except Exception as e:
         logger.error(f"添加图片文件自动清理任务失败: {e}")
 
+    # 添加群成员缓存后台全量刷新任务
+    member_refresh_interval = config.get("XYBot", {}).get("group-member-refresh-interval", 3600)
+    if member_refresh_interval > 0:
+        group_member_cache.refresh_interval = member_refresh_interval
+        scheduler.add_job(
+            group_member_cache.refresh_all,
+            'interval',
+            seconds=member_refresh_interval,
+            args=[xybot.get_chatroom_member_list],
+            id='group_member_refresh'
+        )
+
     # 加载插件目录下的所有插件
     loaded_plugins = await plugin_manager.load_plugins_from_directory(bot, load_disabled_plugin=False)
     logger.success(f"已加载插件: {loaded_plugins}")
@@ -604,6 +634,14 @@ async def bot_core():
     except Exception as e:
         logger.error(f"启动自动重启监控器失败: {e}")
 
+    # 启动本地消息总线，供 wx849_callback_daemon 等本地进程订阅已解析的消息
+    message_bus.configure(config.get("MessageBus", {}))
+    await message_bus.start()
+
+    # 启动消息接收器：有界队列 + 固定数量的工作协程，按配置使用推送或自适应轮询
+    intake = init_message_intake(xybot.process_message, config.get("MessageIntake", {}))
+    await intake.start()
+
     logger.success("开始处理消息")
 
     # 添加重连检测变量
@@ -611,89 +649,100 @@ async def bot_core():
     max_failure_count = 3  # 连续失败超过这个数量则认为离线
     is_offline = False
 
-    while True:
-        # 不需要记录当前时间
+    try:
+        while True:
+            # 本轮拉取到的消息数量，用于调整下一次轮询间隔
+            received = 0
 
-        try:
-            ok,data = await bot.sync_message()
-
-            # 如果成功获取消息，重置失败计数
-            if ok:
-                # 如果之前处于离线状态，现在恢复了，发送重连通知
-                if is_offline and message_failure_count > 0:
-                    is_offline = False
-                    message_failure_count = 0
-
-                    # 发送重连通知
-                    notification_service = get_notification_service()
-                    if notification_service and notification_service.enabled and notification_service.triggers.get("reconnect", False):
-                        if notification_service.token:
-                            logger.info(f"发送微信重连通知，微信ID: {bot.wxid}")
-                            asyncio.create_task(notification_service.send_reconnect_notification(bot.wxid))
-                        else:
-                            logger.warning("PushPlus Token未设置，无法发送重连通知")
-
-                # 正常情况下重置计数器
-                if message_failure_count > 0:
-                    message_failure_count = 0
+            try:
+                ok,data = await bot.sync_message()
+
+                # 如果成功获取消息，重置失败计数
+                if ok:
+                    # 如果之前处于离线状态，现在恢复了，发送重连通知
+                    if is_offline and message_failure_count > 0:
+                        is_offline = False
+                        message_failure_count = 0
+
+                        # 发送重连通知
+                        notification_service = get_notification_service()
+                        if notification_service and notification_service.enabled and notification_service.triggers.get("reconnect", False):
+                            if notification_service.token:
+                                logger.info(f"发送微信重连通知，微信ID: {bot.wxid}")
+                                asyncio.create_task(notification_service.send_reconnect_notification(bot.wxid))
+                            else:
+                                logger.warning("PushPlus Token未设置，无法发送重连通知")
+
+                    # 正常情况下重置计数器
+                    if message_failure_count > 0:
+                        message_failure_count = 0
 
-        except Exception as e:
-            logger.warning("获取新消息失败 {}", e)
-            # 增加失败计数
-            message_failure_count += 1
-
-            # 如果连续失败超过阈值，标记为离线状态
-            if message_failure_count >= max_failure_count and not is_offline:
-                is_offline = True
-                logger.warning(f"连续 {message_failure_count} 次获取消息失败，微信可能已离线")
-
-            # 等待一段时间后重试
-            await asyncio.sleep(5)
-            logger.info("5秒后继续尝试获取消息")
-            continue
-
-            # 以下代码已注释，不再自动重新登录
-            # update_bot_status("waiting_login", "等待微信登录")
-            # 清除所有定时任务
-            # scheduler.remove_all_jobs()
-            # logger.success("所有定时任务已清除")
-            # await bot_core()
-            # break
-
-        # 如果成功获取消息但没有数据，处理消息数据
-
-        # 检查data是否为字典类型
-        if isinstance(data, dict):
-            messages = data.get("AddMsgs")
-            if messages:
-                for message in messages:
-                    asyncio.create_task(xybot.process_message(message))
-        elif data:  # 如果data不是字典但有值，记录日志
-            logger.warning(f"Unexpected data type: {type(data)}, value: {data}")
-
-            # 检测特定的错误消息
-            if isinstance(data, str) and "用户可能退出" in data:
-                # 如果检测到用户退出消息，增加失败计数
+            except Exception as e:
+                logger.warning("获取新消息失败 {}", e)
+                # 增加失败计数
                 message_failure_count += 1
 
                 # 如果连续失败超过阈值，标记为离线状态
                 if message_failure_count >= max_failure_count and not is_offline:
                     is_offline = True
-                    logger.warning(f"检测到用户退出消息，微信可能已离线")
-
-                    # 发送离线通知
-                    notification_service = get_notification_service()
-                    if notification_service and notification_service.enabled and notification_service.triggers.get("offline", False):
-                        if notification_service.token:
-                            logger.info(f"发送微信离线通知，微信ID: {bot.wxid}")
-                            asyncio.create_task(notification_service.send_offline_notification(bot.wxid))
-                        else:
-                            logger.warning("PushPlus Token未设置，无法发送离线通知")
-
-                    # 更新状态为离线
-                    update_bot_status("offline", "微信已离线")
-        # 使用异步睡眠替代忙等待循环
-        await asyncio.sleep(0.5)
+                    logger.warning(f"连续 {message_failure_count} 次获取消息失败，微信可能已离线")
+
+                # 等待一段时间后重试
+                await asyncio.sleep(5)
+                logger.info("5秒后继续尝试获取消息")
+                continue
+
+                # 以下代码已注释，不再自动重新登录
+                # update_bot_status("waiting_login", "等待微信登录")
+                # 清除所有定时任务
+                # scheduler.remove_all_jobs()
+                # logger.success("所有定时任务已清除")
+                # await bot_core()
+                # break
+
+            # 如果成功获取消息但没有数据，处理消息数据
+
+            # 检查data是否为字典类型
+            if isinstance(data, dict):
+                messages = data.get("AddMsgs")
+                if messages:
+                    received = len(messages)
+                    # 队列满时在这里等待，形成背压
+                    await intake.submit(messages)
+            elif data:  # 如果data不是字典但有值，记录日志
+                logger.warning(f"Unexpected data type: {type(data)}, value: {data}")
+
+                # 检测特定的错误消息
+                if isinstance(data, str) and "用户可能退出" in data:
+                    # 如果检测到用户退出消息，增加失败计数
+                    message_failure_count += 1
+
+                    # 如果连续失败超过阈值，标记为离线状态
+                    if message_failure_count >= max_failure_count and not is_offline:
+                        is_offline = True
+                        logger.warning(f"检测到用户退出消息，微信可能已离线")
+
+                        # 发送离线通知
+                        notification_service = get_notification_service()
+                        if notification_service and notification_service.enabled and notification_service.triggers.get("offline", False):
+                            if notification_service.token:
+                                logger.info(f"发送微信离线通知，微信ID: {bot.wxid}")
+                                asyncio.create_task(notification_service.send_offline_notification(bot.wxid))
+                            else:
+                                logger.warning("PushPlus Token未设置，无法发送离线通知")
+
+                        # 更新状态为离线
+                        update_bot_status("offline", "微信已离线")
+            # 根据是否收到消息自适应等待；推送模式下为低频兜底轮询
+            await intake.wait_next_poll(received)
+    finally:
+        # 退出时处理完队列中的消息，写入缓冲的消息记录，并关闭到协议服务器的长连接
+        await intake.stop()
+        await message_bus.stop()
+        await message_db.close()
+        message_counter.shutdown()
+        await bot.close_session()
+        media_worker.shutdown()
 
     # 返回机器人实例（此处不会执行到，因为上面的无限循环）
     return xybot
\ No newline at end of file
@@ -1,11 +1,13 @@
+import asyncio
 import datetime
+import threading
 import tomllib
 from concurrent.futures import ThreadPoolExecutor
-from typing import Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 from loguru import logger
-from sqlalchemy import Column, String, Integer, DateTime, create_engine, JSON, Boolean
-from sqlalchemy import update
+from sqlalchemy import Column, String, Integer, DateTime, create_engine, JSON, Boolean, event
+from sqlalchemy import select, update, bindparam, text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -20,7 +22,7 @@ class User(Base):
 
     wxid = Column(String(20), primary_key=True, nullable=False, unique=True, index=True, autoincrement=False,
                   comment='wxid')
-    points = Column(Integer, nullable=False, default=0, comment='points')
+    points = Column(Integer, nullable=False, default=0, index=True, comment='points')
     signin_stat = Column(DateTime, nullable=False, default=datetime.datetime.fromtimestamp(0), comment='signin_stat')
     signin_streak = Column(Integer, nullable=False, default=0, comment='signin_streak')
     whitelist = Column(Boolean, nullable=False, default=False, comment='whitelist')
@@ -42,16 +44,43 @@ class XYBotDB(metaclass=Singleton):
             main_config = tomllib.load(f)
 
         self.database_url = main_config["XYBot"]["XYBotDB-url"]
-        self.engine = create_engine(self.database_url)
+        self.pool_size = main_config["XYBot"].get("XYBotDB-pool-size", 8)
+        engine_kwargs = {"pool_pre_ping": True}
+        if self.database_url.startswith("sqlite"):
+            # 多个线程同时写入时等待锁，而不是立即报 database is locked
+            engine_kwargs["connect_args"] = {"timeout": 30}
+        if ":memory:" not in self.database_url:
+            engine_kwargs["pool_size"] = self.pool_size
+        self.engine = create_engine(self.database_url, **engine_kwargs)
+        if self.database_url.startswith("sqlite"):
+            self._enable_sqlite_wal()
         self.DBSession = sessionmaker(bind=self.engine)
 
         # 创建表
         Base.metadata.create_all(self.engine)
+        # 已有的数据库不会由 create_all 补建索引，这里单独检查创建
+        for index in User.__table__.indexes:
+            index.create(self.engine, checkfirst=True)
+
+        # 全局积分排行榜缓存，积分变化时增量维护
+        self.leaderboard_cache_size = 100
+        self._top: Optional[List[Tuple[str, int]]] = None
+        self._top_lock = threading.Lock()  # 同时保护积分提交与缓存更新的顺序
         logger.success("数据库初始化成功")
 
         # 创建线程池执行器
         self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
 
+    def _enable_sqlite_wal(self):
+        """SQLite 使用 WAL 模式，读操作不会被写操作阻塞"""
+
+        @event.listens_for(self.engine, "connect")
+        def _set_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
     def _execute_in_queue(self, method, *args, **kwargs):
         """在队列中执行数据库操作"""
         future = self.executor.submit(method, *args, **kwargs)
@@ -82,7 +111,8 @@ class XYBotDB(metaclass=Singleton):
                 user = User(wxid=wxid, points=num)
                 session.add(user)
             logger.info(f"数据库: 用户{wxid}积分增加{num}")
-            session.commit()
+            changed = self._current_points(session, [wxid])
+            self._commit_points(session, changed)
             return True
         except SQLAlchemyError as e:
             session.rollback()
@@ -108,7 +138,7 @@ class XYBotDB(metaclass=Singleton):
                 user = User(wxid=wxid, points=num)
                 session.add(user)
             logger.info(f"数据库: 用户{wxid}积分设置为{num}")
-            session.commit()
+            self._commit_points(session, {wxid: num})
             return True
         except SQLAlchemyError as e:
             session.rollback()
@@ -130,6 +160,110 @@ class XYBotDB(metaclass=Singleton):
         finally:
             session.close()
 
+    def get_points_many(self, wxids: Iterable[str]) -> Dict[str, int]:
+        """批量获取用户积分，不存在的用户积分为0"""
+        return self._execute_in_queue(self._get_points_many, wxids)
+
+    def _get_points_many(self, wxids: Iterable[str]) -> Dict[str, int]:
+        wxids = list(dict.fromkeys(wxids))
+        points = dict.fromkeys(wxids, 0)
+        session = self.DBSession()
+        try:
+            # 分批查询，避免超过SQLite单条语句的参数数量限制
+            for i in range(0, len(wxids), 500):
+                rows = session.execute(
+                    select(User.wxid, User.points).where(User.wxid.in_(wxids[i:i + 500]))
+                )
+                points.update((wxid, num) for wxid, num in rows)
+            return points
+        finally:
+            session.close()
+
+    def add_points_many(self, changes: Dict[str, int]) -> bool:
+        """在一个事务中批量增加多个用户的积分"""
+        return self._execute_in_queue(self._add_points_many, changes)
+
+    def _add_points_many(self, changes: Dict[str, int]) -> bool:
+        if not changes:
+            return True
+        session = self.DBSession()
+        try:
+            existing = set()
+            wxids = list(changes)
+            for i in range(0, len(wxids), 500):
+                existing.update(session.execute(
+                    select(User.wxid).where(User.wxid.in_(wxids[i:i + 500]))
+                ).scalars())
+
+            updates = [{"b_wxid": wxid, "b_num": num} for wxid, num in changes.items() if wxid in existing]
+            if updates:
+                session.connection().execute(
+                    update(User.__table__)
+                    .where(User.__table__.c.wxid == bindparam("b_wxid"))
+                    .values(points=User.__table__.c.points + bindparam("b_num")),
+                    updates
+                )
+            session.add_all(User(wxid=wxid, points=num) for wxid, num in changes.items() if wxid not in existing)
+            changed = self._current_points(session, wxids)
+            self._commit_points(session, changed)
+            logger.info(f"数据库: 批量更新{len(changes)}个用户的积分")
+            return True
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"数据库: 批量更新积分失败, 错误: {e}")
+            return False
+        finally:
+            session.close()
+
+    def signin(self, wxid: str, signin_time: datetime.datetime, points: int, streak_cycle: int,
+               max_streak_point: int) -> dict:
+        """在一个事务中完成签到：检查签到状态，更新连续签到天数、签到时间和积分"""
+        return self._execute_in_queue(self._signin, wxid, signin_time, points, streak_cycle, max_streak_point)
+
+    def _signin(self, wxid: str, signin_time: datetime.datetime, points: int, streak_cycle: int,
+                max_streak_point: int) -> dict:
+        """签到
+
+        Returns:
+            dict: signed 是否签到成功（False表示今天已签到），streak 连续签到天数，
+                  old_streak 签到前的连续签到天数，streak_broken 是否断签，streak_points 连续签到奖励积分
+        """
+        session = self.DBSession()
+        try:
+            # 写操作都在同一个数据库线程中执行，读取和更新之间不会有其他写入
+            user = session.query(User).filter_by(wxid=wxid).first()
+            if not user:
+                user = User(wxid=wxid, points=0, signin_stat=datetime.datetime.fromtimestamp(0), signin_streak=0)
+                session.add(user)
+
+            last_sign = user.signin_stat or datetime.datetime.fromtimestamp(0)
+            days = (signin_time.date() - last_sign.date()).days
+            old_streak = user.signin_streak or 0
+            if days < 1:
+                session.rollback()
+                return {"signed": False, "streak": old_streak, "old_streak": old_streak,
+                        "streak_broken": False, "streak_points": 0}
+
+            # 超过1天没签到则断签，重新从1开始
+            streak_broken = days > 1
+            streak = 1 if streak_broken else old_streak + 1
+            streak_points = min(streak // streak_cycle, max_streak_point)
+
+            user.signin_stat = signin_time.replace(tzinfo=None)
+            user.signin_streak = streak
+            user.points = (user.points or 0) + points + streak_points
+            new_points = user.points
+            self._commit_points(session, {wxid: new_points})
+            logger.info(f"数据库: 用户{wxid}签到成功, 连续签到{streak}天, 积分增加{points + streak_points}")
+            return {"signed": True, "streak": streak, "old_streak": old_streak,
+                    "streak_broken": streak_broken, "streak_points": streak_points}
+        except SQLAlchemyError as e:
+            session.rollback()
+            logger.error(f"数据库: 用户{wxid}签到失败, 错误: {e}")
+            raise
+        finally:
+            session.close()
+
     def get_signin_stat(self, wxid: str) -> datetime.datetime:
         """获取用户签到状态"""
         return self._execute_in_queue(self._get_signin_stat, wxid)
@@ -190,10 +324,100 @@ class XYBotDB(metaclass=Singleton):
 
     def get_leaderboard(self, count: int) -> list:
         """Get points leaderboard"""
+        if count <= self.leaderboard_cache_size:
+            with self._top_lock:
+                if self._top is None:
+                    self._top = self._query_leaderboard(self.leaderboard_cache_size)
+                return self._top[:count]
+        return self._query_leaderboard(count)
+
+    def _query_leaderboard(self, count: int) -> List[Tuple[str, int]]:
+        session = self.DBSession()
+        try:
+            rows = session.execute(
+                select(User.wxid, User.points).order_by(User.points.desc(), User.wxid).limit(count)
+            )
+            return [(wxid, points) for wxid, points in rows]
+        finally:
+            session.close()
+
+    @staticmethod
+    def _current_points(session, wxids: Iterable[str]) -> Dict[str, int]:
+        """在事务提交前读取用户的最新积分，用于更新排行榜缓存"""
+        session.flush()
+        wxids = list(wxids)
+        points = {}
+        for i in range(0, len(wxids), 500):
+            rows = session.execute(select(User.wxid, User.points).where(User.wxid.in_(wxids[i:i + 500])))
+            points.update((wxid, num) for wxid, num in rows)
+        return points
+
+    def _commit_points(self, session, changed: Dict[str, int]):
+        """提交积分变化并更新排行榜缓存
+
+        提交和更新缓存在同一个 _top_lock 内完成，重建缓存的查询也持有该锁，
+        缓存的更新顺序与提交顺序一致，不会被先提交的旧积分覆盖。
+        """
+        with self._top_lock:
+            session.commit()
+            self._update_top(changed)
+
+    def _update_top(self, changed: Dict[str, int]):
+        """根据积分变化增量更新排行榜缓存，调用方需持有 _top_lock
+
+        缓存保存前 leaderboard_cache_size 名。榜上用户积分降到榜尾以下时，
+        无法确定谁会补上空位，此时清空缓存，下次读取时重新查询。
+        """
+        if self._top is None or not changed:
+            return
+        top = dict(self._top)
+        full = len(self._top) >= self.leaderboard_cache_size
+        # 与查询排序一致：积分降序，积分相同按wxid升序
+        floor = (-self._top[-1][1], self._top[-1][0]) if full else None
+
+        for wxid, points in changed.items():
+            if wxid in top:
+                if full and (-points, wxid) > floor:
+                    self._top = None
+                    return
+                top[wxid] = points
+            elif not full or (-points, wxid) < floor:
+                top[wxid] = points
+
+        ranked = sorted(top.items(), key=lambda item: (-item[1], item[0]))
+        self._top = ranked[:self.leaderboard_cache_size]
+
+    def top_points_among(self, wxids: Iterable[str], limit: int) -> List[Tuple[str, int]]:
+        """在给定的用户集合中按积分排名，只返回积分大于0的前 limit 名"""
+        return self._execute_in_queue(self._top_points_among, wxids, limit)
+
+    def _top_points_among(self, wxids: Iterable[str], limit: int) -> List[Tuple[str, int]]:
+        wxids = list(dict.fromkeys(wxids))
+        if not wxids:
+            return []
         session = self.DBSession()
         try:
-            users = session.query(User).order_by(User.points.desc()).limit(count).all()
-            return [(user.wxid, user.points) for user in users]
+            if len(wxids) <= 500 or not self.database_url.startswith("sqlite"):
+                rows = session.execute(
+                    select(User.wxid, User.points)
+                    .where(User.wxid.in_(wxids), User.points > 0)
+                    .order_by(User.points.desc(), User.wxid)
+                    .limit(limit)
+                )
+            else:
+                # 成员较多时放入临时表，用一条联表查询完成排名
+                session.execute(text("CREATE TEMP TABLE IF NOT EXISTS rank_members (wxid TEXT PRIMARY KEY)"))
+                session.execute(text("DELETE FROM rank_members"))
+                session.execute(text("INSERT OR IGNORE INTO rank_members (wxid) VALUES (:wxid)"),
+                                [{"wxid": wxid} for wxid in wxids])
+                rows = session.execute(
+                    text("SELECT u.wxid, u.points FROM user u JOIN rank_members m ON u.wxid = m.wxid "
+                         "WHERE u.points > 0 ORDER BY u.points DESC, u.wxid LIMIT :limit"),
+                    {"limit": limit}
+                )
+            result = [(wxid, points) for wxid, points in rows]
+            session.rollback()
+            return result
         finally:
             session.close()
 
@@ -242,29 +466,28 @@ class XYBotDB(metaclass=Singleton):
         """Thread-safe points trading between users"""
         session = self.DBSession()
         try:
-            # Start transaction with row-level locking
-            trader = session.query(User).filter_by(wxid=trader_wxid) \
-                .with_for_update().first()  # Acquire row lock
-            target = session.query(User).filter_by(wxid=target_wxid) \
-                .with_for_update().first()  # Acquire row lock
-
-            if not trader:
-                trader = User(wxid=trader_wxid)
-                session.add(trader)
-            if not target:
-                target = User(wxid=target_wxid)
-                session.add(target)
-                session.flush()  # Ensure IDs are generated
-
-            if trader.points >= num:
-                trader.points -= num
-                target.points += num
-                session.commit()
-                logger.info(f"数据库: 用户{trader_wxid}给用户{target_wxid}转账{num}积分")
-                return True
-            logger.info(f"数据库: 转账失败, 用户{trader_wxid}积分不足")
-            session.rollback()
-            return False
+            # 扣减和余额检查放在同一条UPDATE中，不依赖SQLite不支持的行锁
+            result = session.execute(
+                update(User)
+                .where(User.wxid == trader_wxid, User.points >= num)
+                .values(points=User.points - num)
+            )
+            if result.rowcount == 0:
+                logger.info(f"数据库: 转账失败, 用户{trader_wxid}积分不足")
+                session.rollback()
+                return False
+
+            result = session.execute(
+                update(User)
+                .where(User.wxid == target_wxid)
+                .values(points=User.points + num)
+            )
+            if result.rowcount == 0:
+                session.add(User(wxid=target_wxid, points=num))
+            changed = self._current_points(session, [trader_wxid, target_wxid])
+            self._commit_points(session, changed)
+            logger.info(f"数据库: 用户{trader_wxid}给用户{target_wxid}转账{num}积分")
+            return True
         except SQLAlchemyError as e:
             session.rollback()
             logger.error(f"数据库: 转账失败, 错误: {e}")
@@ -438,3 +661,84 @@ class XYBotDB(metaclass=Singleton):
             self.executor.shutdown(wait=True)
         if hasattr(self, 'engine'):
             self.engine.dispose()
+
+
+class AsyncXYBotDB(metaclass=Singleton):
+    """XYBotDB 的异步接口
+
+    数据库操作在线程中执行，插件的异步处理函数中使用时不会阻塞事件循环。
+    读操作在线程池中通过连接池并发执行；写操作与同步接口共用 XYBotDB 的单个数据库线程，
+    按提交顺序依次执行。SQLite 不支持 SELECT ... FOR UPDATE，多个线程同时"先读后写"
+    会互相覆盖积分，或在同一用户首次签到时重复插入。
+    """
+
+    def __init__(self):
+        self.db = XYBotDB()
+        self.executor = ThreadPoolExecutor(max_workers=self.db.pool_size, thread_name_prefix="database-async")
+
+    async def _run(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    async def _write(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.db.executor, method, *args)
+
+    # USER
+
+    async def add_points(self, wxid: str, num: int) -> bool:
+        return await self._write(self.db._add_points, wxid, num)
+
+    async def set_points(self, wxid: str, num: int) -> bool:
+        return await self._write(self.db._set_points, wxid, num)
+
+    async def get_points(self, wxid: str) -> int:
+        return await self._run(self.db._get_points, wxid)
+
+    async def get_points_many(self, wxids: Iterable[str]) -> Dict[str, int]:
+        """批量获取用户积分"""
+        return await self._run(self.db._get_points_many, list(wxids))
+
+    async def add_points_many(self, changes: Dict[str, int]) -> bool:
+        """在一个事务中批量增加多个用户的积分"""
+        return await self._write(self.db._add_points_many, dict(changes))
+
+    async def signin(self, wxid: str, signin_time: datetime.datetime, points: int, streak_cycle: int,
+                     max_streak_point: int) -> dict:
+        """在一个事务中完成签到，返回值见 XYBotDB._signin"""
+        return await self._write(self.db._signin, wxid, signin_time, points, streak_cycle, max_streak_point)
+
+    async def get_signin_stat(self, wxid: str) -> datetime.datetime:
+        return await self._run(self.db._get_signin_stat, wxid)
+
+    async def set_signin_stat(self, wxid: str, signin_time: datetime.datetime) -> bool:
+        return await self._write(self.db._set_signin_stat, wxid, signin_time)
+
+    async def get_signin_streak(self, wxid: str) -> int:
+        return await self._run(self.db._get_signin_streak, wxid)
+
+    async def set_signin_streak(self, wxid: str, streak: int) -> bool:
+        return await self._write(self.db._set_signin_streak, wxid, streak)
+
+    async def reset_all_signin_stat(self) -> bool:
+        return await self._write(self.db.reset_all_signin_stat)
+
+    async def get_leaderboard(self, count: int) -> list:
+        return await self._run(self.db.get_leaderboard, count)
+
+    async def top_points_among(self, wxids: Iterable[str], limit: int) -> List[Tuple[str, int]]:
+        """在给定的用户集合中按积分排名"""
+        return await self._run(self.db._top_points_among, list(wxids), limit)
+
+    async def safe_trade_points(self, trader_wxid: str, target_wxid: str, num: int) -> bool:
+        return await self._write(self.db._safe_trade_points, trader_wxid, target_wxid, num)
+
+    async def get_whitelist(self, wxid: str) -> bool:
+        return await self._run(self.db.get_whitelist, wxid)
+
+    async def set_whitelist(self, wxid: str, stat: bool) -> bool:
+        return await self._write(self.db.set_whitelist, wxid, stat)
+
+    async def get_llm_thread_id(self, wxid: str, namespace: str = None) -> Union[dict, str]:
+        return await self._run(self.db.get_llm_thread_id, wxid, namespace)
+
+    async def save_llm_thread_id(self, wxid: str, data: str, namespace: str) -> bool:
+        return await self._write(self.db.save_llm_thread_id, wxid, data, namespace)
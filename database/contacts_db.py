@@ -1,7 +1,11 @@
 import os
 import json
 import time
+import asyncio
 import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from loguru import logger
 
@@ -37,6 +41,92 @@ def create_contacts_table():
     conn.close()
     logger.info("联系人数据表创建完成")
 
+def _row_to_contact(row):
+    """把contacts表的一行转换为联系人字典"""
+    contact = {
+        "wxid": row[0],
+        "nickname": row[1],
+        "remark": row[2],
+        "avatar": row[3],
+        "alias": row[4],
+        "type": row[5],
+        "region": row[6],
+        "last_updated": row[7]
+    }
+
+    # 解析额外数据
+    if row[8]:
+        try:
+            extra_data = json.loads(row[8])
+            contact.update(extra_data)
+        except:
+            pass
+
+    return contact
+
+def _contact_to_row(contact, current_time):
+    """把联系人字典转换为contacts表的一行"""
+    wxid = contact.get("wxid", "")
+
+    # 确定联系人类型
+    contact_type = contact.get("type", "")
+    if not contact_type:
+        if wxid.endswith("@chatroom"):
+            contact_type = "group"
+        elif wxid.startswith("gh_"):
+            contact_type = "official"
+        else:
+            contact_type = "friend"
+
+    # 将其他字段存储为JSON
+    extra_data = {}
+    for key, value in contact.items():
+        if key not in ["wxid", "nickname", "remark", "avatar", "alias", "type", "region"]:
+            extra_data[key] = value
+
+    return (
+        wxid,
+        contact.get("nickname", ""),
+        contact.get("remark", ""),
+        contact.get("avatar", ""),
+        contact.get("alias", ""),
+        contact_type,
+        contact.get("region", ""),
+        current_time,
+        json.dumps(extra_data, ensure_ascii=False)
+    )
+
+def _upsert_contact(cursor, contact):
+    """插入或更新单个联系人，返回是否为新增"""
+    row = _contact_to_row(contact, int(time.time()))
+
+    # 检查联系人是否存在
+    cursor.execute("SELECT wxid FROM contacts WHERE wxid = ?", (row[0],))
+    exists = cursor.fetchone()
+
+    if exists:
+        # 更新现有联系人
+        cursor.execute('''
+        UPDATE contacts SET
+            nickname = ?,
+            remark = ?,
+            avatar = ?,
+            alias = ?,
+            type = ?,
+            region = ?,
+            last_updated = ?,
+            extra_data = ?
+        WHERE wxid = ?
+        ''', row[1:] + row[:1])
+    else:
+        # 插入新联系人
+        cursor.execute('''
+        INSERT INTO contacts
+        (wxid, nickname, remark, avatar, alias, type, region, last_updated, extra_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', row)
+    return not exists
+
 def get_contacts_from_db(offset=None, limit=None):
     """从数据库获取联系人，支持分页
 
@@ -72,28 +162,7 @@ def get_contacts_from_db(offset=None, limit=None):
         cursor.execute(query, params)
         rows = cursor.fetchall()
 
-        contacts = []
-        for row in rows:
-            contact = {
-                "wxid": row[0],
-                "nickname": row[1],
-                "remark": row[2],
-                "avatar": row[3],
-                "alias": row[4],
-                "type": row[5],
-                "region": row[6],
-                "last_updated": row[7]
-            }
-
-            # 解析额外数据
-            if row[8]:
-                try:
-                    extra_data = json.loads(row[8])
-                    contact.update(extra_data)
-                except:
-                    pass
-
-            contacts.append(contact)
+        contacts = [_row_to_contact(row) for row in rows]
 
         conn.close()
 
@@ -118,56 +187,19 @@ def save_contacts_to_db(contacts):
         # 创建表（如果不存在）
         create_contacts_table()
 
-        # 准备批量插入
+        # 批量插入或更新联系人
         current_time = int(time.time())
-        for contact in contacts:
-            # 提取基本字段
-            wxid = contact.get("wxid", "")
-            nickname = contact.get("nickname", "")
-            remark = contact.get("remark", "")
-            avatar = contact.get("avatar", "")
-            alias = contact.get("alias", "")
-
-            # 确定联系人类型
-            contact_type = contact.get("type", "")
-            if not contact_type:
-                if wxid.endswith("@chatroom"):
-                    contact_type = "group"
-                elif wxid.startswith("gh_"):
-                    contact_type = "official"
-                else:
-                    contact_type = "friend"
-
-            # 其他字段
-            region = contact.get("region", "")
-
-            # 将其他字段存储为JSON
-            extra_data = {}
-            for key, value in contact.items():
-                if key not in ["wxid", "nickname", "remark", "avatar", "alias", "type", "region"]:
-                    extra_data[key] = value
-
-            extra_data_json = json.dumps(extra_data, ensure_ascii=False)
-
-            # 插入或更新联系人
-            cursor.execute('''
-            INSERT OR REPLACE INTO contacts
-            (wxid, nickname, remark, avatar, alias, type, region, last_updated, extra_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                wxid,
-                nickname,
-                remark,
-                avatar,
-                alias,
-                contact_type,
-                region,
-                current_time,
-                extra_data_json
-            ))
+        cursor.executemany('''
+        INSERT OR REPLACE INTO contacts
+        (wxid, nickname, remark, avatar, alias, type, region, last_updated, extra_data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [_contact_to_row(contact, current_time) for contact in contacts])
 
         conn.commit()
         conn.close()
+
+        for contact in contacts:
+            contact_cache.discard(contact.get("wxid", ""))
         logger.success(f"成功保存 {len(contacts)} 个联系人到数据库")
         return True
     except Exception as e:
@@ -184,96 +216,30 @@ def update_contact_in_db(contact):
         # 创建表（如果不存在）
         create_contacts_table()
 
-        # 提取基本字段
         wxid = contact.get("wxid", "")
         if not wxid:
             logger.error("更新联系人失败: 缺少wxid")
             return False
 
-        nickname = contact.get("nickname", "")
-        remark = contact.get("remark", "")
-        avatar = contact.get("avatar", "")
-        alias = contact.get("alias", "")
-
-        # 确定联系人类型
-        contact_type = contact.get("type", "")
-        if not contact_type:
-            if wxid.endswith("@chatroom"):
-                contact_type = "group"
-            elif wxid.startswith("gh_"):
-                contact_type = "official"
-            else:
-                contact_type = "friend"
-
-        # 其他字段
-        region = contact.get("region", "")
-        current_time = int(time.time())
-
-        # 将其他字段存储为JSON
-        extra_data = {}
-        for key, value in contact.items():
-            if key not in ["wxid", "nickname", "remark", "avatar", "alias", "type", "region"]:
-                extra_data[key] = value
-
-        extra_data_json = json.dumps(extra_data, ensure_ascii=False)
-
-        # 检查联系人是否存在
-        cursor.execute("SELECT wxid FROM contacts WHERE wxid = ?", (wxid,))
-        exists = cursor.fetchone()
-
-        if exists:
-            # 更新现有联系人
-            cursor.execute('''
-            UPDATE contacts SET
-                nickname = ?,
-                remark = ?,
-                avatar = ?,
-                alias = ?,
-                type = ?,
-                region = ?,
-                last_updated = ?,
-                extra_data = ?
-            WHERE wxid = ?
-            ''', (
-                nickname,
-                remark,
-                avatar,
-                alias,
-                contact_type,
-                region,
-                current_time,
-                extra_data_json,
-                wxid
-            ))
-            logger.debug(f"更新联系人: {wxid}")
-        else:
-            # 插入新联系人
-            cursor.execute('''
-            INSERT INTO contacts
-            (wxid, nickname, remark, avatar, alias, type, region, last_updated, extra_data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                wxid,
-                nickname,
-                remark,
-                avatar,
-                alias,
-                contact_type,
-                region,
-                current_time,
-                extra_data_json
-            ))
+        if _upsert_contact(cursor, contact):
             logger.debug(f"新增联系人: {wxid}")
+        else:
+            logger.debug(f"更新联系人: {wxid}")
 
         conn.commit()
         conn.close()
+        contact_cache.discard(wxid)
         return True
     except Exception as e:
         logger.error(f"更新联系人 {contact.get('wxid', 'unknown')} 失败: {str(e)}")
         return False
 
 def get_contact_from_db(wxid):
-    """从数据库获取单个联系人信息"""
+    """从数据库获取单个联系人信息，优先读取内存缓存"""
+    found, contact = contact_cache.lookup(wxid)
+    if found:
+        return contact
+
     ensure_db_dir()
     try:
         conn = sqlite3.connect(DB_PATH)
@@ -282,33 +248,11 @@ def get_contact_from_db(wxid):
         # 查询联系人
         cursor.execute("SELECT * FROM contacts WHERE wxid = ?", (wxid,))
         row = cursor.fetchone()
+        conn.close()
 
-        if row:
-            # 解析联系人数据
-            contact = {
-                "wxid": row[0],
-                "nickname": row[1],
-                "remark": row[2],
-                "avatar": row[3],
-                "alias": row[4],
-                "type": row[5],
-                "region": row[6],
-                "last_updated": row[7]
-            }
-
-            # 解析额外数据
-            if row[8]:
-                try:
-                    extra_data = json.loads(row[8])
-                    contact.update(extra_data)
-                except:
-                    pass
-
-            conn.close()
-            return contact
-        else:
-            conn.close()
-            return None
+        contact = _row_to_contact(row) if row else None
+        contact_cache.put(wxid, contact)
+        return contact
     except Exception as e:
         logger.error(f"从数据库获取联系人 {wxid} 失败: {str(e)}")
         return None
@@ -325,6 +269,7 @@ def delete_contact_from_db(wxid):
 
         conn.commit()
         conn.close()
+        contact_cache.discard(wxid)
         logger.info(f"从数据库删除联系人: {wxid}")
         return True
     except Exception as e:
@@ -363,12 +308,178 @@ def init_db():
     logger.info("联系人数据库初始化完成")
 
 # 内存缓存
-_contacts_cache = {}
+class ContactCache:
+    """联系人内存缓存
+
+    - LRU + TTL，启动时从数据库批量加载
+    - 数据库中不存在的联系人也会缓存一段较短的时间（负缓存），避免反复查询
+    - 同一wxid并发的联系人详情API请求只发出一次，其余请求等待同一结果
+    - 消息处理中的读写都在一个专用线程上通过一个持久连接执行，不阻塞事件循环
+    """
+
+    def __init__(self, max_size=10000, ttl=3600, negative_ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # wxid -> (联系人或None, 过期时间)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._executor = None
+        self._conn = None
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "api_calls": 0, "coalesced": 0}
+
+    def configure(self, max_size=None, ttl=None, negative_ttl=None):
+        """设置缓存容量和过期时间"""
+        if max_size:
+            self.max_size = int(max_size)
+        if ttl:
+            self.ttl = ttl
+        if negative_ttl:
+            self.negative_ttl = negative_ttl
+
+    def lookup(self, wxid):
+        """查询缓存，返回 (是否命中, 联系人)，命中负缓存时联系人为None"""
+        with self._lock:
+            entry = self._entries.get(wxid)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[wxid]
+                self.stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(wxid)
+            if entry[0] is None:
+                self.stats["negative_hits"] += 1
+            else:
+                self.stats["hits"] += 1
+            return True, entry[0]
+
+    def is_known(self, wxid):
+        """联系人是否已缓存且有昵称，用于跳过不必要的联系人更新"""
+        with self._lock:
+            entry = self._entries.get(wxid)
+            return entry is not None and entry[0] is not None and bool(entry[0].get("nickname")) \
+                and entry[1] >= time.monotonic()
+
+    def put(self, wxid, contact):
+        """写入缓存，contact为None表示数据库中不存在该联系人"""
+        if not wxid:
+            return
+        ttl = self.ttl if contact is not None else self.negative_ttl
+        with self._lock:
+            self._entries[wxid] = (contact, time.monotonic() + ttl)
+            self._entries.move_to_end(wxid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, wxid):
+        with self._lock:
+            self._entries.pop(wxid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        # 切换账号后数据库文件会被替换，持久连接需要重新打开
+        if self._executor is not None:
+            self._executor.submit(self._close_connection)
+
+    def load_all(self):
+        """从数据库批量加载联系人"""
+        contacts = get_contacts_from_db(limit=self.max_size)
+        for contact in contacts:
+            self.put(contact.get("wxid"), contact)
+        logger.info(f"联系人缓存已加载 {len(contacts)} 个联系人")
+        return len(contacts)
+
+    # ---------- 专用数据库线程 ----------
+
+    def _connection(self):
+        if self._conn is None:
+            ensure_db_dir()
+            self._conn = sqlite3.connect(DB_PATH)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _read(self, wxid):
+        cursor = self._connection().execute("SELECT * FROM contacts WHERE wxid = ?", (wxid,))
+        row = cursor.fetchone()
+        return _row_to_contact(row) if row else None
+
+    def _write(self, contact):
+        try:
+            conn = self._connection()
+            _upsert_contact(conn.cursor(), contact)
+            conn.commit()
+        except Exception as e:
+            logger.error(f"更新联系人 {contact.get('wxid', 'unknown')} 失败: {str(e)}")
+
+    def _submit(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="contacts-db")
+        return self._executor.submit(func, *args)
+
+    async def get_contact(self, wxid):
+        """获取联系人，缓存未命中时在数据库线程中查询并写入缓存"""
+        found, contact = self.lookup(wxid)
+        if found:
+            return contact
+        try:
+            contact = await asyncio.wrap_future(self._submit(self._read, wxid))
+        except Exception as e:
+            logger.error(f"从数据库获取联系人 {wxid} 失败: {str(e)}")
+            return None
+        self.put(wxid, contact)
+        return contact
+
+    def update_contact(self, contact):
+        """更新缓存并在数据库线程中写入，不等待写入完成"""
+        wxid = contact.get("wxid", "")
+        if not wxid:
+            logger.error("更新联系人失败: 缺少wxid")
+            return
+        self.put(wxid, contact)
+        self._submit(self._write, dict(contact))
+
+    async def fetch_once(self, wxid, fetch, *args):
+        """同一wxid并发调用时只执行一次fetch(*args)，其余调用等待同一结果"""
+        future = self._inflight.get(wxid)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[wxid] = future
+        self.stats["api_calls"] += 1
+        try:
+            result = await fetch(*args)
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "Future exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(wxid, None)
+            # 发起请求的任务被取消时，让等待同一结果的调用一起结束，而不是一直挂起
+            if not future.done():
+                future.cancel()
+
+    def get_stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {**self.stats, "size": size, "max_size": self.max_size}
+
+contact_cache = ContactCache()
 
 def clear_contacts_cache():
     """清除联系人缓存"""
-    global _contacts_cache
-    _contacts_cache = {}
+    contact_cache.clear()
     logger.info("联系人缓存已清除")
 
 # 当模块被导入时自动初始化数据库
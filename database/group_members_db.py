@@ -1,7 +1,9 @@
 import os
 import json
 import time
+import asyncio
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from loguru import logger
 
@@ -125,6 +127,7 @@ def save_group_members_to_db(group_wxid, members):
 
         conn.commit()
         conn.close()
+        group_member_cache.discard(group_wxid)
         logger.success(f"成功保存群 {group_wxid} 的 {len(members)} 个成员到数据库")
         return True
     except Exception as e:
@@ -317,6 +320,7 @@ def update_group_member_in_db(group_wxid, member):
 
         conn.commit()
         conn.close()
+        group_member_cache.discard(group_wxid)
         logger.info(f"成功更新群 {group_wxid} 的成员 {member_wxid}")
         return True
     except Exception as e:
@@ -346,6 +350,7 @@ def delete_group_member_from_db(group_wxid, member_wxid):
 
         conn.commit()
         conn.close()
+        group_member_cache.discard(group_wxid)
         logger.info(f"从数据库删除群 {group_wxid} 的成员 {member_wxid}")
         return True
     except Exception as e:
@@ -371,6 +376,7 @@ def delete_all_group_members(group_wxid):
 
         conn.commit()
         conn.close()
+        group_member_cache.discard(group_wxid)
         logger.info(f"从数据库删除群 {group_wxid} 的所有成员")
         return True
     except Exception as e:
@@ -413,5 +419,274 @@ def init_db():
     create_group_members_table()
     logger.info("群成员数据库初始化完成")
 
+def _normalize_member(member):
+    """统一API返回、系统消息解析和数据库中的群成员字段"""
+    normalized = dict(member)
+    normalized["wxid"] = member.get("wxid") or member.get("Wxid") or member.get("UserName") or ""
+    normalized["nickname"] = member.get("NickName") or member.get("nickname") or ""
+    normalized["display_name"] = member.get("DisplayName") or member.get("display_name") or ""
+    normalized["avatar"] = (member.get("BigHeadImgUrl") or member.get("SmallHeadImgUrl")
+                            or member.get("avatar") or member.get("HeadImgUrl") or "")
+    return normalized
+
+def _member_to_row(group_wxid, member, current_time):
+    """把群成员转换为group_members表的一行"""
+    extra_data = {}
+    for key, value in member.items():
+        if key not in ["wxid", "Wxid", "UserName", "NickName", "nickname", "DisplayName", "display_name",
+                      "BigHeadImgUrl", "SmallHeadImgUrl", "avatar", "HeadImgUrl", "InviterUserName"]:
+            extra_data[key] = value
+
+    return (
+        group_wxid,
+        member["wxid"],
+        member["nickname"] or None,
+        member["display_name"] or None,
+        member["avatar"] or None,
+        member.get("InviterUserName") or "",
+        current_time,
+        json.dumps(extra_data, ensure_ascii=False)
+    )
+
+class GroupMemberCache:
+    """群成员内存缓存
+
+    - 按群缓存成员列表，首次使用时从数据库加载，数据库中没有再调用API
+    - 入群、移出群聊的系统消息直接增量更新缓存和数据库；群未缓存时只标记为过期，下次使用时从API全量获取
+    - 定时在后台对已缓存的群做全量刷新
+    - 机器人自己在每个群的显示名预先计算好，处理@消息时无需再请求成员列表
+    """
+
+    def __init__(self, refresh_interval=3600):
+        self.refresh_interval = refresh_interval
+        self.bot_wxid = ""
+        self._groups = {}  # group_wxid -> {"members": {wxid: 成员}, "bot_display_name": str, "loaded_at": float}
+        self._inflight = {}
+        self._stale = set()  # 未缓存时收到过入群/退群消息的群，数据库中的成员列表已不完整
+        self._executor = None
+        self._conn = None
+        self.stats = {"hits": 0, "db_loads": 0, "api_loads": 0, "joins": 0, "leaves": 0}
+
+    def set_bot_wxid(self, wxid):
+        """设置机器人wxid，并重新计算已缓存群中机器人的显示名"""
+        self.bot_wxid = wxid or ""
+        for entry in self._groups.values():
+            entry["bot_display_name"] = self._bot_display_name(entry["members"])
+
+    def _bot_display_name(self, members):
+        member = members.get(self.bot_wxid)
+        if not member:
+            return ""
+        return member.get("display_name") or member.get("nickname") or ""
+
+    def _set_group(self, group_wxid, members):
+        members = {m["wxid"]: m for m in map(_normalize_member, members) if m["wxid"]}
+        self._groups[group_wxid] = {
+            "members": members,
+            "bot_display_name": self._bot_display_name(members),
+            "loaded_at": time.monotonic(),
+        }
+        return self._groups[group_wxid]
+
+    def discard(self, group_wxid):
+        self._groups.pop(group_wxid, None)
+
+    def clear(self):
+        self._groups.clear()
+        if self._executor is not None:
+            self._executor.submit(self._close_connection)
+
+    # ---------- 专用数据库线程 ----------
+
+    def _connection(self):
+        if self._conn is None:
+            ensure_db_dir()
+            self._conn = sqlite3.connect(DB_PATH)
+        return self._conn
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _submit(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="group-members-db")
+        return self._executor.submit(func, *args)
+
+    def _read_group(self, group_wxid):
+        cursor = self._connection().execute('''
+        SELECT member_wxid, nickname, display_name, avatar, inviter_wxid, join_time, last_updated, extra_data
+        FROM group_members
+        WHERE group_wxid = ?
+        ''', (group_wxid,))
+        members = []
+        for row in cursor.fetchall():
+            member = {}
+            if row[7]:
+                try:
+                    member.update(json.loads(row[7]))
+                except:
+                    pass
+            member.update({
+                "wxid": row[0],
+                "nickname": row[1] or "",
+                "display_name": row[2] or "",
+                "avatar": row[3] or "",
+                "inviter_wxid": row[4] or "",
+                "join_time": row[5] or 0,
+                "last_updated": row[6] or 0
+            })
+            members.append(member)
+        return members
+
+    def _replace_group(self, group_wxid, members):
+        try:
+            conn = self._connection()
+            current_time = int(time.time())
+            with conn:
+                conn.execute("DELETE FROM group_members WHERE group_wxid = ?", (group_wxid,))
+                conn.executemany('''
+                INSERT OR REPLACE INTO group_members
+                (group_wxid, member_wxid, nickname, display_name, avatar, inviter_wxid, last_updated, extra_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [_member_to_row(group_wxid, m, current_time) for m in members])
+        except Exception as e:
+            logger.error(f"保存群 {group_wxid} 的成员到数据库失败: {str(e)}")
+
+    def _upsert_members(self, group_wxid, members):
+        try:
+            conn = self._connection()
+            current_time = int(time.time())
+            with conn:
+                conn.executemany('''
+                INSERT OR REPLACE INTO group_members
+                (group_wxid, member_wxid, nickname, display_name, avatar, inviter_wxid, join_time, last_updated, extra_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [row[:6] + (current_time,) + row[6:]
+                      for row in (_member_to_row(group_wxid, m, current_time) for m in members)])
+        except Exception as e:
+            logger.error(f"更新群 {group_wxid} 的成员失败: {str(e)}")
+
+    def _delete_members(self, group_wxid, member_wxids):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany("DELETE FROM group_members WHERE group_wxid = ? AND member_wxid = ?",
+                                 [(group_wxid, wxid) for wxid in member_wxids])
+        except Exception as e:
+            logger.error(f"删除群 {group_wxid} 的成员失败: {str(e)}")
+
+    # ---------- 读取与刷新 ----------
+
+    async def _load(self, group_wxid, fetch):
+        entry = self._groups.get(group_wxid)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry
+
+        if group_wxid not in self._stale:
+            members = await asyncio.wrap_future(self._submit(self._read_group, group_wxid))
+            # 读取数据库期间可能收到了入群/退群消息
+            if members and group_wxid not in self._stale:
+                self.stats["db_loads"] += 1
+                return self._set_group(group_wxid, members)
+
+        await self.refresh(group_wxid, fetch)
+        return self._groups.get(group_wxid)
+
+    async def get_members(self, group_wxid, fetch):
+        """获取群成员列表
+
+        Args:
+            group_wxid: 群聊的wxid
+            fetch: 从API获取群成员列表的协程函数，参数为群wxid
+        """
+        entry = await self._load(group_wxid, fetch)
+        return list(entry["members"].values()) if entry else []
+
+    async def get_bot_display_name(self, group_wxid, fetch):
+        """获取机器人在群里的显示名（群昵称，没有时为微信昵称）"""
+        entry = await self._load(group_wxid, fetch)
+        return entry["bot_display_name"] if entry else ""
+
+    async def refresh(self, group_wxid, fetch):
+        """从API全量刷新一个群的成员，并发调用时只请求一次"""
+        future = self._inflight.get(group_wxid)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[group_wxid] = future
+        try:
+            members = await fetch(group_wxid)
+            if members:
+                self.stats["api_loads"] += 1
+                entry = self._set_group(group_wxid, members)
+                self._stale.discard(group_wxid)
+                self._submit(self._replace_group, group_wxid, list(entry["members"].values()))
+            future.set_result(bool(members))
+            return bool(members)
+        except Exception as e:
+            logger.error(f"刷新群 {group_wxid} 的成员列表失败: {str(e)}")
+            future.set_result(False)
+            return False
+        finally:
+            # 发起请求的任务被取消时，等待同一结果的调用按刷新失败处理，而不是一直挂起
+            if not future.done():
+                future.set_result(False)
+            self._inflight.pop(group_wxid, None)
+
+    async def refresh_all(self, fetch):
+        """全量刷新所有超过刷新间隔的已缓存群，逐个刷新避免突发大量请求"""
+        now = time.monotonic()
+        stale = [group_wxid for group_wxid, entry in self._groups.items()
+                 if now - entry["loaded_at"] >= self.refresh_interval]
+        refreshed = 0
+        for group_wxid in stale:
+            if await self.refresh(group_wxid, fetch):
+                refreshed += 1
+            await asyncio.sleep(1)
+        if stale:
+            logger.info(f"群成员缓存后台刷新完成: {refreshed}/{len(stale)} 个群")
+
+    def apply_join(self, group_wxid, members):
+        """根据入群系统消息增量添加成员"""
+        members = [m for m in map(_normalize_member, members) if m["wxid"]]
+        if not members:
+            return
+        self.stats["joins"] += len(members)
+        entry = self._groups.get(group_wxid)
+        if entry is None:
+            # 没有完整的成员列表，只写入新成员会让数据库中的列表被当作完整列表
+            self._stale.add(group_wxid)
+            return
+        for member in members:
+            entry["members"][member["wxid"]] = member
+        entry["bot_display_name"] = self._bot_display_name(entry["members"])
+        self._submit(self._upsert_members, group_wxid, members)
+
+    def apply_leave(self, group_wxid, member_wxids):
+        """根据移出群聊系统消息增量删除成员"""
+        member_wxids = [wxid for wxid in member_wxids if wxid]
+        if not member_wxids:
+            return
+        self.stats["leaves"] += len(member_wxids)
+        entry = self._groups.get(group_wxid)
+        if entry is None:
+            self._stale.add(group_wxid)
+            return
+        for wxid in member_wxids:
+            entry["members"].pop(wxid, None)
+        entry["bot_display_name"] = self._bot_display_name(entry["members"])
+        self._submit(self._delete_members, group_wxid, member_wxids)
+
+    def get_stats(self):
+        return {**self.stats, "groups": len(self._groups),
+                "members": sum(len(entry["members"]) for entry in self._groups.values()),
+                "stale_groups": len(self._stale)}
+
+group_member_cache = GroupMemberCache()
+
 # 当模块被导入时自动初始化数据库
 init_db()
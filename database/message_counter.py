@@ -5,19 +5,28 @@
 
 import os
 import json
+import atexit
 import sqlite3
+import threading
 import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 from loguru import logger
 
 class MessageCounter:
-    """消息计数器类，用于统计消息数量"""
+    """消息计数器类，用于统计消息数量
 
-    def __init__(self, db_path=None):
+    计数先累加到内存中按 (日期, 小时) 划分的桶里，由后台线程每隔 flush_interval 秒
+    在一个事务中写入数据库，退出时也会写入一次。查询时把尚未写入的增量合并到结果中，
+    统计数据始终是准确的。
+    """
+
+    def __init__(self, db_path=None, flush_interval=5.0):
         """初始化消息计数器
 
         参数:
             db_path: 数据库路径，如果为None则使用默认路径
+            flush_interval: 内存中的计数写入数据库的间隔（秒）
         """
         try:
             # 如果未指定数据库路径，使用默认路径
@@ -28,13 +37,22 @@ class MessageCounter:
                 db_path = os.path.join(current_dir, "message_stats.db")
 
             self.db_path = db_path
+            self.flush_interval = flush_interval
+
+            # 尚未写入数据库的计数 {(date, hour): count}，由 _pending_lock 保护
+            self._pending = defaultdict(int)
+            self._pending_lock = threading.Lock()
+            # 数据库连接在多个线程间共用，所有读写都在 _db_lock 内进行。
+            # 需要同时持有两个锁时，先取 _db_lock 再取 _pending_lock
+            self._db_lock = threading.Lock()
 
             # 创建数据库连接，启用多线程支持
             self.conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.cursor = self.conn.cursor()
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
 
             # 创建消息统计表（如果不存在）
-            self.cursor.execute('''
+            self.conn.execute('''
                 CREATE TABLE IF NOT EXISTS message_stats (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     date TEXT NOT NULL,
@@ -45,7 +63,7 @@ class MessageCounter:
             ''')
 
             # 创建每日统计表（如果不存在）
-            self.cursor.execute('''
+            self.conn.execute('''
                 CREATE TABLE IF NOT EXISTS daily_stats (
                     date TEXT PRIMARY KEY,
                     count INTEGER NOT NULL DEFAULT 0
@@ -53,6 +71,13 @@ class MessageCounter:
             ''')
 
             self.conn.commit()
+
+            # 后台定时写入线程
+            self._stop_event = threading.Event()
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="message-counter-flush", daemon=True)
+            self._flush_thread.start()
+            atexit.register(self.close)
+
             logger.success("消息计数器初始化成功")
         except Exception as e:
             logger.error(f"初始化消息计数器失败: {str(e)}")
@@ -67,7 +92,7 @@ class MessageCounter:
             logger.error(f"关闭消息计数器数据库连接失败: {str(e)}")
 
     def increment(self, count=1, date=None, hour=None):
-        """增加消息计数
+        """增加消息计数，只累加到内存中，由后台线程定时写入数据库
 
         参数:
             count: 增加的数量，默认为1
@@ -77,34 +102,128 @@ class MessageCounter:
         返回:
             bool: 是否成功
         """
-        try:
-            # 如果未指定日期和小时，使用当前时间
-            if date is None or hour is None:
-                now = datetime.now()
-                date = now.strftime("%Y-%m-%d")
-                hour = now.hour
-
-            # 更新小时统计
-            self.cursor.execute('''
-                INSERT INTO message_stats (date, hour, count)
-                VALUES (?, ?, ?)
-                ON CONFLICT(date, hour) DO UPDATE SET
-                count = count + ?
-            ''', (date, hour, count, count))
-
-            # 更新日统计
-            self.cursor.execute('''
-                INSERT INTO daily_stats (date, count)
-                VALUES (?, ?)
-                ON CONFLICT(date) DO UPDATE SET
-                count = count + ?
-            ''', (date, count, count))
+        # 如果未指定日期和小时，使用当前时间
+        if date is None or hour is None:
+            now = datetime.now()
+            date = now.strftime("%Y-%m-%d")
+            hour = now.hour
 
-            self.conn.commit()
-            return True
+        with self._pending_lock:
+            self._pending[(date, int(hour))] += count
+        return True
+
+    def flush(self):
+        """把内存中的计数在一个事务中写入数据库
+
+        取出内存计数和写入数据库都在 _db_lock 内完成，查询时不会看到计数
+        已从内存移出但还没有提交的中间状态。
+
+        返回:
+            int: 写入的消息数量
+        """
+        with self._db_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, defaultdict(int)
+            return self._write(pending)
+
+    def _write(self, pending):
+        """写入一批计数，调用方需持有 _db_lock"""
+        daily = defaultdict(int)
+        for (date, hour), count in pending.items():
+            daily[date] += count
+
+        try:
+            with self.conn:
+                # 更新小时统计
+                self.conn.executemany('''
+                    INSERT INTO message_stats (date, hour, count)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(date, hour) DO UPDATE SET
+                    count = count + excluded.count
+                ''', [(date, hour, count) for (date, hour), count in pending.items()])
+
+                # 更新日统计
+                self.conn.executemany('''
+                    INSERT INTO daily_stats (date, count)
+                    VALUES (?, ?)
+                    ON CONFLICT(date) DO UPDATE SET
+                    count = count + excluded.count
+                ''', list(daily.items()))
         except Exception as e:
-            logger.error(f"增加消息计数失败: {str(e)}")
-            return False
+            logger.error(f"写入消息计数失败，将在下次重试: {str(e)}")
+            # 放回内存，下次一起写入
+            with self._pending_lock:
+                for key, count in pending.items():
+                    self._pending[key] += count
+            return 0
+        return sum(daily.values())
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """停止后台写入线程并写入剩余的计数"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        self.flush()
+
+    @staticmethod
+    def _pending_daily(pending):
+        """把尚未写入数据库的计数按日期汇总"""
+        daily = defaultdict(int)
+        for (date, hour), count in pending:
+            daily[date] += count
+        return daily
+
+    def _query(self, sql, params=()):
+        """查询数据库，同时取得尚未写入的计数
+
+        两者在 _db_lock 内一起读取，与 flush 互斥，计数不会被漏算或重复计算。
+
+        返回:
+            tuple: (查询结果, 尚未写入的计数 [((date, hour), count), ...])
+        """
+        with self._db_lock:
+            rows = self.conn.execute(sql, params).fetchall()
+            with self._pending_lock:
+                pending = list(self._pending.items())
+        return rows, pending
+
+    def hourly_stats(self, date):
+        """获取某一天每小时的消息数量，包含尚未写入数据库的计数
+
+        返回:
+            dict: 键为小时(0-23)，值为消息数量
+        """
+        rows, pending = self._query("SELECT hour, count FROM message_stats WHERE date = ? ORDER BY hour", (date,))
+        hourly = dict(rows)
+        for (pending_date, hour), count in pending:
+            if pending_date == date:
+                hourly[hour] = hourly.get(hour, 0) + count
+        return dict(sorted(hourly.items()))
+
+    def daily_stats(self, start_date, end_date):
+        """获取日期范围内每天的消息数量，包含尚未写入数据库的计数
+
+        参数:
+            start_date: 开始日期字符串，格式为YYYY-MM-DD
+            end_date: 结束日期字符串，格式为YYYY-MM-DD
+
+        返回:
+            dict: 键为日期(YYYY-MM-DD)，值为消息数量
+        """
+        rows, pending = self._query(
+            "SELECT date, count FROM daily_stats WHERE date >= ? AND date <= ? ORDER BY date",
+            (start_date, end_date))
+        daily = dict(rows)
+        for date, count in self._pending_daily(pending).items():
+            if start_date <= date <= end_date:
+                daily[date] = daily.get(date, 0) + count
+        return dict(sorted(daily.items()))
 
     def get_stats(self):
         """获取消息统计数据
@@ -118,18 +237,14 @@ class MessageCounter:
             yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
 
             # 获取总消息数
-            self.cursor.execute("SELECT SUM(count) FROM daily_stats")
-            total_messages = self.cursor.fetchone()[0] or 0
+            rows, pending = self._query("SELECT SUM(count) FROM daily_stats")
+            total_messages = (rows[0][0] or 0) + sum(count for _, count in pending)
 
-            # 获取今日消息数
-            self.cursor.execute("SELECT count FROM daily_stats WHERE date = ?", (today,))
-            result = self.cursor.fetchone()
-            today_messages = result[0] if result else 0
-
-            # 获取昨日消息数
-            self.cursor.execute("SELECT count FROM daily_stats WHERE date = ?", (yesterday,))
-            result = self.cursor.fetchone()
-            yesterday_messages = result[0] if result else 0
+            # 获取过去7天的每日消息数，今日、昨日消息数也从中取得
+            seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+            recent = self.daily_stats(seven_days_ago, today)
+            today_messages = recent.get(today, 0)
+            yesterday_messages = recent.get(yesterday, 0)
 
             # 计算增长率
             growth_rate = 0
@@ -139,14 +254,8 @@ class MessageCounter:
                 # 如果昨天没有消息，今天有消息，增长率为100%
                 growth_rate = 100
 
-            # 获取过去7天的平均每日消息数
-            seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-            self.cursor.execute(
-                "SELECT AVG(count) FROM daily_stats WHERE date >= ? AND date <= ?",
-                (seven_days_ago, today)
-            )
-            result = self.cursor.fetchone()
-            avg_daily = result[0] if result and result[0] else 0
+            # 过去7天的平均每日消息数（只计算有记录的日期）
+            avg_daily = sum(recent.values()) / len(recent) if recent else 0
 
             return {
                 'total_messages': total_messages,
@@ -180,16 +289,12 @@ class MessageCounter:
             start_date_str = start_date.strftime("%Y-%m-%d")
             end_date_str = end_date.strftime("%Y-%m-%d")
 
-            # 查询数据库
-            self.cursor.execute(
-                "SELECT date, count FROM daily_stats WHERE date >= ? AND date <= ? ORDER BY date",
-                (start_date_str, end_date_str)
-            )
-            results = self.cursor.fetchall()
+            # 查询数据库，包含尚未写入的计数
+            results = self.daily_stats(start_date_str, end_date_str)
 
             # 构建结果列表
             stats = []
-            for date_str, count in results:
+            for date_str, count in results.items():
                 stats.append({
                     "date": date_str,
                     "count": count
@@ -220,14 +325,22 @@ class MessageCounter:
 
 # 单例模式，确保只有一个消息计数器实例
 _instance = None
+_instance_lock = threading.Lock()
 
 def get_instance():
     """获取消息计数器实例"""
     global _instance
     if _instance is None:
-        _instance = MessageCounter()
+        with _instance_lock:
+            if _instance is None:
+                _instance = MessageCounter()
     return _instance
 
+def shutdown():
+    """写入尚未保存的计数，程序退出前调用"""
+    if _instance is not None:
+        _instance.close()
+
 def get_hourly_stats():
     """获取今天每小时的消息统计数据
 
@@ -238,17 +351,8 @@ def get_hourly_stats():
         counter = get_instance()
         today = datetime.now().strftime("%Y-%m-%d")
 
-        # 查询今天每小时的消息数量
-        counter.cursor.execute(
-            "SELECT hour, count FROM message_stats WHERE date = ? ORDER BY hour",
-            (today,)
-        )
-        results = counter.cursor.fetchall()
-
-        # 构建结果字典
-        hourly_stats = {}
-        for hour, count in results:
-            hourly_stats[str(hour)] = count
+        # 查询今天每小时的消息数量，键转为字符串
+        hourly_stats = {str(hour): count for hour, count in counter.hourly_stats(today).items()}
 
         return hourly_stats
     except Exception as e:
@@ -273,16 +377,7 @@ def get_daily_stats(days=7):
         end_date_str = end_date.strftime("%Y-%m-%d")
 
         # 查询指定日期范围内的每日消息数量
-        counter.cursor.execute(
-            "SELECT date, count FROM daily_stats WHERE date >= ? AND date <= ? ORDER BY date",
-            (start_date_str, end_date_str)
-        )
-        results = counter.cursor.fetchall()
-
-        # 构建结果字典
-        daily_stats = {}
-        for date_str, count in results:
-            daily_stats[date_str] = count
+        daily_stats = counter.daily_stats(start_date_str, end_date_str)
 
         return daily_stats
     except Exception as e:
@@ -4,8 +4,7 @@ import tomllib
 from datetime import datetime, timedelta
 from typing import Optional, List
 
-from pydantic import validate_arguments
-from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, delete
+from sqlalchemy import Column, String, Integer, DateTime, Text, Boolean, delete, event, insert
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_scoped_session
 from sqlalchemy.orm import declarative_base, sessionmaker
@@ -29,7 +28,23 @@ class Message(DeclarativeBase):
     is_group = Column(Boolean, default=False, comment='是否群消息')
 
 
+def _enable_sqlite_wal(engine):
+    """SQLite 使用 WAL 模式，读写互不阻塞，并降低每次提交的 fsync 开销"""
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+
 class MessageDB(metaclass=Singleton):
+    """消息数据库
+
+    save_message 只把消息放入内存缓冲区，由后台任务每隔 flush-interval 毫秒
+    或缓冲区达到 batch-size 条时，在一个事务中批量写入，消息处理不再等待磁盘提交。
+    """
     _instance = None
 
     def __new__(cls):
@@ -44,6 +59,19 @@ class MessageDB(metaclass=Singleton):
                 echo=False,
                 future=True
             )
+            if db_url.startswith("sqlite"):
+                _enable_sqlite_wal(cls._instance.engine)
+
+            # 写缓冲配置
+            cls._instance.flush_interval = main_config["XYBot"].get("msgDB-flush-interval", 500) / 1000
+            cls._instance.batch_size = main_config["XYBot"].get("msgDB-batch-size", 200)
+            cls._instance.max_buffer = max(main_config["XYBot"].get("msgDB-max-buffer", 10000),
+                                           cls._instance.batch_size)
+            cls._instance._buffer = []
+            cls._instance._closing = False
+            cls._instance._flush_event = asyncio.Event()
+            cls._instance._flush_lock = asyncio.Lock()
+            cls._instance._flush_task = None
             cls._async_session_factory = async_scoped_session(
                 sessionmaker(
                     cls._instance.engine,
@@ -59,7 +87,10 @@ class MessageDB(metaclass=Singleton):
         async with self.engine.begin() as conn:
             await conn.run_sync(DeclarativeBase.metadata.create_all)
 
-    @validate_arguments(config=dict(arbitrary_types_allowed=True))
+        self._closing = False
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
     async def save_message(self,
                            msg_id: int,
                            sender_wxid: str = "",
@@ -67,31 +98,74 @@ class MessageDB(metaclass=Singleton):
                            msg_type: int = 0,
                            content: str = "",
                            is_group: bool = False) -> bool:
-        """异步保存消息到数据库"""
+        """保存消息到数据库，消息先进入写缓冲区，由后台任务批量写入"""
         # 确保content是字符串类型
         if isinstance(content, dict) and "string" in content:
             content = content["string"]
         elif not isinstance(content, str):
             content = str(content)
-            
-        async with self._async_session_factory() as session:
+
+        if len(self._buffer) >= self.max_buffer:
+            # 缓冲区已满（数据库持续写入失败或写入跟不上），先等待一次写入
+            await self.flush()
+            if len(self._buffer) >= self.max_buffer:
+                dropped = len(self._buffer) - self.max_buffer + 1
+                del self._buffer[:dropped]
+                logging.error(f"消息写缓冲区已满，丢弃最早的 {dropped} 条消息")
+
+        try:
+            self._buffer.append({
+                "msg_id": int(msg_id),
+                "sender_wxid": str(sender_wxid),
+                "from_wxid": str(from_wxid),
+                "msg_type": int(msg_type),
+                "content": content,
+                "is_group": bool(is_group),
+                "timestamp": datetime.now(),
+            })
+        except (TypeError, ValueError) as e:
+            logging.error(f"保存消息失败: {str(e)}")
+            return False
+
+        if len(self._buffer) >= self.batch_size:
+            self._flush_event.set()
+        return True
+
+    async def flush(self) -> int:
+        """把缓冲区中的消息在一个事务中批量写入，返回写入条数
+
+        写入失败或被取消时，这批消息放回缓冲区最前面，等待下一次写入。
+        """
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
             try:
-                message = Message(
-                    msg_id=msg_id,
-                    sender_wxid=sender_wxid,
-                    from_wxid=from_wxid,
-                    msg_type=msg_type,
-                    content=content,
-                    is_group=is_group,
-                    timestamp=datetime.now()
-                )
-                session.add(message)
-                await session.commit()
-                return True
+                async with self._async_session_factory() as session:
+                    try:
+                        await session.execute(insert(Message), rows)
+                        await session.commit()
+                    except BaseException:
+                        await session.rollback()
+                        raise
             except Exception as e:
-                logging.error(f"保存消息失败: {str(e)}")
-                await session.rollback()
-                return False
+                self._buffer[:0] = rows
+                logging.error(f"批量保存消息失败: {str(e)}，共 {len(rows)} 条，等待重试")
+                return 0
+            except BaseException:
+                self._buffer[:0] = rows
+                raise
+            return len(rows)
+
+    async def _flush_loop(self):
+        """按时间间隔或缓冲区大小触发批量写入，close() 时写完当前批次后退出"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
 
     async def get_messages(self,
                            start_time: Optional[datetime] = None,
@@ -102,6 +176,8 @@ class MessageDB(metaclass=Singleton):
                            is_group: Optional[bool] = None,
                            limit: int = 100) -> List[Message]:
         """异步查询消息记录"""
+        # 先写入缓冲区中的消息，保证能查到刚保存的消息
+        await self.flush()
         async with self._async_session_factory() as session:
             try:
                 query = select(Message).order_by(Message.timestamp.desc()).limit(limit)
@@ -126,7 +202,14 @@ class MessageDB(metaclass=Singleton):
                 return []
 
     async def close(self):
-        """关闭数据库连接"""
+        """写入缓冲区中剩余的消息并关闭数据库连接"""
+        if self._flush_task is not None:
+            # 不取消后台任务，等待正在进行的写入完成，避免这批消息丢失
+            self._closing = True
+            self._flush_event.set()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
         await self.engine.dispose()
 
     async def cleanup_messages(self):
@@ -0,0 +1,380 @@
+"""
+备忘录/定时提醒存储
+
+原先每个用户一个 reminder_data/user_<wxid>.db 文件，定时检查时需要遍历目录、逐个打开所有文件。
+这里改为一个统一的 reminder_data/reminders.db，并为每条提醒保存下一次触发时间 next_fire
+（Unix 时间戳），在 next_fire 上建索引，调度器启动时按触发时间一次性载入。
+
+旧的按用户拆分的数据库会在第一次打开时自动迁移，迁移后的文件重命名为 *.db.migrated。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+DATA_DIR = "reminder_data"
+DB_NAME = "reminders.db"
+
+# 循环类型的提醒，触发后计算下一次时间；其余类型触发一次后删除
+RECURRING_TYPES = ("daily", "weekly", "monthly", "yearly", "every_hour", "every_day", "every_week")
+
+_COLUMNS = "id, wxid, content, reminder_type, reminder_time, chat_id, is_done, next_fire"
+
+
+def calculate_next_fire(reminder_type: str, reminder_time: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """计算提醒在 now 之后的下一次触发时间，无法解析时返回 None
+
+    Args:
+        reminder_type: 提醒类型
+        reminder_time: 提醒时间字符串，格式取决于提醒类型
+        now: 基准时间，默认为当前时间；循环提醒返回严格晚于 now 的时间
+    """
+    now = now or datetime.now()
+    try:
+        if reminder_type == "one_time":
+            if isinstance(reminder_time, str):
+                try:
+                    # 尝试标准格式
+                    return datetime.strptime(reminder_time, '%Y-%m-%d %H:%M:%S')
+                except ValueError:
+                    try:
+                        # 尝试 ISO 8601 格式 (带Z的UTC时间)
+                        if reminder_time.endswith('Z'):
+                            dt = datetime.fromisoformat(reminder_time.replace('Z', '+00:00'))
+                            # 转换为本地时间 (UTC+8)
+                            china_timezone = timezone(timedelta(hours=8))
+                            local_dt = dt.astimezone(china_timezone)
+                            logger.info(f"将UTC时间 {dt} 转换为中国时间 {local_dt}")
+                            return local_dt.replace(tzinfo=None)
+                        else:
+                            # 尝试其他ISO格式
+                            return datetime.fromisoformat(reminder_time)
+                    except ValueError:
+                        logger.warning(f"无法解析 one_time 时间格式: {reminder_time}")
+                        return None
+            return None
+
+        elif reminder_type in ("every_day", "daily"):
+            if not reminder_time:
+                return None
+            hour, minute = map(int, reminder_time.split(":"))
+            next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_time <= now:
+                next_time += timedelta(days=1)
+            return next_time
+
+        elif reminder_type == "weekly":
+            weekday_str, time_str = reminder_time.split()
+            hour, minute = map(int, time_str.split(":"))
+
+            # 1=周一, ..., 6=周六, 0或7=周日，支持 "1,2,3,4,5" 形式的多个星期几
+            current_weekday = (now.weekday() + 1) % 7
+            candidates = []
+            for day in weekday_str.split(","):
+                days_ahead = (int(day) % 7 - current_weekday) % 7
+                candidate = (now + timedelta(days=days_ahead)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+                # 今天的提醒时间已过，顺延到下周的同一天
+                if candidate <= now:
+                    candidate += timedelta(days=7)
+                candidates.append(candidate)
+            return min(candidates)
+
+        elif reminder_type == "monthly":
+            day, time_str = reminder_time.split()
+            day = int(day)
+            hour, minute = map(int, time_str.split(":"))
+            # 当月没有这一天（如31日、2月30日）时顺延到下一个有这一天的月份
+            year, month = now.year, now.month
+            for _ in range(13):
+                try:
+                    next_time = datetime(year, month, day, hour, minute)
+                except ValueError:
+                    next_time = None
+                if next_time is not None and next_time > now:
+                    return next_time
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            logger.warning(f"每月提醒的日期无效: {reminder_time}")
+            return None
+
+        elif reminder_type == "yearly":
+            month, day, time_str = reminder_time.split()
+            month, day = int(month), int(day)
+            hour, minute = map(int, time_str.split(":"))
+            # 2月29日的提醒顺延到下一个闰年
+            for year in range(now.year, now.year + 9):
+                try:
+                    next_time = datetime(year, month, day, hour, minute)
+                except ValueError:
+                    continue
+                if next_time > now:
+                    return next_time
+            logger.warning(f"每年提醒的日期无效: {reminder_time}")
+            return None
+
+        elif reminder_type == "every_hour":
+            return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+        elif reminder_type == "every_week":
+            hour, minute = map(int, reminder_time.split(":"))
+            next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_time <= now:
+                next_time += timedelta(days=7)
+            return next_time
+
+        else:
+            logger.warning(f"未知的提醒类型: {reminder_type}")
+            return None
+    except ValueError as e:
+        logger.warning(f"时间格式错误: {reminder_time}, 错误信息: {e}")
+        return None
+
+
+def _next_fire_ts(reminder_type: str, reminder_time: str, now: Optional[datetime] = None) -> Optional[float]:
+    next_time = calculate_next_fire(reminder_type, reminder_time, now)
+    return next_time.timestamp() if next_time else None
+
+
+def _row_to_reminder(row) -> Dict:
+    return {
+        "id": row[0],
+        "wxid": row[1],
+        "content": row[2],
+        "reminder_type": row[3],
+        "reminder_time": row[4],
+        "chat_id": row[5],
+        "is_done": row[6],
+        "next_fire": row[7],
+    }
+
+
+class ReminderDB:
+    """统一的提醒数据库
+
+    插件和管理后台（运行在另一个线程）共用一个连接，所有操作在锁内执行。
+    修改提醒后会通知已注册的监听函数，调度器据此同步内存中的堆。
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, DB_NAME)
+        os.makedirs(data_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[int, Optional[Dict]], None]] = []
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_table()
+        self.migrate_legacy()
+
+    def _create_table(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    wxid TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    reminder_type TEXT NOT NULL,
+                    reminder_time TEXT NOT NULL,
+                    chat_id TEXT NOT NULL,
+                    is_done INTEGER NOT NULL DEFAULT 0,
+                    next_fire REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_next_fire ON reminders (next_fire)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_wxid ON reminders (wxid)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_chat_id ON reminders (chat_id)")
+
+    def migrate_legacy(self) -> int:
+        """把旧的 user_<wxid>.db 合并到统一数据库，返回迁移的提醒数量"""
+        legacy_files = [f for f in os.listdir(self.data_dir) if f.startswith("user_") and f.endswith(".db")]
+        migrated = 0
+        for filename in legacy_files:
+            path = os.path.join(self.data_dir, filename)
+            try:
+                conn = sqlite3.connect(path)
+                try:
+                    rows = conn.execute(
+                        "SELECT wxid, content, reminder_type, reminder_time, chat_id FROM reminders WHERE is_done = 0"
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    # 没有提醒表的空库
+                    rows = []
+                finally:
+                    conn.close()
+
+                with self._lock, self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO reminders (wxid, content, reminder_type, reminder_time, chat_id, next_fire) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        [(*row, _next_fire_ts(row[2], row[3])) for row in rows]
+                    )
+                os.replace(path, path + ".migrated")
+                migrated += len(rows)
+            except Exception as e:
+                logger.error(f"迁移提醒数据库 {filename} 失败: {e}")
+
+        if legacy_files:
+            logger.success(f"已将 {len(legacy_files)} 个旧提醒数据库中的 {migrated} 条提醒迁移到 {self.db_path}，提醒ID已重新编号")
+        return migrated
+
+    # ---------- 监听 ----------
+
+    def add_listener(self, listener: Callable[[int, Optional[Dict]], None]):
+        """注册修改监听函数，参数为 (提醒ID, 最新的提醒数据)，删除时提醒数据为 None"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[int, Optional[Dict]], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, reminder_id: int, reminder: Optional[Dict]):
+        for listener in list(self._listeners):
+            try:
+                listener(reminder_id, reminder)
+            except Exception as e:
+                logger.error(f"提醒修改监听函数执行失败: {e}")
+
+    # ---------- 查询 ----------
+
+    def get(self, reminder_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+        return _row_to_reminder(row) if row else None
+
+    def list_by_wxid(self, wxid: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM reminders WHERE wxid = ? AND is_done = 0 ORDER BY id", (wxid,)
+            ).fetchall()
+        return [_row_to_reminder(row) for row in rows]
+
+    def list_by_chat(self, chat_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM reminders WHERE chat_id = ? AND is_done = 0 ORDER BY id", (chat_id,)
+            ).fetchall()
+        return [_row_to_reminder(row) for row in rows]
+
+    def list_all(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM reminders WHERE is_done = 0 ORDER BY id").fetchall()
+        return [_row_to_reminder(row) for row in rows]
+
+    def load_pending(self) -> List[Dict]:
+        """按触发时间顺序载入所有待触发的提醒，供调度器启动时建堆
+
+        之前无法计算下一次触发时间的循环提醒（如每月31日）在这里重新计算。
+        """
+        with self._lock:
+            placeholders = ", ".join("?" * len(RECURRING_TYPES))
+            missing = self._conn.execute(
+                f"SELECT id, reminder_type, reminder_time FROM reminders "
+                f"WHERE is_done = 0 AND next_fire IS NULL AND reminder_type IN ({placeholders})",
+                RECURRING_TYPES
+            ).fetchall()
+            repaired = [(next_fire, reminder_id) for reminder_id, reminder_type, reminder_time in missing
+                        if (next_fire := _next_fire_ts(reminder_type, reminder_time)) is not None]
+            if repaired:
+                with self._conn:
+                    self._conn.executemany("UPDATE reminders SET next_fire = ? WHERE id = ?", repaired)
+                logger.info(f"已重新计算 {len(repaired)} 条循环提醒的触发时间")
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM reminders WHERE is_done = 0 AND next_fire IS NOT NULL ORDER BY next_fire"
+            ).fetchall()
+        return [_row_to_reminder(row) for row in rows]
+
+    # ---------- 修改 ----------
+
+    def add(self, wxid: str, content: str, reminder_type: str, reminder_time: str, chat_id: str) -> int:
+        """新增提醒，返回提醒ID"""
+        next_fire = _next_fire_ts(reminder_type, reminder_time)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO reminders (wxid, content, reminder_type, reminder_time, chat_id, next_fire) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (wxid, content, reminder_type, reminder_time, chat_id, next_fire)
+            )
+            reminder_id = cursor.lastrowid
+        self._notify(reminder_id, {
+            "id": reminder_id, "wxid": wxid, "content": content, "reminder_type": reminder_type,
+            "reminder_time": reminder_time, "chat_id": chat_id, "is_done": 0, "next_fire": next_fire,
+        })
+        return reminder_id
+
+    def update(self, reminder_id: int, wxid: str, content: str, reminder_type: str, reminder_time: str,
+               chat_id: str, is_done: int = 0) -> bool:
+        """更新提醒内容和时间，并重新计算下一次触发时间"""
+        next_fire = _next_fire_ts(reminder_type, reminder_time)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE reminders SET content = ?, reminder_type = ?, reminder_time = ?, chat_id = ?, is_done = ?, "
+                "next_fire = ? WHERE id = ? AND wxid = ?",
+                (content, reminder_type, reminder_time, chat_id, is_done, next_fire, reminder_id, wxid)
+            )
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify(reminder_id, self.get(reminder_id))
+        return updated
+
+    def delete(self, reminder_id: int, wxid: Optional[str] = None) -> bool:
+        """删除提醒，指定 wxid 时只删除属于该用户的提醒"""
+        with self._lock, self._conn:
+            if wxid is None:
+                cursor = self._conn.execute("DELETE FROM reminders WHERE id = ?", (reminder_id,))
+            else:
+                cursor = self._conn.execute("DELETE FROM reminders WHERE id = ? AND wxid = ?", (reminder_id, wxid))
+            deleted = cursor.rowcount > 0
+        if deleted:
+            self._notify(reminder_id, None)
+        return deleted
+
+    def delete_by_wxid(self, wxid: str) -> int:
+        """删除用户的所有提醒，返回删除数量"""
+        with self._lock, self._conn:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM reminders WHERE wxid = ?", (wxid,))]
+            self._conn.execute("DELETE FROM reminders WHERE wxid = ?", (wxid,))
+        for reminder_id in ids:
+            self._notify(reminder_id, None)
+        return len(ids)
+
+    def record_fired(self, rescheduled: Iterable[Tuple[int, float]], finished: Iterable[int],
+                     expired: Iterable[int] = ()):
+        """在一个事务中记录一批触发结果，由调度器调用，不通知监听函数
+
+        Args:
+            rescheduled: 循环提醒的 (提醒ID, 下一次触发时间)
+            finished: 已触发完毕、需要删除的一次性提醒
+            expired: 错过触发时间、标记为已完成的一次性提醒
+        """
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE reminders SET next_fire = ? WHERE id = ?",
+                                   [(next_fire, reminder_id) for reminder_id, next_fire in rescheduled])
+            self._conn.executemany("DELETE FROM reminders WHERE id = ?", [(reminder_id,) for reminder_id in finished])
+            self._conn.executemany("UPDATE reminders SET is_done = 1, next_fire = NULL WHERE id = ?",
+                                   [(reminder_id,) for reminder_id in expired])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_reminder_db: Optional[ReminderDB] = None
+_reminder_db_lock = threading.Lock()
+
+
+def get_reminder_db() -> ReminderDB:
+    """获取提醒数据库实例，第一次调用时创建并迁移旧数据"""
+    global _reminder_db
+    if _reminder_db is None:
+        with _reminder_db_lock:
+            if _reminder_db is None:
+                _reminder_db = ReminderDB()
+    return _reminder_db
@@ -1,3 +1,5 @@
+import functools
+
 from bot.session_manager import Session
 from common.log import logger
 from common import const
@@ -18,6 +20,37 @@ class ChatGPTSession(Session):
         self.model = model
         self.reset()
 
+    def reset(self):
+        super().reset()
+        self._reset_tokens()
+
+    def _reset_tokens(self):
+        # 与 messages 对齐的已计数消息和各自的 token 数，新消息在下次计算时只计数一次
+        self._counted = []
+        self._message_tokens = []
+        self._total_tokens = 0
+
+    def _sync_tokens(self):
+        """为新追加的消息计数；messages 被外部整体替换或修改了中间部分时重新计数"""
+        counted = len(self._counted)
+        messages = self.messages
+        if counted > len(messages) or (
+            counted and (messages[0] is not self._counted[0] or messages[counted - 1] is not self._counted[-1])
+        ):
+            self._reset_tokens()
+            counted = 0
+        for message in messages[counted:]:
+            tokens = num_tokens_from_message(message, self.model)
+            self._counted.append(message)
+            self._message_tokens.append(tokens)
+            self._total_tokens += tokens
+
+    def _pop_message(self, index):
+        self.messages.pop(index)
+        if index < len(self._counted):
+            self._counted.pop(index)
+            self._total_tokens -= self._message_tokens.pop(index)
+
     def discard_exceeding(self, max_tokens, cur_tokens=None):
         precise = True
         try:
@@ -29,9 +62,9 @@ class ChatGPTSession(Session):
             logger.debug("Exception when counting tokens precisely for query: {}".format(e))
         while cur_tokens > max_tokens:
             if len(self.messages) > 2:
-                self.messages.pop(1)
+                self._pop_message(1)
             elif len(self.messages) == 2 and self.messages[1]["role"] == "assistant":
-                self.messages.pop(1)
+                self._pop_message(1)
                 if precise:
                     cur_tokens = self.calc_tokens()
                 else:
@@ -50,52 +83,73 @@ class ChatGPTSession(Session):
         return cur_tokens
 
     def calc_tokens(self):
-        return num_tokens_from_messages(self.messages, self.model)
+        self._sync_tokens()
+        return self._total_tokens + reply_priming_tokens(self.model)
 
 
-# refer to https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
-def num_tokens_from_messages(messages, model):
-    """Returns the number of tokens used by a list of messages."""
+_GPT4_MODELS = {"gpt-4", "gpt-4-0314", "gpt-4-0613", "gpt-4-32k", "gpt-4-32k-0613", "gpt-3.5-turbo-0613",
+                "gpt-3.5-turbo-16k", "gpt-3.5-turbo-16k-0613", "gpt-35-turbo-16k", "gpt-4-turbo-preview",
+                "gpt-4-1106-preview", const.GPT4_TURBO_PREVIEW, const.GPT4_VISION_PREVIEW, const.GPT4_TURBO_01_25,
+                const.GPT_4o, const.GPT_4O_0806, const.GPT_4o_MINI, const.LINKAI_4o, const.LINKAI_4_TURBO}
+
 
+@functools.lru_cache(maxsize=None)
+def _token_model(model):
+    """计数方式：按字符计数，或按 gpt-4 / gpt-3.5-turbo 的规则计数（其他模型都按 gpt-3.5-turbo 计数）"""
     if model in ["wenxin", "xunfei"] or model.startswith(const.GEMINI):
-        return num_tokens_by_character(messages)
+        return "character"
+    if model in _GPT4_MODELS:
+        return "gpt-4"
+    if model not in ["gpt-3.5-turbo", "gpt-3.5-turbo-0301", "gpt-35-turbo", "gpt-3.5-turbo-1106", "moonshot",
+                     const.LINKAI_35] and not model.startswith("claude-3"):
+        logger.debug(f"num_tokens_from_messages() is not implemented for model {model}. Returning num tokens assuming gpt-3.5-turbo.")
+    return "gpt-3.5-turbo"
+
 
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model):
+    """按模型缓存 tiktoken 编码器"""
     import tiktoken
 
-    if model in ["gpt-3.5-turbo-0301", "gpt-35-turbo", "gpt-3.5-turbo-1106", "moonshot", const.LINKAI_35]:
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo")
-    elif model in ["gpt-4-0314", "gpt-4-0613", "gpt-4-32k", "gpt-4-32k-0613", "gpt-3.5-turbo-0613",
-                   "gpt-3.5-turbo-16k", "gpt-3.5-turbo-16k-0613", "gpt-35-turbo-16k", "gpt-4-turbo-preview",
-                   "gpt-4-1106-preview", const.GPT4_TURBO_PREVIEW, const.GPT4_VISION_PREVIEW, const.GPT4_TURBO_01_25,
-                   const.GPT_4o, const.GPT_4O_0806, const.GPT_4o_MINI, const.LINKAI_4o, const.LINKAI_4_TURBO]:
-        return num_tokens_from_messages(messages, model="gpt-4")
-    elif model.startswith("claude-3"):
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo")
     try:
-        encoding = tiktoken.encoding_for_model(model)
+        return tiktoken.encoding_for_model(model)
     except KeyError:
         logger.debug("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model == "gpt-3.5-turbo":
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def num_tokens_from_message(message, model):
+    """Returns the number of tokens used by a single message, excluding the reply priming."""
+    token_model = _token_model(model)
+    if token_model == "character":
+        return len(message["content"])
+
+    encoding = _get_encoding(token_model)
+    if token_model == "gpt-3.5-turbo":
         tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
         tokens_per_name = -1  # if there's a name, the role is omitted
-    elif model == "gpt-4":
+    else:
         tokens_per_message = 3
         tokens_per_name = 1
-    else:
-        logger.debug(f"num_tokens_from_messages() is not implemented for model {model}. Returning num tokens assuming gpt-3.5-turbo.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo")
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+    num_tokens = tokens_per_message
+    for key, value in message.items():
+        num_tokens += len(encoding.encode(value))
+        if key == "name":
+            num_tokens += tokens_per_name
     return num_tokens
 
 
+def reply_priming_tokens(model):
+    # every reply is primed with <|start|>assistant<|message|>
+    return 0 if _token_model(model) == "character" else 3
+
+
+# refer to https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+def num_tokens_from_messages(messages, model):
+    """Returns the number of tokens used by a list of messages."""
+    return sum(num_tokens_from_message(message, model) for message in messages) + reply_priming_tokens(model)
+
+
 def num_tokens_by_character(messages):
     """Returns the number of tokens used by a list of messages."""
     tokens = 0
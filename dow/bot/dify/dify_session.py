@@ -61,7 +61,11 @@ class DifySession(object):
 class DifySessionManager(object):
     def __init__(self, sessioncls, **session_kwargs):
         if conf().get("expires_in_seconds"):
-            sessions = ExpiredDict(conf().get("expires_in_seconds"))
+            sessions = ExpiredDict(
+                conf().get("expires_in_seconds"),
+                max_entries=conf().get("session_max_entries"),
+                max_bytes=int(conf().get("session_max_mb", 0) * 1024 * 1024) or None,
+            )
         else:
             sessions = dict()
         self.sessions = sessions
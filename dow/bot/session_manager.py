@@ -39,7 +39,11 @@ class Session(object):
 class SessionManager(object):
     def __init__(self, sessioncls, **session_args):
         if conf().get("expires_in_seconds"):
-            sessions = ExpiredDict(conf().get("expires_in_seconds"))
+            sessions = ExpiredDict(
+                conf().get("expires_in_seconds"),
+                max_entries=conf().get("session_max_entries"),
+                max_bytes=int(conf().get("session_max_mb", 0) * 1024 * 1024) or None,
+            )
         else:
             sessions = dict()
         self.sessions = sessions
@@ -70,6 +74,7 @@ class SessionManager(object):
             logger.debug("prompt tokens used={}".format(total_tokens))
         except Exception as e:
             logger.warning("Exception when counting tokens precisely for prompt: {}".format(str(e)))
+        self._resize(session_id, session)
         return session
 
     def session_reply(self, reply, session_id, total_tokens=None):
@@ -81,8 +86,14 @@ class SessionManager(object):
             logger.debug("raw total_tokens={}, savesession tokens={}".format(total_tokens, tokens_cnt))
         except Exception as e:
             logger.warning("Exception when counting tokens precisely for session: {}".format(str(e)))
+        self._resize(session_id, session)
         return session
 
+    def _resize(self, session_id, session):
+        """会话内容变化后重新写入，更新会话缓存中的内存估算"""
+        if session_id is not None and isinstance(self.sessions, ExpiredDict):
+            self.sessions[session_id] = session
+
     def clear_session(self, session_id):
         if session_id in self.sessions:
             del self.sessions[session_id]
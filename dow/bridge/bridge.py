@@ -1,12 +1,15 @@
+import os
+
 from bot.bot_factory import create_bot
 from bridge.context import Context
-from bridge.reply import Reply
+from bridge.reply import Reply, ReplyType
 from common import const
 from common.log import logger
 from common.singleton import singleton
 from config import conf
 from translate.factory import create_translator
 from voice.factory import create_voice
+from voice.voice_cache import get_voice_cache, save_to_tmp, synthesis_key
 
 
 @singleton
@@ -96,7 +99,26 @@ class Bridge(object):
         return self.get_bot("voice_to_text").voiceToText(voiceFile)
 
     def fetch_text_to_voice(self, text) -> Reply:
-        return self.get_bot("text_to_voice").textToVoice(text)
+        voice_bot = self.get_bot("text_to_voice")
+        cache = get_voice_cache()
+        if not cache.enabled:
+            return voice_bot.textToVoice(text)
+
+        # 相同提供方、音色和文本的语音直接复用，不再请求合成接口
+        key = synthesis_key(self.btype["text_to_voice"], voice_bot, text)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.debug("[Bridge] text to voice cache hit, text={}".format(text[:50]))
+            return Reply(ReplyType.VOICE, save_to_tmp(cached[1], cached[2]))
+
+        reply = voice_bot.textToVoice(text)
+        if reply and reply.type == ReplyType.VOICE and reply.content and os.path.isfile(reply.content):
+            try:
+                with open(reply.content, "rb") as f:
+                    cache.put(key, 0, os.path.splitext(reply.content)[1] or "mp3", f.read())
+            except Exception as e:
+                logger.warning("[Bridge] save voice cache failed: {}".format(e))
+        return reply
 
     def fetch_translate(self, text, from_lang="", to_lang="en") -> Reply:
         return self.get_bot("translate").translate(text, from_lang, to_lang)
@@ -3,6 +3,7 @@ import re
 import threading
 import time
 from asyncio import CancelledError
+from collections import deque
 from concurrent.futures import Future, ThreadPoolExecutor
 
 from bridge.context import *
@@ -26,9 +27,10 @@ handler_pool = ThreadPoolExecutor(max_workers=8)  # 处理消息的线程池
 class ChatChannel(Channel):
     name = None  # 登录的用户名
     user_id = None  # 登录的用户id
-    futures = {}  # 记录每个session_id提交到线程池的future对象, 用于重置会话时把没执行的future取消掉，正在执行的不会被取消
-    sessions = {}  # 用于控制并发，每个session_id同时只能有一个context在处理
+    sessions = {}  # session_id -> SessionState，只保存有排队或处理中消息的会话，用于控制每个会话的并发
     lock = threading.Lock()  # 用于控制对sessions的访问
+    ready_cond = threading.Condition(lock)  # 有会话就绪时唤醒消费线程
+    ready_sessions = deque()  # 有待处理消息且并发未满的会话，消费线程按顺序取出
 
     def __init__(self):
         _thread = threading.Thread(target=self.consume)
@@ -794,71 +796,124 @@ class ChatChannel(Channel):
             except Exception as e:
                 logger.exception("Worker raise exception: {}".format(e))
             with self.lock:
-                self.sessions[session_id][1].release()
+                state = self.sessions.get(session_id)
+                if state is not None:
+                    state.running -= 1
+                    state.futures = [f for f in state.futures if not f.done()]
+                    self._schedule(session_id, state)
 
         return func
 
+    def _schedule(self, session_id, state):
+        """会话有待处理消息且并发未满时放入就绪队列，空闲时回收，调用前需持有 self.lock"""
+        if state.ready:
+            return
+        if not state.queue.empty() and state.running < state.concurrency:
+            state.ready = True
+            self.ready_sessions.append(session_id)
+            self.ready_cond.notify()
+        elif state.running == 0 and state.queue.empty():
+            # 没有排队和处理中的消息，回收会话
+            del self.sessions[session_id]
+
     def produce(self, context: Context):
         session_id = context.get("session_id", 0)
         with self.lock:
-            if session_id not in self.sessions:
-                self.sessions[session_id] = [
-                    Dequeue(),
-                    threading.BoundedSemaphore(conf().get("concurrency_in_session", 4)),
-                ]
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = self.sessions[session_id] = SessionState(conf().get("concurrency_in_session", 4))
             if context.type == ContextType.TEXT and context.content.startswith("#"):
-                self.sessions[session_id][0].putleft(context)  # 优先处理管理命令
+                state.queue.putleft((context, time.time()))  # 优先处理管理命令
             else:
-                self.sessions[session_id][0].put(context)
+                state.queue.put((context, time.time()))
+            self._schedule(session_id, state)
 
-    # 消费者函数，单独线程，用于从消息队列中取出消息并处理
+    # 消费者函数，单独线程，只在有会话就绪时被唤醒，从就绪会话中取出消息提交到线程池
     def consume(self):
         while True:
             with self.lock:
-                session_ids = list(self.sessions.keys())
-            for session_id in session_ids:
-                with self.lock:
-                    context_queue, semaphore = self.sessions[session_id]
-                if semaphore.acquire(blocking=False):  # 等线程处理完毕才能删除
-                    if not context_queue.empty():
-                        context = context_queue.get()
-                        logger.debug("[chat_channel] consume context: {}".format(context))
-                        future: Future = handler_pool.submit(self._handle, context)
-                        future.add_done_callback(self._thread_pool_callback(session_id, context=context))
-                        with self.lock:
-                            if session_id not in self.futures:
-                                self.futures[session_id] = []
-                            self.futures[session_id].append(future)
-                    elif semaphore._initial_value == semaphore._value + 1:  # 除了当前，没有任务再申请到信号量，说明所有任务都处理完毕
-                        with self.lock:
-                            self.futures[session_id] = [t for t in self.futures[session_id] if not t.done()]
-                            assert len(self.futures[session_id]) == 0, "thread pool error"
-                            del self.sessions[session_id]
-                    else:
-                        semaphore.release()
-            time.sleep(0.2)
+                while not self.ready_sessions:
+                    self.ready_cond.wait()
+                session_id = self.ready_sessions.popleft()
+                state = self.sessions.get(session_id)
+                if state is None:
+                    continue
+                state.ready = False
+                if state.queue.empty() or state.running >= state.concurrency:
+                    self._schedule(session_id, state)
+                    continue
+                context, enqueue_time = state.queue.get_nowait()
+                state.running += 1
+                state.record_wait(time.time() - enqueue_time)
+                # 还有空闲的并发额度时排到队尾，各会话轮流处理
+                self._schedule(session_id, state)
+
+            logger.debug("[chat_channel] consume context: {}".format(context))
+            future: Future = handler_pool.submit(self._handle, context)
+            with self.lock:
+                state.futures.append(future)
+            future.add_done_callback(self._thread_pool_callback(session_id, context=context))
 
     # 取消session_id对应的所有任务，只能取消排队的消息和已提交线程池但未执行的任务
     def cancel_session(self, session_id):
         with self.lock:
-            if session_id in self.sessions:
-                for future in self.futures[session_id]:
-                    future.cancel()
-                cnt = self.sessions[session_id][0].qsize()
-                if cnt > 0:
-                    logger.info("Cancel {} messages in session {}".format(cnt, session_id))
-                self.sessions[session_id][0] = Dequeue()
+            state = self.sessions.get(session_id)
+            futures = self._clear_session(session_id, state) if state else []
+        # 取消 future 会同步执行回调，回调中需要获取 self.lock，所以在锁外取消
+        for future in futures:
+            future.cancel()
 
     def cancel_all_session(self):
         with self.lock:
-            for session_id in self.sessions:
-                for future in self.futures[session_id]:
-                    future.cancel()
-                cnt = self.sessions[session_id][0].qsize()
-                if cnt > 0:
-                    logger.info("Cancel {} messages in session {}".format(cnt, session_id))
-                self.sessions[session_id][0] = Dequeue()
-
+            futures = []
+            for session_id, state in list(self.sessions.items()):
+                futures.extend(self._clear_session(session_id, state))
+        for future in futures:
+            future.cancel()
+
+    def _clear_session(self, session_id, state):
+        cnt = state.queue.qsize()
+        if cnt > 0:
+            logger.info("Cancel {} messages in session {}".format(cnt, session_id))
+        state.queue = Dequeue()
+        futures = list(state.futures)
+        self._schedule(session_id, state)
+        return futures
+
+    def get_session_stats(self):
+        """各会话的排队长度、处理中数量和等待时间"""
+        now = time.time()
+        with self.lock:
+            return {
+                session_id: {
+                    "queued": state.queue.qsize(),
+                    "running": state.running,
+                    "oldest_wait": round(now - min(t for _, t in state.queue.queue), 3) if state.queue.qsize() else 0,
+                    "processed": state.processed,
+                    "avg_wait": round(state.total_wait / state.processed, 3) if state.processed else 0,
+                    "max_wait": round(state.max_wait, 3),
+                }
+                for session_id, state in self.sessions.items()
+            }
+
+
+class SessionState(object):
+    """一个会话的待处理消息队列、并发计数和等待时间统计"""
+
+    def __init__(self, concurrency):
+        self.queue = Dequeue()  # 元素为 (context, 入队时间)
+        self.concurrency = max(int(concurrency), 1)
+        self.running = 0
+        self.ready = False  # 是否已在就绪队列中
+        self.futures = []  # 提交到线程池的future对象, 用于重置会话时把没执行的future取消掉，正在执行的不会被取消
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait):
+        self.processed += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
 
 def check_prefix(content, prefix_list):
     if not prefix_list:
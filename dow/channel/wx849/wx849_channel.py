@@ -1,4 +1,5 @@
 import asyncio
+import hashlib
 import os
 import json
 import time
@@ -19,10 +20,12 @@ from channel.chat_message import ChatMessage
 from channel.wx849.wx849_message import WX849Message  # 改为从wx849_message导入WX849Message
 from common.expired_dict import ExpiredDict
 from common.log import logger
+from common.session_dispatcher import SessionDispatcher
 from common.singleton import singleton
 from common.time_check import time_checker
 from common.utils import remove_markdown_symbol
 from config import conf, get_appdata_dir
+from voice.voice_cache import get_voice_cache
 # 新增HTTP服务器相关导入
 from aiohttp import web
 import uuid
@@ -205,83 +208,60 @@ class WX849Channel(ChatChannel):
     # 不再使用单独的图片消息ID集合，所有消息ID都记录在_processed_message_ids中
 
     def _process_single_message_independently(self, msg_id: str, msg: dict):
-        """在独立线程中处理单条消息"""
+        """在分发线程池中处理单条消息，同一会话的消息由 SessionDispatcher 保证按到达顺序依次处理"""
+        thread_id = threading.get_ident()
         try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            # 记录处理信息
-            thread_id = threading.get_ident()
-            logger.debug(f"[WX849] 独立消息处理线程 {thread_id} 开始处理 - 消息ID: {msg_id}")
-
-            try:
-                # 构建标准的消息对象
-                is_group = False
-
-                # 判断是否是群消息
-                from_user_id = msg.get("fromUserName", msg.get("FromUserName", ""))
-                to_user_id = msg.get("toUserName", msg.get("ToUserName", ""))
-
-                if isinstance(from_user_id, dict) and "string" in from_user_id:
-                    from_user_id = from_user_id["string"]
-                if isinstance(to_user_id, dict) and "string" in to_user_id:
-                    to_user_id = to_user_id["string"]
-
-                if from_user_id and from_user_id.endswith("@chatroom"):
-                    is_group = True
-                elif to_user_id and to_user_id.endswith("@chatroom"):
-                    is_group = True
-                    # 交换发送者和接收者，确保from_user_id是群ID
-                    from_user_id, to_user_id = to_user_id, from_user_id
-
-                # 创建消息对象
-                cmsg = WX849Message(msg, is_group)
-
-                # 注释掉从回调消息中获取发送者昵称的部分，改用API接口获取
-                # if "SenderNickName" in msg and msg["SenderNickName"]:
-                #     cmsg.sender_nickname = msg["SenderNickName"]
-                #     logger.debug(f"[WX849] 使用回调中的发送者昵称: {cmsg.sender_nickname}")
-
-                # 处理被@消息
-                if is_group and "@" in str(msg.get("Content", "")):
-                    # 检查是否有@列表
-                    at_list = []
-
-                    # 方法1: 从RawLogLine中提取@列表
-                    raw_log_line = msg.get("RawLogLine", "")
-
-                    # 检查是否是被@消息
-                    if raw_log_line and "收到被@消息" in raw_log_line:
-                        logger.debug(f"[WX849] 检测到被@消息: {raw_log_line}")
-                        # 设置is_at标志
-                        cmsg.is_at = True
-                    # 检查是否有IsAtMessage标志
-                    elif "IsAtMessage" in msg and msg["IsAtMessage"]:
-                        logger.debug(f"[WX849] 检测到IsAtMessage标志")
-                        # 设置is_at标志
-                        cmsg.is_at = True
+            logger.debug(f"[WX849] 消息处理线程 {thread_id} 开始处理 - 消息ID: {msg_id}")
+
+            # 构建标准的消息对象
+            is_group = False
+
+            # 判断是否是群消息
+            from_user_id = msg.get("fromUserName", msg.get("FromUserName", ""))
+            to_user_id = msg.get("toUserName", msg.get("ToUserName", ""))
+
+            if isinstance(from_user_id, dict) and "string" in from_user_id:
+                from_user_id = from_user_id["string"]
+            if isinstance(to_user_id, dict) and "string" in to_user_id:
+                to_user_id = to_user_id["string"]
+
+            if from_user_id and from_user_id.endswith("@chatroom"):
+                is_group = True
+            elif to_user_id and to_user_id.endswith("@chatroom"):
+                is_group = True
+                # 交换发送者和接收者，确保from_user_id是群ID
+                from_user_id, to_user_id = to_user_id, from_user_id
+
+            # 创建消息对象
+            cmsg = WX849Message(msg, is_group)
+
+            # 注释掉从回调消息中获取发送者昵称的部分，改用API接口获取
+            # if "SenderNickName" in msg and msg["SenderNickName"]:
+            #     cmsg.sender_nickname = msg["SenderNickName"]
+            #     logger.debug(f"[WX849] 使用回调中的发送者昵称: {cmsg.sender_nickname}")
+
+            # 处理被@消息
+            if is_group and "@" in str(msg.get("Content", "")):
+                # 检查是否有@列表
+                at_list = []
+
+                # 方法1: 从RawLogLine中提取@列表
+                raw_log_line = msg.get("RawLogLine", "")
+
+                # 检查是否是被@消息
+                if raw_log_line and "收到被@消息" in raw_log_line:
+                    logger.debug(f"[WX849] 检测到被@消息: {raw_log_line}")
+                    # 设置is_at标志
+                    cmsg.is_at = True
+                # 检查是否有IsAtMessage标志
+                elif "IsAtMessage" in msg and msg["IsAtMessage"]:
+                    logger.debug(f"[WX849] 检测到IsAtMessage标志")
+                    # 设置is_at标志
+                    cmsg.is_at = True
 
-                        # 尝试从日志行中提取@列表
-                        if "@:" in raw_log_line:
-                            try:
-                                at_part = raw_log_line.split("@:", 1)[1].split(" ", 1)[0]
-                                if at_part.startswith("[") and at_part.endswith("]"):
-                                    # 解析@列表
-                                    at_list_str = at_part[1:-1]  # 去除[]
-                                    if at_list_str:
-                                        at_items = at_list_str.split(",")
-                                        for item in at_items:
-                                            item = item.strip().strip("'\"")
-                                            if item:
-                                                at_list.append(item)
-                                        logger.debug(f"[WX849] 从被@消息中提取到@列表: {at_list}")
-                            except Exception as e:
-                                logger.debug(f"[WX849] 从被@消息中提取@列表失败: {e}")
-                    # 普通消息中的@列表提取
-                    elif raw_log_line and "@:" in raw_log_line:
+                    # 尝试从日志行中提取@列表
+                    if "@:" in raw_log_line:
                         try:
-                            # 尝试从日志行中提取@列表
                             at_part = raw_log_line.split("@:", 1)[1].split(" ", 1)[0]
                             if at_part.startswith("[") and at_part.endswith("]"):
                                 # 解析@列表
@@ -292,156 +272,162 @@ class WX849Channel(ChatChannel):
                                         item = item.strip().strip("'\"")
                                         if item:
                                             at_list.append(item)
-                                    logger.debug(f"[WX849] 从RawLogLine提取到@列表: {at_list}")
+                                    logger.debug(f"[WX849] 从被@消息中提取到@列表: {at_list}")
                         except Exception as e:
-                            logger.debug(f"[WX849] 从RawLogLine提取@列表失败: {e}")
+                            logger.debug(f"[WX849] 从被@消息中提取@列表失败: {e}")
+                # 普通消息中的@列表提取
+                elif raw_log_line and "@:" in raw_log_line:
+                    try:
+                        # 尝试从日志行中提取@列表
+                        at_part = raw_log_line.split("@:", 1)[1].split(" ", 1)[0]
+                        if at_part.startswith("[") and at_part.endswith("]"):
+                            # 解析@列表
+                            at_list_str = at_part[1:-1]  # 去除[]
+                            if at_list_str:
+                                at_items = at_list_str.split(",")
+                                for item in at_items:
+                                    item = item.strip().strip("'\"")
+                                    if item:
+                                        at_list.append(item)
+                                logger.debug(f"[WX849] 从RawLogLine提取到@列表: {at_list}")
+                    except Exception as e:
+                        logger.debug(f"[WX849] 从RawLogLine提取@列表失败: {e}")
 
-                    # 方法2: 从MsgSource中提取@列表
-                    if not at_list and "MsgSource" in msg:
-                        try:
-                            msg_source = msg.get("MsgSource", "")
-                            if msg_source:
-                                root = ET.fromstring(msg_source)
-                                atuserlist_elem = root.find('atuserlist')
-                                if atuserlist_elem is not None and atuserlist_elem.text:
-                                    at_users = atuserlist_elem.text.split(",")
-                                    for user in at_users:
-                                        if user.strip():
-                                            at_list.append(user.strip())
-                                    logger.debug(f"[WX849] 从MsgSource提取到@列表: {at_list}")
-                        except Exception as e:
-                            logger.debug(f"[WX849] 从MsgSource提取@列表失败: {e}")
+                # 方法2: 从MsgSource中提取@列表
+                if not at_list and "MsgSource" in msg:
+                    try:
+                        msg_source = msg.get("MsgSource", "")
+                        if msg_source:
+                            root = ET.fromstring(msg_source)
+                            atuserlist_elem = root.find('atuserlist')
+                            if atuserlist_elem is not None and atuserlist_elem.text:
+                                at_users = atuserlist_elem.text.split(",")
+                                for user in at_users:
+                                    if user.strip():
+                                        at_list.append(user.strip())
+                                logger.debug(f"[WX849] 从MsgSource提取到@列表: {at_list}")
+                    except Exception as e:
+                        logger.debug(f"[WX849] 从MsgSource提取@列表失败: {e}")
 
-                    # 设置@列表到消息对象
-                    if at_list:
-                        cmsg.at_list = at_list
-                        # 设置is_at标志
-                        cmsg.is_at = self.wxid in at_list
-                        logger.debug(f"[WX849] 设置@列表: {at_list}, is_at: {cmsg.is_at}")
+                # 设置@列表到消息对象
+                if at_list:
+                    cmsg.at_list = at_list
+                    # 设置is_at标志
+                    cmsg.is_at = self.wxid in at_list
+                    logger.debug(f"[WX849] 设置@列表: {at_list}, is_at: {cmsg.is_at}")
 
-                # 处理消息
-                logger.debug(f"[WX849] 处理回调消息: ID:{cmsg.msg_id} 类型:{cmsg.msg_type}")
+            # 处理消息
+            logger.debug(f"[WX849] 处理回调消息: ID:{cmsg.msg_id} 类型:{cmsg.msg_type}")
 
-                # 使用线程安全的方式检查和标记消息
-                with self.__class__._message_lock:
-                    # 检查消息是否已经处理过 - 使用全局集合
-                    if cmsg.msg_id in self.__class__._processed_message_ids:
-                        logger.debug(f"[WX849] 消息 {cmsg.msg_id} 已在全局集合中标记为处理过，忽略")
-                        return
+            # 使用线程安全的方式检查和标记消息
+            with self.__class__._message_lock:
+                # 检查消息是否已经处理过 - 使用全局集合
+                if cmsg.msg_id in self.__class__._processed_message_ids:
+                    logger.debug(f"[WX849] 消息 {cmsg.msg_id} 已在全局集合中标记为处理过，忽略")
+                    return
 
-                    # 检查本地字典中是否有这个消息ID（兼容旧代码）
-                    if cmsg.msg_id in self.received_msgs:
-                        logger.debug(f"[WX849] 消息 {cmsg.msg_id} 已在本地字典中标记为处理过，忽略")
-                        return
+                # 检查本地字典中是否有这个消息ID（兼容旧代码）
+                if cmsg.msg_id in self.received_msgs:
+                    logger.debug(f"[WX849] 消息 {cmsg.msg_id} 已在本地字典中标记为处理过，忽略")
+                    return
 
-                    # 标记消息为已处理 - 在全局集合和本地字典中标记
-                    # 所有消息都在这里标记，包括图片消息
-                    self.__class__._processed_message_ids.add(cmsg.msg_id)
-                    self.received_msgs[cmsg.msg_id] = True
+                # 标记消息为已处理 - 在全局集合和本地字典中标记
+                # 所有消息都在这里标记，包括图片消息
+                self.__class__._processed_message_ids.add(cmsg.msg_id)
+                self.received_msgs[cmsg.msg_id] = True
 
-                    # 如果集合太大，清理一下
-                    if len(self.__class__._processed_message_ids) > 1000:
-                        # 只保留最近的500条
-                        self.__class__._processed_message_ids = set(list(self.__class__._processed_message_ids)[-500:])
+                # 如果集合太大，清理一下
+                if len(self.__class__._processed_message_ids) > 1000:
+                    # 只保留最近的500条
+                    self.__class__._processed_message_ids = set(list(self.__class__._processed_message_ids)[-500:])
 
-                    # 不再使用_processed_image_ids集合
+                # 不再使用_processed_image_ids集合
 
-                # 检查消息时间是否过期
-                create_time = cmsg.create_time  # 消息时间戳
-                current_time = int(time.time())
+            # 检查消息时间是否过期
+            create_time = cmsg.create_time  # 消息时间戳
+            current_time = int(time.time())
 
-                # 设置超时时间为60秒
-                timeout = 60
-                if int(create_time) < current_time - timeout:
-                    logger.debug(f"[WX849] 历史消息 {cmsg.msg_id} 已跳过，时间差: {current_time - int(create_time)}秒")
-                    return
+            # 设置超时时间为60秒
+            timeout = 60
+            if int(create_time) < current_time - timeout:
+                logger.debug(f"[WX849] 历史消息 {cmsg.msg_id} 已跳过，时间差: {current_time - int(create_time)}秒")
+                return
 
-                # 创建一个全新的消息对象，避免共享引用
-                new_msg = WX849Message(msg, is_group)
+            # 创建一个全新的消息对象，避免共享引用
+            new_msg = WX849Message(msg, is_group)
 
-                # 复制原始消息对象的属性
-                for attr_name in dir(cmsg):
-                    if not attr_name.startswith('_') and not callable(getattr(cmsg, attr_name)):
-                        try:
-                            setattr(new_msg, attr_name, getattr(cmsg, attr_name))
-                        except Exception:
-                            pass
-
-                # 设置正确的接收者和会话ID
-                if is_group:
-                    # 如果是群聊，接收者应该是群ID
-                    new_msg.to_user_id = from_user_id  # 群ID
-                    new_msg.session_id = from_user_id  # 使用群ID作为会话ID
-                    new_msg.other_user_id = from_user_id  # 群ID
-                    new_msg.is_group = True
-
-                    # 确保群聊消息的其他字段也是正确的
-                    new_msg.group_id = from_user_id
-
-                    # 清除可能从其他消息继承的私聊相关字段
-                    if hasattr(new_msg, 'other_user_nickname'):
-                        delattr(new_msg, 'other_user_nickname')
-                else:
-                    # 如果是私聊，接收者应该是发送者ID
-                    sender_wxid = msg.get("SenderWxid", "")
-                    if not sender_wxid:
-                        sender_wxid = from_user_id
-
-                    new_msg.to_user_id = sender_wxid
-                    new_msg.session_id = sender_wxid  # 使用发送者ID作为会话ID
-                    new_msg.other_user_id = sender_wxid
-                    new_msg.is_group = False
-
-                    # 清除可能从其他消息继承的群聊相关字段
-                    if hasattr(new_msg, 'group_name'):
-                        delattr(new_msg, 'group_name')
-                    if hasattr(new_msg, 'group_id'):
-                        delattr(new_msg, 'group_id')
-                    if hasattr(new_msg, 'is_at'):
-                        new_msg.is_at = False
-                    if hasattr(new_msg, 'at_list'):
-                        new_msg.at_list = []
-
-                # 使用新的消息对象替换原始消息对象
-                cmsg = new_msg
-
-                # 创建一个新的线程来处理消息，确保每个消息都有完全独立的处理环境
-                def process_message_in_new_thread():
+            # 复制原始消息对象的属性
+            for attr_name in dir(cmsg):
+                if not attr_name.startswith('_') and not callable(getattr(cmsg, attr_name)):
                     try:
-                        # 创建新的事件循环
-                        msg_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(msg_loop)
+                        setattr(new_msg, attr_name, getattr(cmsg, attr_name))
+                    except Exception:
+                        pass
 
-                        try:
-                            # 调用原有的消息处理逻辑
-                            if is_group:
-                                self.handle_group(cmsg)
-                            else:
-                                self.handle_single(cmsg)
-                        finally:
-                            # 关闭事件循环
-                            msg_loop.close()
-                    except Exception as e:
-                        logger.error(f"[WX849] 消息处理线程执行异常: {e}")
-                        logger.error(traceback.format_exc())
+            # 设置正确的接收者和会话ID
+            if is_group:
+                # 如果是群聊，接收者应该是群ID
+                new_msg.to_user_id = from_user_id  # 群ID
+                new_msg.session_id = from_user_id  # 使用群ID作为会话ID
+                new_msg.other_user_id = from_user_id  # 群ID
+                new_msg.is_group = True
+
+                # 确保群聊消息的其他字段也是正确的
+                new_msg.group_id = from_user_id
+
+                # 清除可能从其他消息继承的私聊相关字段
+                if hasattr(new_msg, 'other_user_nickname'):
+                    delattr(new_msg, 'other_user_nickname')
+            else:
+                # 如果是私聊，接收者应该是发送者ID
+                sender_wxid = msg.get("SenderWxid", "")
+                if not sender_wxid:
+                    sender_wxid = from_user_id
 
-                # 启动新线程处理消息
-                msg_thread = threading.Thread(target=process_message_in_new_thread)
-                msg_thread.daemon = True
-                msg_thread.start()
+                new_msg.to_user_id = sender_wxid
+                new_msg.session_id = sender_wxid  # 使用发送者ID作为会话ID
+                new_msg.other_user_id = sender_wxid
+                new_msg.is_group = False
 
-                # 等待消息处理线程完成
-                msg_thread.join()
-            finally:
-                # 关闭事件循环
-                loop.close()
+                # 清除可能从其他消息继承的群聊相关字段
+                if hasattr(new_msg, 'group_name'):
+                    delattr(new_msg, 'group_name')
+                if hasattr(new_msg, 'group_id'):
+                    delattr(new_msg, 'group_id')
+                if hasattr(new_msg, 'is_at'):
+                    new_msg.is_at = False
+                if hasattr(new_msg, 'at_list'):
+                    new_msg.at_list = []
+
+            # 使用新的消息对象替换原始消息对象
+            cmsg = new_msg
+
+            # 调用原有的消息处理逻辑，工作线程已有可复用的事件循环，不再为每条消息新建线程和事件循环
+            if is_group:
+                self.handle_group(cmsg)
+            else:
+                self.handle_single(cmsg)
 
-            logger.debug(f"[WX849] 独立消息处理线程 {thread_id} 处理完成 - 消息ID: {msg_id}")
+            logger.debug(f"[WX849] 消息处理线程 {thread_id} 处理完成 - 消息ID: {msg_id}")
         except Exception as e:
-            logger.error(f"[WX849] 独立消息处理线程 {thread_id} 执行异常: {e}")
+            logger.error(f"[WX849] 消息处理线程 {thread_id} 执行异常: {e}")
             logger.error(traceback.format_exc())
 
-
+    @staticmethod
+    def _get_dispatch_session_id(msg: dict) -> str:
+        """消息所属会话：群消息为群ID，私聊为发送者ID，与处理时设置的session_id一致"""
+        from_user_id = msg.get("fromUserName", msg.get("FromUserName", ""))
+        to_user_id = msg.get("toUserName", msg.get("ToUserName", ""))
+        if isinstance(from_user_id, dict):
+            from_user_id = from_user_id.get("string", "")
+        if isinstance(to_user_id, dict):
+            to_user_id = to_user_id.get("string", "")
+
+        if from_user_id and from_user_id.endswith("@chatroom"):
+            return from_user_id
+        if to_user_id and to_user_id.endswith("@chatroom"):
+            return to_user_id
+        return msg.get("SenderWxid") or from_user_id or ""
 
     def __init__(self):
         super().__init__()
@@ -481,6 +467,8 @@ class WX849Channel(ChatChannel):
         self.waiting_for_image = ExpiredDict(300)  # 设置5分钟过期，固定值
         # 新增属性，用于记录会话最近图片消息
         self.recent_image_msgs = ExpiredDict(600)  # 设置10分钟过期，固定值
+        # 消息分发器：同一会话的消息按顺序处理，所有消息共用固定大小的线程池
+        self.dispatcher = SessionDispatcher(conf().get("wx849_dispatch_workers", 8), name="wx849-dispatch")
 
     async def _initialize_bot(self):
         """初始化 bot"""
@@ -986,7 +974,7 @@ class WX849Channel(ChatChannel):
                     logger.error(f"[WX849] 处理媒体消息失败: {e}")
                     logger.error(traceback.format_exc())
 
-            # 处理所有消息 - 为每条消息创建独立的处理流程
+            # 处理所有消息 - 按会话分发到线程池处理
             for msg in messages:
                 try:
                     # 确保消息类型正确设置
@@ -1006,17 +994,13 @@ class WX849Channel(ChatChannel):
                     msg_type = msg.get('MsgType', 0)
                     # 让图片消息正常处理
 
-                    # 创建独立的处理线程
-                    process = threading.Thread(
-                        target=self._process_single_message_independently,
-                        args=(msg_id, msg),
-                        daemon=True  # 设置为守护线程，主线程退出时自动结束
-                    )
-                    process.start()
-                    logger.debug(f"[WX849] 已启动独立处理流程 - 消息ID: {msg_id}")
+                    # 按会话分发到线程池，同一会话内保持消息顺序
+                    session_id = self._get_dispatch_session_id(msg)
+                    self.dispatcher.submit(session_id, self._process_single_message_independently, msg_id, msg)
+                    logger.debug(f"[WX849] 已分发消息 - 消息ID: {msg_id}, 会话: {session_id}")
 
                 except Exception as e:
-                    logger.error(f"[WX849] 创建消息处理线程失败: {e}")
+                    logger.error(f"[WX849] 分发消息失败: {e}")
                     logger.error(traceback.format_exc())
 
             return True
@@ -1089,6 +1073,7 @@ class WX849Channel(ChatChannel):
             await self.http_site.stop()
         if self.http_runner:
             await self.http_runner.cleanup()
+        self.dispatcher.shutdown()
 
         logger.info("[WX849] HTTP服务器已关闭")
 
@@ -1504,14 +1489,14 @@ class WX849Channel(ChatChannel):
                 cmsg.actual_user_nickname = cmsg.sender_wxid
 
                 # 启动异步任务获取昵称并更新actual_user_nickname
-                threading.Thread(target=lambda: asyncio.run(self._update_nickname_async(cmsg))).start()
+                self.dispatcher.run_coroutine(self._update_nickname_async(cmsg))
 
             # 确保other_user_id设置为群ID
             cmsg.other_user_id = cmsg.from_user_id
 
             # 设置other_user_nickname为群名称，与gewechat保持一致
             # 启动异步任务获取群名称并更新other_user_nickname
-            threading.Thread(target=lambda: asyncio.run(self._update_group_nickname_async(cmsg))).start()
+            self.dispatcher.run_coroutine(self._update_group_nickname_async(cmsg))
 
             # 处理@消息，与gewechat保持一致
             # 优先从MsgSource的XML中解析是否被at
@@ -1552,7 +1537,7 @@ class WX849Channel(ChatChannel):
 
             # 设置other_user_nickname为联系人昵称，与gewechat保持一致
             # 启动异步任务获取联系人昵称并更新other_user_nickname
-            threading.Thread(target=lambda: asyncio.run(self._update_contact_nickname_async(cmsg))).start()
+            self.dispatcher.run_coroutine(self._update_contact_nickname_async(cmsg))
 
             logger.debug(f"[WX849] 设置私聊发送者信息: actual_user_id={cmsg.actual_user_id}, actual_user_nickname={cmsg.actual_user_nickname}")
 
@@ -3355,243 +3340,6 @@ class WX849Channel(ChatChannel):
             logger.error(f"[WX849] 发送图片失败: {e}")
             return None
 
-    def _process_message_independently(self, message_id: str, msg: dict):
-        """在独立线程中处理单条消息"""
-        try:
-            # 创建新的事件循环
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            # 记录处理信息
-            thread_id = threading.get_ident()
-            logger.debug(f"[WX849] 独立消息处理线程 {thread_id} 开始处理 - 消息ID: {message_id}")
-
-            try:
-                # 构建标准的消息对象
-                is_group = False
-
-                # 判断是否是群消息
-                from_user_id = msg.get("fromUserName", msg.get("FromUserName", ""))
-                to_user_id = msg.get("toUserName", msg.get("ToUserName", ""))
-
-                if isinstance(from_user_id, dict) and "string" in from_user_id:
-                    from_user_id = from_user_id["string"]
-                if isinstance(to_user_id, dict) and "string" in to_user_id:
-                    to_user_id = to_user_id["string"]
-
-                if from_user_id and from_user_id.endswith("@chatroom"):
-                    is_group = True
-                elif to_user_id and to_user_id.endswith("@chatroom"):
-                    is_group = True
-                    # 交换发送者和接收者，确保from_user_id是群ID
-                    from_user_id, to_user_id = to_user_id, from_user_id
-
-                # 创建消息对象
-                cmsg = WX849Message(msg, is_group)
-
-                # 检查是否有发送者昵称信息，优先使用这个
-                if "SenderNickName" in msg and msg["SenderNickName"]:
-                    cmsg.sender_nickname = msg["SenderNickName"]
-                    logger.debug(f"[WX849] 使用回调中的发送者昵称: {cmsg.sender_nickname}")
-
-                # 处理被@消息
-                if is_group and "@" in str(msg.get("Content", "")):
-                    # 检查是否有@列表
-                    at_list = []
-
-                    # 方法1: 从RawLogLine中提取@列表
-                    raw_log_line = msg.get("RawLogLine", "")
-
-                    # 检查是否是被@消息
-                    if raw_log_line and "收到被@消息" in raw_log_line:
-                        logger.debug(f"[WX849] 检测到被@消息: {raw_log_line}")
-                        # 设置is_at标志
-                        cmsg.is_at = True
-                    # 检查是否有IsAtMessage标志
-                    elif "IsAtMessage" in msg and msg["IsAtMessage"]:
-                        logger.debug(f"[WX849] 检测到IsAtMessage标志")
-                        # 设置is_at标志
-                        cmsg.is_at = True
-
-                        # 确保at_list中包含机器人wxid
-                        if not hasattr(cmsg, 'at_list'):
-                            cmsg.at_list = []
-                        if self.wxid not in cmsg.at_list:
-                            cmsg.at_list.append(self.wxid)
-
-                        # 尝试从日志行中提取@列表
-                        if "@:" in raw_log_line:
-                            try:
-                                at_part = raw_log_line.split("@:", 1)[1].split(" ", 1)[0]
-                                if at_part.startswith("[") and at_part.endswith("]"):
-                                    # 解析@列表
-                                    at_list_str = at_part[1:-1]  # 去除[]
-                                    if at_list_str:
-                                        at_items = at_list_str.split(",")
-                                        for item in at_items:
-                                            item = item.strip().strip("'\"")
-                                            if item:
-                                                at_list.append(item)
-                                        logger.debug(f"[WX849] 从被@消息中提取到@列表: {at_list}")
-                            except Exception as e:
-                                logger.debug(f"[WX849] 从被@消息中提取@列表失败: {e}")
-                    # 普通消息中的@列表提取
-                    elif raw_log_line and "@:" in raw_log_line:
-                        try:
-                            # 尝试从日志行中提取@列表
-                            at_part = raw_log_line.split("@:", 1)[1].split(" ", 1)[0]
-                            if at_part.startswith("[") and at_part.endswith("]"):
-                                # 解析@列表
-                                at_list_str = at_part[1:-1]  # 去除[]
-                                if at_list_str:
-                                    at_items = at_list_str.split(",")
-                                    for item in at_items:
-                                        item = item.strip().strip("'\"")
-                                        if item:
-                                            at_list.append(item)
-                                    logger.debug(f"[WX849] 从RawLogLine提取到@列表: {at_list}")
-                        except Exception as e:
-                            logger.debug(f"[WX849] 从RawLogLine提取@列表失败: {e}")
-
-                    # 方法2: 从MsgSource中提取@列表
-                    if not at_list and "MsgSource" in msg:
-                        try:
-                            msg_source = msg.get("MsgSource", "")
-                            if msg_source:
-                                root = ET.fromstring(msg_source)
-                                atuserlist_elem = root.find('atuserlist')
-                                if atuserlist_elem is not None and atuserlist_elem.text:
-                                    at_users = atuserlist_elem.text.split(",")
-                                    for user in at_users:
-                                        if user.strip():
-                                            at_list.append(user.strip())
-                                    logger.debug(f"[WX849] 从MsgSource提取到@列表: {at_list}")
-                        except Exception as e:
-                            logger.debug(f"[WX849] 从MsgSource提取@列表失败: {e}")
-
-                    # 设置@列表到消息对象
-                    if at_list:
-                        cmsg.at_list = at_list
-                        # 设置is_at标志
-                        cmsg.is_at = self.wxid in at_list
-                        logger.debug(f"[WX849] 设置@列表: {at_list}, is_at: {cmsg.is_at}")
-
-                # 处理消息
-                logger.debug(f"[WX849] 处理回调消息: ID:{cmsg.msg_id} 类型:{cmsg.msg_type}")
-
-                # 使用线程安全的方式检查和标记消息
-                with self.__class__._message_lock:
-                    # 检查消息是否已经处理过
-                    if cmsg.msg_id in self.received_msgs:
-                        logger.debug(f"[WX849] 消息 {cmsg.msg_id} 已处理过，忽略")
-                        return
-
-                    # 标记消息为已处理
-                    self.received_msgs[cmsg.msg_id] = True
-
-                # 检查消息时间是否过期
-                create_time = cmsg.create_time  # 消息时间戳
-                current_time = int(time.time())
-
-                # 设置超时时间为60秒
-                timeout = 60
-                if int(create_time) < current_time - timeout:
-                    logger.debug(f"[WX849] 历史消息 {cmsg.msg_id} 已跳过，时间差: {current_time - int(create_time)}秒")
-                    return
-
-                # 创建一个全新的消息对象，避免共享引用
-                new_msg = WX849Message(msg, is_group)
-
-                # 复制原始消息对象的属性
-                for attr_name in dir(cmsg):
-                    if not attr_name.startswith('_') and not callable(getattr(cmsg, attr_name)):
-                        try:
-                            setattr(new_msg, attr_name, getattr(cmsg, attr_name))
-                        except Exception:
-                            pass
-
-                # 设置正确的接收者和会话ID
-                if is_group:
-                    # 如果是群聊，接收者应该是群ID
-                    new_msg.to_user_id = from_user_id  # 群ID
-                    new_msg.session_id = from_user_id  # 使用群ID作为会话ID
-                    new_msg.other_user_id = from_user_id  # 群ID
-                    new_msg.is_group = True
-
-                    # 确保群聊消息的其他字段也是正确的
-                    new_msg.group_id = from_user_id
-
-                    # 清除可能从其他消息继承的私聊相关字段
-                    if hasattr(new_msg, 'other_user_nickname'):
-                        delattr(new_msg, 'other_user_nickname')
-                else:
-                    # 如果是私聊，接收者应该是发送者ID
-                    sender_wxid = msg.get("SenderWxid", "")
-                    if not sender_wxid:
-                        sender_wxid = from_user_id
-
-                    new_msg.to_user_id = sender_wxid
-                    new_msg.session_id = sender_wxid  # 使用发送者ID作为会话ID
-                    new_msg.other_user_id = sender_wxid
-                    new_msg.is_group = False
-
-                    # 清除可能从其他消息继承的群聊相关字段
-                    if hasattr(new_msg, 'group_name'):
-                        delattr(new_msg, 'group_name')
-                    if hasattr(new_msg, 'group_id'):
-                        delattr(new_msg, 'group_id')
-                    if hasattr(new_msg, 'is_at'):
-                        new_msg.is_at = False
-                    if hasattr(new_msg, 'at_list'):
-                        new_msg.at_list = []
-                    # 确保没有任何群聊相关的属性
-                    for attr_name in dir(new_msg):
-                        if not attr_name.startswith('_') and not callable(getattr(new_msg, attr_name)):
-                            if 'group' in attr_name.lower() or 'at' in attr_name.lower():
-                                try:
-                                    delattr(new_msg, attr_name)
-                                except Exception:
-                                    pass
-
-                # 使用新的消息对象替换原始消息对象
-                cmsg = new_msg
-
-                # 创建一个新的线程来处理消息，确保每个消息都有完全独立的处理环境
-                def process_message_in_new_thread():
-                    try:
-                        # 创建新的事件循环
-                        msg_loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(msg_loop)
-
-                        try:
-                            # 调用原有的消息处理逻辑
-                            if is_group:
-                                self.handle_group(cmsg)
-                            else:
-                                self.handle_single(cmsg)
-                        finally:
-                            # 关闭事件循环
-                            msg_loop.close()
-                    except Exception as e:
-                        logger.error(f"[WX849] 消息处理线程执行异常: {e}")
-                        logger.error(traceback.format_exc())
-
-                # 启动新线程处理消息
-                msg_thread = threading.Thread(target=process_message_in_new_thread)
-                msg_thread.daemon = True
-                msg_thread.start()
-
-                # 等待消息处理线程完成
-                msg_thread.join()
-            finally:
-                # 关闭事件循环
-                loop.close()
-
-            logger.debug(f"[WX849] 独立消息处理线程 {thread_id} 处理完成 - 消息ID: {message_id}")
-        except Exception as e:
-            logger.error(f"[WX849] 独立消息处理线程 {thread_id} 执行异常: {e}")
-            logger.error(traceback.format_exc())
-
     async def _process_message_async(self, message_id: str, reply: Reply, context: Context, receiver: str, session_id: str):
         """异步处理消息"""
         try:
@@ -4247,6 +3995,17 @@ class WX849Channel(ChatChannel):
             # 导入base64模块
             import base64
 
+            # 转码结果按语音文件内容缓存，相同的语音（如固定文本的合成语音）不再重复转码
+            voice_cache = get_voice_cache()
+            silk_key = None
+            if voice_cache.enabled:
+                with open(voice_path, 'rb') as f:
+                    silk_key = voice_cache.make_key("wx849", "", hashlib.sha256(f.read()).hexdigest(), "silk")
+                cached = voice_cache.get(silk_key)
+                if cached is not None:
+                    logger.debug(f"[WX849] 语音命中转码缓存，时长: {cached[0]}毫秒")
+                    return await self._send_silk_voice(to_user_id, cached[2], cached[0])
+
             # 查找ffmpeg可执行文件
             ffmpeg_cmd = "ffmpeg"
             if os.name == 'nt':
@@ -4473,36 +4232,9 @@ class WX849Channel(ChatChannel):
                     # 语音时长不超过最大片段时长，直接发送
                     logger.info(f"[WX849] 语音时长不超过20秒 ({total_duration/1000:.1f}秒)，直接发送")
                     silk_data = await pysilk.async_encode(audio.raw_data, sample_rate=audio.frame_rate)
-                    voice_base64 = base64.b64encode(silk_data).decode('utf-8')
-
-                    api_url = f"http://{api_host}:{api_port}{api_path_prefix}/Msg/SendVoice"
-                    params = {
-                        "Wxid": self.wxid,
-                        "ToWxid": to_user_id,
-                        "Base64": voice_base64,
-                        "Type": 4,  # SILK格式
-                        "VoiceTime": total_duration
-                    }
-
-                    # 记录日志，隐藏base64数据
-                    debug_params = params.copy()
-                    debug_params["Base64"] = f"[Base64 data, length: {len(voice_base64)}]"
-                    logger.debug(f"[WX849] 语音API参数: {json.dumps(debug_params, ensure_ascii=False)}")
-
-                    # 发送请求
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(api_url, json=params, timeout=60) as response:
-                            json_resp = await response.json()
-
-                            # 检查响应
-                            if json_resp and json_resp.get("Success", False):
-                                logger.info(f"[WX849] 语音发送成功")
-                                result = {"Success": True}
-                            else:
-                                error_msg = json_resp.get("Message", "未知错误")
-                                logger.error(f"[WX849] 语音API返回错误: {error_msg}")
-                                logger.error(f"[WX849] 响应详情: {json.dumps(json_resp, ensure_ascii=False)}")
-                                result = None
+                    if silk_key:
+                        voice_cache.put(silk_key, total_duration, "silk", silk_data)
+                    result = await self._send_silk_voice(to_user_id, silk_data, total_duration)
             except Exception as e:
                 logger.error(f"[WX849] 处理音频数据失败: {e}")
                 logger.error(traceback.format_exc())
@@ -4522,6 +4254,42 @@ class WX849Channel(ChatChannel):
 
         return result
 
+    async def _send_silk_voice(self, to_user_id, silk_data, duration):
+        """发送已编码为SILK的语音"""
+        api_host = conf().get("wx849_api_host", "127.0.0.1")
+        api_port = conf().get("wx849_api_port", 9011)
+        protocol_version = conf().get("wx849_protocol_version", "849")
+        api_path_prefix = "/api" if protocol_version in ("855", "ipad") else "/VXAPI"
+
+        voice_base64 = base64.b64encode(silk_data).decode('utf-8')
+        api_url = f"http://{api_host}:{api_port}{api_path_prefix}/Msg/SendVoice"
+        params = {
+            "Wxid": self.wxid,
+            "ToWxid": to_user_id,
+            "Base64": voice_base64,
+            "Type": 4,  # SILK格式
+            "VoiceTime": duration
+        }
+
+        # 记录日志，隐藏base64数据
+        debug_params = params.copy()
+        debug_params["Base64"] = f"[Base64 data, length: {len(voice_base64)}]"
+        logger.debug(f"[WX849] 语音API参数: {json.dumps(debug_params, ensure_ascii=False)}")
+
+        # 发送请求
+        async with aiohttp.ClientSession() as session:
+            async with session.post(api_url, json=params, timeout=60) as response:
+                json_resp = await response.json()
+
+                # 检查响应
+                if json_resp and json_resp.get("Success", False):
+                    logger.info(f"[WX849] 语音发送成功")
+                    return {"Success": True}
+                error_msg = json_resp.get("Message", "未知错误")
+                logger.error(f"[WX849] 语音API返回错误: {error_msg}")
+                logger.error(f"[WX849] 响应详情: {json.dumps(json_resp, ensure_ascii=False)}")
+                return None
+
     async def _send_video(self, to_user_id, video_base64, cover_base64=None, video_duration=10):
         """发送视频消息"""
         try:
@@ -1,42 +1,205 @@
-from datetime import datetime, timedelta
+import heapq
+import itertools
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
 
+# 后台清理线程的检查间隔（秒）
+SWEEP_INTERVAL = 30
 
-class ExpiredDict(dict):
-    def __init__(self, expires_in_seconds):
-        super().__init__()
+# id -> ExpiredDict，映射类型不可哈希，不能放入 WeakSet
+_instances = weakref.WeakValueDictionary()
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_loop():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        for cache in list(_instances.values()):
+            try:
+                cache.expire()
+            except Exception:
+                pass
+
+
+def _ensure_sweeper():
+    """所有 ExpiredDict 共用一个后台清理线程"""
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = threading.Thread(target=_sweep_loop, name="expired-dict-sweeper", daemon=True)
+            _sweeper.start()
+
+
+def estimate_size(obj, max_depth=4):
+    """粗略估算对象占用的内存（字节），递归统计容器和对象属性，同一对象只计一次"""
+    seen = set()
+
+    def _size(o, depth):
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        size = sys.getsizeof(o, 0)
+        if depth <= 0 or isinstance(o, (str, bytes, bytearray, int, float, bool, type(None))):
+            return size
+        if isinstance(o, dict):
+            size += sum(_size(k, depth - 1) + _size(v, depth - 1) for k, v in o.items())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            size += sum(_size(item, depth - 1) for item in o)
+        elif hasattr(o, "__dict__"):
+            size += _size(vars(o), depth - 1)
+        return size
+
+    try:
+        return _size(obj, max_depth)
+    except Exception:
+        return sys.getsizeof(obj, 0)
+
+
+class ExpiredDict(MutableMapping):
+    """
+    带过期时间的字典，读取时刷新过期时间。
+
+    原先只在再次读取某个键时才检查是否过期，不再出现的用户会一直留在内存中。这里：
+    - 过期时间保存在最小堆中，后台线程和每次写入时从堆顶清理已过期的条目，每条 O(log n)
+    - 可以限制条目数和估算的内存占用，超出时按最近最少使用的顺序淘汰
+    - get_stats() 返回条目数、淘汰次数和内存估算
+
+    :param expires_in_seconds: 过期时间（秒），为空时默认 3600
+    :param max_entries: 最多保留的条目数，为空表示不限制
+    :param max_bytes: 估算内存占用上限（字节），为空表示不限制
+    :param sizeof: 估算单个值占用内存的函数，默认递归统计容器和对象属性
+    """
+
+    def __init__(self, expires_in_seconds, max_entries=None, max_bytes=None, sizeof=None):
         self.expires_in_seconds = expires_in_seconds if expires_in_seconds else 3600
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or estimate_size
+        self.lock = threading.RLock()
+        # key -> [value, expiry_time, size]，按最近使用顺序排列，最久未使用的在前
+        self._data = OrderedDict()
+        # (expiry_time, seq, key)，条目刷新后旧的堆元素留在堆中，弹出时与当前过期时间比对后丢弃
+        self._heap = []
+        self._seq = itertools.count()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+        _instances[id(self)] = self
+        _ensure_sweeper()
+
+    def _push(self, key, expiry_time):
+        heapq.heappush(self._heap, (expiry_time, next(self._seq), key))
+        # 频繁读取的键会在堆中留下很多过时元素，超过条目数两倍时重建
+        if len(self._heap) > 2 * len(self._data) + 64:
+            self._heap = [(entry[1], next(self._seq), k) for k, entry in self._data.items()]
+            heapq.heapify(self._heap)
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= entry[2]
+        return entry
+
+    def expire(self, now=None):
+        """清理已过期的条目，返回清理数量"""
+        now = time.monotonic() if now is None else now
+        count = 0
+        with self.lock:
+            while self._heap and self._heap[0][0] <= now:
+                expiry_time, _, key = heapq.heappop(self._heap)
+                entry = self._data.get(key)
+                if entry is not None and entry[1] == expiry_time:
+                    self._remove(key)
+                    count += 1
+            self.stats["expired"] += count
+        return count
+
+    def _evict(self):
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries) or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._data)))
+            self.stats["evicted"] += 1
 
     def __getitem__(self, key):
-        value, expiry_time = super().__getitem__(key)
-        if datetime.now() > expiry_time:
-            del self[key]
-            raise KeyError("expired {}".format(key))
-        self.__setitem__(key, value)
-        return value
+        with self.lock:
+            entry = self._data.get(key)
+            now = time.monotonic()
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    self._remove(key)
+                    self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                raise KeyError("expired {}".format(key))
+            # 读取时刷新过期时间和使用顺序
+            entry[1] = now + self.expires_in_seconds
+            self._push(key, entry[1])
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
 
     def __setitem__(self, key, value):
-        expiry_time = datetime.now() + timedelta(seconds=self.expires_in_seconds)
-        super().__setitem__(key, (value, expiry_time))
+        size = self.sizeof(value)
+        with self.lock:
+            now = time.monotonic()
+            self.expire(now)
+            if key in self._data:
+                self._remove(key)
+            expiry_time = now + self.expires_in_seconds
+            self._data[key] = [value, expiry_time, size]
+            self._bytes += size
+            self._push(key, expiry_time)
+            self._evict()
 
-    def get(self, key, default=None):
-        try:
-            return self[key]
-        except KeyError:
-            return default
+    def __delitem__(self, key):
+        with self.lock:
+            self._remove(key)
 
     def __contains__(self, key):
-        try:
-            self[key]
-            return True
-        except KeyError:
-            return False
+        with self.lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
+
+    def __len__(self):
+        with self.lock:
+            self.expire()
+            return len(self._data)
+
+    def __iter__(self):
+        return iter(self.keys())
 
     def keys(self):
-        keys = list(super().keys())
-        return [key for key in keys if key in self]
+        with self.lock:
+            self.expire()
+            return list(self._data.keys())
 
     def items(self):
-        return [(key, self[key]) for key in self.keys()]
+        with self.lock:
+            self.expire()
+            return [(key, entry[0]) for key, entry in self._data.items()]
 
-    def __iter__(self):
-        return self.keys().__iter__()
+    def values(self):
+        with self.lock:
+            self.expire()
+            return [entry[0] for entry in self._data.values()]
+
+    def clear(self):
+        with self.lock:
+            self._data.clear()
+            self._heap.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            self.expire()
+            return {
+                **self.stats,
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "heap_size": len(self._heap),
+            }
@@ -1,3 +1,4 @@
 from common.expired_dict import ExpiredDict
 
-USER_IMAGE_CACHE = ExpiredDict(60 * 3)
\ No newline at end of file
+# 每个用户最近一张图片，不限制时活跃用户多了会一直占用内存
+USER_IMAGE_CACHE = ExpiredDict(60 * 3, max_entries=1000, max_bytes=64 * 1024 * 1024)
\ No newline at end of file
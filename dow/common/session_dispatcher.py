@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from common.log import logger
+
+_thread_local = threading.local()
+
+
+def _ensure_thread_loop():
+    """工作线程复用同一个事件循环，处理函数中的 asyncio.get_event_loop() 不必每次新建"""
+    loop = getattr(_thread_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_local.loop = loop
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+class SessionDispatcher(object):
+    """
+    按会话分发消息处理任务：同一会话内按到达顺序串行处理，不同会话之间并行处理，
+    所有任务都在固定大小的线程池中执行，不再为每条消息创建线程和事件循环。
+
+    submit 必须在事件循环线程中调用；其他线程使用 submit_threadsafe。
+    处理函数中的后台协程（如更新昵称）通过 run_coroutine 放到同一个事件循环中执行。
+    """
+
+    def __init__(self, max_workers=8, name="session-dispatch"):
+        self.max_workers = max(int(max_workers), 1)
+        self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name,
+                                       initializer=_ensure_thread_loop)
+        self._loop = None
+        # session_id -> 待处理任务队列，队列存在即表示该会话有一个排空协程在运行
+        self._queues = {}
+        self._tasks = set()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "max_wait_ms": 0.0}
+
+    def submit(self, session_id, func, *args):
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        queue = self._queues.get(session_id)
+        if queue is None:
+            queue = self._queues[session_id] = deque()
+            task = self._loop.create_task(self._drain(session_id, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append((func, args, time.monotonic()))
+        self.stats["submitted"] += 1
+
+    def submit_threadsafe(self, session_id, func, *args):
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("SessionDispatcher 尚未绑定事件循环")
+        self._loop.call_soon_threadsafe(self.submit, session_id, func, *args)
+
+    def run_coroutine(self, coro):
+        """在绑定的事件循环中执行协程，不等待结果，可以在任意线程中调用"""
+        if self._loop is None or self._loop.is_closed():
+            coro.close()
+            raise RuntimeError("SessionDispatcher 尚未绑定事件循环")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        future.add_done_callback(self._log_coroutine_error)
+        return future
+
+    @staticmethod
+    def _log_coroutine_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"[SessionDispatcher] 后台协程执行失败: {future.exception()}")
+
+    async def _drain(self, session_id, queue):
+        loop = asyncio.get_running_loop()
+        try:
+            while queue:
+                func, args, enqueued = queue.popleft()
+                wait_ms = (time.monotonic() - enqueued) * 1000
+                if wait_ms > self.stats["max_wait_ms"]:
+                    self.stats["max_wait_ms"] = round(wait_ms, 2)
+                try:
+                    await loop.run_in_executor(self.pool, self._run, func, args)
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.exception(f"[SessionDispatcher] 会话 {session_id} 的任务执行失败: {e}")
+        finally:
+            # 队列为空后退出，下一条消息到达时重新创建
+            self._queues.pop(session_id, None)
+
+    @staticmethod
+    def _run(func, args):
+        _ensure_thread_loop()
+        return func(*args)
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "workers": self.max_workers,
+            "active_sessions": len(self._queues),
+            "pending": sum(len(queue) for queue in self._queues.values()),
+        }
+
+    def shutdown(self, wait=False):
+        for task in list(self._tasks):
+            task.cancel()
+        self._queues.clear()
+        self.pool.shutdown(wait=wait)
@@ -62,6 +62,8 @@ available_setting = {
     "accept_friend_msg": "",  # 接受好友请求后发送的消息
     # chatgpt会话参数
     "expires_in_seconds": 3600,  # 无操作会话的过期时间
+    "session_max_entries": 10000,  # 最多保留的会话数，超出时淘汰最久未使用的会话
+    "session_max_mb": 256,  # 会话占用内存的估算上限（MB），0表示不限制
     # 人格描述
     "character_desc": "你是ChatGPT, 一个由OpenAI训练的大型语言模型, 你旨在回答并解决人们的任何问题，并且可以使用多种语言与人交流。",
     "conversation_max_tokens": 1000,  # 支持上下文记忆的最多字符数
@@ -124,6 +126,9 @@ available_setting = {
     "text_to_voice": "openai",  # 语音合成引擎，支持openai,baidu,google,azure,xunfei,ali,pytts(offline),elevenlabs,edge(online)
     "text_to_voice_model": "tts-1",
     "tts_voice_id": "alloy",
+    "voice_cache_enabled": True,  # 是否缓存语音合成和转码结果，相同文本不再重复合成
+    "voice_cache_max_mb": 200,  # 语音缓存磁盘占用上限（MB），超出时淘汰最久未使用的语音
+    "voice_cache_memory_mb": 16,  # 内存中缓存最近使用语音的上限（MB）
     # baidu 语音api配置， 使用百度语音识别和语音合成时需要
     "baidu_app_id": "",
     "baidu_api_key": "",
@@ -189,6 +194,7 @@ available_setting = {
     "wx849_callback_host": "127.0.0.1",  # 微信849回调服务监听地址
     "wx849_callback_port": 8088,  # 微信849回调服务监听端口
     "wx849_callback_key": "",  # 微信849回调服务API密钥
+    "wx849_dispatch_workers": 8,  # 微信849回调消息处理线程数，同一会话的消息按顺序处理
     "log_level": "INFO",
     "wx849_wxid": "",
     "wx849_device_name": "DoW微信机器人",
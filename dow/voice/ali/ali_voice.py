@@ -42,6 +42,9 @@ class AliVoice(Voice):
         except Exception as e:
             logger.warn("AliVoice init failed: %s, ignore " % e)
 
+    def cacheKeyFields(self):
+        return {"api_url": getattr(self, "api_url_text_to_voice", None), "app_key": getattr(self, "app_key", None)}
+
     def textToVoice(self, text):
         """
         将文本转换为语音文件。
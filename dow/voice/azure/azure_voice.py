@@ -69,6 +69,10 @@ class AzureVoice(Voice):
             reply = Reply(ReplyType.ERROR, "抱歉，语音识别失败")
         return reply
 
+    def cacheKeyFields(self):
+        # 音色及按语言自动选择的各语言音色都在 config 中
+        return {"config": getattr(self, "config", None)}
+
     def textToVoice(self, text):
         if self.config.get("auto_detect"):
             lang = classify(text)[0]
@@ -74,6 +74,9 @@ class BaiduVoice(Voice):
             reply = Reply(ReplyType.ERROR, "百度语音识别出错了；{0}".format(res["err_msg"]))
         return reply
 
+    def cacheKeyFields(self):
+        return {key: getattr(self, key, None) for key in ("lang", "ctp", "spd", "pit", "vol", "per")}
+
     def textToVoice(self, text):
         result = self.client.synthesis(
             text,
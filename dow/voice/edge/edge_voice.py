@@ -41,6 +41,9 @@ class EdgeVoice(Voice):
         communicate = edge_tts.Communicate(text, self.voice)
         await communicate.save(fileName)
 
+    def cacheKeyFields(self):
+        return {"voice": self.voice}
+
     def textToVoice(self, text):
         fileName = TmpDir().path() + "reply-" + str(int(time.time())) + "-" + str(hash(text) & 0x7FFFFFFF) + ".mp3"
 
@@ -45,6 +45,9 @@ class OpenaiVoice(Voice):
             return reply
 
 
+    def cacheKeyFields(self):
+        return {key: conf().get(key) for key in ("text_to_voice_model", "tts_voice_id")}
+
     def textToVoice(self, text):
         try:
             api_base = conf().get("open_ai_api_base") or "https://api.openai.com/v1"
@@ -83,6 +83,9 @@ class TencentVoice(Voice):
             logger.error("[Tencent] Voice to text error: {}".format(e))
             return Reply(ReplyType.ERROR, "腾讯语音识别出错：{}".format(str(e)))
 
+    def cacheKeyFields(self):
+        return {"voice_type": self.voice_type}
+
     def textToVoice(self, text):
         """
         将文本转换为语音
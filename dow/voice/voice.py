@@ -15,3 +15,10 @@ class Voice(object):
         Send text to voice service and get voice
         """
         raise NotImplementedError
+
+    def cacheKeyFields(self):
+        """
+        Settings that change the synthesized voice (voice name, speed, language...),
+        used together with the text as the voice cache key
+        """
+        return {}
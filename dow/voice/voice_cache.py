@@ -0,0 +1,218 @@
+"""
+语音合成缓存
+
+相同文本每次回复都会重新调用语音合成接口，再由通道转码为 silk。
+这里按内容哈希缓存合成结果和转码结果，磁盘缓存超过上限时淘汰最久未使用的条目，
+最近使用的条目同时保留在内存中。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from common.log import logger
+from config import conf, get_appdata_dir
+
+
+class VoiceCache(object):
+    def __init__(self, cache_dir=None, max_bytes=200 * 1024 * 1024, memory_bytes=16 * 1024 * 1024):
+        self.enabled = True
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.lock = threading.Lock()
+        # key -> (格式, 文件大小)，最久未使用的在前
+        self._index = OrderedDict()
+        self._disk_size = 0
+        # key -> (时长毫秒, 格式, 数据)
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._loaded = False
+        self.stats = {"requests": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "stores": 0, "evictions": 0, "errors": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def make_key(provider, voice, text, format=""):
+        raw = json.dumps([provider or "", voice or "", text or "", format or ""], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """返回 (时长毫秒, 格式, 数据)，未命中返回 None"""
+        if not self.enabled or not key:
+            return None
+        with self.lock:
+            self.stats["requests"] += 1
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                if key in self._index:
+                    self._index.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                self.stats["bytes_saved"] += len(entry[2])
+                return entry
+
+            self._ensure_index()
+            item = self._index.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            fmt = item[0]
+            try:
+                path = self._path(key, fmt)
+                with open(path, "rb") as f:
+                    raw = f.read()
+                if len(raw) < 4:
+                    raise ValueError("缓存文件不完整")
+                os.utime(path)
+            except (OSError, ValueError) as e:
+                logger.warning("[VoiceCache] 读取缓存 {} 失败: {}".format(key, e))
+                self.stats["errors"] += 1
+                self.stats["misses"] += 1
+                self._drop(key)
+                return None
+
+            entry = (int.from_bytes(raw[:4], "big"), fmt, raw[4:])
+            self._index.move_to_end(key)
+            self._remember(key, entry)
+            self.stats["disk_hits"] += 1
+            self.stats["bytes_saved"] += len(entry[2])
+            return entry
+
+    def put(self, key, duration, fmt, data):
+        if not self.enabled or not key or not data:
+            return
+        fmt = (fmt or "bin").lower().lstrip(".")
+        if not fmt.isalnum():
+            raise ValueError("invalid voice format: {}".format(fmt))
+        with self.lock:
+            self._ensure_index()
+            self._remember(key, (int(duration or 0), fmt, data))
+            size = len(data) + 4
+            if size > self.max_bytes:
+                return
+            path = self._path(key, fmt)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = "{}.{}.tmp".format(path, threading.get_ident())
+                with open(tmp_path, "wb") as f:
+                    f.write(max(int(duration or 0), 0).to_bytes(4, "big"))
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("[VoiceCache] 写入缓存 {} 失败: {}".format(key, e))
+                self.stats["errors"] += 1
+                return
+
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._disk_size -= old[1]
+            self._index[key] = (fmt, size)
+            self._disk_size += size
+            self.stats["stores"] += 1
+            self._evict()
+
+    def _remember(self, key, entry):
+        if len(entry[2]) > self.memory_bytes // 4:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old[2])
+        self._memory[key] = entry
+        self._memory_size += len(entry[2])
+        while self._memory and self._memory_size > self.memory_bytes:
+            _, (_, _, data) = self._memory.popitem(last=False)
+            self._memory_size -= len(data)
+
+    def _evict(self):
+        while self._index and self._disk_size > self.max_bytes:
+            key, (fmt, size) = self._index.popitem(last=False)
+            self._disk_size -= size
+            self.stats["evictions"] += 1
+            try:
+                os.remove(self._path(key, fmt))
+            except OSError:
+                pass
+
+    def _drop(self, key):
+        item = self._index.pop(key, None)
+        if item is not None:
+            self._disk_size -= item[1]
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[2])
+
+    def _path(self, key, fmt):
+        return os.path.join(self.cache_dir, key[:2], "{}.{}".format(key, fmt))
+
+    def _ensure_index(self):
+        """第一次使用时扫描缓存目录，按修改时间还原使用顺序"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_dir is None:
+            self.cache_dir = os.path.join(get_appdata_dir(), "voice_cache")
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                key, _, fmt = name.partition(".")
+                if not fmt.isalnum():
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, key, fmt, stat.st_size))
+        for _, key, fmt, size in sorted(entries):
+            self._index[key] = (fmt, size)
+            self._disk_size += size
+        if entries:
+            logger.info("[VoiceCache] 已载入 {} 条语音缓存，共 {:.1f}MB".format(len(entries), self._disk_size / 1024 / 1024))
+        self._evict()
+
+    def get_stats(self):
+        with self.lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            requests = self.stats["requests"]
+            return {
+                **self.stats,
+                "hits": hits,
+                "hit_rate": round(hits / requests * 100, 1) if requests else 0.0,
+                "entries": len(self._index),
+                "disk_bytes": self._disk_size,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+            }
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_voice_cache():
+    """按配置创建全局语音缓存"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                cache = VoiceCache(max_bytes=int(float(conf().get("voice_cache_max_mb", 200)) * 1024 * 1024),
+                                   memory_bytes=int(float(conf().get("voice_cache_memory_mb", 16)) * 1024 * 1024))
+                cache.enabled = conf().get("voice_cache_enabled", True)
+                _instance = cache
+    return _instance
+
+
+def synthesis_key(provider, voice_bot, text):
+    """合成结果的缓存键：提供方、提供方给出的音色相关配置和文本"""
+    voice = voice_bot.cacheKeyFields()
+    return VoiceCache.make_key(provider, json.dumps(voice, sort_keys=True, default=str), text)
+
+
+def save_to_tmp(fmt, data):
+    """把缓存的语音写到临时文件，通道发送后可能会删除该文件"""
+    os.makedirs("tmp", exist_ok=True)
+    path = os.path.join("tmp", "voice_cache_{}_{}.{}".format(int(time.time() * 1000), threading.get_ident(), fmt))
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
@@ -73,6 +73,9 @@ class XunfeiVoice(Voice):
             reply = Reply(ReplyType.ERROR, "讯飞语音识别出错了；{0}")
         return reply
 
+    def cacheKeyFields(self):
+        return {"business_args": getattr(self, "BusinessArgsTTS", None)}
+
     def textToVoice(self, text):
         try:
             # Avoid the same filename under multithreading
@@ -21,6 +21,7 @@ from loguru import logger
 import speech_recognition as sr
 import os
 from WechatAPI import WechatAPIClient
+from WechatAPI.voice_cache import voice_cache
 from database.XYBotDB import XYBotDB
 from utils.decorators import *
 from utils.plugin_base import PluginBase
@@ -2445,11 +2446,19 @@ class Dify(PluginBase):
                 await bot.send_text_message(message["FromWxid"], f"{TEXT_TO_VOICE_FAILED}: 未提供文本内容或消息ID")
                 return
 
+            # 按文本合成时先查语音缓存，命中则不再请求 Dify 和转码；message_id 对应的内容无法预先确定，不缓存
+            cache_key = None
+            if not message_id:
+                cache_key = voice_cache.make_key("dify", f"{model.base_url}|{model.api_key}", text, "silk")
+                if await bot.send_cached_voice_message(message["FromWxid"], cache_key):
+                    logger.info("文本转语音命中缓存，跳过 text-to-audio 请求")
+                    return
+
             async with aiohttp.ClientSession(proxy=self.http_proxy) as session:
                 async with session.post(text_to_audio_url, headers=headers, json=data) as resp:
                     if resp.status == 200:
                         audio = await resp.read()
-                        await bot.send_voice_message(message["FromWxid"], voice=audio, format="mp3")
+                        await bot.send_voice_message(message["FromWxid"], voice=audio, format="mp3", cache_key=cache_key)
                         logger.info(f"文本转语音成功，{'使用message_id' if message_id else '使用text'}")
                     else:
                         error_text = await resp.text()
@@ -6,9 +6,10 @@ from typing import List, Optional
 from loguru import logger
 from WechatAPI import WechatAPIClient
 from database.XYBotDB import XYBotDB
-from utils.decorators import on_text_message, schedule
+from database.reminder_db import calculate_next_fire, get_reminder_db
+from utils.decorators import on_text_message
 from utils.plugin_base import PluginBase
-import os
+from utils.reminder_scheduler import ReminderScheduler
 import sqlite3
 from datetime import datetime, timedelta
 from dateutil import parser
@@ -19,7 +20,7 @@ from utils.event_manager import EventManager
 class Reminder(PluginBase):
     description = "备忘录插件"
     author = "老夏的金库"
-    version = "1.2.1"  # 更新版本号
+    version = "1.3.0"  # 更新版本号
 
     def __init__(self):
         super().__init__()
@@ -42,8 +43,9 @@ class Reminder(PluginBase):
 
         self.db = XYBotDB()
         self.processed_message_ids = set()
-        self.data_dir = "reminder_data"
-        os.makedirs(self.data_dir, exist_ok=True)
+        self.reminder_db = get_reminder_db()
+        self.scheduler = ReminderScheduler(self.reminder_db, self.fire_reminder)
+        self.bot = None
 
         self.store_command = "记录"
         self.query_command = ["我的记录"]
@@ -58,35 +60,16 @@ class Reminder(PluginBase):
             # ... 添加其他插件的触发命令
         ]
 
-    def get_db_path(self, wxid: str) -> str:
-        db_name = f"user_{wxid}.db"
-        return os.path.join(self.data_dir, db_name)
+    async def on_enable(self, bot=None):
+        await super().on_enable(bot)
+        self.bot = bot
+        await self.scheduler.start()
 
-    def create_table(self, db_path: str):
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS reminders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    wxid TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    reminder_type TEXT NOT NULL,
-                    reminder_time TEXT NOT NULL,
-                    chat_id TEXT NOT NULL,  -- 新增字段，存储创建时的聊天ID
-                    is_done INTEGER NOT NULL DEFAULT 0
-                )
-            """)
-            conn.commit()
-        except sqlite3.Error as e:
-            logger.exception(f"创建数据库表失败: {e}")
-        finally:
-            conn.close()
+    async def on_disable(self):
+        await self.scheduler.stop()
+        await super().on_disable()
 
     async def store_reminder(self, wxid: str, content: str, reminder_type: str, reminder_time: str, chat_id: str) -> Optional[int]:
-        db_path = self.get_db_path(wxid)
-        self.create_table(db_path)
-
         # 如果是相对时间类型，计算绝对时间并转换为 one_time
         if reminder_type in ["minutes_later", "hours_later", "days_later"]:
             now = datetime.now()
@@ -103,72 +86,43 @@ class Reminder(PluginBase):
             reminder_type = "one_time"
 
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO reminders (wxid, content, reminder_type, reminder_time, chat_id) VALUES (?, ?, ?, ?, ?)",
-                           (wxid, content, reminder_type, reminder_time, chat_id))
-            new_id = cursor.lastrowid
-            conn.commit()
+            # 写入后数据库会通知调度器把新提醒放入堆中
+            new_id = self.reminder_db.add(wxid, content, reminder_type, reminder_time, chat_id)
             logger.info(f"用户 {wxid} 存储备忘录成功: {content}, {reminder_type}, {reminder_time}, chat_id={chat_id}")
             return new_id
         except sqlite3.Error as e:
             logger.exception(f"存储备忘录失败: {e}")
             return None
-        finally:
-            conn.close()
 
     async def query_reminders(self, wxid: str) -> List[tuple]:
-        db_path = self.get_db_path(wxid)
-        if not os.path.exists(db_path):
-            return []
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, content, reminder_type, reminder_time, chat_id FROM reminders WHERE wxid = ? AND is_done = 0", (wxid,))
-            results = cursor.fetchall()
-            conn.close()
-            return results
+            return [(r["id"], r["content"], r["reminder_type"], r["reminder_time"], r["chat_id"])
+                    for r in self.reminder_db.list_by_wxid(wxid)]
         except sqlite3.Error as e:
             logger.exception(f"查询用户 {wxid} 的备忘录失败: {e}")
             return []
-        finally:
-            conn.close()
 
     async def delete_reminder(self, wxid: str, reminder_id: int) -> bool:
-        db_path = self.get_db_path(wxid)
-        if not os.path.exists(db_path):
-            logger.warning(f"用户 {wxid} 的数据库不存在")
-            return False
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM reminders WHERE id = ? AND wxid = ?", (reminder_id, wxid))
-            conn.commit()
+            if not self.reminder_db.delete(reminder_id, wxid):
+                logger.warning(f"用户 {wxid} 没有ID为 {reminder_id} 的备忘录")
+                return False
             logger.info(f"删除备忘录 {reminder_id} 成功")
             return True
         except sqlite3.Error as e:
             logger.exception(f"删除备忘录失败: {e}")
             return False
-        finally:
-            conn.close()
 
     async def delete_all_reminders(self, wxid: str) -> bool:
-        db_path = self.get_db_path(wxid)
-        if not os.path.exists(db_path):
-            logger.warning(f"用户 {wxid} 的数据库不存在")
-            return False
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM reminders WHERE wxid = ?", (wxid,))
-            conn.commit()
+            if not self.reminder_db.delete_by_wxid(wxid):
+                logger.warning(f"用户 {wxid} 没有备忘录")
+                return False
             logger.info(f"删除用户 {wxid} 的所有备忘录成功")
             return True
         except sqlite3.Error as e:
             logger.exception(f"删除所有备忘录失败: {e}")
             return False
-        finally:
-            conn.close()
 
     @on_text_message(priority=90)
     async def handle_text(self, bot: WechatAPIClient, message: dict):
@@ -493,81 +447,12 @@ class Reminder(PluginBase):
 
         return True
 
-    @schedule('interval', seconds=30)
-    async def check_reminders(self, bot: WechatAPIClient):
-        now = datetime.now()
-        buffer_time = timedelta(seconds=30)
-        check_start = now - buffer_time
-        check_end = now + buffer_time
-
-        wxids = set()
-
-        for filename in os.listdir(self.data_dir):
-            if filename.startswith("user_") and filename.endswith(".db"):
-                wxid = filename[5:-3]
-                wxids.add(wxid)
-
-        for wxid in wxids:
-            try:
-                reminders = await self.query_reminders(wxid)
-                if reminders:
-                    for id, content, reminder_type, reminder_time, chat_id in reminders:
-                        try:
-                            if reminder_type == "every_day":
-                                next_time = await self.calculate_remind_time("every_day", reminder_time)
-                            else:
-                                next_time = await self.calculate_remind_time(reminder_type, reminder_time)
-
-                            if next_time and check_start <= next_time <= check_end:
-                                await self.send_reminder(bot, wxid, content, id, chat_id)
-
-                                if reminder_type in ["daily", "weekly", "monthly", "yearly", "every_hour", "every_day", "every_week"]:
-                                    new_next_time = await self.calculate_remind_time(reminder_type, reminder_time)
-                                    if new_next_time:
-                                        # 计算下一个周期的提醒时间字符串
-                                        if reminder_type == "weekly":
-                                            # 保持原有星期几部分，更新时间部分
-                                            weekday_part = reminder_time.split()[0]
-                                            time_part = new_next_time.strftime("%H:%M")
-                                            new_reminder_time = f"{weekday_part} {time_part}"
-                                        elif reminder_type == "monthly":
-                                            day_part = reminder_time.split()[0]
-                                            time_part = new_next_time.strftime("%H:%M")
-                                            new_reminder_time = f"{day_part} {time_part}"
-                                        elif reminder_type == "yearly":
-                                            month_part, day_part = reminder_time.split()[:2]
-                                            time_part = new_next_time.strftime("%H:%M")
-                                            new_reminder_time = f"{month_part} {day_part} {time_part}"
-                                        elif reminder_type in ["every_day", "daily"]:
-                                            new_reminder_time = new_next_time.strftime("%H:%M")
-                                        elif reminder_type == "every_hour":
-                                            new_reminder_time = ""
-                                        elif reminder_type == "every_week":
-                                            new_reminder_time = new_next_time.strftime("%H:%M")
-                                        else:
-                                            new_reminder_time = new_next_time.strftime("%Y-%m-%d %H:%M:%S")
-                                        db_path = self.get_db_path(wxid)
-                                        conn = sqlite3.connect(db_path)
-                                        cursor = conn.cursor()
-                                        try:
-                                            cursor.execute(
-                                                "UPDATE reminders SET reminder_time = ? WHERE id = ?",
-                                                (new_reminder_time, id)
-                                            )
-                                            conn.commit()
-                                            logger.info(f"已更新提醒 {id} 的下次提醒时间为 {new_next_time}")
-                                        except sqlite3.Error as e:
-                                            logger.error(f"更新提醒时间失败: {e}")
-                                        finally:
-                                            conn.close()
-                                else:
-                                    await self.delete_reminder(wxid, id)
-
-                        except ValueError as e:
-                            logger.warning(f"时间格式错误，无法执行提醒 {id}: {e}")
-
-            except Exception as e:
-                logger.exception(f"处理用户 {wxid} 的提醒时出错: {e}")
+    async def fire_reminder(self, reminder: dict):
+        """调度器到点后调用"""
+        if self.bot is None:
+            logger.warning(f"提醒 {reminder['id']} 到期时机器人尚未就绪，跳过发送")
+            return
+        await self.send_reminder(self.bot, reminder["wxid"], reminder["content"], reminder["id"], reminder["chat_id"])
 
     async def send_reminder(self, bot: WechatAPIClient, wxid: str, content: str, reminder_id: int, chat_id: str):
         try:
@@ -654,127 +539,7 @@ class Reminder(PluginBase):
             return True
 
     async def calculate_remind_time(self, reminder_type: str, reminder_time: str) -> Optional[datetime]:
-        from datetime import timedelta  # 确保timedelta在本地作用域可用
-        now = datetime.now()
-        try:
-            if reminder_type == "one_time":
-                if isinstance(reminder_time, str):
-                    try:
-                        # 尝试标准格式
-                        return datetime.strptime(reminder_time, '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        try:
-                            # 尝试 ISO 8601 格式 (带Z的UTC时间)
-                            if reminder_time.endswith('Z'):
-                                # 移除Z并解析
-                                dt = datetime.fromisoformat(reminder_time.replace('Z', '+00:00'))
-                                # 转换为本地时间 (UTC+8)
-                                from datetime import timezone, timedelta
-                                china_timezone = timezone(timedelta(hours=8))
-                                local_dt = dt.astimezone(china_timezone)
-                                logger.info(f"将UTC时间 {dt} 转换为中国时间 {local_dt}")
-                                return local_dt.replace(tzinfo=None)
-                            else:
-                                # 尝试其他ISO格式
-                                return datetime.fromisoformat(reminder_time)
-                        except ValueError:
-                            logger.warning(f"无法解析 one_time 时间格式: {reminder_time}")
-                            return None
-                return None
-
-            elif reminder_type == "every_day":
-                if not reminder_time:
-                    return None
-                hour, minute = map(int, reminder_time.split(":"))
-                next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                if next_time <= now:
-                    next_time += timedelta(days=1)
-                return next_time
-
-            elif reminder_type == "daily":
-                hour, minute = map(int, reminder_time.split(":"))
-                next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                if next_time <= now:
-                    next_time += timedelta(days=1)
-                return next_time
-
-            elif reminder_type == "weekly":
-                weekday_str, time_str = reminder_time.split()
-                hour, minute = map(int, time_str.split(":"))
-
-                # 处理多个星期几的情况，如 "1,2,3,4,5"
-                if "," in weekday_str:
-                    weekdays = [int(day) for day in weekday_str.split(",")]
-                    # 让1=周一, ..., 6=周六, 0=周日
-                    current_weekday = (now.weekday() + 1) % 7  # 0=周日, 1=周一, ..., 6=周六
-
-                    # 计算每个星期几距离现在的天数
-                    days_ahead_list = []
-                    for day in weekdays:
-                        days = day - current_weekday
-                        if days < 0:
-                            days += 7
-                        days_ahead_list.append(days)
-
-                    # 选择最近的一天
-                    days_ahead = min(days_ahead_list)
-                else:
-                    # 单个星期几的情况
-                    weekday = int(weekday_str)
-                    current_weekday = (now.weekday() + 1) % 7  # 0=周日, 1=周一, ..., 6=周六
-                    days_ahead = weekday - current_weekday
-                    if days_ahead < 0:
-                        days_ahead += 7
-
-                next_time = now + timedelta(days=days_ahead)
-                next_time = next_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
-
-                # 检查是否已经过了今天的提醒时间
-                if days_ahead == 0 and next_time <= now:
-                    next_time += timedelta(days=7)
-
-                return next_time
-
-            elif reminder_type == "monthly":
-                day, time_str = reminder_time.split()
-                day = int(day)
-                hour, minute = map(int, time_str.split(":"))
-                next_time = now.replace(day=day, hour=hour, minute=minute, second=0, microsecond=0)
-                if next_time <= now:
-                    month = next_time.month + 1
-                    year = next_time.year
-                    if month > 12:
-                        month = 1
-                        year += 1
-                    next_time = next_time.replace(year=year, month=month)
-                return next_time
-
-            elif reminder_type == "yearly":
-                month, day, time_str = reminder_time.split()
-                month, day = int(month), int(day)
-                hour, minute = map(int, time_str.split(":"))
-                next_time = now.replace(month=month, day=day, hour=hour, minute=minute, second=0, microsecond=0)
-                if next_time <= now:
-                    next_time = next_time.replace(year=now.year + 1)
-                return next_time
-
-            elif reminder_type == "every_hour":
-                next_time = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-                return next_time
-
-            elif reminder_type == "every_week":
-                hour, minute = map(int, reminder_time.split(":"))
-                next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                if next_time <= now:
-                    next_time += timedelta(days=7)
-                return next_time
-
-            else:
-                logger.warning(f"未知的提醒类型: {reminder_type}")
-                return None
-        except ValueError as e:
-            logger.warning(f"时间格式错误: {reminder_time}, 错误信息: {e}")
-            return None
+        return calculate_next_fire(reminder_type, reminder_time)
 
     async def create_reminder_task(self, bot: WechatAPIClient, wxid: str, content: str, remind_time: datetime, message_id: int, new_id: int):
         now = datetime.now()
@@ -0,0 +1,89 @@
+import asyncio
+import gzip
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "admin"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from middleware import add_middlewares  # noqa: E402
+from system_sampler import SystemSampler  # noqa: E402
+
+
+def make_app():
+    """与管理后台相同的中间件，加上一个 SSE 接口和一个普通 JSON 接口"""
+    app = FastAPI()
+    add_middlewares(app)
+    sampler = SystemSampler(interval=60)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(sampler.stream(), media_type="text/event-stream")
+
+    @app.get("/json")
+    async def json_api():
+        return JSONResponse({"data": "x" * 2000})
+
+    return app
+
+
+async def request(app, path, accept, until):
+    """直接调用 ASGI 应用，收到的响应满足 until 时断开连接，返回 (响应头, 响应体)"""
+    disconnected = asyncio.Event()
+    messages = []
+    received = asyncio.Event()
+
+    async def receive():
+        if not messages:
+            messages.append(None)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    headers = {}
+    body = bytearray()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            headers.update((k.decode(), v.decode()) for k, v in message["headers"])
+        elif message["type"] == "http.response.body":
+            body.extend(message.get("body", b""))
+            if until(body) or not message.get("more_body", False):
+                received.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"accept", accept.encode()), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 12345), "server": ("testserver", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, send))
+    try:
+        await asyncio.wait_for(received.wait(), timeout=5)
+    finally:
+        disconnected.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    return headers, bytes(body)
+
+
+class TestAdminMiddleware(unittest.TestCase):
+    def test_sse_event_not_buffered_by_gzip(self):
+        """SSE 第一条事件应当立即送达，且不被压缩"""
+        headers, body = asyncio.run(request(make_app(), "/stream", "text/event-stream",
+                                            lambda body: b"\n\n" in body))
+        self.assertNotIn("content-encoding", headers)
+        self.assertTrue(body.startswith(b"event: snapshot\ndata: "))
+
+    def test_json_still_compressed(self):
+        """普通接口仍然按原配置压缩"""
+        headers, body = asyncio.run(request(make_app(), "/json", "application/json", lambda body: False))
+        self.assertEqual(headers.get("content-encoding"), "gzip")
+        self.assertIn(b'"data"', gzip.decompress(body))
+
+
+if __name__ == "__main__":
+    unittest.main()
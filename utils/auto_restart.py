@@ -13,6 +13,7 @@ from loguru import logger
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from admin.restart_api import restart_system
 from utils.notification_service import get_notification_service
+from utils.log_index import log_index
 
 class AutoRestartMonitor:
     """自动检测掉线并重启的监控器"""
@@ -74,8 +75,8 @@ class AutoRestartMonitor:
         self.failure_count = 0
         self.last_failure_time = 0
 
-        # 已处理的日志行哈希集合，用于避免重复计数
-        self.processed_log_hashes = set()
+        # 已处理到的日志索引序号，用于避免重复计数
+        self.log_seq = 0
         # 最后一次检查的时间
         self.last_check_time = 0
 
@@ -205,7 +206,6 @@ class AutoRestartMonitor:
 
             current_time = time.time()
             # 更新最后一次检查的时间
-            last_check_time = self.last_check_time
             self.last_check_time = current_time
 
             status = status_data.get("status", "unknown")
@@ -223,104 +223,41 @@ class AutoRestartMonitor:
                 if self.check_offline_trace:
                     # 检查日志中是否有“获取新消息失败”的记录
                     try:
-                        # 获取日志目录
-                        logs_dir = Path(self.admin_path) / "logs"
-
-                        # 获取最新的日志文件
-                        latest_log_file = None
-                        latest_mtime = 0
-
-                        # 遍历日志目录中的所有文件
-                        for log_file in logs_dir.glob("XYBot_*.log"):
-                            # 获取文件的修改时间
-                            mtime = os.path.getmtime(log_file)
-                            # 如果这个文件比当前找到的最新文件还新，则更新
-                            if mtime > latest_mtime:
-                                latest_log_file = log_file
-                                latest_mtime = mtime
-
-                        # 如果找到了日志文件
-                        if latest_log_file and latest_log_file.exists():
-                            logger.debug(f"检查最新的日志文件: {latest_log_file}")
-                            # 检查最近的日志条目
-                            with open(latest_log_file, "r", encoding="utf-8", errors="ignore") as f:
-                                # 读取最后1000行日志
-                                lines = f.readlines()
-                                if len(lines) > 1000:
-                                    lines = lines[-1000:]
-
-                                # 记录本次检查中发现的新失败数
-                                new_failures_this_check = 0
-
-                                # 检查最近的日志中是否有“获取新消息失败”的记录
-                                for line in reversed(lines):
-                                    # 如果找到“获取新消息失败”的记录
-                                    if "获取新消息失败" in line:
-                                        # 计算日志行的哈希值，用于唯一标识
-                                        line_hash = hash(line.strip())
-
-                                        # 如果这一行已经处理过，则跳过
-                                        if line_hash in self.processed_log_hashes:
-                                            continue
-
-                                        # 提取时间戳
-                                        try:
-                                            # XYBot 日志格式可能是多种的，尝试不同的格式
-                                            # 尝试格式 1: "YYYY-MM-DD HH:MM:SS | LEVEL | 消息内容"
-                                            if " | " in line:
-                                                timestamp_str = line.split(" | ")[0]
-                                                try:
-                                                    log_time = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                                                except ValueError:
-                                                    # 尝试其他格式
-                                                    raise
-                                            # 尝试格式 2: 其他可能的格式
-                                            else:
-                                                # 如果没有找到时间戳，使用文件修改时间
-                                                log_time = datetime.fromtimestamp(latest_mtime)
-                                            log_timestamp = log_time.timestamp()
-
-                                            # 检查这条日志是否在最近的离线阈值时间内
-                                            if current_time - log_timestamp < self.offline_threshold:
-                                                # 检查是否是上次检查之后的新日志
-                                                if log_timestamp > last_check_time:
-                                                    # 将这一行添加到已处理集合
-                                                    self.processed_log_hashes.add(line_hash)
-
-                                                    # 更新最后失败时间
-                                                    self.last_failure_time = log_timestamp
-                                                    # 增加失败计数
-                                                    self.failure_count += 1
-                                                    new_failures_this_check += 1
-                                                    logger.warning(f"检测到新的'获取新消息失败'记录，当前失败计数: {self.failure_count}/{self.failure_count_threshold}")
-
-                                                    # 如果达到失败阈值，标记为掉线
-                                                    if self.failure_count >= self.failure_count_threshold:
-                                                        has_offline_trace = True
-                                                        logger.warning(f"连续检测到 {self.failure_count} 次'获取新消息失败'，超过阈值 {self.failure_count_threshold}，判断为掉线状态")
-                                                        # 重置失败计数器，防止重复触发
-                                                        self.failure_count = 0
-                                                        # 立即跳出循环，不再检查其他日志
-                                                        break
-                                                else:
-                                                    # 将这一行添加到已处理集合，但不增加计数
-                                                    self.processed_log_hashes.add(line_hash)
-
-                                                # 如果已经达到阈值，则跳出循环
-                                                if has_offline_trace:
-                                                    break
-                                        except Exception as e:
-                                            logger.error(f"解析日志时间戳失败: {e}")
-
-                                # 如果本次检查没有发现新的失败，则更新最后失败时间
-                                if new_failures_this_check == 0 and self.failure_count > 0:
-                                    logger.debug(f"本次检查没有发现新的失败记录，当前失败计数保持为: {self.failure_count}")
-
-                                # 定期清理已处理的日志行集合，防止内存泄漏
-                                if len(self.processed_log_hashes) > 10000:  # 如果超过一定数量，清理旧的哈希
-                                    logger.info(f"清理已处理的日志行哈希集合，当前大小: {len(self.processed_log_hashes)}")
-                                    self.processed_log_hashes = set()
-                                    logger.info("已清理已处理的日志行哈希集合")
+                        # 从共享的日志索引中只取上次检查之后新写入的日志
+                        entries, self.log_seq = await asyncio.to_thread(log_index.read_since, self.log_seq)
+
+                        # 记录本次检查中发现的新失败数
+                        new_failures_this_check = 0
+
+                        for entry in entries:
+                            if "获取新消息失败" not in entry.raw:
+                                continue
+
+                            # 没有时间戳的行按当前时间处理
+                            log_timestamp = entry.ts if entry.ts is not None else current_time
+
+                            # 只统计最近的离线阈值时间内的日志
+                            if current_time - log_timestamp >= self.offline_threshold:
+                                continue
+
+                            # 更新最后失败时间
+                            self.last_failure_time = log_timestamp
+                            # 增加失败计数
+                            self.failure_count += 1
+                            new_failures_this_check += 1
+                            logger.warning(f"检测到新的'获取新消息失败'记录，当前失败计数: {self.failure_count}/{self.failure_count_threshold}")
+
+                            # 如果达到失败阈值，标记为掉线
+                            if self.failure_count >= self.failure_count_threshold:
+                                has_offline_trace = True
+                                logger.warning(f"连续检测到 {self.failure_count} 次'获取新消息失败'，超过阈值 {self.failure_count_threshold}，判断为掉线状态")
+                                # 重置失败计数器，防止重复触发
+                                self.failure_count = 0
+                                break
+
+                        # 如果本次检查没有发现新的失败，则更新最后失败时间
+                        if new_failures_this_check == 0 and self.failure_count > 0:
+                            logger.debug(f"本次检查没有发现新的失败记录，当前失败计数保持为: {self.failure_count}")
                     except Exception as e:
                         logger.error(f"检查系统日志时出错: {e}")
 
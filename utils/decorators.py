@@ -56,8 +56,14 @@ def remove_job_safe(scheduler: AsyncIOScheduler, job_id: str):
         pass
 
 
-def on_text_message(priority=50):
-    """文本消息装饰器"""
+def on_text_message(priority=50, observer=False):
+    """文本消息装饰器
+
+    Args:
+        priority: 优先级，0-99，越大越先处理
+        observer: 是否为观察者。观察者从不返回 False 阻止后续处理，
+                  同一优先级上相邻的观察者会被并发执行
+    """
     def decorator(func):
         if callable(priority):  # 无参数调用时
             func_to_decorate = priority
@@ -67,12 +73,13 @@ def on_text_message(priority=50):
         # 有参数调用时
         setattr(func, '_event_type', 'text_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_image_message(priority=50):
+def on_image_message(priority=50, observer=False):
     """图片消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -82,12 +89,13 @@ def on_image_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'image_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_voice_message(priority=50):
+def on_voice_message(priority=50, observer=False):
     """语音消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -97,12 +105,13 @@ def on_voice_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'voice_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_emoji_message(priority=50):
+def on_emoji_message(priority=50, observer=False):
     """表情消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -112,12 +121,13 @@ def on_emoji_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'emoji_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_file_message(priority=50):
+def on_file_message(priority=50, observer=False):
     """文件消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -127,12 +137,13 @@ def on_file_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'file_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_quote_message(priority=50):
+def on_quote_message(priority=50, observer=False):
     """引用消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -142,12 +153,13 @@ def on_quote_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'quote_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_video_message(priority=50):
+def on_video_message(priority=50, observer=False):
     """视频消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -157,12 +169,13 @@ def on_video_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'video_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_pat_message(priority=50):
+def on_pat_message(priority=50, observer=False):
     """拍一拍消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -172,12 +185,13 @@ def on_pat_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'pat_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_at_message(priority=50):
+def on_at_message(priority=50, observer=False):
     """被@消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -187,12 +201,13 @@ def on_at_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'at_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_system_message(priority=50):
+def on_system_message(priority=50, observer=False):
     """系统消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -202,12 +217,13 @@ def on_system_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'system_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_other_message(priority=50):
+def on_other_message(priority=50, observer=False):
     """其他消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -217,12 +233,13 @@ def on_other_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'other_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_article_message(priority=50):
+def on_article_message(priority=50, observer=False):
     """公众号文章消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -232,12 +249,13 @@ def on_article_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'article_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
 
 
-def on_xml_message(priority=50):
+def on_xml_message(priority=50, observer=False):
     """XML消息装饰器"""
     def decorator(func):
         if callable(priority):
@@ -247,6 +265,7 @@ def on_xml_message(priority=50):
             return func_to_decorate
         setattr(func, '_event_type', 'xml_message')
         setattr(func, '_priority', min(max(priority, 0), 99))
+        setattr(func, '_observer', bool(observer))
         return func
 
     return decorator if not callable(priority) else decorator(priority)
\ No newline at end of file
@@ -1,10 +1,124 @@
+import asyncio
 import copy
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 消息拷贝模式
+COPY_MODE_DEEPCOPY = "deepcopy"  # 每个处理函数拿到一份完整的深拷贝（旧行为）
+COPY_MODE_COW = "cow"  # 每个处理函数拿到一份写时复制的消息视图
+
+_MUTABLE_TYPES = (dict, list, set, bytearray)
+
+
+class MessageView(dict):
+    """写时复制的消息视图
+
+    创建时只做一次浅拷贝，顶层键的增删改只影响当前视图；
+    嵌套的可变对象（列表、字典等）在第一次读取时才深拷贝到当前视图中，
+    因此处理函数修改消息不会影响到其他处理函数。
+    需要一份完全独立的消息时调用 fork()。
+    """
+
+    __slots__ = ("_owned",)
+
+    def __init__(self, base: dict):
+        super().__init__(base)
+        self._owned = set()
+
+    def _own(self, key, value):
+        if isinstance(value, _MUTABLE_TYPES) and key not in self._owned:
+            value = copy.deepcopy(value)
+            dict.__setitem__(self, key, value)
+            self._owned.add(key)
+        return value
+
+    def __getitem__(self, key):
+        return self._own(key, dict.__getitem__(self, key))
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._owned.add(key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *args):
+        if key in self:
+            value = self[key]
+            dict.__delitem__(self, key)
+            self._owned.discard(key)
+            return value
+        return dict.pop(self, key, *args)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def copy(self) -> "MessageView":
+        return MessageView(self)
+
+    def fork(self) -> dict:
+        """返回一份完全独立的深拷贝，供需要大量修改消息的插件使用"""
+        return copy.deepcopy(dict(self))
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
 
 
 class EventManager:
     _handlers: Dict[str, List[tuple[Callable, object, int]]] = {}
+    # 每个事件按优先级分好层的处理函数，在绑定/解绑时计算，emit 时直接遍历
+    # 每一层为 (是否为观察者层, 处理函数元组)，同一优先级上相邻的观察者合并为一层并发执行
+    _dispatch: Dict[str, Tuple[Tuple[bool, Tuple[tuple[Callable, object, int], ...]], ...]] = {}
     _method_priorities: Dict[str, Dict[str, int]] = {}  # 存储每个插件方法的原始优先级
+    copy_mode: str = COPY_MODE_COW
+    # 观察者层的超时时间（秒），超时后不再等待，未完成的处理函数继续在后台运行；None 表示不限制
+    observer_timeout: Optional[float] = 60
+
+    @classmethod
+    def set_copy_mode(cls, mode: str):
+        """设置分发消息时的拷贝模式
+
+        Args:
+            mode: "cow" 写时复制视图（默认），"deepcopy" 每个处理函数深拷贝一次
+        """
+        if mode not in (COPY_MODE_COW, COPY_MODE_DEEPCOPY):
+            from loguru import logger
+            logger.warning(f"未知的事件消息拷贝模式: {mode}，使用默认值 {COPY_MODE_COW}")
+            mode = COPY_MODE_COW
+        cls.copy_mode = mode
+
+    @classmethod
+    def set_observer_timeout(cls, timeout: Optional[float]):
+        """设置观察者层的超时时间（秒），0 或 None 表示不限制"""
+        cls.observer_timeout = timeout if timeout and timeout > 0 else None
+
+    @classmethod
+    def _rebuild_dispatch(cls, event_type: str):
+        """重新计算某个事件的处理函数分层，优先级高的在前，同优先级保持绑定顺序"""
+        ordered = sorted(cls._handlers.get(event_type, ()), key=lambda x: x[2], reverse=True)
+        tiers = []
+        for entry in ordered:
+            handler, instance, priority = entry
+            is_observer = getattr(handler, '_observer', False)
+            # 与上一层同为观察者且优先级相同，则合并到上一层
+            if is_observer and tiers and tiers[-1][0] and tiers[-1][1][-1][2] == priority:
+                tiers[-1][1].append(entry)
+            else:
+                tiers.append((is_observer, [entry]))
+        cls._dispatch[event_type] = tuple((is_observer, tuple(entries)) for is_observer, entries in tiers)
 
     @classmethod
     def bind_instance(cls, instance: object):
@@ -16,6 +130,7 @@ class EventManager:
         # 收集插件中所有方法的原始优先级
         plugin_name = instance.__class__.__name__
         method_priorities = {}
+        bound_events = set()
 
         for method_name in dir(instance):
             method = getattr(instance, method_name)
@@ -47,9 +162,11 @@ class EventManager:
                 if event_type not in cls._handlers:
                     cls._handlers[event_type] = []
                 cls._handlers[event_type].append((method, instance, final_priority))
-                # 按优先级排序，优先级高的在前
-                cls._handlers[event_type].sort(key=lambda x: x[2], reverse=True)
+                bound_events.add(event_type)
 
+        # 所有方法绑定完成后，每个事件只排序一次
+        for event_type in bound_events:
+            cls._rebuild_dispatch(event_type)
         # 存储插件的方法优先级
         cls._method_priorities[plugin_name] = method_priorities
 
@@ -68,7 +185,8 @@ class EventManager:
         # 提取 callback 参数，如果没有则为 None
         callback = kwargs.pop('callback', None)
 
-        if event_type not in cls._handlers:
+        handlers = cls._dispatch.get(event_type)
+        if not handlers:
             # 如果有回调函数，调用它并传递 None
             if callback:
                 callback(None)
@@ -76,11 +194,20 @@ class EventManager:
 
         api_client, message = args
         final_result = None
+        isolate = cls._isolate_deepcopy if cls.copy_mode == COPY_MODE_DEEPCOPY else cls._isolate_cow
+
+        for is_observer, tier in handlers:
+            if is_observer:
+                # 观察者不会阻止后续处理，同一层并发执行
+                for result in await cls._run_observers(tier, api_client, message, kwargs, isolate):
+                    if result is not None:
+                        final_result = result
+                continue
 
-        for handler, instance, priority in cls._handlers[event_type]:
-            # 只对 message 进行深拷贝，api_client 保持不变
-            handler_args = (api_client, copy.deepcopy(message))
-            new_kwargs = {k: copy.deepcopy(v) for k, v in kwargs.items()}
+            handler, instance, priority = tier[0]
+            # 只隔离 message 和 kwargs，api_client 保持不变
+            handler_args = (api_client, isolate(message))
+            new_kwargs = {k: isolate(v) for k, v in kwargs.items()}
 
             result = await handler(*handler_args, **new_kwargs)
 
@@ -104,6 +231,65 @@ class EventManager:
 
         return final_result
 
+    @classmethod
+    async def _run_observers(cls, tier, api_client, message, kwargs, isolate) -> List:
+        """并发执行一层观察者，返回按绑定顺序排列的结果，超时或出错的处理函数结果为 None"""
+        from loguru import logger
+
+        tasks = [
+            asyncio.ensure_future(handler(api_client, isolate(message), **{k: isolate(v) for k, v in kwargs.items()}))
+            for handler, instance, priority in tier
+        ]
+
+        done, pending = await asyncio.wait(tasks, timeout=cls.observer_timeout)
+
+        results = []
+        for (handler, instance, priority), task in zip(tier, tasks):
+            plugin_name = instance.__class__.__name__
+            if task in pending:
+                # 不取消，让其在后台继续执行，只是不再阻塞后续处理函数
+                logger.warning(f"插件 {plugin_name} 的观察者 {handler.__name__} 超过 {cls.observer_timeout} 秒未完成，继续执行后续处理")
+                task.add_done_callback(cls._log_observer_exception)
+                results.append(None)
+            elif task.cancelled():
+                logger.warning(f"插件 {plugin_name} 的观察者 {handler.__name__} 被取消")
+                results.append(None)
+            elif task.exception() is not None:
+                logger.error(f"插件 {plugin_name} 的观察者 {handler.__name__} 执行出错: {task.exception()}")
+                results.append(None)
+            else:
+                result = task.result()
+                if result is False:
+                    logger.warning(f"插件 {plugin_name} 的观察者 {handler.__name__} 返回了 False，观察者不能阻止后续处理")
+                    result = None
+                results.append(result)
+        return results
+
+    @staticmethod
+    def _log_observer_exception(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            from loguru import logger
+            logger.error(f"后台观察者执行出错: {task.exception()}")
+
+    @staticmethod
+    def _isolate_deepcopy(value):
+        value = copy.deepcopy(value)
+        if isinstance(value, dict):
+            # 同样包装为 MessageView，两种模式下处理函数都可以调用 fork()；
+            # 内容已经是独立的深拷贝，全部标记为已拥有，读取时不再拷贝
+            view = MessageView(value)
+            view._owned.update(value)
+            return view
+        return value
+
+    @staticmethod
+    def _isolate_cow(value):
+        if isinstance(value, dict):
+            return MessageView(value)
+        if isinstance(value, _MUTABLE_TYPES):
+            return copy.deepcopy(value)
+        return value
+
     @classmethod
     def unbind_instance(cls, instance: object):
         """解绑实例的所有事件处理函数"""
@@ -120,6 +306,7 @@ class EventManager:
                 for handler, inst, priority in cls._handlers[event_type]
                 if inst is not instance
             ]
+            cls._rebuild_dispatch(event_type)
 
     @classmethod
     def get_method_priorities(cls, plugin_name: str) -> Dict[str, int]:
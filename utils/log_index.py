@@ -0,0 +1,373 @@
+"""
+日志增量索引
+
+管理后台的 /api/system/logs 原先每次请求都要 glob 十个路径、readlines() 读入整个最新日志文件，
+再对每一行执行三次正则；自动重启监控也每分钟把整个日志文件读入内存查找掉线记录。
+日志保留两周、单日日志可达数百 MB，一次请求就要数秒并占用大量内存。
+
+这里改为一个共享的日志索引：
+- 为每个日志文件记录已解析到的字节偏移，每次只读取并解析新追加的字节
+- 解析结果（级别、时间戳、消息）放在环形缓冲区中，每条记录带有递增序号，
+  自动重启监控按序号只处理上次检查之后的新日志
+- 查询最后 N 行时缓冲区不够，再从文件末尾向前按块读取，不读入整个文件
+- 日志按时间顺序写入，按时间范围查询时用二分查找直接定位到文件中的偏移
+"""
+
+import glob
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 日志文件可能的位置，按 XYBot_{time}.log 写入，旧版本使用 latest.log / xybot.log
+LOG_PATTERNS = [
+    os.path.join(ROOT_DIR, "logs", "XYBot_*.log"),
+    os.path.join(ROOT_DIR, "logs", "latest.log"),
+    os.path.join(ROOT_DIR, "logs", "xybot.log"),
+    os.path.join(ROOT_DIR, "_data", "logs", "XYBot_*.log"),
+]
+
+LEVELS = ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+
+# 与 main.py 中的日志格式对应: "YYYY-MM-DD HH:mm:ss | LEVEL    | module:line | message"
+_LINE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})?.*?\|\s*(" + "|".join(LEVELS) + r")\s*\|\s*(.*)$")
+_TIME_RE = re.compile(r"(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2})")
+
+# 反向读取的块大小
+BLOCK_SIZE = 256 * 1024
+
+
+class LogEntry(NamedTuple):
+    """解析后的一行日志"""
+    seq: int
+    path: str
+    offset: int
+    ts: Optional[float]
+    timestamp: Optional[str]
+    level: str
+    message: str
+    raw: str
+
+    def to_dict(self) -> Dict[str, str]:
+        entry = {"raw": self.raw, "level": self.level, "message": self.message}
+        if self.timestamp:
+            entry["timestamp"] = self.timestamp
+        return entry
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(timestamp: str) -> Optional[float]:
+    # 同一秒内的日志很多，缓存解析结果
+    try:
+        return datetime.strptime(" ".join(timestamp.split()), "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+def parse_line(raw: str) -> Tuple[Optional[float], Optional[str], str, str]:
+    """解析一行日志，返回 (时间戳, 时间字符串, 级别, 消息)
+
+    无法识别级别的行（例如异常堆栈）级别记为 info，消息为整行
+    """
+    match = _LINE_RE.match(raw)
+    if match:
+        timestamp, level, message = match.group(1), match.group(2).lower(), match.group(3).strip()
+        if level == "success":
+            level = "info"
+    else:
+        time_match = _TIME_RE.search(raw)
+        timestamp, level, message = time_match.group(1) if time_match else None, "info", raw
+
+    ts = _parse_time(timestamp) if timestamp else None
+    if ts is None:
+        timestamp = None
+    return ts, timestamp, level, message
+
+
+class _FileState:
+    """单个日志文件的索引状态"""
+
+    def __init__(self, path: str, offset: int):
+        self.path = path
+        self.inode = None
+        # 已解析到的字节偏移，总是位于行首
+        self.offset = offset
+        # 增量解析的起点，之前的内容只能反向读取
+        self.start_offset = offset
+
+
+class LogIndex:
+    """共享的日志增量索引，管理后台线程和机器人事件循环都会调用，内部加锁
+
+    Args:
+        patterns: 日志文件的 glob 路径
+        buffer_size: 环形缓冲区保留的日志条数
+        initial_bytes: 第一次打开一个已有的大文件时，只从末尾这么多字节开始增量解析
+        rescan_interval: 重新 glob 日志文件列表的最小间隔（秒）
+    """
+
+    def __init__(self, patterns: List[str] = None, buffer_size: int = 5000,
+                 initial_bytes: int = 1024 * 1024, rescan_interval: float = 5.0):
+        self.patterns = patterns or LOG_PATTERNS
+        self.initial_bytes = initial_bytes
+        self.rescan_interval = rescan_interval
+        self.entries: Deque[LogEntry] = deque(maxlen=buffer_size)
+
+        self._lock = threading.RLock()
+        self._files: Dict[str, _FileState] = {}
+        self._log_files: List[str] = []
+        self._current: Optional[str] = None
+        self._last_scan = 0.0
+        self._seq = 0
+
+        self.stats = {"refreshes": 0, "bytes_parsed": 0, "lines_parsed": 0, "reverse_bytes": 0}
+
+    # ---------- 文件发现 ----------
+
+    def _scan_files(self, force: bool = False):
+        now = time.monotonic()
+        if not force and self._current and now - self._last_scan < self.rescan_interval \
+                and os.path.exists(self._current):
+            return
+        self._last_scan = now
+
+        found = {}
+        for pattern in self.patterns:
+            for path in glob.glob(pattern):
+                if os.path.isfile(path):
+                    found[os.path.realpath(path)] = None
+        self._log_files = list(found)
+        if not self._log_files:
+            self._current = None
+            return
+
+        latest = max(self._log_files, key=os.path.getmtime)
+        if latest != self._current:
+            previous = self._current
+            if previous and previous in self._files:
+                # 日志轮转：先把旧文件剩余的内容解析完，不遗漏轮转前的最后几行
+                self._read_appended(self._files[previous])
+            # 启动后第一次打开的文件只从末尾开始解析，轮转产生的新文件从头解析
+            self._current = latest
+            if latest not in self._files:
+                self._files[latest] = self._open_state(latest, from_start=previous is not None)
+
+        # 已删除的文件（超过保留期）不再跟踪
+        for path in list(self._files):
+            if path not in found:
+                del self._files[path]
+
+    def _open_state(self, path: str, from_start: bool) -> _FileState:
+        size = os.path.getsize(path)
+        if from_start or size <= self.initial_bytes:
+            return _FileState(path, 0)
+
+        # 从末尾 initial_bytes 处开始，对齐到下一行的行首
+        with open(path, "rb") as f:
+            f.seek(size - self.initial_bytes)
+            f.readline()
+            return _FileState(path, f.tell())
+
+    # ---------- 增量解析 ----------
+
+    def _read_appended(self, state: _FileState):
+        try:
+            stat = os.stat(state.path)
+        except OSError:
+            return
+        if state.inode is not None and (stat.st_ino != state.inode or stat.st_size < state.offset):
+            # 文件被截断或替换，重新解析
+            logger.debug(f"日志文件已被截断或替换，重新建立索引: {state.path}")
+            self.entries = deque((entry for entry in self.entries if entry.path != state.path),
+                                 maxlen=self.entries.maxlen)
+            state.offset = state.start_offset = 0
+        state.inode = stat.st_ino
+        if stat.st_size <= state.offset:
+            return
+
+        with open(state.path, "rb") as f:
+            f.seek(state.offset)
+            data = f.read(stat.st_size - state.offset)
+
+        # 最后一行可能还没有写完，留到下次解析
+        end = data.rfind(b"\n")
+        if end < 0:
+            return
+        data = data[:end + 1]
+
+        offset = state.offset
+        for line in data.split(b"\n")[:-1]:
+            line_offset = offset
+            offset += len(line) + 1
+            raw = line.decode("utf-8", errors="ignore").strip()
+            if not raw:
+                continue
+            ts, timestamp, level, message = parse_line(raw)
+            self._seq += 1
+            self.entries.append(LogEntry(self._seq, state.path, line_offset, ts, timestamp, level, message, raw))
+            self.stats["lines_parsed"] += 1
+
+        state.offset = offset
+        self.stats["bytes_parsed"] += len(data)
+
+    def refresh(self):
+        """发现日志文件并解析当前文件新追加的内容"""
+        with self._lock:
+            self._scan_files()
+            if self._current:
+                self._read_appended(self._files[self._current])
+            self.stats["refreshes"] += 1
+
+    # ---------- 查询 ----------
+
+    @property
+    def current_file(self) -> Optional[str]:
+        return self._current
+
+    @property
+    def log_files(self) -> List[str]:
+        return list(self._log_files)
+
+    def read_since(self, seq: int = 0) -> Tuple[List[LogEntry], int]:
+        """返回序号大于 seq 的缓冲日志（按时间顺序）和最新的序号
+
+        调用方保存返回的序号，下次只会得到新的日志
+        """
+        with self._lock:
+            self.refresh()
+            new_entries = []
+            for entry in reversed(self.entries):
+                if entry.seq <= seq:
+                    break
+                new_entries.append(entry)
+            new_entries.reverse()
+            return new_entries, self._seq
+
+    def _iter_reverse(self, path: str, end: int) -> Iterator[Tuple[int, str]]:
+        """从 end 偏移处向前按块读取文件，逐行产出 (行首偏移, 内容)，end 必须位于行首"""
+        with open(path, "rb") as f:
+            pos = end
+            head = b""
+            while pos > 0:
+                size = min(BLOCK_SIZE, pos)
+                pos -= size
+                f.seek(pos)
+                chunk = f.read(size) + head
+                self.stats["reverse_bytes"] += size
+                lines = chunk.split(b"\n")
+                # 第一段可能是不完整的行，与前一块拼接后再处理
+                head = lines[0]
+                line_end = pos + len(chunk)
+                for line in reversed(lines[1:]):
+                    line_end -= len(line) + 1
+                    yield line_end + 1, line.decode("utf-8", errors="ignore").strip()
+            if head:
+                yield 0, head.decode("utf-8", errors="ignore").strip()
+
+    def _seek_time(self, path: str, until: float, end: int) -> int:
+        """二分查找 [0, end) 中第一行时间晚于 until 的行首偏移，之后的内容都不需要读取"""
+        lo, hi = 0, end
+        with open(path, "rb") as f:
+            while hi - lo > BLOCK_SIZE:
+                mid = (lo + hi) // 2
+                f.seek(mid)
+                # 跳过不完整的行
+                f.readline()
+                start = line_start = f.tell()
+                ts = None
+                while ts is None and f.tell() < hi:
+                    line_start = f.tell()
+                    ts = parse_line(f.readline().decode("utf-8", errors="ignore").strip())[0]
+                if ts is None:
+                    # mid 之后没有带时间的行
+                    if start >= hi:
+                        break
+                    hi = start
+                elif ts > until:
+                    hi = line_start
+                else:
+                    lo = f.tell()
+        return hi
+
+    def tail(self, limit: int = 0, level: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None,
+             predicate: Callable[[LogEntry], bool] = None) -> List[Dict[str, str]]:
+        """返回当前日志文件最后 limit 条符合条件的日志（按时间顺序）
+
+        Args:
+            limit: 返回条数，0 表示不限
+            level: 只返回该级别的日志
+            since: 只返回该时间戳之后的日志
+            until: 只返回该时间戳之前的日志
+            predicate: 额外的过滤条件
+        """
+        level = level.lower() if level else None
+
+        def matches(entry: LogEntry) -> bool:
+            if level and entry.level != level:
+                return False
+            if until is not None and entry.ts is not None and entry.ts > until:
+                return False
+            return predicate is None or predicate(entry)
+
+        with self._lock:
+            self.refresh()
+            path = self._current
+            if not path:
+                return []
+            state = self._files[path]
+
+            results: List[LogEntry] = []
+            scan_end = state.start_offset
+            for entry in reversed(self.entries):
+                if entry.path != path:
+                    continue
+                # 日志按时间顺序写入，早于 since 即可停止
+                if since is not None and entry.ts is not None and entry.ts < since:
+                    return [entry.to_dict() for entry in reversed(results)]
+                scan_end = entry.offset
+                if matches(entry):
+                    results.append(entry)
+                    if limit and len(results) >= limit:
+                        return [entry.to_dict() for entry in reversed(results)]
+
+            # 缓冲区不够，从缓冲区最早的一行向前读取文件
+            try:
+                if until is not None:
+                    scan_end = self._seek_time(path, until, scan_end)
+                for offset, raw in self._iter_reverse(path, scan_end):
+                    if not raw:
+                        continue
+                    ts, timestamp, entry_level, message = parse_line(raw)
+                    if since is not None and ts is not None and ts < since:
+                        break
+                    entry = LogEntry(0, path, offset, ts, timestamp, entry_level, message, raw)
+                    if matches(entry):
+                        results.append(entry)
+                        if limit and len(results) >= limit:
+                            break
+            except OSError as e:
+                logger.warning(f"读取日志文件失败: {e}")
+
+            return [entry.to_dict() for entry in reversed(results)]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "current_file": self._current,
+                "buffered": len(self.entries),
+                "files": {path: {"offset": state.offset, "start_offset": state.start_offset}
+                          for path, state in self._files.items()},
+            }
+
+
+log_index = LogIndex()
@@ -0,0 +1,278 @@
+"""
+本地消息总线
+
+wx849_callback_daemon.py 原先每 0.5 秒读取一次 logs/XYBot_*.log，用二十多个正则从中文日志中还原消息，
+日志格式一变就解析失败，日志轮转时还会丢消息。这里由 XYBot 在解析完消息后直接发布结构化数据，
+本地进程通过 websocket 订阅：
+
+- 订阅时可以按主题（text、at、image、quote 等）和会话 ID 过滤
+- 消息分批推送，消费者处理完后回复 ack；未确认的消息在断线重连后重新投递（至少一次）
+- 按消费者名称记录确认位置，消费者重启后从上次确认处继续，最近的消息保存在环形缓冲区中
+- 每个连接的未确认消息数有上限，消费者处理慢时暂停推送，不会无限堆积
+
+协议（JSON 文本帧）:
+    客户端 -> {"op": "subscribe", "consumer": "dow", "topics": ["text", "at"], "chats": [],
+              "batch_size": 50, "batch_wait": 0.05, "window": 500, "key": ""}
+    服务端 -> {"op": "subscribed", "seq": 最新序号, "resume_from": 开始投递的序号}
+    服务端 -> {"op": "batch", "seq": 本批投递到的序号, "events": [{"seq": 1, "topic": "text", "ts": 1700000000.0, "data": {...}}]}
+    客户端 -> {"op": "ack", "seq": 已处理完的批次的 seq}
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from itertools import islice
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from loguru import logger
+
+TOPICS = ("text", "at", "image", "voice", "video", "emoji", "link", "file", "quote", "system", "pat")
+
+# 只发布可以直接序列化的字段，File、Video 等二进制内容和语音的 ImgBuf 不通过总线传递
+_JSON_TYPES = (str, int, float, bool, list, dict, type(None))
+_EXCLUDED_FIELDS = {"ImgBuf"}
+
+
+class BusEvent:
+    __slots__ = ("seq", "topic", "ts", "data", "chats")
+
+    def __init__(self, seq: int, topic: str, data: Dict[str, Any]):
+        self.seq = seq
+        self.topic = topic
+        self.ts = time.time()
+        self.data = data
+        self.chats = (data.get("FromWxid"), data.get("SenderWxid"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seq": self.seq, "topic": self.topic, "ts": self.ts, "data": self.data}
+
+
+class _Subscription:
+    """一个 websocket 连接上的订阅"""
+
+    def __init__(self, consumer: str, options: Dict[str, Any]):
+        self.consumer = consumer
+        self.topics: Set[str] = set(options.get("topics") or TOPICS)
+        self.chats: Set[str] = set(options.get("chats") or [])
+        self.batch_size = max(int(options.get("batch_size", 50)), 1)
+        self.batch_wait = max(float(options.get("batch_wait", 0.05)), 0.0)
+        self.window = max(int(options.get("window", 500)), self.batch_size)
+        # 下一次投递从 cursor 之后开始，acked 为已确认的最大序号
+        self.cursor = 0
+        self.acked = 0
+        self.inflight = 0
+        # 已投递未确认的批次 [批次的 seq, 确认该批后可推进到的 seq]，
+        # 批次之后全部被过滤掉的消息在该批确认时一起确认
+        self.batches: Deque[List[int]] = deque()
+        self.wakeup = asyncio.Event()
+
+    def matches(self, event: BusEvent) -> bool:
+        if event.topic not in self.topics:
+            return False
+        return not self.chats or event.chats[0] in self.chats or event.chats[1] in self.chats
+
+
+class MessageBus:
+    """进程内发布、websocket 订阅的消息总线"""
+
+    def __init__(self):
+        self.enabled = False
+        self.host = "127.0.0.1"
+        self.port = 9013
+        self.path = "/bus"
+        self.key = ""
+        self.events: Deque[BusEvent] = deque(maxlen=10000)
+        self._seq = 0
+        self._subscriptions: Set[_Subscription] = set()
+        # 各消费者已确认的序号，重连后从这里继续
+        self._offsets: Dict[str, int] = {}
+        self._runner = None
+
+        self.stats = {"published": 0, "delivered": 0, "acked": 0, "dropped": 0}
+
+    def configure(self, config: Dict[str, Any]):
+        """读取 main_config.toml 中的 [MessageBus] 配置"""
+        self.enabled = config.get("enable", True)
+        self.host = config.get("host", self.host)
+        self.port = int(config.get("port", self.port))
+        self.path = config.get("path", self.path)
+        self.key = config.get("key", self.key)
+        buffer_size = int(config.get("buffer-size", self.events.maxlen))
+        if buffer_size != self.events.maxlen:
+            self.events = deque(self.events, maxlen=max(buffer_size, 1))
+
+    # ---------- 发布 ----------
+
+    def publish(self, topic: str, message: Dict[str, Any], **extra):
+        """发布一条已解析的消息，总线未启动时直接返回"""
+        if self._runner is None:
+            return
+        data = {key: value for key, value in message.items()
+                if isinstance(value, _JSON_TYPES) and key not in _EXCLUDED_FIELDS}
+        data.update(extra)
+
+        self._seq += 1
+        self.events.append(BusEvent(self._seq, topic, data))
+        self.stats["published"] += 1
+        for subscription in self._subscriptions:
+            subscription.wakeup.set()
+
+    # ---------- 服务端 ----------
+
+    async def start(self):
+        if not self.enabled or self._runner is not None:
+            return
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get(self.path, self._handle_ws)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError as e:
+            await runner.cleanup()
+            logger.error(f"消息总线启动失败，端口 {self.port} 可能已被占用: {e}")
+            return
+        self._runner = runner
+        logger.success(f"消息总线已启动: ws://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            runner, self._runner = self._runner, None
+            await runner.cleanup()
+
+    async def _handle_ws(self, request):
+        from aiohttp import web, WSMsgType
+
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        subscription: Optional[_Subscription] = None
+        sender: Optional[asyncio.Task] = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = json.loads(msg.data)
+                except ValueError:
+                    continue
+                op = payload.get("op")
+
+                if op == "subscribe" and subscription is None:
+                    if self.key and payload.get("key") != self.key:
+                        await ws.send_json({"op": "error", "message": "unauthorized"})
+                        break
+                    subscription = self._subscribe(payload)
+                    await ws.send_json({"op": "subscribed", "seq": self._seq, "resume_from": subscription.cursor + 1})
+                    sender = asyncio.create_task(self._send_loop(ws, subscription))
+                elif op == "ack" and subscription is not None:
+                    self._ack(subscription, int(payload.get("seq", 0)))
+        finally:
+            if sender is not None:
+                sender.cancel()
+                await asyncio.gather(sender, return_exceptions=True)
+            if subscription is not None:
+                self._subscriptions.discard(subscription)
+                logger.info(f"消息总线消费者 {subscription.consumer} 已断开，已确认到 {subscription.acked}")
+        return ws
+
+    def _subscribe(self, options: Dict[str, Any]) -> _Subscription:
+        consumer = str(options.get("consumer") or f"anonymous-{id(options)}")
+        subscription = _Subscription(consumer, options)
+
+        if "from_seq" in options:
+            start = int(options["from_seq"]) - 1
+        elif consumer in self._offsets:
+            # 从上次确认的位置继续，未确认的消息重新投递
+            start = self._offsets[consumer]
+        else:
+            # 新的消费者只接收订阅之后的消息
+            start = self._seq
+        subscription.cursor = subscription.acked = min(max(start, 0), self._seq)
+
+        self._subscriptions.add(subscription)
+        if subscription.cursor < self._seq:
+            subscription.wakeup.set()
+        logger.info(f"消息总线消费者 {consumer} 已订阅，主题: {sorted(subscription.topics)}，从序号 {subscription.cursor + 1} 开始")
+        return subscription
+
+    def _ack(self, subscription: _Subscription, seq: int):
+        batches = subscription.batches
+        while batches and batches[0][0] <= seq:
+            seq = max(seq, batches.popleft()[1])
+        if seq <= subscription.acked:
+            return
+        seq = min(seq, subscription.cursor)
+        self.stats["acked"] += seq - subscription.acked
+        subscription.acked = seq
+        subscription.inflight = subscription.cursor - subscription.acked
+        self._offsets[subscription.consumer] = seq
+        subscription.wakeup.set()
+
+    def _collect(self, subscription: _Subscription) -> List[BusEvent]:
+        """取出 cursor 之后符合订阅条件的一批消息，并推进 cursor"""
+        if not self.events or subscription.cursor >= self._seq:
+            return []
+        first_seq = self.events[0].seq
+        if subscription.cursor + 1 < first_seq:
+            dropped = first_seq - subscription.cursor - 1
+            self.stats["dropped"] += dropped
+            logger.warning(f"消息总线消费者 {subscription.consumer} 落后过多，{dropped} 条消息已被移出缓冲区")
+            subscription.cursor = first_seq - 1
+
+        limit = min(subscription.batch_size, subscription.window - subscription.inflight)
+        batch = []
+        for event in islice(self.events, subscription.cursor + 1 - first_seq, None):
+            subscription.cursor = event.seq
+            if subscription.matches(event):
+                batch.append(event)
+                if len(batch) >= limit:
+                    break
+        subscription.inflight = subscription.cursor - subscription.acked
+        if batch:
+            subscription.batches.append([subscription.cursor, subscription.cursor])
+        elif subscription.inflight:
+            if subscription.batches:
+                # 前面还有未确认的批次，不能越过它们推进确认位置，等最后一批确认时再一起确认
+                subscription.batches[-1][1] = subscription.cursor
+            else:
+                # 全部被过滤掉的消息不需要确认
+                self._ack(subscription, subscription.cursor)
+        return batch
+
+    async def _send_loop(self, ws, subscription: _Subscription):
+        while not ws.closed:
+            await subscription.wakeup.wait()
+            subscription.wakeup.clear()
+            if subscription.inflight >= subscription.window:
+                # 等待消费者确认
+                continue
+            if subscription.batch_wait and self._seq - subscription.cursor < subscription.batch_size:
+                # 稍等片刻，把短时间内到达的消息合并为一批
+                await asyncio.sleep(subscription.batch_wait)
+
+            batch = self._collect(subscription)
+            if not batch:
+                continue
+            await ws.send_str(json.dumps({"op": "batch", "seq": subscription.cursor,
+                                          "events": [event.to_dict() for event in batch]}, ensure_ascii=False))
+            self.stats["delivered"] += len(batch)
+            if subscription.cursor < self._seq:
+                # 还有没发完的消息
+                subscription.wakeup.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self._runner is not None,
+            "seq": self._seq,
+            "buffered": len(self.events),
+            "consumers": {subscription.consumer: {"acked": subscription.acked, "inflight": subscription.inflight}
+                          for subscription in self._subscriptions},
+        }
+
+
+message_bus = MessageBus()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+消息接收子系统
+
+替代 bot_core 中固定 0.5 秒的 sync_message 轮询：
+- 自适应轮询：有消息时按最小间隔快速拉取，空闲时逐步退避到最大间隔
+- 推送模式：在本地启动一个 HTTP 接收端，协议服务器通过 syncmessagebusinessuri
+  把同步到的消息直接推送过来；轮询退化为低频兜底，同时用于在线状态检测
+- 有界队列：消息放入有界 asyncio.Queue，由固定数量的工作协程处理，
+  队列满时拉取/推送会等待，不再为每条消息无限制地创建任务
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from database.message_counter import get_instance as get_message_counter
+
+MODE_POLL = "poll"
+MODE_PUSH = "push"
+
+
+class MessageIntake:
+    """消息接收器"""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]], config: Dict[str, Any]):
+        """初始化消息接收器
+
+        Args:
+            handler: 处理单条消息的协程函数，一般为 XYBot.process_message
+            config: main_config.toml 中的 [MessageIntake] 配置
+        """
+        self.handler = handler
+        self.mode = config.get("mode", MODE_POLL)
+        if self.mode not in (MODE_POLL, MODE_PUSH):
+            logger.warning(f"未知的消息接收模式: {self.mode}，使用轮询模式")
+            self.mode = MODE_POLL
+
+        # 自适应轮询间隔（秒）
+        self.min_interval = float(config.get("min-interval", 0.1))
+        self.max_interval = float(config.get("max-interval", 0.5))
+        self.backoff_factor = float(config.get("backoff-factor", 1.5))
+        # 推送模式下轮询只作为兜底和在线检测
+        self.push_poll_interval = float(config.get("push-poll-interval", 10.0))
+        self.interval = self.min_interval
+
+        # 有界队列与工作协程
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=int(config.get("queue-size", 1000)))
+        self.worker_count = int(config.get("workers", 32))
+        self._workers: List[asyncio.Task] = []
+
+        # 推送接收端配置
+        self.push_host = config.get("push-host", "127.0.0.1")
+        self.push_port = int(config.get("push-port", 9012))
+        self.push_path = config.get("push-path", "/message")
+        self._push_runner = None
+        self._push_event = asyncio.Event()
+
+        # 推送与轮询同时开启时，按消息ID去重
+        self._seen_ids: "OrderedDict[Any, None]" = OrderedDict()
+        self._seen_limit = 5000
+
+        # 统计信息
+        self.stats = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "duplicates": 0,
+            "pushed": 0,
+            "max_queue_depth": 0,
+        }
+        # 按小时统计的消息数量，供管理后台展示；计数只累加到内存，定时批量写入数据库
+        self._counter = get_message_counter()
+
+    async def start(self):
+        """启动工作协程，推送模式下同时启动推送接收端"""
+        for i in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+
+        if self.mode == MODE_PUSH:
+            try:
+                await self._start_push_server()
+            except Exception as e:
+                logger.error(f"启动消息推送接收端失败，回退到轮询模式: {e}")
+                self.mode = MODE_POLL
+
+        logger.success(f"消息接收器已启动，模式: {self.mode}，工作协程: {self.worker_count}，队列上限: {self.queue.maxsize}")
+
+    async def stop(self):
+        """停止接收并等待队列中的消息处理完毕"""
+        if self._push_runner:
+            await self._push_runner.cleanup()
+            self._push_runner = None
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"停止消息接收器时仍有 {self.queue.qsize()} 条消息未处理")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    async def submit(self, messages: List[Dict[str, Any]]):
+        """将一批消息放入队列，队列满时等待（背压）"""
+        for message in messages:
+            msg_id = message.get("NewMsgId") or message.get("MsgId")
+            if msg_id is not None:
+                if msg_id in self._seen_ids:
+                    self.stats["duplicates"] += 1
+                    continue
+                self._seen_ids[msg_id] = None
+                if len(self._seen_ids) > self._seen_limit:
+                    self._seen_ids.popitem(last=False)
+
+            await self.queue.put((time.monotonic(), message))
+            self.stats["received"] += 1
+            self._counter.increment()
+            if self.queue.qsize() > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = self.queue.qsize()
+
+    async def wait_next_poll(self, received: int):
+        """根据上一次拉取到的消息数量等待下一次轮询
+
+        Args:
+            received: 上一次拉取到的消息数量
+        """
+        if self.mode == MODE_PUSH:
+            # 推送模式下只做低频兜底轮询；收到推送时提前唤醒一次，及时检测连接状态
+            self._push_event.clear()
+            try:
+                await asyncio.wait_for(self._push_event.wait(), timeout=self.push_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        if received:
+            # 有消息时收紧间隔，尽快拉取后续消息
+            self.interval = self.min_interval
+        else:
+            # 空闲时逐步退避
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+        await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取接收器统计信息"""
+        return {
+            **self.stats,
+            "mode": self.mode,
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "poll_interval": self.interval,
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            enqueued_at, message = await self.queue.get()
+            try:
+                await self.handler(message)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"消息处理工作协程 {index} 处理消息失败: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _start_push_server(self):
+        from aiohttp import web
+
+        async def handle_push(request: web.Request):
+            try:
+                payload = await request.json()
+            except Exception:
+                return web.json_response({"Success": False, "Message": "invalid json"}, status=400)
+
+            messages = self._extract_messages(payload)
+            if messages:
+                self.stats["pushed"] += len(messages)
+                await self.submit(messages)
+                self._push_event.set()
+            return web.json_response({"Success": True})
+
+        app = web.Application()
+        app.router.add_post(self.push_path, handle_push)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, self.push_host, self.push_port)
+        await site.start()
+        self._push_runner = runner
+        logger.success(f"消息推送接收端已启动: http://{self.push_host}:{self.push_port}{self.push_path}")
+
+    @staticmethod
+    def _extract_messages(payload: Any) -> List[Dict[str, Any]]:
+        """从推送数据中取出消息列表，兼容 {AddMsgs: [...]}、{Data: {AddMsgs: [...]}} 和单条消息"""
+        if isinstance(payload, list):
+            return [m for m in payload if isinstance(m, dict)]
+        if not isinstance(payload, dict):
+            return []
+        data = payload.get("Data", payload)
+        if isinstance(data, dict):
+            if isinstance(data.get("AddMsgs"), list):
+                return data["AddMsgs"]
+            if "MsgType" in data:
+                return [data]
+        return []
+
+
+_message_intake: Optional[MessageIntake] = None
+
+
+def init_message_intake(handler: Callable[[Dict[str, Any]], Awaitable[Any]], config: Dict[str, Any]) -> MessageIntake:
+    """初始化消息接收器"""
+    global _message_intake
+    _message_intake = MessageIntake(handler, config)
+    return _message_intake
+
+
+def get_message_intake() -> Optional[MessageIntake]:
+    """获取消息接收器实例"""
+    return _message_intake
@@ -1,17 +1,21 @@
+import asyncio
 import importlib
 import inspect
 import os
 import sys
+import time
 import tomllib
 import traceback
 import ast
-from typing import Dict, Type, List, Union
+from typing import Dict, Type, List, Optional, Tuple, Union
 
 from loguru import logger
 
 from WechatAPI import WechatAPIClient
 from .event_manager import EventManager
 from .plugin_base import PluginBase
+from .plugin_manifest import PluginManifest, PluginManifestEntry
+from .wakeup_index import wakeup_index
 
 
 class PluginManager:
@@ -23,6 +27,14 @@ class PluginManager:
         # 默认将 excluded_plugins 初始化为空列表
         self.excluded_plugins: List[str] = []
 
+        # 插件清单：不导入模块即可知道插件类名、所在模块和元数据
+        self.manifest = PluginManifest()
+        # 每个插件的导入耗时、初始化耗时和状态
+        self.load_stats: Dict[str, dict] = {}
+        # 批量加载时并发执行 async_init 的超时时间（秒），超时的插件在后台继续初始化
+        self.init_timeout: float = 30
+        self._init_tasks: Dict[str, asyncio.Task] = {}
+
         try:
             with open("main_config.toml", "rb") as f:
                 main_config = tomllib.load(f)
@@ -30,6 +42,7 @@ class PluginManager:
             # 安全地获取 'disabled-plugins' 配置
             # 使用 .get("XYBot", {}).get("disabled-plugins") 防止因键不存在而引发 KeyError
             disabled_plugins_setting = main_config.get("XYBot", {}).get("disabled-plugins")
+            self.init_timeout = float(main_config.get("XYBot", {}).get("plugin-init-timeout", 30))
 
             if isinstance(disabled_plugins_setting, list):
                 # 如果配置值本身已经是列表 (例如，TOML 正确解析了 disabled-plugins = ["p1", "p2"])
@@ -85,6 +98,110 @@ class PluginManager:
 
 
 
+    def _record_plugin_info(self, plugin_class: Type[PluginBase]):
+        """记录插件信息，即使插件被禁用也会记录"""
+        plugin_name = plugin_class.__name__
+        self.plugin_info[plugin_name] = {
+            "name": plugin_name,
+            "description": plugin_class.description,
+            "author": plugin_class.author,
+            "version": plugin_class.version,
+            "enabled": False,
+            "class": plugin_class,
+            "is_ai_platform": getattr(plugin_class, 'is_ai_platform', False),  # 检查是否为AI平台插件
+            "priority": getattr(plugin_class, 'priority', 50),  # 记录插件优先级
+            "has_global_priority": getattr(plugin_class, 'has_global_priority', False)  # 记录是否设置了全局优先级
+        }
+
+    def _record_manifest_info(self, entry: PluginManifestEntry):
+        """根据插件清单记录未导入的（被禁用的）插件信息"""
+        self.plugin_info[entry.name] = {
+            "name": entry.name,
+            "description": entry.description,
+            "author": entry.author,
+            "version": entry.version,
+            "enabled": False,
+            "is_ai_platform": entry.is_ai_platform,
+            "priority": 50,
+            "has_global_priority": False,
+            "decorator_priority": entry.decorator_priority,
+        }
+        self.load_stats[entry.name] = {"module": entry.module, "status": "disabled",
+                                       "import_ms": None, "init_ms": None, "error": None}
+
+    def _import_module(self, module_name: str, reload: bool = False):
+        """导入插件模块并记录耗时，返回 (模块, 耗时毫秒)"""
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        if reload:
+            module = importlib.reload(module)
+        return module, round((time.perf_counter() - start) * 1000, 2)
+
+    async def _enable_plugin(self, bot: WechatAPIClient, plugin_class: Type[PluginBase]) -> Optional[PluginBase]:
+        """实例化插件、绑定事件并调用 on_enable，返回插件实例"""
+        plugin_name = plugin_class.__name__
+        stats = self.load_stats.setdefault(plugin_name, {"module": plugin_class.__module__, "import_ms": None})
+        stats.update({"status": "loading", "init_ms": None, "error": None})
+        start = time.perf_counter()
+        try:
+            plugin = plugin_class()
+            # 记录插件优先级信息
+            priority = getattr(plugin, 'priority', 50)
+            has_global_priority = getattr(plugin, 'has_global_priority', False)
+
+            if has_global_priority:
+                logger.info(f"加载插件 {plugin_name}，使用全局优先级: {priority}")
+            else:
+                logger.info(f"加载插件 {plugin_name}，使用装饰器优先级")
+
+            EventManager.bind_instance(plugin)
+            try:
+                await plugin.on_enable(bot)
+            except:
+                EventManager.unbind_instance(plugin)
+                raise
+        except:
+            stats.update({"status": "failed", "error": traceback.format_exc(limit=1).strip().splitlines()[-1]})
+            logger.error(f"加载插件时发生错误: {traceback.format_exc()}")
+            return None
+        stats["enable_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return plugin
+
+    async def _init_plugin(self, plugin: PluginBase) -> bool:
+        """执行插件的 async_init 并记录耗时，失败时撤销 on_enable"""
+        plugin_name = plugin.__class__.__name__
+        stats = self.load_stats[plugin_name]
+        start = time.perf_counter()
+        try:
+            await plugin.async_init()
+        except Exception:
+            stats.update({"status": "failed", "error": traceback.format_exc(limit=1).strip().splitlines()[-1],
+                          "init_ms": round((time.perf_counter() - start) * 1000, 2)})
+            logger.error(f"插件 {plugin_name} 初始化失败: {traceback.format_exc()}")
+            if self.plugins.get(plugin_name) is plugin:
+                await self.unload_plugin(plugin_name)
+            else:
+                try:
+                    await plugin.on_disable()
+                finally:
+                    EventManager.unbind_instance(plugin)
+            return False
+        init_ms = round((time.perf_counter() - start) * 1000, 2)
+        if stats.get("status") == "timeout":
+            logger.info(f"插件 {plugin_name} 在后台完成初始化，耗时 {init_ms}ms")
+        stats.update({"status": "loaded", "init_ms": init_ms})
+        return True
+
+    def _register_plugin(self, plugin: PluginBase):
+        plugin_name = plugin.__class__.__name__
+        self.plugins[plugin_name] = plugin
+        self.plugin_classes[plugin_name] = plugin.__class__
+        self.plugin_info[plugin_name]["enabled"] = True
+        self.plugin_info[plugin_name]["priority"] = getattr(plugin, 'priority', 50)  # 更新优先级信息
+        self.plugin_info[plugin_name]["has_global_priority"] = getattr(plugin, 'has_global_priority', False)  # 更新全局优先级标志
+        # 插件集合变化，唤醒词分发索引需要重建
+        wakeup_index.invalidate()
+
     async def load_plugin(self, bot: WechatAPIClient, plugin_class: Type[PluginBase],
                           is_disabled: bool = False) -> bool:
         """加载单个插件，接受Type[PluginBase]"""
@@ -95,46 +212,98 @@ class PluginManager:
             if plugin_name in self.plugins:
                 return False
 
-            # 记录插件信息，即使插件被禁用也会记录
-            self.plugin_info[plugin_name] = {
-                "name": plugin_name,
-                "description": plugin_class.description,
-                "author": plugin_class.author,
-                "version": plugin_class.version,
-                "enabled": False,
-                "class": plugin_class,
-                "is_ai_platform": getattr(plugin_class, 'is_ai_platform', False),  # 检查是否为AI平台插件
-                "priority": getattr(plugin_class, 'priority', 50),  # 记录插件优先级
-                "has_global_priority": getattr(plugin_class, 'has_global_priority', False)  # 记录是否设置了全局优先级
-            }
+            self._record_plugin_info(plugin_class)
 
             # 如果插件被禁用则不加载
             if is_disabled:
+                self.load_stats.setdefault(plugin_name, {"module": plugin_class.__module__, "import_ms": None,
+                                                         "init_ms": None, "error": None})["status"] = "disabled"
                 return False
 
-            plugin = plugin_class()
-            # 记录插件优先级信息
-            priority = getattr(plugin, 'priority', 50)
-            has_global_priority = getattr(plugin, 'has_global_priority', False)
-
-            if has_global_priority:
-                logger.info(f"加载插件 {plugin_name}，使用全局优先级: {priority}")
-            else:
-                logger.info(f"加载插件 {plugin_name}，使用装饰器优先级")
-
-            EventManager.bind_instance(plugin)
-            await plugin.on_enable(bot)
-            await plugin.async_init()
-            self.plugins[plugin_name] = plugin
-            self.plugin_classes[plugin_name] = plugin_class
-            self.plugin_info[plugin_name]["enabled"] = True
-            self.plugin_info[plugin_name]["priority"] = priority  # 更新优先级信息
-            self.plugin_info[plugin_name]["has_global_priority"] = has_global_priority  # 更新全局优先级标志
+            plugin = await self._enable_plugin(bot, plugin_class)
+            if plugin is None or not await self._init_plugin(plugin):
+                return False
+            self._register_plugin(plugin)
             return True
         except:
             logger.error(f"加载插件时发生错误: {traceback.format_exc()}")
             return False
 
+    async def _load_plugins(self, bot: WechatAPIClient, dirnames: List[str], skip_disabled: bool,
+                            action: str = "加载") -> Tuple[List[str], List[str]]:
+        """批量加载插件
+
+        依次导入模块并调用 on_enable（保持事件处理函数的注册顺序），被禁用的插件只记录清单信息、不导入模块；
+        之后并发执行所有插件的 async_init，超过 init_timeout 的插件先注册，初始化在后台继续。
+        """
+        failed_plugins = []
+        enabled: List[PluginBase] = []
+
+        for dirname in dirnames:
+            module_name = f"plugins.{dirname}.main"
+            try:
+                if self.manifest.needs_import(dirname):
+                    # 静态解析找不到插件类，只能导入后查找
+                    module, import_ms = self._import_module(module_name)
+                    classes = [obj for _, obj in inspect.getmembers(module)
+                               if inspect.isclass(obj) and issubclass(obj, PluginBase) and obj != PluginBase]
+                else:
+                    entries = self.manifest.entries(dirname)
+                    if skip_disabled:
+                        for entry in entries:
+                            if entry.name in self.excluded_plugins and entry.name not in self.plugins:
+                                self._record_manifest_info(entry)
+                        entries = [entry for entry in entries if entry.name not in self.excluded_plugins]
+                    if not entries:
+                        continue
+                    module, import_ms = self._import_module(module_name)
+                    classes = [getattr(module, entry.name) for entry in entries]
+
+                for obj in classes:
+                    plugin_name = obj.__name__
+                    if plugin_name in self.plugins:
+                        continue
+                    self._record_plugin_info(obj)
+                    self.load_stats[plugin_name] = {"module": module_name, "import_ms": import_ms}
+                    if skip_disabled and plugin_name in self.excluded_plugins:
+                        self.load_stats[plugin_name].update({"status": "disabled", "init_ms": None, "error": None})
+                        continue
+                    plugin = await self._enable_plugin(bot, obj)
+                    if plugin is not None:
+                        enabled.append(plugin)
+            except Exception:
+                logger.error(f"{action} {dirname} 时发生错误: {traceback.format_exc()}")
+                failed_plugins.append(dirname)
+                # 继续加载其他插件而不是返回False
+                continue
+
+        loaded_plugins = await self._init_plugins(enabled)
+        failed_plugins.extend(plugin.__class__.__name__ for plugin in enabled
+                              if plugin.__class__.__name__ not in loaded_plugins)
+        return loaded_plugins, failed_plugins
+
+    async def _init_plugins(self, plugins: List[PluginBase]) -> List[str]:
+        """并发执行 async_init，返回加载成功（含初始化超时、仍在后台执行）的插件名称"""
+        if not plugins:
+            return []
+
+        tasks = {asyncio.create_task(self._init_plugin(plugin)): plugin for plugin in plugins}
+        done, pending = await asyncio.wait(tasks, timeout=self.init_timeout)
+
+        loaded = []
+        for task, plugin in tasks.items():
+            plugin_name = plugin.__class__.__name__
+            if task in pending:
+                logger.warning(f"插件 {plugin_name} 初始化超过 {self.init_timeout} 秒，在后台继续初始化")
+                self.load_stats[plugin_name]["status"] = "timeout"
+                self._init_tasks[plugin_name] = task
+                task.add_done_callback(lambda _, name=plugin_name: self._init_tasks.pop(name, None))
+            elif not task.result():
+                continue
+            self._register_plugin(plugin)
+            loaded.append(plugin_name)
+        return loaded
+
     async def unload_plugin(self, plugin_name: str, add_to_excluded: bool = False) -> bool:
         """卸载单个插件
 
@@ -152,11 +321,17 @@ class PluginManager:
             return False
 
         try:
+            # 初始化超时、仍在后台执行 async_init 的插件，先取消初始化
+            init_task = self._init_tasks.pop(plugin_name, None)
+            if init_task is not None and init_task is not asyncio.current_task():
+                init_task.cancel()
+
             plugin = self.plugins[plugin_name]
             await plugin.on_disable()
             EventManager.unbind_instance(plugin)
             del self.plugins[plugin_name]
             del self.plugin_classes[plugin_name]
+            wakeup_index.invalidate()
             if plugin_name in self.plugin_info.keys():
                 self.plugin_info[plugin_name]["enabled"] = False
 
@@ -174,31 +349,18 @@ class PluginManager:
 
     async def load_plugins_from_directory(self, bot: WechatAPIClient, load_disabled_plugin: bool = True) -> List[str]:
         """从plugins目录批量加载插件"""
-        loaded_plugins = []
-        failed_plugins = []
-
-        for dirname in os.listdir("plugins"):
-            if os.path.isdir(f"plugins/{dirname}") and os.path.exists(f"plugins/{dirname}/main.py"):
-                try:
-                    module = importlib.import_module(f"plugins.{dirname}.main")
-                    for name, obj in inspect.getmembers(module):
-                        if inspect.isclass(obj) and issubclass(obj, PluginBase) and obj != PluginBase:
-                            is_disabled = False
-                            if not load_disabled_plugin:
-                                is_disabled = obj.__name__ in self.excluded_plugins
-
-                            if await self.load_plugin(bot, obj, is_disabled=is_disabled):
-                                loaded_plugins.append(obj.__name__)
-
-                except Exception as e:
-                    logger.error(f"加载 {dirname} 时发生错误: {traceback.format_exc()}")
-                    failed_plugins.append(dirname)
-                    # 继续加载其他插件而不是返回False
-                    continue
+        start = time.perf_counter()
+        dirnames = self.manifest.scan()
+        loaded_plugins, failed_plugins = await self._load_plugins(bot, dirnames, skip_disabled=not load_disabled_plugin)
 
         if failed_plugins:
             logger.warning(f"以下插件加载失败: {', '.join(failed_plugins)}，但不影响其他插件的加载")
 
+        slowest = sorted(((name, (stats.get("import_ms") or 0) + (stats.get("init_ms") or 0))
+                          for name, stats in self.load_stats.items() if stats.get("status") != "disabled"),
+                         key=lambda item: item[1], reverse=True)[:5]
+        logger.info(f"插件加载耗时 {round((time.perf_counter() - start) * 1000)}ms，"
+                    f"最慢的插件: {', '.join(f'{name}({ms:.0f}ms)' for name, ms in slowest)}")
         return loaded_plugins
 
     async def load_plugin_from_directory(self, bot: WechatAPIClient, plugin_name: str) -> bool:
@@ -211,49 +373,48 @@ class PluginManager:
         Returns:
             bool: 是否成功加载插件
         """
-        found = False
-        for dirname in os.listdir("plugins"):
+        # 通过插件清单找到插件所在模块，只导入这一个模块
+        self.manifest.scan()
+        entry = self.manifest.find(plugin_name)
+        candidates = [entry.dirname] if entry else [
+            dirname for dirname in os.listdir("plugins") if self.manifest.needs_import(dirname)]
+
+        for dirname in candidates:
             try:
-                if os.path.isdir(f"plugins/{dirname}") and os.path.exists(f"plugins/{dirname}/main.py"):
-                    module = importlib.import_module(f"plugins.{dirname}.main")
-                    importlib.reload(module)
-
-                    for name, obj in inspect.getmembers(module):
-                        if (inspect.isclass(obj) and
-                                issubclass(obj, PluginBase) and
-                                obj != PluginBase and
-                                obj.__name__ == plugin_name):
-                            found = True
-
-                            # 检查是否为AI平台插件
-                            is_ai_platform = getattr(obj, 'is_ai_platform', False)
-
-                            # 如果是AI平台插件，先禁用其他所有AI平台插件
-                            if is_ai_platform:
-                                logger.info(f"启用AI平台插件 {plugin_name}，将禁用其他AI平台插件")
-
-                                # 遍历已启用的插件，禁用其他AI平台插件
-                                for plugin in list(self.plugins):
-                                    if getattr(plugin.__class__, 'is_ai_platform', False) and plugin.__class__.__name__ != plugin_name:
-                                        logger.info(f"禁用AI平台插件: {plugin.__class__.__name__}")
-                                        await self.unload_plugin(plugin.__class__.__name__)
-
-                            # 如果插件在禁用列表中，将其移除
-                            if plugin_name in self.excluded_plugins:
-                                self.excluded_plugins.remove(plugin_name)
-                                # 保存禁用插件列表到配置文件
-                                self._save_disabled_plugins_to_config()
-                                logger.info(f"将插件 {plugin_name} 从禁用列表中移除并保存到配置文件")
-
-                            return await self.load_plugin(bot, obj)
+                module_name = f"plugins.{dirname}.main"
+                module, import_ms = self._import_module(module_name, reload=module_name in sys.modules)
+                obj = getattr(module, plugin_name, None)
+                if not (inspect.isclass(obj) and issubclass(obj, PluginBase) and obj != PluginBase):
+                    continue
+
+                # 检查是否为AI平台插件
+                is_ai_platform = getattr(obj, 'is_ai_platform', False)
+
+                # 如果是AI平台插件，先禁用其他所有AI平台插件
+                if is_ai_platform:
+                    logger.info(f"启用AI平台插件 {plugin_name}，将禁用其他AI平台插件")
+
+                    # 遍历已启用的插件，禁用其他AI平台插件
+                    for name, plugin in list(self.plugins.items()):
+                        if getattr(plugin.__class__, 'is_ai_platform', False) and name != plugin_name:
+                            logger.info(f"禁用AI平台插件: {name}")
+                            await self.unload_plugin(name)
+
+                # 如果插件在禁用列表中，将其移除
+                if plugin_name in self.excluded_plugins:
+                    self.excluded_plugins.remove(plugin_name)
+                    # 保存禁用插件列表到配置文件
+                    self._save_disabled_plugins_to_config()
+                    logger.info(f"将插件 {plugin_name} 从禁用列表中移除并保存到配置文件")
+
+                self.load_stats[plugin_name] = {"module": module_name, "import_ms": import_ms}
+                return await self.load_plugin(bot, obj)
             except:
                 logger.error(f"检查 {dirname} 时发生错误: {traceback.format_exc()}")
                 continue
 
-        if not found:
-            logger.warning(f"未找到插件类 {plugin_name}")
-            return False
-
+        logger.warning(f"未找到插件类 {plugin_name}")
+        return False
 
     async def unload_all_plugins(self) -> tuple[List[str], List[str]]:
         """卸载所有插件"""
@@ -286,8 +447,8 @@ class PluginManager:
                 return False
 
             # 重新导入模块
-            module = importlib.import_module(module_name)
-            importlib.reload(module)
+            module, import_ms = self._import_module(module_name, reload=True)
+            self.load_stats[plugin_name] = {"module": module_name, "import_ms": import_ms}
 
             # 从重新加载的模块中获取插件类
             for name, obj in inspect.getmembers(module):
@@ -329,24 +490,9 @@ class PluginManager:
                     del sys.modules[module_name]
 
             # 从目录重新加载插件，不加载禁用的插件
-            loaded_plugins = []
-            failed_plugins = []
-
-            # 从plugins目录批量加载插件
-            for dirname in os.listdir("plugins"):
-                if os.path.isdir(f"plugins/{dirname}") and os.path.exists(f"plugins/{dirname}/main.py"):
-                    try:
-                        module = importlib.import_module(f"plugins.{dirname}.main")
-                        for name, obj in inspect.getmembers(module):
-                            if inspect.isclass(obj) and issubclass(obj, PluginBase) and obj != PluginBase:
-                                is_disabled = obj.__name__ in self.excluded_plugins
-
-                                if not is_disabled and await self.load_plugin(bot, obj, is_disabled=is_disabled):
-                                    loaded_plugins.append(obj.__name__)
-                    except Exception as e:
-                        logger.error(f"重载插件 {dirname} 时发生错误: {traceback.format_exc()}")
-                        failed_plugins.append(dirname)
-                        continue
+            dirnames = self.manifest.scan()
+            loaded_plugins, failed_plugins = await self._load_plugins(bot, dirnames, skip_disabled=True,
+                                                                      action="重载插件")
 
             if failed_plugins:
                 logger.warning(f"以下插件重载失败: {', '.join(failed_plugins)}，但不影响其他插件的加载")
@@ -439,6 +585,10 @@ class PluginManager:
                     decorator_priority = max_priority
                     logger.debug(f"插件 {plugin_name} 从插件信息中获取最高装饰器优先级: {decorator_priority}")
 
+                # 未导入的插件，使用插件清单中静态解析出的装饰器优先级
+                elif "decorator_priority" in info:
+                    decorator_priority = info["decorator_priority"]
+
             # 确定最终优先级
             final_priority = decorator_priority
             if has_global_priority:
@@ -453,8 +603,14 @@ class PluginManager:
                 "enabled": info.get("enabled", False),
                 "is_ai_platform": info.get("is_ai_platform", False),  # 添加AI平台标识
                 "priority": final_priority,  # 使用全局优先级或装饰器最高优先级
-                "has_global_priority": has_global_priority  # 添加全局优先级标志
+                "has_global_priority": has_global_priority,  # 添加全局优先级标志
             }
+            # 导入耗时、初始化耗时和加载状态
+            stats = self.load_stats.get(plugin_name, {})
+            result["load_status"] = stats.get("status")
+            result["import_ms"] = stats.get("import_ms")
+            result["init_ms"] = stats.get("init_ms")
+            result["load_error"] = stats.get("error")
             return result
 
         if plugin_name:
@@ -465,6 +621,19 @@ class PluginManager:
 
         return [clean_plugin_info(info) for info in self.plugin_info.values()]
 
+    def get_load_stats(self) -> dict:
+        """获取插件导入、初始化耗时，按总耗时从高到低排序"""
+        plugins = []
+        for plugin_name, stats in self.load_stats.items():
+            total = (stats.get("import_ms") or 0) + (stats.get("enable_ms") or 0) + (stats.get("init_ms") or 0)
+            plugins.append({"name": plugin_name, **stats, "total_ms": round(total, 2)})
+        plugins.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {
+            "init_timeout": self.init_timeout,
+            "initializing": list(self._init_tasks),
+            "plugins": plugins,
+        }
+
     def _save_disabled_plugins_to_config(self):
         """将禁用的插件列表保存到配置文件中"""
         try:
@@ -0,0 +1,200 @@
+"""
+插件清单缓存
+
+启动时原先要导入 plugins 下所有的 main.py 才能知道有哪些插件类，被禁用的插件也会被导入，
+Dify、VideoDemand、FastGPT 等插件的依赖导入很慢。这里用 ast 静态解析 main.py，
+得到插件类名、所在模块以及描述、作者、版本等元数据，不执行插件代码。
+
+解析结果按文件的修改时间和大小缓存到 resource/plugin_manifest.json，文件未变化时直接复用。
+"""
+
+import ast
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+PLUGINS_DIR = "plugins"
+MANIFEST_PATH = os.path.join("resource", "plugin_manifest.json")
+# 缓存格式变化时修改版本号，旧缓存会被丢弃
+MANIFEST_VERSION = 1
+
+_METADATA_FIELDS = ("description", "author", "version", "is_ai_platform")
+
+
+@dataclass
+class PluginManifestEntry:
+    """单个插件类的清单信息"""
+    name: str
+    module: str
+    dirname: str
+    description: str = "暂无描述"
+    author: str = "未知"
+    version: str = "1.0.0"
+    is_ai_platform: bool = False
+    decorator_priority: int = 50
+
+
+@dataclass
+class _ModuleManifest:
+    mtime: float
+    size: int
+    classes: List[dict] = field(default_factory=list)
+    # 静态解析无法确定插件类时（例如间接继承 PluginBase），只能导入模块后再查找
+    needs_import: bool = False
+
+
+def _is_plugin_base(node: ast.expr) -> bool:
+    if isinstance(node, ast.Name):
+        return node.id == "PluginBase"
+    if isinstance(node, ast.Attribute):
+        return node.attr == "PluginBase"
+    return False
+
+
+def _decorator_priority(func: ast.AST) -> Optional[int]:
+    """读取 @on_xxx(priority=N) 装饰器中的优先级"""
+    priority = None
+    for decorator in getattr(func, "decorator_list", []):
+        if not isinstance(decorator, ast.Call):
+            continue
+        for keyword in decorator.keywords:
+            if keyword.arg == "priority" and isinstance(keyword.value, ast.Constant) \
+                    and isinstance(keyword.value.value, int):
+                value = min(max(keyword.value.value, 0), 99)
+                priority = value if priority is None else max(priority, value)
+    return priority
+
+
+def _parse_class(node: ast.ClassDef, module: str, dirname: str) -> PluginManifestEntry:
+    entry = PluginManifestEntry(name=node.name, module=module, dirname=dirname)
+    priorities = []
+    for item in node.body:
+        target = value = None
+        if isinstance(item, ast.Assign) and len(item.targets) == 1 and isinstance(item.targets[0], ast.Name):
+            target, value = item.targets[0].id, item.value
+        elif isinstance(item, ast.AnnAssign) and isinstance(item.target, ast.Name) and item.value is not None:
+            target, value = item.target.id, item.value
+        elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            priority = _decorator_priority(item)
+            if priority is not None:
+                priorities.append(priority)
+
+        if target in _METADATA_FIELDS:
+            try:
+                setattr(entry, target, ast.literal_eval(value))
+            except ValueError:
+                pass
+    if priorities:
+        entry.decorator_priority = max(50, max(priorities))
+    return entry
+
+
+def parse_plugin_module(path: str, dirname: str) -> _ModuleManifest:
+    """静态解析插件的 main.py"""
+    stat = os.stat(path)
+    manifest = _ModuleManifest(mtime=stat.st_mtime, size=stat.st_size)
+    module = f"{PLUGINS_DIR}.{dirname}.main"
+
+    with open(path, "rb") as f:
+        source = f.read()
+    try:
+        tree = ast.parse(source, filename=path)
+    except SyntaxError as e:
+        logger.warning(f"解析插件 {dirname} 失败，将在加载时直接导入: {e}")
+        manifest.needs_import = True
+        return manifest
+
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and any(_is_plugin_base(base) for base in node.bases):
+            manifest.classes.append(asdict(_parse_class(node, module, dirname)))
+
+    if not manifest.classes and b"PluginBase" in source:
+        manifest.needs_import = True
+    return manifest
+
+
+class PluginManifest:
+    """插件清单：类名 -> 模块与元数据"""
+
+    def __init__(self, plugins_dir: str = PLUGINS_DIR, cache_path: str = MANIFEST_PATH):
+        self.plugins_dir = plugins_dir
+        self.cache_path = cache_path
+        self._modules: Dict[str, _ModuleManifest] = {}
+        self._loaded = False
+
+    def _load_cache(self):
+        self._loaded = True
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return
+            self._modules = {dirname: _ModuleManifest(**module) for dirname, module in data.get("modules", {}).items()}
+        except Exception as e:
+            logger.warning(f"读取插件清单缓存失败，将重新解析: {e}")
+            self._modules = {}
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION,
+                           "modules": {dirname: asdict(module) for dirname, module in self._modules.items()}},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"保存插件清单缓存失败: {e}")
+
+    def scan(self) -> List[str]:
+        """扫描插件目录，只重新解析有变化的 main.py，返回插件目录名列表（按目录顺序）"""
+        if not self._loaded:
+            self._load_cache()
+
+        dirnames = []
+        changed = False
+        for dirname in os.listdir(self.plugins_dir):
+            path = os.path.join(self.plugins_dir, dirname, "main.py")
+            if not os.path.isfile(path):
+                continue
+            dirnames.append(dirname)
+            try:
+                stat = os.stat(path)
+                cached = self._modules.get(dirname)
+                if cached is None or cached.mtime != stat.st_mtime or cached.size != stat.st_size:
+                    self._modules[dirname] = parse_plugin_module(path, dirname)
+                    changed = True
+            except OSError as e:
+                logger.warning(f"读取插件 {dirname} 失败: {e}")
+
+        for dirname in set(self._modules) - set(dirnames):
+            del self._modules[dirname]
+            changed = True
+
+        if changed:
+            self._save_cache()
+        return dirnames
+
+    def needs_import(self, dirname: str) -> bool:
+        module = self._modules.get(dirname)
+        return module is not None and module.needs_import
+
+    def entries(self, dirname: str) -> List[PluginManifestEntry]:
+        """插件目录中的插件类"""
+        module = self._modules.get(dirname)
+        if module is None:
+            return []
+        return [PluginManifestEntry(**cls) for cls in module.classes]
+
+    def find(self, class_name: str) -> Optional[PluginManifestEntry]:
+        """按类名查找插件，不导入模块"""
+        for dirname in self._modules:
+            for entry in self.entries(dirname):
+                if entry.name == class_name:
+                    return entry
+        return None
@@ -0,0 +1,191 @@
+"""
+提醒调度器
+
+替代原先每 30 秒遍历所有用户数据库、为每条提醒重新计算时间的轮询：
+- 启动时从统一的提醒数据库按 next_fire 一次性载入，放入以触发时间为键的最小堆
+- 新增、修改、删除提醒时由数据库通知调度器同步堆，管理后台线程的修改也会通过 call_soon_threadsafe 同步
+- 调度协程只睡眠到堆顶提醒的触发时间，有修改时提前唤醒，提醒按秒准时触发
+- 同一时刻触发的一批提醒在一个事务中写回下一次触发时间
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from database.reminder_db import RECURRING_TYPES, ReminderDB, calculate_next_fire
+
+
+class ReminderScheduler:
+    """基于最小堆的提醒调度器
+
+    Args:
+        db: 提醒数据库
+        on_fire: 提醒触发时调用的协程函数，参数为提醒字典
+        misfire_grace: 允许的最大延迟秒数，超过后一次性提醒标记为已完成、循环提醒顺延到下一周期
+    """
+
+    def __init__(self, db: ReminderDB, on_fire: Callable[[Dict], Awaitable], misfire_grace: float = 60):
+        self.db = db
+        self.on_fire = on_fire
+        self.misfire_grace = misfire_grace
+
+        # 堆中元素为 (触发时间戳, 提醒ID)；提醒修改或删除后旧元素留在堆中，出堆时与 _entries 比对后丢弃
+        self._heap: List[Tuple[float, int]] = []
+        self._entries: Dict[int, Dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fire_tasks: Set[asyncio.Task] = set()
+
+        self.stats = {"fired": 0, "missed": 0, "max_delay_ms": 0.0}
+
+    async def start(self):
+        """载入所有待触发的提醒并启动调度协程"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        reminders = await self._loop.run_in_executor(None, self.db.load_pending)
+        self._entries = {reminder["id"]: reminder for reminder in reminders}
+        # load_pending 已按 next_fire 排序，有序列表本身就是合法的堆
+        self._heap = [(reminder["next_fire"], reminder["id"]) for reminder in reminders]
+        heapq.heapify(self._heap)
+
+        self.db.add_listener(self._on_db_change)
+        self._task = asyncio.create_task(self._run())
+        logger.success(f"提醒调度器已启动，载入 {len(self._entries)} 条提醒")
+
+    async def stop(self):
+        """停止调度协程"""
+        self.db.remove_listener(self._on_db_change)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._heap.clear()
+        self._entries.clear()
+
+    def _on_db_change(self, reminder_id: int, reminder: Optional[Dict]):
+        """数据库修改回调，可能在管理后台线程中调用"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._apply_change(reminder_id, reminder)
+        else:
+            loop.call_soon_threadsafe(self._apply_change, reminder_id, reminder)
+
+    def _apply_change(self, reminder_id: int, reminder: Optional[Dict]):
+        if reminder is None or reminder.get("is_done") or reminder.get("next_fire") is None:
+            self._entries.pop(reminder_id, None)
+        else:
+            self._push(reminder)
+        self._wakeup.set()
+
+    def _push(self, reminder: Dict):
+        self._entries[reminder["id"]] = reminder
+        heapq.heappush(self._heap, (reminder["next_fire"], reminder["id"]))
+
+    def _compact(self):
+        """堆中过期元素过多时重建"""
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(reminder["next_fire"], reminder_id) for reminder_id, reminder in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def next_fire_time(self) -> Optional[float]:
+        """堆顶有效提醒的触发时间戳"""
+        while self._heap:
+            next_fire, reminder_id = self._heap[0]
+            reminder = self._entries.get(reminder_id)
+            if reminder is not None and reminder["next_fire"] == next_fire:
+                return next_fire
+            heapq.heappop(self._heap)
+        return None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._fire_due()
+            except Exception as e:
+                logger.exception(f"处理到期提醒时出错: {e}")
+
+            next_fire = self.next_fire_time()
+            timeout = None if next_fire is None else max(next_fire - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire_due(self):
+        now = time.time()
+        rescheduled: List[Tuple[int, float]] = []
+        finished: List[int] = []
+        expired: List[int] = []
+
+        while True:
+            next_fire = self.next_fire_time()
+            if next_fire is None or next_fire > now:
+                break
+            _, reminder_id = heapq.heappop(self._heap)
+            reminder = self._entries[reminder_id]
+            delay = now - next_fire
+
+            if delay <= self.misfire_grace:
+                self._spawn(reminder)
+                self.stats["fired"] += 1
+                self.stats["max_delay_ms"] = max(self.stats["max_delay_ms"], round(delay * 1000, 2))
+            else:
+                # 一般是机器人离线期间错过的提醒
+                self.stats["missed"] += 1
+                logger.warning(f"提醒 {reminder_id} 已错过触发时间 {datetime.fromtimestamp(next_fire)}，不再发送")
+
+            if reminder["reminder_type"] in RECURRING_TYPES:
+                base = datetime.fromtimestamp(max(next_fire, now))
+                next_time = calculate_next_fire(reminder["reminder_type"], reminder["reminder_time"], base)
+                if next_time is not None:
+                    reminder["next_fire"] = next_time.timestamp()
+                    heapq.heappush(self._heap, (reminder["next_fire"], reminder_id))
+                    rescheduled.append((reminder_id, reminder["next_fire"]))
+                    continue
+                # 计算失败不代表提醒已结束，保留数据库中的记录，只是不再调度
+                del self._entries[reminder_id]
+                logger.error(f"无法计算循环提醒 {reminder_id} 的下一次触发时间: "
+                             f"{reminder['reminder_type']} {reminder['reminder_time']}")
+                continue
+
+            del self._entries[reminder_id]
+            (finished if delay <= self.misfire_grace else expired).append(reminder_id)
+
+        if rescheduled or finished or expired:
+            self._compact()
+            await self._loop.run_in_executor(None, self.db.record_fired, rescheduled, finished, expired)
+
+    def _spawn(self, reminder: Dict):
+        task = asyncio.create_task(self._fire(dict(reminder)))
+        self._fire_tasks.add(task)
+        task.add_done_callback(self._fire_tasks.discard)
+
+    async def _fire(self, reminder: Dict):
+        try:
+            await self.on_fire(reminder)
+        except Exception as e:
+            logger.exception(f"发送提醒 {reminder['id']} 失败: {e}")
+
+    def get_stats(self) -> Dict:
+        next_fire = self.next_fire_time()
+        return {
+            **self.stats,
+            "pending": len(self._entries),
+            "heap_size": len(self._heap),
+            "next_fire": datetime.fromtimestamp(next_fire).strftime("%Y-%m-%d %H:%M:%S") if next_fire else None,
+        }
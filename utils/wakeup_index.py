@@ -0,0 +1,245 @@
+"""
+唤醒词 / 触发词 / 命令分发索引
+
+check_wakeup_words 原先在每条@消息上遍历所有插件的 dir()，再对每个插件的
+wakeup_words、trigger_words、commands 等做嵌套的子串匹配。
+这里改为在插件加载、卸载、重载时构建一次索引，消息到来时只做一次扫描：
+
+- 子串类触发词（wakeup_words、trigger_words 等）放入 Aho-Corasick 自动机
+- 前缀类命令（commands、command_prefix）放入前缀字典树
+- 完全匹配类命令（command 及所有名称包含 command 的属性）放入哈希表
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+# 匹配类别：at 类触发调用插件的 at_message 处理函数，text 类触发调用 text_message 处理函数
+KIND_AT = "at"
+KIND_TEXT = "text"
+
+
+class AhoCorasick:
+    """Aho-Corasick 多模式子串匹配自动机"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[object]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value: object):
+        """添加一个模式串，匹配时返回 value"""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(value)
+        self._built = False
+
+    def build(self):
+        """计算失败指针"""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # 合并失败链上的输出，扫描时无需再沿失败链回溯
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+        self._built = True
+
+    def search(self, text: str) -> Set[object]:
+        """扫描一次文本，返回所有命中模式对应的 value 集合"""
+        if not self._built:
+            self.build()
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._output[node]:
+                found.update(self._output[node])
+        return found
+
+
+class PrefixTrie:
+    """前缀字典树，返回文本开头命中的所有前缀对应的 value"""
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, prefix: str, value: object):
+        if not prefix:
+            return
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        node.setdefault(None, []).append(value)
+
+    def match(self, text: str) -> List[object]:
+        found = []
+        node = self._root
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            found.extend(node.get(None, ()))
+        return found
+
+
+@dataclass
+class PluginDispatchEntry:
+    """单个插件的分发信息"""
+    name: str
+    plugin: object
+    priority: int
+    at_handler: Optional[Callable] = None
+    text_handler: Optional[Callable] = None
+
+
+def _find_handler(plugin, event_type: str) -> Optional[Callable]:
+    """按 dir() 顺序找到插件第一个指定事件类型的处理函数"""
+    for method_name in dir(plugin):
+        method = getattr(plugin, method_name, None)
+        if hasattr(method, '_event_type') and method._event_type == event_type:
+            return method
+    return None
+
+
+def _as_str_list(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple, set)):
+        return [item for item in value if isinstance(item, str)]
+    return []
+
+
+class WakeupIndex:
+    """插件唤醒词分发索引，在插件变化时标记失效，下次使用时重建"""
+
+    def __init__(self):
+        self._dirty = True
+        self.entries: List[PluginDispatchEntry] = []
+        self._substring = AhoCorasick()
+        self._prefix = PrefixTrie()
+        self._case_sensitive_prefix = PrefixTrie()
+        self._exact: Dict[str, Set[Tuple[str, str]]] = {}
+        self._first_word: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def invalidate(self):
+        """插件加载、卸载或重载后调用"""
+        self._dirty = True
+
+    def ensure(self, plugins: Dict[str, object]):
+        if self._dirty:
+            self.rebuild(plugins)
+
+    def rebuild(self, plugins: Dict[str, object]):
+        """根据已加载的插件重建索引"""
+        entries = []
+        substring = AhoCorasick()
+        prefix = PrefixTrie()
+        case_sensitive_prefix = PrefixTrie()
+        exact: Dict[str, Set[Tuple[str, str]]] = {}
+        first_word: Dict[str, Set[Tuple[str, str]]] = {}
+        trigger_count = 0
+
+        for plugin_name, plugin in plugins.items():
+            at_handler = _find_handler(plugin, 'at_message')
+            text_handler = _find_handler(plugin, 'text_message')
+            priority = getattr(at_handler, '_priority', 50) if at_handler else 50
+            entry = PluginDispatchEntry(plugin_name, plugin, priority, at_handler, text_handler)
+            entries.append(entry)
+
+            # 1. 插件唤醒词：子串匹配
+            for word in _as_str_list(getattr(plugin, 'wakeup_words', None)):
+                substring.add(word.lower(), (plugin_name, KIND_AT))
+                trigger_count += 1
+
+            # 2. Dify 插件的唤醒词：开头匹配或以空格分隔后出现
+            if plugin_name == "Dify":
+                wakeup_word_to_model = getattr(plugin, 'wakeup_word_to_model', None)
+                if isinstance(wakeup_word_to_model, dict):
+                    for word in wakeup_word_to_model.keys():
+                        if not isinstance(word, str) or not word:
+                            continue
+                        prefix.add(word.lower(), (plugin_name, KIND_AT))
+                        substring.add(f" {word.lower()}", (plugin_name, KIND_AT))
+                        trigger_count += 1
+
+            # 仅在插件可以处理文本消息时才注册文本类触发词
+            if text_handler is None:
+                continue
+
+            # 3. 触发词：子串匹配
+            for word in _as_str_list(getattr(plugin, 'trigger_words', None)):
+                substring.add(word.lower(), (plugin_name, KIND_TEXT))
+                trigger_count += 1
+
+            # 4. commands：前缀匹配或第一个词完全匹配
+            for command in _as_str_list(getattr(plugin, 'commands', None)):
+                prefix.add(command.lower(), (plugin_name, KIND_TEXT))
+                first_word.setdefault(command.lower(), set()).add((plugin_name, KIND_TEXT))
+                trigger_count += 1
+
+            # 5. 所有名称包含 command 的非方法属性（包括 command）：完全匹配
+            for attr_name in dir(plugin):
+                if 'command' not in attr_name.lower() or attr_name.startswith('__'):
+                    continue
+                value = getattr(plugin, attr_name, None)
+                if callable(value):
+                    continue
+                if attr_name == 'command_prefix' and isinstance(value, str):
+                    # 6. command_prefix：大小写敏感的前缀匹配
+                    if value:
+                        case_sensitive_prefix.add(value, (plugin_name, KIND_TEXT))
+                        trigger_count += 1
+                    continue
+                for command in _as_str_list(value):
+                    exact.setdefault(command.lower(), set()).add((plugin_name, KIND_TEXT))
+                    trigger_count += 1
+
+        substring.build()
+        # 稳定排序：优先级相同时保持插件加载顺序
+        entries.sort(key=lambda e: e.priority, reverse=True)
+
+        self.entries = entries
+        self._substring = substring
+        self._prefix = prefix
+        self._case_sensitive_prefix = case_sensitive_prefix
+        self._exact = exact
+        self._first_word = first_word
+        self._dirty = False
+        logger.debug(f"唤醒词分发索引已重建: {len(entries)} 个插件, {trigger_count} 个触发词")
+
+    def match(self, content: str) -> Set[Tuple[str, str]]:
+        """扫描一次消息内容，返回命中的 (插件名, 类别) 集合"""
+        content_lower = content.lower()
+        hits = set(self._substring.search(content_lower))
+        hits.update(self._exact.get(content_lower, ()))
+        hits.update(self._first_word.get(content_lower.split(" ", 1)[0], ()))
+        hits.update(self._prefix.match(content_lower))
+        hits.update(self._case_sensitive_prefix.match(content))
+        return hits
+
+
+wakeup_index = WakeupIndex()
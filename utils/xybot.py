@@ -14,8 +14,11 @@ from loguru import logger
 from WechatAPI import WechatAPIClient
 from WechatAPI.Client.protect import protector
 from database.messsagDB import MessageDB
-from database.contacts_db import update_contact_in_db, get_contact_from_db
+from database.contacts_db import contact_cache
+from database.group_members_db import group_member_cache
 from utils.event_manager import EventManager
+from utils.message_bus import message_bus
+from utils.wakeup_index import wakeup_index, KIND_AT, KIND_TEXT
 
 
 class XYBot:
@@ -52,6 +55,16 @@ class XYBot:
         xybot_config = main_config.get("XYBot", {})
         self.group_wakeup_words = xybot_config.get("group-wakeup-words", ["bot"])
         self.enable_group_wakeup = xybot_config.get("enable-group-wakeup", True)
+        # 机器人名称列表，用于移除@前缀；未配置时使用默认值
+        self.robot_names = xybot_config.get("robot-names", []) or ["小小x", "小x", "机器人"]
+
+        # 事件分发时的消息拷贝模式
+        EventManager.set_copy_mode(xybot_config.get("event-copy-mode", "cow"))
+        # 观察者层超时时间，防止单个插件卡住整条处理链
+        EventManager.set_observer_timeout(xybot_config.get("event-observer-timeout", 60))
+        # 联系人缓存容量与过期时间
+        contact_cache.configure(xybot_config.get("contact-cache-size"), xybot_config.get("contact-cache-ttl"),
+                                xybot_config.get("contact-negative-ttl"))
         logger.info(f"群聊唤醒词: {self.group_wakeup_words}, 启用状态: {self.enable_group_wakeup}")
 
         # 从配置文件中读取消息过滤设置
@@ -88,6 +101,7 @@ class XYBot:
         self.nickname = nickname
         self.alias = alias
         self.phone = phone
+        group_member_cache.set_bot_wxid(wxid)
 
     def is_logged_in(self):
         """检查机器人是否已登录
@@ -244,8 +258,8 @@ class XYBot:
             wxid: 联系人的wxid
         """
         try:
-            # 先检查数据库中是否已有该联系人的信息
-            existing_contact = get_contact_from_db(wxid)
+            # 先检查缓存/数据库中是否已有该联系人的信息
+            existing_contact = await contact_cache.get_contact(wxid)
 
             # 如果数据库中没有该联系人的信息，或者信息不完整，则从 API 获取
             if not existing_contact or not existing_contact.get('nickname'):
@@ -259,13 +273,14 @@ class XYBot:
                             'type': 'group'
                         }
                         # 更新到数据库
-                        update_contact_in_db(contact_info)
+                        contact_cache.update_contact(contact_info)
                         logger.debug(f"已在消息处理中更新群聊 {wxid} 的基本信息")
                     else:
                         # 获取联系人详细信息
                         logger.debug(f"开始获取联系人 {wxid} 的详细信息")
                         try:
-                            detail = await self.bot.get_contract_detail(wxid)
+                            # 同一联系人并发的详情请求只调用一次API
+                            detail = await contact_cache.fetch_once(wxid, self.bot.get_contract_detail, wxid)
                             logger.debug(f"获取到联系人 {wxid} 的详细信息: {detail}")
 
                             if detail:
@@ -418,7 +433,7 @@ class XYBot:
                                 }
 
                             # 更新到数据库
-                            update_contact_in_db(contact_info)
+                            contact_cache.update_contact(contact_info)
                             logger.debug(f"已在消息处理中更新联系人 {wxid} 的信息")
                         except Exception as e:
                             logger.error(f"调用API获取联系人 {wxid} 详情失败: {str(e)}")
@@ -429,7 +444,7 @@ class XYBot:
                                 'type': 'friend'
                             }
                             # 仍然更新到数据库，确保至少有基本信息
-                            update_contact_in_db(contact_info)
+                            contact_cache.update_contact(contact_info)
                             logger.debug(f"已在消息处理中更新联系人 {wxid} 的基本信息")
                 except Exception as e:
                     logger.error(f"在消息处理中获取联系人 {wxid} 信息失败: {str(e)}")
@@ -439,7 +454,7 @@ class XYBot:
                         'nickname': wxid,
                         'type': 'friend' if not wxid.endswith("@chatroom") else 'group'
                     }
-                    update_contact_in_db(contact_info)
+                    contact_cache.update_contact(contact_info)
                     logger.debug(f"已在消息处理中更新联系人 {wxid} 的基本信息(异常处理)")
         except Exception as e:
             logger.error(f"更新联系人信息时发生异常: {str(e)}")
@@ -472,7 +487,8 @@ class XYBot:
 
         # 异步更新发送者联系人信息
         from_wxid = message.get("FromWxid", "")
-        if from_wxid and from_wxid != self.wxid:
+        # 已缓存的联系人直接跳过，不再为每条消息创建更新任务
+        if from_wxid and from_wxid != self.wxid and not contact_cache.is_known(from_wxid):
             # 如果是群聊，只更新群聊本身信息
             if from_wxid.endswith("@chatroom"):
                 logger.info(f"开始异步更新群聊信息: {from_wxid}")
@@ -563,6 +579,7 @@ class XYBot:
             logger.info("收到被@消息: 消息ID:{} 来自:{} 发送人:{} @:{} 内容:{}",
                         message.get("MsgId", ""), message["FromWxid"],
                         message["SenderWxid"], message["Ats"], message["Content"])
+            message_bus.publish("at", message)
             if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
                 if self.ignore_protection or not protector.check(14400):
                     # 先检查消息是否包含唤醒词
@@ -579,6 +596,7 @@ class XYBot:
         logger.info("收到文本消息: 消息ID:{} 来自:{} 发送人:{} @:{} 内容:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Ats"], message["Content"])
+        message_bus.publish("text", message)
 
         # 检查是否需要处理该消息（群聊唤醒词检查）
         should_process = await self.check_group_wakeup_word(message)
@@ -616,6 +634,7 @@ class XYBot:
         logger.info("收到图片消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Content"])
+        message_bus.publish("image", message)
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -728,6 +747,7 @@ class XYBot:
         logger.info("收到语音消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Content"])
+        message_bus.publish("voice", message)
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -788,6 +808,7 @@ class XYBot:
         logger.info("收到表情消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["ActualUserWxid"], message["Content"])
+        message_bus.publish("emoji", message, SenderWxid=message["ActualUserWxid"])
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -875,6 +896,7 @@ class XYBot:
             logger.info("收到链接分享消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                         message.get("MsgId", ""), message["FromWxid"],
                         message["SenderWxid"], message["Content"])
+            message_bus.publish("link", message)
             logger.debug("完整 XML 内容: {}", message["Content"])
             if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
                 if self.ignore_protection or not protector.check(14400):
@@ -984,6 +1006,7 @@ class XYBot:
         logger.info("收到引用消息: 消息ID:{} 来自:{} 发送人:{} 内容:{} 引用:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Content"], message["Quote"])
+        message_bus.publish("quote", message)
 
         if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
             if self.ignore_protection or not protector.check(14400):
@@ -1015,6 +1038,7 @@ class XYBot:
         logger.info("收到视频消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Content"])
+        message_bus.publish("video", message)
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -1050,6 +1074,7 @@ class XYBot:
         logger.info("收到文件消息: 消息ID:{} 来自:{} 发送人:{} XML:{}",
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Content"])
+        message_bus.publish("file", message)
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -1097,18 +1122,52 @@ class XYBot:
             logger.error("解析系统消息失败: {}, 内容: {}", e, message["Content"])
             return
 
+        if msg_type == "sysmsgtemplate" and message["IsGroup"]:
+            # 入群、移出群聊消息增量更新群成员缓存
+            self.update_group_members_from_sysmsg(message["FromWxid"], root)
+
         if msg_type == "pat":
             await self.process_pat_message(message)
         elif msg_type == "ClientCheckGetExtInfo":
             pass
         else:
             logger.info("收到系统消息: {}, 完整内容: {}", message, message["Content"])
+            message_bus.publish("system", message)
             if self.ignore_check(message["FromWxid"], message["SenderWxid"]):
                 if self.ignore_protection or not protector.check(14400):
                     await EventManager.emit("system_message", self.bot, message)
                 else:
                     logger.warning("风控保护: 新设备登录后4小时内请挂机")
 
+    @staticmethod
+    def _parse_sysmsg_members(root: ET.Element, link_name: str) -> list:
+        """解析系统消息模板中指定链接下的成员列表"""
+        members = []
+        link = root.find(f".//link[@name='{link_name}']")
+        if link is None or link.find("memberlist") is None:
+            return members
+        for member in link.find("memberlist").findall("member"):
+            username = member.findtext("username")
+            if username:
+                members.append({"wxid": username, "nickname": member.findtext("nickname") or ""})
+        return members
+
+    def update_group_members_from_sysmsg(self, group_wxid: str, root: ET.Element):
+        """根据入群、移出群聊的系统消息增量更新群成员缓存"""
+        template = root.findtext(".//content_template/template") or ""
+        try:
+            if "加入了群聊" in template or "加入群聊" in template:
+                link_name = "adder" if "$adder$" in template else "names"
+                members = self._parse_sysmsg_members(root, link_name)
+                group_member_cache.apply_join(group_wxid, members)
+                logger.debug(f"群 {group_wxid} 新增成员: {[m['wxid'] for m in members]}")
+            elif "移出了群聊" in template:
+                members = self._parse_sysmsg_members(root, "kickoutname")
+                group_member_cache.apply_leave(group_wxid, [m["wxid"] for m in members])
+                logger.debug(f"群 {group_wxid} 移除成员: {[m['wxid'] for m in members]}")
+        except Exception as e:
+            logger.warning(f"根据系统消息更新群成员失败: {e}")
+
     async def process_pat_message(self, message: Dict[str, Any]):
         """处理拍一拍请求消息"""
         try:
@@ -1129,6 +1188,7 @@ class XYBot:
                     message.get("MsgId", ""), message["FromWxid"],
                     message["SenderWxid"], message["Patter"],
                     message["Patted"], message["PatSuffix"])
+        message_bus.publish("pat", message)
 
         await self.msg_db.save_message(
             msg_id=int(message.get("MsgId", 0)),
@@ -1164,37 +1224,21 @@ class XYBot:
         # 检查消息是否包含Ats字段，并且机器人的wxid在Ats列表中
         if "Ats" in message and self.wxid in message["Ats"]:
             # 尝试从消息内容中移除@部分
-            # 从main_config.toml中读取机器人名称列表
-            robot_names = []
-            try:
-                # 读取main_config.toml中的配置
-                import tomllib
-                with open("main_config.toml", "rb") as f:
-                    main_config = tomllib.load(f)
-                    robot_names = main_config.get("XYBot", {}).get("robot-names", [])
-                    logger.debug(f"从main_config.toml中读取到机器人名称列表: {robot_names}")
-            except Exception as e:
-                logger.error(f"读取main_config.toml中的机器人名称失败: {e}")
-
-            # 如果配置文件中没有设置或读取失败，使用默认值
-            if not robot_names:
-                robot_names = ["小小x", "小x", "机器人"]
-                logger.debug(f"使用默认机器人名称列表: {robot_names}")
+            # 机器人名称列表在初始化时从main_config.toml中读取
+            robot_names = list(self.robot_names)
 
             # 添加机器人自己的昵称
             if self.nickname and self.nickname not in robot_names:
                 robot_names.append(self.nickname)
 
-            # 尝试从群成员列表中获取机器人的群昵称
+            # 从群成员缓存中获取机器人的群昵称，缓存未命中时才请求成员列表
             if message["FromWxid"].endswith("@chatroom"):
                 try:
-                    # 异步获取群成员列表
-                    members = await self.get_chatroom_member_list(message["FromWxid"])
-                    for member in members:
-                        if member.get("wxid") == self.wxid and member.get("nickname"):
-                            robot_names.append(member["nickname"])
-                            logger.debug(f"从群成员列表中获取到机器人的群昵称: {member['nickname']}")
-                            break
+                    group_name = await group_member_cache.get_bot_display_name(message["FromWxid"],
+                                                                               self.get_chatroom_member_list)
+                    if group_name and group_name not in robot_names:
+                        robot_names.append(group_name)
+                        logger.debug(f"从群成员缓存中获取到机器人的群昵称: {group_name}")
                 except Exception as e:
                     logger.warning(f"获取群成员列表失败: {e}")
 
@@ -1228,281 +1272,41 @@ class XYBot:
         message["Content"] = content
 
         try:
-            # 遍历所有已加载的插件，按优先级排序
-            plugins_by_priority = {}
-            for plugin_name, plugin in plugin_manager.plugins.items():
-                # 获取插件的优先级
-                priority = 50  # 默认优先级
-
-                # 检查插件是否有处理@消息的方法
-                for method_name in dir(plugin):
-                    method = getattr(plugin, method_name)
-                    if hasattr(method, '_event_type') and method._event_type == 'at_message':
-                        # 如果有，获取其优先级
-                        priority = getattr(method, '_priority', 50)
-                        break
-
-                # 将插件添加到对应优先级的列表中
-                if priority not in plugins_by_priority:
-                    plugins_by_priority[priority] = []
-                plugins_by_priority[priority].append((plugin_name, plugin))
-
-            # 按优先级从高到低排序
-            priorities = sorted(plugins_by_priority.keys(), reverse=True)
-
-            # 检查每个插件的唤醒词
-            for priority in priorities:
-                for plugin_name, plugin in plugins_by_priority[priority]:
-                    # 1. 检查插件是否有唤醒词属性
-                    if hasattr(plugin, 'wakeup_words') and plugin.wakeup_words:
-                        for wakeup_word in plugin.wakeup_words:
-                            if wakeup_word.lower() in content.lower():
-                                logger.info(f"检测到插件 {plugin_name} 的唤醒词: {wakeup_word}")
-                                # 触发该插件的at_message事件
-                                for method_name in dir(plugin):
-                                    method = getattr(plugin, method_name)
-                                    if hasattr(method, '_event_type') and method._event_type == 'at_message':
-                                        # 调用插件的at_message处理方法
-                                        result = await method(self.bot, message)
-                                        # 如果插件返回False，表示阻止后续处理
-                                        if result is False:
-                                            return True
-                                        break
-
-                    # 2. 检查Dify插件的特殊处理
-                    if plugin_name == "Dify" and hasattr(plugin, 'wakeup_word_to_model') and plugin.wakeup_word_to_model:
-                        for wakeup_word in plugin.wakeup_word_to_model.keys():
-                            content_lower = content.lower()
-                            wakeup_lower = wakeup_word.lower()
-                            if content_lower.startswith(wakeup_lower) or f" {wakeup_lower}" in content_lower:
-                                logger.info(f"检测到Dify插件的唤醒词: {wakeup_word}")
-                                # 触发Dify插件的at_message事件
-                                for method_name in dir(plugin):
-                                    method = getattr(plugin, method_name)
-                                    if hasattr(method, '_event_type') and method._event_type == 'at_message':
-                                        # 调用插件的at_message处理方法
-                                        result = await method(self.bot, message)
-                                        # 如果插件返回False，表示阻止后续处理
-                                        if result is False:
-                                            return True
-                                        break
-
-                    # 3. 检查插件的触发词属性（如YujieSajiao插件的trigger_words）
-                    if hasattr(plugin, 'trigger_words') and plugin.trigger_words:
-                        for trigger_word in plugin.trigger_words:
-                            if trigger_word.lower() in content.lower():
-                                logger.info(f"检测到插件 {plugin_name} 的触发词: {trigger_word}")
-
-                                # 检查插件是否有处理文本消息的方法
-                                text_message_method = None
-                                for method_name in dir(plugin):
-                                    method = getattr(plugin, method_name)
-                                    if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                        text_message_method = method
-                                        break
-
-                                if text_message_method:
-                                    # 创建一个临时消息对象，模拟文本消息
-                                    temp_message = message.copy()
-                                    # 使用处理后的内容（移除了@部分）
-                                    temp_message["Content"] = content
-
-                                    # 调用插件的text_message处理方法
-                                    result = await text_message_method(self.bot, temp_message)
-
-                                    # 如果插件返回False，表示阻止后续处理
-                                    if result is False:
-                                        return True
-                                break
-
-                    # 4. 检查插件的commands属性（常见于AI对话插件）
-                    if hasattr(plugin, 'commands') and plugin.commands:
-                        for command in plugin.commands:
-                            # 检查两种情况：
-                            # 1. 内容以命令开头（前缀匹配）
-                            # 2. 内容的第一个词与命令完全匹配（完全匹配，用于FastGPT等插件）
-                            content_first_word = content.split(" ", 1)[0].lower()
-                            if content.lower().startswith(command.lower()) or content_first_word == command.lower():
-                                logger.info(f"检测到插件 {plugin_name} 的命令: {command}")
-
-                                # 检查插件是否有处理文本消息的方法
-                                text_message_method = None
-                                for method_name in dir(plugin):
-                                    method = getattr(plugin, method_name)
-                                    if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                        text_message_method = method
-                                        break
-
-                                if text_message_method:
-                                    # 创建一个临时消息对象，模拟文本消息
-                                    temp_message = message.copy()
-                                    # 使用处理后的内容（移除了@部分）
-                                    temp_message["Content"] = content
-
-                                    # 调用插件的text_message处理方法
-                                    result = await text_message_method(self.bot, temp_message)
-
-                                    # 如果插件返回False，表示阻止后续处理
-                                    if result is False:
-                                        return True
-                                break
-
-                    # 4.1 检查插件的command属性（单数形式，如VideoDemand插件）
-                    if hasattr(plugin, 'command') and plugin.command:
-                        # 处理列表类型的command
-                        if isinstance(plugin.command, list):
-                            for cmd in plugin.command:
-                                if isinstance(cmd, str) and content.lower() == cmd.lower():
-                                    logger.info(f"检测到插件 {plugin_name} 的命令(单数形式): {cmd}")
-
-                                    # 检查插件是否有处理文本消息的方法
-                                    text_message_method = None
-                                    for method_name in dir(plugin):
-                                        method = getattr(plugin, method_name)
-                                        if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                            text_message_method = method
-                                            break
-
-                                    if text_message_method:
-                                        # 创建一个临时消息对象，模拟文本消息
-                                        temp_message = message.copy()
-                                        # 使用处理后的内容（移除了@部分）
-                                        temp_message["Content"] = content
-
-                                        # 调用插件的text_message处理方法
-                                        result = await text_message_method(self.bot, temp_message)
-
-                                        # 如果插件返回False，表示阻止后续处理
-                                        if result is False:
-                                            return True
-                                    break
-                        # 处理字符串类型的command
-                        elif isinstance(plugin.command, str) and content.lower() == plugin.command.lower():
-                            logger.info(f"检测到插件 {plugin_name} 的命令(单数形式): {plugin.command}")
-
-                            # 检查插件是否有处理文本消息的方法
-                            text_message_method = None
-                            for method_name in dir(plugin):
-                                method = getattr(plugin, method_name)
-                                if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                    text_message_method = method
-                                    break
-
-                            if text_message_method:
-                                # 创建一个临时消息对象，模拟文本消息
-                                temp_message = message.copy()
-                                # 使用处理后的内容（移除了@部分）
-                                temp_message["Content"] = content
-
-                                # 调用插件的text_message处理方法
-                                result = await text_message_method(self.bot, temp_message)
-
-                                # 如果插件返回False，表示阻止后续处理
-                                if result is False:
-                                    return True
-
-                    # 5. 检查插件的所有可能的command属性
-                    # 自动检测插件的所有属性，查找可能的命令
-                    for attr_name in dir(plugin):
-                        # 只检查包含'command'的属性名，并且不是方法或内置属性
-                        if 'command' in attr_name.lower() and not attr_name.startswith('__') and not callable(getattr(plugin, attr_name)):
-                            command_value = getattr(plugin, attr_name)
-
-                            # 处理字符串类型的命令
-                            if isinstance(command_value, str) and content.lower() == command_value.lower():
-                                logger.info(f"检测到插件 {plugin_name} 的命令: {command_value}")
-
-                                # 检查插件是否有处理文本消息的方法
-                                text_message_method = None
-                                for method_name in dir(plugin):
-                                    method = getattr(plugin, method_name)
-                                    if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                        text_message_method = method
-                                        break
-
-                                if text_message_method:
-                                    # 创建一个临时消息对象，模拟文本消息
-                                    temp_message = message.copy()
-                                    # 使用处理后的内容（移除了@部分）
-                                    temp_message["Content"] = content
-
-                                    # 调用插件的text_message处理方法
-                                    result = await text_message_method(self.bot, temp_message)
-
-                                    # 如果插件返回False，表示阻止后续处理
-                                    if result is False:
-                                        return True
-                                break
-
-                            # 处理列表类型的命令
-                            elif isinstance(command_value, list):
-                                for cmd in command_value:
-                                    if isinstance(cmd, str) and content.lower() == cmd.lower():
-                                        logger.info(f"检测到插件 {plugin_name} 的命令: {cmd}")
-
-                                        # 检查插件是否有处理文本消息的方法
-                                        text_message_method = None
-                                        for method_name in dir(plugin):
-                                            method = getattr(plugin, method_name)
-                                            if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                                text_message_method = method
-                                                break
-
-                                        if text_message_method:
-                                            # 创建一个临时消息对象，模拟文本消息
-                                            temp_message = message.copy()
-                                            # 使用处理后的内容（移除了@部分）
-                                            temp_message["Content"] = content
-
-                                            # 调用插件的text_message处理方法
-                                            result = await text_message_method(self.bot, temp_message)
-
-                                            # 如果插件返回False，表示阻止后续处理
-                                            if result is False:
-                                                return True
-                                        break
-
-                    # 6. 检查插件的command_prefix属性（如DifyConversationManager插件的command_prefix）
-                    if hasattr(plugin, 'command_prefix') and isinstance(plugin.command_prefix, str):
-                        prefix = plugin.command_prefix
-                        if content.startswith(prefix):
-                            logger.info(f"检测到插件 {plugin_name} 的命令前缀: {prefix}")
-
-                            # 检查插件是否有处理文本消息的方法
-                            text_message_method = None
-                            for method_name in dir(plugin):
-                                method = getattr(plugin, method_name)
-                                if hasattr(method, '_event_type') and method._event_type == 'text_message':
-                                    text_message_method = method
-                                    break
-
-                            if text_message_method:
-                                # 创建一个临时消息对象，模拟文本消息
-                                temp_message = message.copy()
-                                # 使用处理后的内容（移除了@部分）
-                                temp_message["Content"] = content
-
-                                # 调用插件的text_message处理方法
-                                result = await text_message_method(self.bot, temp_message)
-
-                                # 如果插件返回False，表示阻止后续处理
-                                if result is False:
-                                    return True
-
-                    # 6. 通用处理：检查插件的at_message方法
-                    # 许多插件没有明确定义命令属性，而是在处理方法中直接检查命令
-                    # 我们直接调用插件的at_message方法，让插件自己判断是否处理该消息
-                    for method_name in dir(plugin):
-                        method = getattr(plugin, method_name)
-                        if hasattr(method, '_event_type') and method._event_type == 'at_message':
-                            # 调用插件的at_message处理方法
-                            result = await method(self.bot, message)
-                            # 如果插件返回False，表示它处理了消息并阻止后续处理
-                            if result is False:
-                                logger.info(f"插件 {plugin_name} 处理了@消息")
-                                return True
-                            # 如果插件返回True，表示它没有处理消息，继续检查其他插件
-                            break
+            # 插件集合变化后索引会被标记失效，这里按需重建
+            wakeup_index.ensure(plugin_manager.plugins)
+            # 对消息内容只做一次扫描，得到所有命中的 (插件名, 类别)
+            hits = wakeup_index.match(content)
+
+            # 按优先级从高到低检查每个插件
+            for entry in wakeup_index.entries:
+                # 1. 插件唤醒词（包括Dify插件的wakeup_word_to_model）
+                if entry.at_handler and (entry.name, KIND_AT) in hits:
+                    logger.info(f"检测到插件 {entry.name} 的唤醒词")
+                    # 调用插件的at_message处理方法，如果插件返回False，表示阻止后续处理
+                    if await entry.at_handler(self.bot, message) is False:
+                        return True
+
+                # 2. 插件的触发词、命令、命令前缀
+                if entry.text_handler and (entry.name, KIND_TEXT) in hits:
+                    logger.info(f"检测到插件 {entry.name} 的触发词或命令")
+                    # 创建一个临时消息对象，模拟文本消息
+                    temp_message = message.copy()
+                    # 使用处理后的内容（移除了@部分）
+                    temp_message["Content"] = content
+
+                    # 调用插件的text_message处理方法，如果插件返回False，表示阻止后续处理
+                    if await entry.text_handler(self.bot, temp_message) is False:
+                        return True
+
+                # 3. 通用处理：检查插件的at_message方法
+                # 许多插件没有明确定义命令属性，而是在处理方法中直接检查命令
+                # 我们直接调用插件的at_message方法，让插件自己判断是否处理该消息
+                if entry.at_handler:
+                    result = await entry.at_handler(self.bot, message)
+                    # 如果插件返回False，表示它处理了消息并阻止后续处理
+                    if result is False:
+                        logger.info(f"插件 {entry.name} 处理了@消息")
+                        return True
         finally:
             # 恢复原始消息内容
             message["Content"] = original_message_content